@@ -0,0 +1,116 @@
+"""
+Benchmark of model load time and memory, cloudpickle files vs. native artifact directories.
+
+A CatBoost and a LightGBM model are trained on synthetic data, and saved in both formats. Each load
+is then measured in a fresh Python process, after the model libraries are imported, so the reported
+resident set size (RSS) growth only covers the loaded model.
+
+Usage:
+    python benchmarks/bench_artifact_load.py --rows 200000 --n-estimators 500 --repeat 5
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import make_sales_data, train_model
+
+FORMATS = ("pickle", "native")
+
+
+def _rss_kb() -> int:
+    with open("/proc/self/status", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure_load(path: str) -> dict:
+    """
+    Loads a model in the current process, and returns the load time and RSS growth.
+    """
+    # pylint: disable=import-outside-toplevel, unused-import
+    import catboost  # noqa: F401
+    import lightgbm  # noqa: F401
+    from usf_model_api.models.artifacts import load_model
+
+    before = _rss_kb()
+    start = time.perf_counter()
+    model = load_model(path)
+    elapsed = time.perf_counter() - start
+    after = _rss_kb()
+    assert model is not None
+
+    return {"load_ms": elapsed * 1e3, "rss_mb": (after - before) / 1024}
+
+
+def run(n_rows: int, n_estimators: int, repeat: int) -> list:
+    # pylint: disable=import-outside-toplevel
+    from usf_model_api.models.artifacts import ARTIFACT_SUFFIX, save_artifact
+
+    data = make_sales_data(n_rows)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in ("catboost", "lgbm"):
+            model = train_model(name, data, n_estimators=n_estimators)
+            paths = {
+                "pickle": Path(tmp_dir) / f"{name}.pkl",
+                "native": Path(tmp_dir) / f"{name}{ARTIFACT_SUFFIX}",
+            }
+            model.serialize(paths["pickle"])
+            save_artifact(model, paths["native"])
+
+            for fmt in FORMATS:
+                size = sum(p.stat().st_size for p in [paths[fmt], *paths[fmt].glob("*")])
+                samples = [
+                    json.loads(
+                        subprocess.run(
+                            [sys.executable, __file__, "--child", str(paths[fmt])],
+                            check=True,
+                            capture_output=True,
+                            text=True,
+                        ).stdout
+                    )
+                    for _ in range(repeat)
+                ]
+                results.append(
+                    {
+                        "model": name,
+                        "format": fmt,
+                        "size_mb": size / 2**20,
+                        "load_ms": min(s["load_ms"] for s in samples),
+                        "rss_mb": min(s["rss_mb"] for s in samples),
+                    }
+                )
+
+    return results
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark model artifact load time and RSS.")
+    parser.add_argument("--rows", type=int, default=100_000, help="Training rows.")
+    parser.add_argument("--n-estimators", type=int, default=500, help="Trees per model.")
+    parser.add_argument("--repeat", type=int, default=5, help="Loads per model and format.")
+    parser.add_argument("--child", type=str, default=None, help=argparse.SUPPRESS)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.child is not None:
+        print(json.dumps(measure_load(args.child)))
+    else:
+        for result in run(args.rows, args.n_estimators, args.repeat):
+            print(
+                " ".join(
+                    f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}"
+                    for k, v in result.items()
+                )
+            )
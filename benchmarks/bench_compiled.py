@@ -0,0 +1,116 @@
+"""
+Benchmark of small-batch prediction latency, native vs. compiled tree ensembles.
+
+A CatBoost and a LightGBM model are trained on synthetic data and compiled with
+``compile_model()``. Each model then predicts random request batches of every batch size, one
+batch at a time on a single thread, and the p50/p95 latency of ``model.predict()`` is reported for
+the native and the compiled predictor.
+
+Usage:
+    python benchmarks/bench_compiled.py --rows 100000 --n-estimators 500 \\
+        --batch-size 1 --batch-size 10 --batch-size 100 --batch-size 1000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from common import START_DATE, N_DAYS, N_ITEMS, N_STORES, make_sales_data, train_model
+
+DEFAULT_BATCH_SIZES = [1, 10, 100, 1000]
+
+
+def make_batches(n: int, batch_size: int, seed: int = 0) -> list:
+    """
+    Returns ``n`` random request batches of ``batch_size`` rows each.
+    """
+    rng = np.random.default_rng(seed)
+    return [
+        pd.DataFrame(
+            {
+                "date": (np.datetime64(START_DATE) + rng.integers(0, N_DAYS, batch_size)).astype(
+                    str
+                ),
+                "store": rng.integers(1, N_STORES + 1, batch_size),
+                "item": rng.integers(1, N_ITEMS + 1, batch_size),
+            }
+        )
+        for _ in range(n)
+    ]
+
+
+def measure(model, batches: list, predict_params: dict) -> dict:
+    """
+    Predicts every batch in turn (after a warm-up), and returns the latency percentiles.
+    """
+    model.predict(batches[0], **predict_params)
+    latencies = []
+    for batch in batches:
+        start = time.perf_counter()
+        model.predict(batch, **predict_params)
+        latencies.append(time.perf_counter() - start)
+
+    p50, p95 = np.percentile(latencies, [50, 95]) * 1e3
+    return {"p50_ms": p50, "p95_ms": p95}
+
+
+def run(n_rows: int, n_estimators: int, batch_sizes: list, n_batches: int) -> list:
+    # pylint: disable=import-outside-toplevel
+    from usf_model_api.models.compiled import compile_model
+
+    data = make_sales_data(n_rows)
+    results = []
+    for name in ("catboost", "lgbm"):
+        model = train_model(name, data, n_estimators=n_estimators)
+        compiled = compile_model(model, make_batches(1, 10_000, seed=1)[0])
+        # Native predictors are capped to one thread, as the compiled ones run on one
+        thread_param = {"catboost": "thread_count", "lgbm": "num_threads"}[name]
+
+        for batch_size in batch_sizes:
+            batches = make_batches(n_batches, batch_size)
+            native = measure(model, batches, {thread_param: 1})
+            fast = measure(compiled, batches, {})
+            results.append(
+                {
+                    "model": name,
+                    "batch_size": batch_size,
+                    "native_p50_ms": native["p50_ms"],
+                    "native_p95_ms": native["p95_ms"],
+                    "compiled_p50_ms": fast["p50_ms"],
+                    "compiled_p95_ms": fast["p95_ms"],
+                    "speedup_p50": native["p50_ms"] / fast["p50_ms"],
+                }
+            )
+
+    return results
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark small-batch latency of native vs. compiled models."
+    )
+    parser.add_argument("--rows", type=int, default=100_000, help="Training rows.")
+    parser.add_argument("--n-estimators", type=int, default=500, help="Trees per model.")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        action="append",
+        default=None,
+        help=f"Rows per batch; repeatable (default is {DEFAULT_BATCH_SIZES}).",
+    )
+    parser.add_argument("--batches", type=int, default=200, help="Batches per configuration.")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    for result in run(
+        args.rows, args.n_estimators, args.batch_size or DEFAULT_BATCH_SIZES, args.batches
+    ):
+        print(
+            " ".join(
+                f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}" for k, v in result.items()
+            )
+        )
@@ -0,0 +1,298 @@
+"""
+Load test of the sales forecasting ``/predict`` endpoint.
+
+Small CatBoost and LightGBM models are trained on synthetic data (through ``train_models()``), and
+``[POST] /sales-forecasting/predict`` is driven with every combination of batch size, concurrency and
+model mix, either in-process (through the ASGI app, without a network) or over local HTTP (against a
+``uvicorn`` server started in a subprocess). For each configuration, the p50/p95/p99 latency,
+request and row throughput, and the resident set size (RSS) of the serving process are reported.
+
+Results are written as JSON, together with the commit and environment they were measured on, so
+that runs can be compared across commits with ``--baseline``.
+
+Usage:
+    python benchmarks/bench_predict_load.py --mode in-process --mode http \\
+        --batch-size 1 --batch-size 100 --concurrency 1 --concurrency 16 \\
+        --model-mix catboost --model-mix mixed --output results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from common import START_DATE, N_ITEMS, N_STORES, train_saved_models
+
+ROOT = Path(__file__).resolve().parent.parent
+PREDICT_PATH = "/sales-forecasting/predict"
+MODEL_MIXES = {
+    "catboost": ["catboost"],
+    "lgbm": ["lgbm"],
+    "mixed": ["catboost", "lgbm"],
+}
+SUMMARY_KEYS = ("p50_ms", "p95_ms", "p99_ms", "requests_per_s", "rows_per_s", "rss_mb")
+
+
+def _rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+
+    return float("nan")
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_payloads(n: int, batch_size: int, model_mix: str, seed: int = 0) -> List[bytes]:
+    """
+    Returns ``n`` encoded ``/predict`` request bodies of ``batch_size`` requests each. With a mixed
+    model mix, the models are assigned to requests at random.
+    """
+    rng = np.random.default_rng(seed)
+    models = MODEL_MIXES[model_mix]
+    dates = np.datetime64(START_DATE) + np.arange(5 * 365)
+    payloads = []
+    for _ in range(n):
+        body = [
+            {
+                "date": str(dates[rng.integers(len(dates))]),
+                "store": int(rng.integers(1, N_STORES + 1)),
+                "item": int(rng.integers(1, N_ITEMS + 1)),
+                "model_id": models[rng.integers(len(models))],
+            }
+            for _ in range(batch_size)
+        ]
+        payloads.append(json.dumps(body[0] if batch_size == 1 else body).encode())
+
+    return payloads
+
+
+async def drive(
+    client: httpx.AsyncClient, payloads: List[bytes], concurrency: int, warmup: int
+) -> Dict[str, Any]:
+    """
+    Sends the payloads with ``concurrency`` concurrent clients, each waiting for its response
+    before sending its next request, and returns the latency and throughput statistics.
+    """
+    headers = {"Content-Type": "application/json"}
+    for payload in payloads[:warmup]:
+        (await client.post(PREDICT_PATH, content=payload, headers=headers)).raise_for_status()
+
+    queue = list(reversed(payloads[warmup:]))
+    latencies, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        while queue:
+            payload = queue.pop()
+            start = time.perf_counter()
+            response = await client.post(PREDICT_PATH, content=payload, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            errors += response.status_code != 200
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1e3
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "p99_ms": p99,
+        "requests_per_s": len(latencies) / elapsed,
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class HttpServer:
+    """
+    Runs the app with ``uvicorn`` in a subprocess, for the duration of a ``with`` block.
+    """
+
+    def __init__(self, env: Dict[str, str]):
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.env = env
+        self.process: Optional[subprocess.Popen] = None
+
+    def __enter__(self) -> "HttpServer":
+        self.process = subprocess.Popen(  # pylint: disable=consider-using-with
+            [sys.executable, "-m", "uvicorn", "service.api:app", "--port", str(self.port)],
+            cwd=ROOT,
+            env=self.env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            try:
+                httpx.get(f"{self.url}/sales-forecasting/status").raise_for_status()
+                return self
+            except httpx.HTTPError:
+                if self.process.poll() is not None:
+                    raise RuntimeError("The server exited during startup.") from None
+                time.sleep(0.2)
+
+        raise RuntimeError("The server did not start within 60 seconds.")
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.wait()
+
+
+async def run_in_process(configs: List[Dict[str, Any]], args: argparse.Namespace) -> List[dict]:
+    # pylint: disable=import-outside-toplevel
+    from service.api import app
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for cfg in configs:
+            payloads = make_payloads(
+                args.requests + args.warmup, cfg["batch_size"], cfg["model_mix"]
+            )
+            stats = await drive(client, payloads, cfg["concurrency"], args.warmup)
+            results.append({**cfg, **stats, "rss_mb": _rss_mb(os.getpid())})
+
+    return results
+
+
+async def run_http(configs: List[Dict[str, Any]], args: argparse.Namespace) -> List[dict]:
+    results = []
+    with HttpServer(env=dict(os.environ)) as server:
+        limits = httpx.Limits(max_connections=max(c["concurrency"] for c in configs))
+        async with httpx.AsyncClient(base_url=server.url, limits=limits, timeout=60) as client:
+            for cfg in configs:
+                payloads = make_payloads(
+                    args.requests + args.warmup, cfg["batch_size"], cfg["model_mix"]
+                )
+                stats = await drive(client, payloads, cfg["concurrency"], args.warmup)
+                results.append({**cfg, **stats, "rss_mb": _rss_mb(server.process.pid)})
+
+    return results
+
+
+def compare(results: List[dict], baseline_path: str):
+    """
+    Prints the relative change of each statistic from a previous run, for matching configurations.
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    def key(r: dict) -> tuple:
+        return (r["mode"], r["batch_size"], r["concurrency"], r["model_mix"])
+
+    previous = {key(r): r for r in baseline["results"]}
+    print(f"Compared to {baseline_path} (commit {baseline.get('commit')}):")
+    for result in results:
+        before = previous.get(key(result))
+        if before is None:
+            continue
+
+        changes = " ".join(
+            f"{k}={(result[k] - before[k]) / before[k]:+.1%}" for k in SUMMARY_KEYS if before[k]
+        )
+        mode, batch_size, concurrency, model_mix = key(result)
+        print(f"  {mode} batch={batch_size} concurrency={concurrency} mix={model_mix}: {changes}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load test the /predict endpoint.")
+    parser.add_argument(
+        "--mode", action="append", choices=["in-process", "http"], default=[], help="Drivers."
+    )
+    parser.add_argument("--batch-size", action="append", type=int, default=[], help="Rows/request.")
+    parser.add_argument("--concurrency", action="append", type=int, default=[], help="Clients.")
+    parser.add_argument(
+        "--model-mix", action="append", choices=sorted(MODEL_MIXES), default=[], help="Models."
+    )
+    parser.add_argument("--requests", type=int, default=200, help="Requests per configuration.")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests first.")
+    parser.add_argument("--train-rows", type=int, default=50_000, help="Training rows.")
+    parser.add_argument("--n-estimators", type=int, default=200, help="Trees per model.")
+    parser.add_argument("--model-dir", type=str, default=None, help="Use these models instead.")
+    parser.add_argument("--output", type=str, default="bench_predict_load.json", help="JSON file.")
+    parser.add_argument("--baseline", type=str, default=None, help="Previous JSON to compare to.")
+
+    return parser.parse_args()
+
+
+def main(args: argparse.Namespace):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model_dir = args.model_dir
+        if model_dir is None:
+            model_dir = train_saved_models(
+                Path(tmp_dir) / "models", args.train_rows, n_estimators=args.n_estimators
+            )
+
+        # The service reads its settings when imported (in-process) or started (over HTTP)
+        os.environ["USF_MODEL_DIR"] = str(model_dir)
+        os.environ["PYTHONPATH"] = os.pathsep.join(
+            p for p in (str(ROOT / "src"), os.environ.get("PYTHONPATH")) if p
+        )
+
+        configs = [
+            {"batch_size": b, "concurrency": c, "model_mix": m}
+            for m in args.model_mix or ["mixed"]
+            for b in args.batch_size or [1, 100]
+            for c in args.concurrency or [1, 8]
+        ]
+        results = []
+        for mode in args.mode or ["in-process"]:
+            runner = run_in_process if mode == "in-process" else run_http
+            for result in asyncio.run(runner(configs, args)):
+                result = {"mode": mode, **result}
+                result["rows_per_s"] = result["requests_per_s"] * result["batch_size"]
+                results.append(result)
+                print(
+                    " ".join(
+                        f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}"
+                        for k, v in result.items()
+                    )
+                )
+
+    output = {
+        "commit": _git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2)
+    print(f"Wrote results to {args.output}")
+
+    if args.baseline is not None:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main(parse_args())
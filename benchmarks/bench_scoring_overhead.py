@@ -0,0 +1,130 @@
+"""
+Micro-benchmark for the per-row overhead of the sales forecasting scoring path.
+
+The models are replaced with constant predictors whose own run time is measured separately, so the
+reported overhead is the pandas/NumPy work the router does around inference (partitioning, ID and
+timestamp generation, and assembling the scored frame). The current implementation is compared
+against the previous per-model boolean-mask loop.
+
+Usage:
+    python benchmarks/bench_scoring_overhead.py --rows 1000 --rows 100000 --models 2 --models 50
+"""
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+from uuid import uuid4
+
+import numpy as np
+import pandas as pd
+
+# Ugly hack, but it works for now
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from service.routers.sales_forecasting.router import SIMPLE_DB, _score  # noqa: E402
+
+
+class ConstantModel:
+    """
+    A stand-in for ``PredictionModel`` that returns zeros and records how long it spent predicting.
+    """
+
+    def __init__(self):
+        self.elapsed = 0.0
+
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        start = time.perf_counter()
+        predictions = np.zeros(len(X))
+        self.elapsed += time.perf_counter() - start
+        return predictions
+
+
+def _legacy_score(scoring_df: pd.DataFrame, get_model) -> pd.DataFrame:
+    # The scoring loop as it was before the single-pass rewrite, kept for comparison
+    scoring_df = scoring_df.copy()
+    scoring_df.insert(0, column="prediction_id", value=None)
+    scoring_df["prediction"] = None
+    scoring_df["created_at"] = None
+    features = sorted(
+        set(scoring_df.columns) - {"model_id", "prediction_id", "prediction", "created_at"}
+    )
+    for m in scoring_df["model_id"].unique():
+        model = get_model(m)
+        predictions = model.predict(X=scoring_df.loc[scoring_df["model_id"] == m, features])
+        scoring_df.loc[scoring_df["model_id"] == m, "prediction"] = predictions
+        scoring_df.loc[scoring_df["model_id"] == m, "prediction_id"] = [
+            str(uuid4()) for _ in range(len(predictions))
+        ]
+        scoring_df.loc[scoring_df["model_id"] == m, "created_at"] = pd.to_datetime(
+            datetime.utcnow()
+        ).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+    assert not scoring_df.isnull().values.any()
+    return scoring_df
+
+
+def make_scoring_df(n_rows: int, n_models: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2018-01-01", periods=90).strftime("%Y-%m-%d").to_numpy()
+    return pd.DataFrame(
+        {
+            "model_id": np.array([f"model_{i}" for i in range(n_models)])[
+                rng.integers(0, n_models, n_rows)
+            ],
+            "date": dates[rng.integers(0, len(dates), n_rows)],
+            "store": rng.integers(1, 11, n_rows),
+            "item": rng.integers(1, 51, n_rows),
+        }
+    )
+
+
+def run(n_rows: int, n_models: int, repeat: int) -> dict:
+    scoring_df = make_scoring_df(n_rows, n_models)
+    results = {"rows": n_rows, "models": n_models}
+    loop = asyncio.new_event_loop()
+
+    for name, score in (
+        ("current", lambda df: loop.run_until_complete(_score(df))),
+        ("legacy", lambda df: _legacy_score(df, SIMPLE_DB.get_model)),
+    ):
+        model = ConstantModel()
+        timings = []
+        with patch.object(SIMPLE_DB, "get_model", return_value=model):
+            for _ in range(repeat):
+                model.elapsed = 0.0
+                start = time.perf_counter()
+                score(scoring_df)
+                timings.append((time.perf_counter() - start, model.elapsed))
+
+        total, model_time = min(timings)
+        results[f"{name}_total_ms"] = total * 1e3
+        results[f"{name}_model_ms"] = model_time * 1e3
+        results[f"{name}_overhead_us_per_row"] = (total - model_time) / n_rows * 1e6
+
+    loop.close()
+    return results
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the scoring path overhead.")
+    parser.add_argument("--rows", action="append", type=int, default=[], help="Batch sizes.")
+    parser.add_argument("--models", action="append", type=int, default=[], help="Model counts.")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions per configuration.")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    for rows in args.rows or [100, 10_000]:
+        for models in args.models or [1, 20]:
+            result = run(rows, models, args.repeat)
+            print(
+                " ".join(
+                    f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}"
+                    for k, v in result.items()
+                )
+            )
@@ -0,0 +1,159 @@
+"""
+Benchmark of prediction storage throughput, per backend.
+
+Batches of scored predictions (as produced by ``/predict``) are written by several concurrent
+writer threads to:
+ * ``memory``: the in-memory ``PredictionStore`` of the ``memory`` database backend.
+ * ``sqlite``: the ``SQLPredictionStore`` of the ``sqlite`` backend, one ``executemany()`` insert
+   per batch, over a pool of connections.
+ * ``sqlite-rows``: the same table, with one ``INSERT`` statement per row, for comparison.
+The write throughput is reported, then the p50 latency of ``lookup()`` by ID and of a filtered,
+paginated ``query()`` of the written predictions.
+
+Usage:
+    python benchmarks/bench_storage_backends.py --batches 200 --batch-rows 1000 --writers 4
+"""
+import argparse
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from common import START_DATE, N_DAYS, N_ITEMS, N_STORES
+
+BACKENDS = ("memory", "sqlite", "sqlite-rows")
+
+
+def make_batches(n: int, batch_rows: int, seed: int = 0) -> list:
+    """
+    Returns ``n`` batches of ``batch_rows`` scored predictions each.
+    """
+    # pylint: disable=import-outside-toplevel
+    from usf_model_api.serving.utils import generate_prediction_ids, get_created_at
+
+    rng = np.random.default_rng(seed)
+    return [
+        pd.DataFrame(
+            {
+                "prediction_id": generate_prediction_ids(batch_rows),
+                "model_id": rng.choice(["catboost", "lgbm"], batch_rows),
+                "date": (np.datetime64(START_DATE) + rng.integers(0, N_DAYS, batch_rows)).astype(
+                    str
+                ),
+                "store": rng.integers(1, N_STORES + 1, batch_rows),
+                "item": rng.integers(1, N_ITEMS + 1, batch_rows),
+                "prediction": rng.random(batch_rows),
+                "created_at": get_created_at(),
+            }
+        )
+        for _ in range(n)
+    ]
+
+
+def make_store(backend: str, path: Path, pool_size: int):
+    # pylint: disable=import-outside-toplevel
+    from usf_model_api.serving.database import ConnectionPool, SQLPredictionStore
+    from usf_model_api.serving.storage import PredictionStore
+
+    if backend == "memory":
+        return PredictionStore()
+
+    store = SQLPredictionStore(ConnectionPool(path, size=pool_size))
+    if backend == "sqlite-rows":
+
+        def append(predictions_df: pd.DataFrame):
+            store._ensure_table(predictions_df)  # pylint: disable=protected-access
+            names = ", ".join(f'"{c}"' for c in predictions_df.columns)
+            placeholders = ", ".join("?" for _ in predictions_df.columns)
+            with store.pool.connection() as conn:
+                for row in predictions_df.itertuples(index=False):
+                    conn.execute(
+                        f'INSERT INTO "{store.table}" ({names}) VALUES ({placeholders})', row
+                    )
+
+        store.append = append
+
+    return store
+
+
+def write(store, batches: list, writers: int) -> float:
+    """
+    Appends the batches to the store from ``writers`` threads, and returns the elapsed seconds.
+    """
+    per_writer = [batches[i::writers] for i in range(writers)]
+
+    def run(own_batches: list):
+        for batch in own_batches:
+            store.append(batch)
+
+    threads = [threading.Thread(target=run, args=(b,)) for b in per_writer]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return time.perf_counter() - start
+
+
+def p50_ms(call, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - start) * 1e3)
+
+    return float(np.median(samples))
+
+
+def run(n_batches: int, batch_rows: int, writers: int, pool_size: int, repeat: int) -> list:
+    batches = make_batches(n_batches, batch_rows)
+    n_rows = n_batches * batch_rows
+    rng = np.random.default_rng(1)
+    ids = [batches[i]["prediction_id"].iloc[0] for i in rng.integers(0, n_batches, 10)]
+    filters = {"model_id": ("lgbm", "lgbm"), "store": (3, 3), "item": (7, 7)}
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for backend in BACKENDS:
+            store = make_store(backend, Path(tmp_dir) / f"{backend}.sqlite", pool_size)
+            elapsed = write(store, batches, writers)
+            assert len(store) == n_rows
+            # The first query builds the indexes of the in-memory store
+            store.query(filters, limit=100)
+            results.append(
+                {
+                    "backend": backend,
+                    "rows": n_rows,
+                    "write_s": elapsed,
+                    "rows_per_s": n_rows / elapsed,
+                    "lookup_ms": p50_ms(lambda s=store: s.lookup(ids), repeat),
+                    "query_ms": p50_ms(lambda s=store: s.query(filters, limit=100), repeat),
+                }
+            )
+
+    return results
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark prediction storage throughput.")
+    parser.add_argument("--batches", type=int, default=200, help="Batches written.")
+    parser.add_argument("--batch-rows", type=int, default=1000, help="Rows per batch.")
+    parser.add_argument("--writers", type=int, default=4, help="Concurrent writer threads.")
+    parser.add_argument("--pool-size", type=int, default=4, help="Connections per SQL pool.")
+    parser.add_argument("--repeat", type=int, default=20, help="Lookups and queries timed.")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    for result in run(args.batches, args.batch_rows, args.writers, args.pool_size, args.repeat):
+        print(
+            " ".join(
+                f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in result.items()
+            )
+        )
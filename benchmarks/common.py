@@ -0,0 +1,164 @@
+"""
+Helpers shared by the benchmarks: synthetic sales data shaped like the Kaggle "Store Item Demand
+Forecasting" training set, and small sales forecasting models trained on it.
+"""
+import argparse
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterable
+
+import numpy as np
+import pandas as pd
+
+# Ugly hack, but it works for now
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from models.sales_forecasting.train import (  # noqa: E402
+    DEFAULT_CHUNK_ROWS,
+    DEFAULT_RANDOM_SEED,
+    DEFAULT_TRAIN_PCT,
+    MODEL_PARAMS,
+    TARGET,
+    DateFeatureExtractor,
+    SalesForecastingModel,
+    train_models,
+)
+
+N_STORES = 10
+N_ITEMS = 50
+START_DATE = "2013-01-01"
+N_DAYS = 5 * 365
+
+
+def make_sales_data(n_rows: int, seed: int = 42) -> pd.DataFrame:
+    """
+    Returns random sales records with a weekly and yearly seasonality.
+
+    Parameters
+    ----------
+    n_rows : int
+        The number of records.
+    seed : int, optional
+        The random seed (default is 42).
+
+    Returns
+    -------
+    pd.DataFrame
+        The records, with ``date`` (as ``YYYY-MM-DD`` strings), ``store``, ``item`` and ``sales``
+        columns.
+    """
+    rng = np.random.default_rng(seed)
+    days = rng.integers(0, N_DAYS, n_rows)
+    store = rng.integers(1, N_STORES + 1, n_rows)
+    item = rng.integers(1, N_ITEMS + 1, n_rows)
+    dates = pd.Timestamp(START_DATE) + pd.to_timedelta(days, unit="D")
+    sales = (
+        20
+        + store
+        + item / 2
+        + 5 * np.sin(2 * np.pi * days / 365)
+        + 3 * (dates.dayofweek.to_numpy() >= 5)
+        + rng.normal(scale=2, size=n_rows)
+    )
+    return pd.DataFrame(
+        {"date": dates.strftime("%Y-%m-%d"), "store": store, "item": item, TARGET: sales.round()}
+    )
+
+
+def _quiet_params(name: str) -> Dict[str, Any]:
+    if name == "catboost":
+        return {"verbose": 0, "allow_writing_files": False}
+
+    return {"verbose": -1}
+
+
+def train_model(name: str, data: pd.DataFrame, **params: Any) -> SalesForecastingModel:
+    """
+    Trains a sales forecasting model with the parameters of ``params.yaml``.
+
+    Parameters
+    ----------
+    name : str
+        The model type, one of ``catboost`` or ``lgbm``.
+    data : pd.DataFrame
+        The training records.
+    **params : Any
+        Model parameters overriding those of ``params.yaml``.
+
+    Returns
+    -------
+    SalesForecastingModel
+        The trained model.
+    """
+    # pylint: disable=import-outside-toplevel
+    from catboost import CatBoostRegressor
+    from lightgbm import LGBMRegressor
+
+    model_params: Dict[str, Any] = {**MODEL_PARAMS[name], **_quiet_params(name), **params}
+    model = SalesForecastingModel(
+        model_id=name,
+        preprocessor=DateFeatureExtractor(),
+        predictor=(CatBoostRegressor if name == "catboost" else LGBMRegressor)(**model_params),
+    )
+    model.fit(data.drop(columns=[TARGET]), data[TARGET].to_numpy())
+    return model
+
+
+def train_saved_models(
+    model_dir: Path,
+    n_rows: int,
+    names: Iterable[str] = ("catboost", "lgbm"),
+    artifact_format: str = "pickle",
+    **params: Any,
+) -> Path:
+    """
+    Trains sales forecasting models on synthetic data with ``train_models()``, as the ``train.py``
+    script does, and saves them to a model directory.
+
+    Parameters
+    ----------
+    model_dir : Path
+        The directory to save the models to. The synthetic training data is written next to them.
+    n_rows : int
+        The number of training records.
+    names : Iterable[str], optional
+        The model types to train (default is both ``catboost`` and ``lgbm``).
+    artifact_format : str, optional
+        The format to save the models in, ``pickle`` or ``native`` (default is ``pickle``).
+    **params : Any
+        Model parameters overriding those of ``params.yaml``, for every model.
+
+    Returns
+    -------
+    Path
+        The model directory.
+    """
+    model_dir.mkdir(parents=True, exist_ok=True)
+    data_loc = model_dir / "train.csv"
+    make_sales_data(n_rows).to_csv(data_loc, index=False)
+
+    names = list(names)
+    original = {name: MODEL_PARAMS[name] for name in names}
+    try:
+        for name in names:
+            MODEL_PARAMS[name] = {**original[name], **_quiet_params(name), **params}
+
+        train_models(
+            argparse.Namespace(
+                model_name=names,
+                data_loc=data_loc,
+                save_loc=model_dir,
+                train_pct=DEFAULT_TRAIN_PCT,
+                seed=DEFAULT_RANDOM_SEED,
+                artifact_format=artifact_format,
+                jobs=None,
+                threads=None,
+                cache_dir=None,
+                chunk_rows=DEFAULT_CHUNK_ROWS,
+            )
+        )
+    finally:
+        MODEL_PARAMS.update(original)
+        data_loc.unlink()
+
+    return model_dir
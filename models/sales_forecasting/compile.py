@@ -0,0 +1,139 @@
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from usf_model_api.models.artifacts import ARTIFACT_SUFFIX, find_model, load_model, save_artifact
+from usf_model_api.models.compiled import compile_model
+from usf_model_api.utils import get_logger
+
+# Ugly hack, but it works for now
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+from models.sales_forecasting.train import (  # noqa: E402
+    DATE_COLUMN,
+    DATE_FORMAT,
+    DEFAULT_SAVE_MODEL_LOC,
+    TARGET,
+    VALID_MODEL_TYPES,
+    load_sales_data,
+)
+
+
+LOG = get_logger(__name__)
+
+
+# Defaults (can be overridden by command line args)
+DEFAULT_COMPILED_LOC = DEFAULT_SAVE_MODEL_LOC.joinpath("compiled")
+DEFAULT_CHECK_ROWS = 10_000
+DEFAULT_NUM_STORES = 10
+DEFAULT_NUM_ITEMS = 50
+DEFAULT_SEED = 42
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Compile trained sales forecasting models into flat-array tree ensembles, "
+        "checking that they make the same predictions."
+    )
+    parser.add_argument(
+        "--model-name",
+        action="append",
+        help=f"Models to compile. One of {VALID_MODEL_TYPES}.",
+        type=str,
+        default=[],
+    )
+    parser.add_argument(
+        "--model-loc",
+        type=str,
+        default=DEFAULT_SAVE_MODEL_LOC,
+        help="Location of the trained models.",
+    )
+    parser.add_argument(
+        "--save-loc",
+        type=str,
+        default=DEFAULT_COMPILED_LOC,
+        help="Location to save the compiled model artifacts.",
+    )
+    parser.add_argument(
+        "--data-loc",
+        type=str,
+        default=None,
+        help="Location of a sales data file (CSV or Parquet), whose rows the predictions are "
+        "checked on. If not given, random requests over stores 1..--num-stores and items "
+        "1..--num-items are used.",
+    )
+    parser.add_argument(
+        "--check-rows",
+        type=int,
+        default=DEFAULT_CHECK_ROWS,
+        help="Number of rows the predictions are checked on.",
+    )
+    parser.add_argument(
+        "--num-stores",
+        type=int,
+        default=DEFAULT_NUM_STORES,
+        help="Number of stores of the random requests, when --data-loc is not given.",
+    )
+    parser.add_argument(
+        "--num-items",
+        type=int,
+        default=DEFAULT_NUM_ITEMS,
+        help="Number of items of the random requests, when --data-loc is not given.",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=DEFAULT_SEED,
+        help="Random seed for sampling the rows the predictions are checked on.",
+    )
+
+    return parser.parse_args()
+
+
+def check_requests(args: argparse.Namespace) -> pd.DataFrame:
+    """
+    Returns the requests the compiled models are checked on: a sample of the sales data if given,
+    and random dates, stores and items otherwise.
+    """
+    if args.data_loc is not None:
+        LOG.info("Loading check rows from %s", args.data_loc)
+        data = load_sales_data(args.data_loc).drop(columns=[TARGET])
+        # Dates are checked as strings, as they arrive in requests
+        data[DATE_COLUMN] = data[DATE_COLUMN].dt.strftime(DATE_FORMAT)
+        return data.sample(n=min(args.check_rows, len(data)), random_state=args.seed)
+
+    rng = np.random.default_rng(args.seed)
+    dates = np.datetime64("2013-01-01") + rng.integers(0, 10 * 365, args.check_rows)
+    return pd.DataFrame(
+        {
+            DATE_COLUMN: dates.astype(str),
+            "store": rng.integers(1, args.num_stores + 1, args.check_rows),
+            "item": rng.integers(1, args.num_items + 1, args.check_rows),
+        }
+    )
+
+
+def compile_models(args: argparse.Namespace):
+    if set(args.model_name) - VALID_MODEL_TYPES:
+        raise ValueError(
+            f"Expected elements of 'model_name' to be one of {VALID_MODEL_TYPES}, but found '{args.model_name}'."
+        )
+
+    X_check = check_requests(args)
+    for name in args.model_name:
+        model_path = find_model(args.model_loc, name)
+        LOG.info("Loading model from '%s'", model_path)
+        model = load_model(model_path)
+
+        compiled = compile_model(model, X_check)
+        save_path = Path(args.save_loc).joinpath(f"{compiled.model_id}{ARTIFACT_SUFFIX}")
+        LOG.info("Saving compiled model to '%s'", save_path)
+        save_artifact(compiled, save_path)
+
+
+if __name__ == "__main__":
+    parsed_args = parse_args()
+    compile_models(parsed_args)
@@ -0,0 +1,142 @@
+import argparse
+import sys
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from usf_model_api.models.artifacts import find_model, load_model, model_version
+from usf_model_api.serving.materialized import (
+    DEFAULT_CHUNK_ROWS,
+    TABLE_SUFFIX,
+    write_forecast_table,
+)
+from usf_model_api.utils import get_logger
+
+# Ugly hack, but it works for now
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+from models.sales_forecasting.train import (  # noqa: E402
+    DEFAULT_SAVE_MODEL_LOC,
+    VALID_MODEL_TYPES,
+)
+
+
+LOG = get_logger(__name__)
+
+
+# Defaults (can be overridden by command line args)
+DEFAULT_FORECAST_LOC = DEFAULT_SAVE_MODEL_LOC.joinpath("forecasts")
+DEFAULT_HORIZON = 90
+DEFAULT_NUM_STORES = 10
+DEFAULT_NUM_ITEMS = 50
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Precompute the forecasts of trained sales forecasting models over a grid of "
+        "stores, items and days."
+    )
+    parser.add_argument(
+        "--model-name",
+        action="append",
+        help=f"Models to materialize. One of {VALID_MODEL_TYPES}.",
+        type=str,
+        default=[],
+    )
+    parser.add_argument(
+        "--model-loc",
+        type=str,
+        default=DEFAULT_SAVE_MODEL_LOC,
+        help="Location of the trained models.",
+    )
+    parser.add_argument(
+        "--save-loc",
+        type=str,
+        default=DEFAULT_FORECAST_LOC,
+        help="Location to save the forecast tables.",
+    )
+    parser.add_argument(
+        "--start-date",
+        type=str,
+        default=date.today().isoformat(),
+        help="First day of the forecast horizon, as YYYY-MM-DD (default is today).",
+    )
+    parser.add_argument(
+        "--horizon",
+        type=int,
+        default=DEFAULT_HORIZON,
+        help="Number of days to forecast.",
+    )
+    parser.add_argument(
+        "--data-loc",
+        type=str,
+        default=None,
+        help="Location of a sales data CSV file, whose stores and items make up the grid. If not "
+        "given, stores 1..--num-stores and items 1..--num-items are used.",
+    )
+    parser.add_argument(
+        "--num-stores",
+        type=int,
+        default=DEFAULT_NUM_STORES,
+        help="Number of stores of the grid, when --data-loc is not given.",
+    )
+    parser.add_argument(
+        "--num-items",
+        type=int,
+        default=DEFAULT_NUM_ITEMS,
+        help="Number of items of the grid, when --data-loc is not given.",
+    )
+    parser.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=DEFAULT_CHUNK_ROWS,
+        help="Approximate number of grid rows scored at once.",
+    )
+
+    return parser.parse_args()
+
+
+def materialize_models(args: argparse.Namespace):
+    if set(args.model_name) - VALID_MODEL_TYPES:
+        raise ValueError(
+            f"Expected elements of 'model_name' to be one of {VALID_MODEL_TYPES}, but found '{args.model_name}'."
+        )
+
+    if args.data_loc is not None:
+        LOG.info("Loading stores and items from %s", args.data_loc)
+        data = pd.read_csv(args.data_loc, usecols=["store", "item"])
+        stores, items = np.unique(data["store"]), np.unique(data["item"])
+    else:
+        stores, items = np.arange(1, args.num_stores + 1), np.arange(1, args.num_items + 1)
+
+    for name in args.model_name:
+        model_path = find_model(args.model_loc, name)
+        LOG.info("Loading model from '%s'", model_path)
+        model = load_model(model_path)
+
+        save_path = Path(args.save_loc).joinpath(f"{name}{TABLE_SUFFIX}")
+        LOG.info(
+            "Materializing %d days x %d stores x %d items to '%s' ...",
+            args.horizon,
+            len(stores),
+            len(items),
+            save_path,
+        )
+        write_forecast_table(
+            model,
+            save_path,
+            start_date=args.start_date,
+            horizon=args.horizon,
+            stores=stores,
+            items=items,
+            chunk_rows=args.chunk_rows,
+            model_version=model_version(model_path),
+            model_id=name,
+        )
+
+
+if __name__ == "__main__":
+    parsed_args = parse_args()
+    materialize_models(parsed_args)
@@ -0,0 +1,369 @@
+# pylint: disable=protected-access
+import sys
+from pathlib import Path
+
+# Ugly hack, but it works for now
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+import argparse
+import pickle
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from models.sales_forecasting import train
+from models.sales_forecasting import tune
+from models.sales_forecasting.compile import compile_models
+from models.sales_forecasting.train import (
+    ChunkedSalesDataset,
+    DateFeatureExtractor,
+    SalesDataset,
+    SalesForecastingModel,
+    civil_from_days,
+    load_sales_data,
+    train_models,
+)
+from usf_model_api.models.artifacts import load_model
+from usf_model_api.models.compiled import CompiledTreeEnsemble, compile_model
+from usf_model_api.utils import load_yaml
+
+
+def _pandas_date_features(X: pd.DataFrame) -> pd.DataFrame:
+    dates = pd.to_datetime(X["date"])
+    return X.drop(columns=["date"]).assign(
+        day=dates.dt.day, month=dates.dt.month, year=dates.dt.year, day_of_week=dates.dt.dayofweek
+    )
+
+
+def test_civil_from_days():
+    dates = pd.date_range("1899-12-25", "2101-01-05")
+    fields = civil_from_days(dates.to_numpy(dtype="datetime64[D]").view(np.int64))
+    np.testing.assert_array_equal(fields["day"], dates.day)
+    np.testing.assert_array_equal(fields["month"], dates.month)
+    np.testing.assert_array_equal(fields["year"], dates.year)
+    np.testing.assert_array_equal(fields["day_of_week"], dates.dayofweek)
+    assert all(f.dtype == np.int32 for f in fields.values())
+
+
+def test_date_feature_extractor():
+    X = pd.DataFrame(
+        {
+            "date": ["2023-01-01", "2024-02-29", "2023-01-01", "2017-12-31"],
+            "store": [1, 2, 3, 4],
+            "item": [10, 20, 30, 40],
+        },
+        index=[5, 6, 7, 8],
+    )
+    extractor = DateFeatureExtractor().fit(X)
+    expected = _pandas_date_features(X)
+    pd.testing.assert_frame_equal(extractor.transform(X), expected)
+
+    # Columns follow the training order, whatever the order of the input
+    pd.testing.assert_frame_equal(extractor.transform(X[["date", "item", "store"]]), expected)
+
+    # The columns are also returned as arrays
+    columns = extractor.transform_columns(X)
+    assert list(columns) == expected.columns.tolist()
+    for name, values in columns.items():
+        np.testing.assert_array_equal(values, expected[name])
+
+    # Datetime columns are used as is
+    pd.testing.assert_frame_equal(
+        extractor.transform(X.assign(date=pd.to_datetime(X["date"]))), expected
+    )
+
+    with pytest.raises(ValueError):
+        extractor.transform(X.assign(date=["2023-1-01", None, "2023-01-01", "2017-12-31"]))
+
+
+def test_date_feature_extractor_memo():
+    X = pd.DataFrame({"date": ["2023-01-01", "2023-01-02", "2023-01-01"], "store": 1, "item": 1})
+    extractor = DateFeatureExtractor(max_memo_size=2).fit(X)
+    extractor.transform(X)
+    assert set(extractor._memo) == {"2023-01-01", "2023-01-02"}
+
+    # The memo table is bounded, and not pickled
+    extractor.transform(X.assign(date="2023-01-03"))
+    assert len(extractor._memo) <= 2
+    restored = pickle.loads(pickle.dumps(extractor))
+    assert "_memo" not in restored.__dict__
+    pd.testing.assert_frame_equal(restored.transform(X), _pandas_date_features(X))
+
+    # Parsing without the memo table gives the same features
+    unmemoized = DateFeatureExtractor(max_memo_size=0).fit(X)
+    pd.testing.assert_frame_equal(unmemoized.transform(X), _pandas_date_features(X))
+    assert "_memo" not in unmemoized.__dict__
+
+
+def test_date_feature_extractor_legacy_state():
+    # Extractors pickled before the parameters (and fit attributes) existed have an empty state
+    extractor = DateFeatureExtractor.__new__(DateFeatureExtractor)
+    extractor.__setstate__({})
+    X = pd.DataFrame({"date": ["2023-01-01"], "item": [1], "store": [2]})
+    pd.testing.assert_frame_equal(extractor.transform(X), _pandas_date_features(X))
+
+
+def _sales_data(n: int = 400) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "date": (np.datetime64("2017-01-01") + rng.integers(0, 365, n)).astype(str),
+            "store": rng.integers(1, 5, n),
+            "item": rng.integers(1, 10, n),
+            "sales": rng.integers(1, 100, n),
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    "name, params",
+    [
+        ("catboost", {"n_estimators": 10, "verbose": 0, "allow_writing_files": False}),
+        ("lgbm", {"n_estimators": 10, "verbose": -1}),
+    ],
+)
+def test_predict_columns(name, params):
+    data = _sales_data()
+    X, y = data.drop(columns=["sales"]), data["sales"].to_numpy()
+    model = SalesForecastingModel(
+        model_id=name,
+        preprocessor=DateFeatureExtractor(),
+        predictor=train.MODEL_CLASSES[name](**params),
+    )
+    model.fit(X, y)
+
+    # The features are passed to the predictor as a matrix, with the predictions of the pipeline
+    expected = model.model.predict(X)
+    np.testing.assert_allclose(model.predict(X), expected)
+
+    # Arrow tables and record batches, and NumPy structured arrays, are accepted as well
+    table = pa.Table.from_pandas(X, preserve_index=False)
+    compiled = compile_model(model, X)
+    for X_other in (table, table.to_batches(max_chunksize=100)[0], X.to_records(index=False)):
+        n = len(X_other)
+        np.testing.assert_allclose(model.predict(X_other), expected[:n])
+        np.testing.assert_allclose(compiled.predict(X_other), expected[:n], atol=1e-6)
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+def test_load_sales_data(tmp_path, suffix):
+    data = _sales_data()
+    path = tmp_path / f"train{suffix}"
+    if suffix == ".csv":
+        data.to_csv(path, index=False)
+    else:
+        data.to_parquet(path)
+
+    loaded = load_sales_data(path)
+    assert loaded.dtypes.astype(str).to_dict() == {
+        "date": "datetime64[ns]",
+        "store": "int16",
+        "item": "int16",
+        "sales": "int32",
+    }
+    np.testing.assert_array_equal(loaded["sales"], data["sales"])
+    np.testing.assert_array_equal(loaded["date"], pd.to_datetime(data["date"]))
+
+    # Casting returns a copy, and leaves the given frame untouched
+    original = data.copy()
+    train._cast_sales_data(data)  # pylint: disable=protected-access
+    pd.testing.assert_frame_equal(data, original)
+
+
+@pytest.mark.parametrize("cached", [False, True])
+def test_train_models(tmp_path, cached):
+    data_loc = tmp_path / "train.csv"
+    _sales_data().to_csv(data_loc, index=False)
+    params = {
+        "catboost": {"n_estimators": 5, "verbose": 0, "allow_writing_files": False},
+        "lgbm": {"n_estimators": 5, "verbose": -1},
+    }
+    args = argparse.Namespace(
+        model_name=["catboost", "lgbm"],
+        data_loc=str(data_loc),
+        save_loc=str(tmp_path),
+        train_pct=0.8,
+        seed=0,
+        artifact_format="pickle",
+        jobs=2,
+        threads=1,
+        cache_dir=str(tmp_path / "cache") if cached else None,
+        chunk_rows=100,
+    )
+    with patch.dict(train.MODEL_PARAMS, params):
+        results = train_models(args)
+
+    assert [r["model_id"] for r in results] == ["catboost", "lgbm"]
+    X = _sales_data(10).drop(columns=["sales"])
+    for result in results:
+        assert result["wall_time_s"] > 0 and result["peak_rss_mb"] > 0
+        model = load_model(result["save_path"])
+        assert model.model_id == result["model_id"]
+        assert model.predictor.get_params()[train.THREAD_PARAMS[model.model_id]] == 1
+        assert model.predict(X).shape == (10,)
+
+
+def test_compile_models(tmp_path):
+    data_loc = tmp_path / "train.csv"
+    _sales_data().to_csv(data_loc, index=False)
+    params = {
+        "catboost": {"n_estimators": 5, "verbose": 0, "allow_writing_files": False},
+        "lgbm": {"n_estimators": 5, "verbose": -1},
+    }
+    # With a single job, the models are trained in this process
+    with patch.dict(train.MODEL_PARAMS, params), patch.object(
+        train, "ProcessPoolExecutor", side_effect=AssertionError("No worker process expected")
+    ):
+        train_models(
+            argparse.Namespace(
+                model_name=["catboost", "lgbm"],
+                data_loc=str(data_loc),
+                save_loc=str(tmp_path),
+                train_pct=0.8,
+                seed=0,
+                artifact_format="native",
+                jobs=1,
+                threads=1,
+                cache_dir=None,
+                chunk_rows=100,
+            )
+        )
+
+    compile_models(
+        argparse.Namespace(
+            model_name=["catboost", "lgbm"],
+            model_loc=str(tmp_path),
+            save_loc=str(tmp_path / "compiled"),
+            data_loc=str(data_loc),
+            check_rows=50,
+            num_stores=3,
+            num_items=5,
+            seed=0,
+        )
+    )
+
+    X = _sales_data(10).drop(columns=["sales"])
+    for name in ("catboost", "lgbm"):
+        model = load_model(tmp_path / f"{name}.model")
+        compiled = load_model(tmp_path / "compiled" / f"{name}.model")
+        assert isinstance(compiled.predictor, CompiledTreeEnsemble)
+        np.testing.assert_allclose(compiled.predict(X), model.predict(X), atol=1e-6)
+
+
+def test_rolling_origin_folds():
+    data = _sales_data(2000)
+    dataset = SalesDataset(data, n_folds=3, horizon_days=30)
+    train_df = dataset.get_training_split()
+    dates = pd.to_datetime(train_df["date"]).to_numpy()
+
+    folds = dataset.get_rolling_origin_folds()
+    assert len(folds) == 3
+    last_day = dates.max()
+    for k, (train_idx, valid_idx) in enumerate(folds):
+        # Each fold trains on every row before its validation window, and validates on the window
+        cutoff = last_day - np.timedelta64((3 - k) * 30 - 1, "D")
+        assert dates[train_idx].max() < cutoff
+        assert dates[valid_idx].min() >= cutoff
+        assert dates[valid_idx].max() < cutoff + np.timedelta64(30, "D")
+        np.testing.assert_array_equal(np.sort(train_idx), np.flatnonzero(dates < cutoff))
+
+    pd.testing.assert_frame_equal(dataset.get_validation_split(), train_df.iloc[folds[-1][1]])
+
+    with pytest.raises(ValueError, match="days of training data"):
+        SalesDataset(data, n_folds=3, horizon_days=200).get_rolling_origin_folds()
+    with pytest.raises(ValueError, match="'n_folds' to be set"):
+        SalesDataset(data).get_rolling_origin_folds()
+
+
+def test_time_based_split():
+    data = _sales_data(2000)
+    dataset = SalesDataset(data, train_pct=0.8, n_folds=3, horizon_days=30)
+    train_dates = pd.to_datetime(dataset.get_training_split()["date"])
+    test_dates = pd.to_datetime(dataset.get_test_split()["date"])
+
+    # With folds, every test day comes after every training day
+    assert train_dates.max() < test_dates.min()
+    assert len(train_dates) + len(test_dates) == len(data)
+    n_days = data["date"].nunique()
+    assert train_dates.nunique() == round(n_days * 0.8)
+
+    # Without folds, the rows are split at random
+    dataset = SalesDataset(data, train_pct=0.8)
+    assert pd.to_datetime(dataset.get_test_split()["date"]).min() < train_dates.max()
+
+
+def test_halving_budgets():
+    assert tune.halving_budgets(50, 500, 3) == [50, 150, 450, 500]
+    assert tune.halving_budgets(50, 50, 3) == [50]
+
+
+def test_tune_models(tmp_path):
+    data_loc = tmp_path / "train.csv"
+    _sales_data(2000).to_csv(data_loc, index=False)
+    args = argparse.Namespace(
+        model_name=["catboost", "lgbm"],
+        data_loc=str(data_loc),
+        save_loc=str(tmp_path / "tuned_params.yaml"),
+        train_pct=0.8,
+        seed=0,
+        n_folds=2,
+        horizon_days=30,
+        n_trials=4,
+        eta=2,
+        min_estimators=5,
+        max_estimators=10,
+        early_stopping_rounds=3,
+        jobs=2,
+        threads=1,
+    )
+    tuned_params = tune.tune_models(args)
+
+    assert tuned_params == load_yaml(args.save_loc)
+    for name, params in tuned_params.items():
+        assert 1 <= params["n_estimators"] <= 10
+        config = {k: params[k] for k in tune.SEARCH_SPACE[name]}
+        assert config in tune.sample_configs(name, 4, seed=0)
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+def test_chunked_sales_dataset(tmp_path, suffix):
+    data = _sales_data(1000)
+    data_loc = tmp_path / f"train{suffix}"
+    if suffix == ".csv":
+        data.to_csv(data_loc, index=False)
+    else:
+        data.to_parquet(data_loc, row_group_size=300)
+
+    dataset = ChunkedSalesDataset(data_loc, tmp_path / "cache", train_pct=0.7, chunk_rows=300)
+    X_train, y_train = dataset.get_features("train")
+    X_test, y_test = dataset.get_features("test")
+    assert isinstance(y_train, np.memmap)
+    assert len(X_train) + len(X_test) == 1000
+    assert 600 < len(X_train) < 800
+    assert dataset.get_training_split().columns.tolist() == [*X_train.columns, "sales"]
+
+    # Every row is in one of the splits, with the features of a DateFeatureExtractor
+    expected = DateFeatureExtractor().fit_transform(data.drop(columns=["sales"]))
+    expected["sales"] = data["sales"]
+    actual = pd.concat([X_train.assign(sales=y_train), X_test.assign(sales=y_test)])
+    sort_columns = ["year", "month", "day", "store", "item", "sales"]
+    pd.testing.assert_frame_equal(
+        actual.sort_values(sort_columns).reset_index(drop=True),
+        expected.sort_values(sort_columns).reset_index(drop=True),
+        check_dtype=False,
+    )
+    assert dataset.preprocessor.feature_names_in_.tolist() == ["date", "store", "item"]
+    with pytest.raises(NotImplementedError, match="no validation split"):
+        dataset.get_validation_split()
+
+    # The cache is reused by later runs, without reading the data again
+    with patch.object(train, "read_sales_chunks", side_effect=AssertionError):
+        reused = ChunkedSalesDataset(data_loc, tmp_path / "cache", train_pct=0.7)
+    np.testing.assert_array_equal(reused.get_features("train")[1], y_train)
+
+    # ... and rebuilt when the split changes
+    rebuilt = ChunkedSalesDataset(data_loc, tmp_path / "cache", train_pct=0.5)
+    assert rebuilt.metadata["rows"]["train"] < dataset.metadata["rows"]["train"]
@@ -1,9 +1,17 @@
 import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List, Mapping, Optional, Tuple
 
 import pandas as pd
 import numpy as np
+import pyarrow.parquet as pq
 
 from sklearn import set_config
 from sklearn.base import BaseEstimator, TransformerMixin
@@ -15,6 +23,7 @@ from catboost import CatBoostRegressor
 from lightgbm import LGBMRegressor
 
 from usf_model_api.models.base import PredictionModel, ModelDataset
+from usf_model_api.models.artifacts import ARTIFACT_SUFFIX, save_artifact
 from usf_model_api.utils import get_logger, load_yaml
 
 
@@ -25,6 +34,9 @@ LOG = get_logger(__name__)
 # Model types
 VALID_MODEL_TYPES = {"catboost", "lgbm"}
 
+# Model file formats
+VALID_ARTIFACT_FORMATS = {"pickle", "native"}
+
 
 # Defaults (can be overridden by command line args)
 DEFAULT_SCRIPT_PATH = Path(__file__).resolve().parent
@@ -34,38 +46,222 @@ DEFAULT_SAVE_MODEL_LOC = DEFAULT_SCRIPT_PATH.joinpath(
 )
 DEFAULT_TRAIN_PCT = 0.8
 DEFAULT_RANDOM_SEED = 42
+DEFAULT_ARTIFACT_FORMAT = "pickle"
+DEFAULT_N_FOLDS = 3
+DEFAULT_HORIZON_DAYS = 90
+DEFAULT_CHUNK_ROWS = 1_000_000
 
 # Model parameters
 TARGET = "sales"
 # MODEL_PARAMS = load_yaml("./params.yaml")
 MODEL_PARAMS = load_yaml(DEFAULT_SCRIPT_PATH / "params.yaml")
+MODEL_CLASSES = {"catboost": CatBoostRegressor, "lgbm": LGBMRegressor}
+# The parameter that sets the number of training threads of each model type
+THREAD_PARAMS = {"catboost": "thread_count", "lgbm": "nthread"}
+
+# Compact dtypes of the training data columns (the date column is parsed)
+DATA_DTYPES = {"store": "int16", "item": "int16", TARGET: "int32"}
+
+# Version of the layout of the feature cache written by ChunkedSalesDataset
+FEATURE_CACHE_VERSION = 1
+FEATURE_CACHE_METADATA_FILE = "metadata.json"
+
+
+# Date features
+DATE_COLUMN = "date"
+DATE_FORMAT = "%Y-%m-%d"
+DATE_FEATURES = ["day", "month", "year", "day_of_week"]
+DEFAULT_MAX_MEMO_SIZE = 100_000
+_NOT_PARSED = np.iinfo(np.int64).min
+
+
+def civil_from_days(days: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Converts days since the Unix epoch to calendar fields, using integer arithmetic only (see
+    http://howardhinnant.github.io/date_algorithms.html#civil_from_days).
+
+    Parameters
+    ----------
+    days : np.ndarray
+        The number of days since 1970-01-01, as integers.
+
+    Returns
+    -------
+    Dict[str, np.ndarray]
+        The ``day``, ``month``, ``year`` and ``day_of_week`` (Monday is 0) of each date, as int32.
+    """
+    days = np.asarray(days, dtype=np.int64)
+    z = days + 719468
+    era = z // 146097
+    doe = z - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    month = np.where(mp < 10, mp + 3, mp - 9)
+    return {
+        "day": (doy - (153 * mp + 2) // 5 + 1).astype(np.int32),
+        "month": month.astype(np.int32),
+        "year": (yoe + era * 400 + (month <= 2)).astype(np.int32),
+        # 1970-01-01 was a Thursday
+        "day_of_week": ((days + 3) % 7).astype(np.int32),
+    }
 
 
 class DateFeatureExtractor(BaseEstimator, TransformerMixin):
+    """
+    Replaces the date column with its ``day``, ``month``, ``year`` and ``day_of_week``.
+
+    Each distinct date of a batch is parsed once, with an explicit format, and the calendar fields
+    are derived from its day number with integer arithmetic. Parsed dates are kept in a bounded memo
+    table, so the small set of dates repeated across prediction requests is only parsed once. The
+    other columns are passed through in the order seen by ``fit()``.
+
+    Attributes
+    ----------
+    date_column : str
+        The name of the date column.
+    date_format : str
+        The ``strftime`` format of the date strings.
+    max_memo_size : int
+        The maximum number of parsed date strings kept in the memo table. Zero disables the table.
+    feature_names_in_ : np.ndarray
+        The columns seen by ``fit()``.
+    """
+
+    def __init__(
+        self,
+        date_column: str = DATE_COLUMN,
+        date_format: str = DATE_FORMAT,
+        max_memo_size: int = DEFAULT_MAX_MEMO_SIZE,
+    ):
+        self.date_column = date_column
+        self.date_format = date_format
+        self.max_memo_size = max_memo_size
+
+    def __setstate__(self, state: Dict[str, Any]):
+        # Extractors pickled before the parameters existed use the defaults
+        super().__setstate__(
+            {
+                "date_column": DATE_COLUMN,
+                "date_format": DATE_FORMAT,
+                "max_memo_size": DEFAULT_MAX_MEMO_SIZE,
+                **state,
+            }
+        )
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The memo table is a cache, and is not saved with the model
+        state = super().__getstate__()
+        state.pop("_memo", None)
+        return state
+
     # pylint: disable=unused-argument
     def fit(self, X: pd.DataFrame, y=None) -> "DateFeatureExtractor":
+        self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        self.n_features_in_ = len(self.feature_names_in_)
         return self
 
     def transform(self, X: pd.DataFrame) -> pd.DataFrame:
-        X = X.copy()
-        X["day"] = pd.to_datetime(X["date"]).dt.day
-        X["month"] = pd.to_datetime(X["date"]).dt.month
-        X["year"] = pd.to_datetime(X["date"]).dt.year
-        X["day_of_week"] = pd.to_datetime(X["date"]).dt.dayofweek
-        return X.drop(columns=["date"])
+        return pd.DataFrame(self.transform_columns(X), index=X.index)
+
+    def transform_columns(
+        self, X: pd.DataFrame | Mapping[str, np.ndarray]
+    ) -> Dict[str, np.ndarray]:
+        """
+        Returns the columns of ``transform()`` as arrays, without building a frame (which is most
+        of the cost of a small batch). ``X`` may also be a mapping of column names to arrays.
+        """
+        # Pass the other columns through in the training order, since LightGBM matches features
+        # by position, not by name
+        columns = getattr(self, "feature_names_in_", None)
+        if columns is None:
+            columns = list(X.keys()) if isinstance(X, Mapping) else X.columns
+        features = {c: np.asarray(X[c]) for c in columns if c != self.date_column}
+        features.update(civil_from_days(self._to_days(X[self.date_column])))
+        return features
+
+    def _to_days(self, dates: pd.Series | np.ndarray) -> np.ndarray:
+        if pd.api.types.is_datetime64_any_dtype(dates):
+            return np.asarray(dates, dtype="datetime64[D]").view(np.int64)
+
+        codes, uniques = pd.factorize(dates)
+        if (codes < 0).any():
+            raise ValueError(f"Column '{self.date_column}' has missing dates.")
+
+        return self._parse(np.asarray(uniques, dtype=object))[codes]
+
+    def _parse(self, values: np.ndarray) -> np.ndarray:
+        if self.max_memo_size <= 0:
+            return self._parse_all(values)
+
+        memo: Dict[str, int] = self.__dict__.setdefault("_memo", {})
+        days = np.fromiter((memo.get(v, _NOT_PARSED) for v in values), np.int64, len(values))
+        missing = days == _NOT_PARSED
+        if missing.any():
+            days[missing] = self._parse_all(values[missing])
+            if len(memo) + missing.sum() > self.max_memo_size:
+                memo.clear()
+            memo.update(zip(values[missing], days[missing]))
+
+        return days
+
+    def _parse_all(self, values: np.ndarray) -> np.ndarray:
+        dates = pd.to_datetime(values, format=self.date_format)
+        return dates.to_numpy(dtype="datetime64[D]").view(np.int64)
+
+
+def _to_days(dates: pd.Series) -> np.ndarray:
+    # Days since the epoch, of parsed or ``yyyy-MM-dd`` dates
+    dates = pd.to_datetime(dates, format=DATE_FORMAT)
+    return dates.to_numpy(dtype="datetime64[D]").view(np.int64)
 
 
 class SalesDataset(ModelDataset):
-    def __init__(self, data: pd.DataFrame, train_pct: float = 0.8, random_seed: int = 42):
+    """
+    A sales dataset held in memory.
+
+    Without validation folds, the rows are split into training and test sets at random. With
+    ``n_folds`` rolling-origin folds (see ``get_rolling_origin_folds()``), the split is by date
+    instead: the test set is the last ``1 - train_pct`` of the days, so neither the folds nor the
+    test set are ever predicted by a model that learned from later days.
+    """
+
+    def __init__(
+        self,
+        data: pd.DataFrame,
+        train_pct: float = 0.8,
+        random_seed: int = 42,
+        n_folds: Optional[int] = None,
+        horizon_days: int = DEFAULT_HORIZON_DAYS,
+    ):
         self.data = data
         self.train_pct = train_pct
         self.random_seed = random_seed
+        self.n_folds = n_folds
+        self.horizon_days = horizon_days
         self.splits = self._get_splits(data)
 
     def _get_splits(self, data: pd.DataFrame) -> Dict[str, pd.DataFrame]:
-        train_df, test_df = train_test_split(
-            data, train_size=self.train_pct, shuffle=True, random_state=self.random_seed
-        )
+        if self.n_folds is None:
+            train_df, test_df = train_test_split(
+                data, train_size=self.train_pct, shuffle=True, random_state=self.random_seed
+            )
+        else:
+            days = _to_days(data[DATE_COLUMN])
+            unique_days = np.unique(days)
+            if len(unique_days) < 2:
+                raise ValueError(
+                    f"Expected at least 2 days of data for a time-based split, but found "
+                    f"{len(unique_days)}."
+                )
+
+            # The test set holds at least the last day
+            n_train_days = min(
+                max(1, round(len(unique_days) * self.train_pct)), len(unique_days) - 1
+            )
+            is_train = days < unique_days[n_train_days]
+            train_df, test_df = data[is_train], data[~is_train]
+
         return {
             "train": train_df,
             "test": test_df,
@@ -75,11 +271,224 @@ class SalesDataset(ModelDataset):
         return self.splits["train"]
 
     def get_validation_split(self) -> pd.DataFrame:
-        raise NotImplementedError("get_validation_split() is not implemented.")
+        """
+        Returns the validation rows of the last rolling-origin fold of the training split: its most
+        recent ``horizon_days`` days.
+        """
+        _, valid_idx = self.get_rolling_origin_folds()[-1]
+        return self.splits["train"].iloc[valid_idx]
 
     def get_test_split(self) -> pd.DataFrame:
         return self.splits["test"]
 
+    def get_rolling_origin_folds(self) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Returns the rolling-origin (time-based) cross-validation folds of the training split. The
+        last ``n_folds * horizon_days`` days of the split are cut into ``n_folds`` consecutive
+        windows of ``horizon_days`` days. Each fold validates on one window, and trains on every
+        row dated before it, so a model is never validated on days before the ones it learned from.
+
+        Returns
+        -------
+        List[Tuple[np.ndarray, np.ndarray]]
+            The positions (in the training split) of the training and validation rows of each
+            fold, from the earliest validation window to the latest.
+
+        Raises
+        ------
+        ValueError
+            If no folds were requested (``n_folds`` is None), or the training split does not have
+            enough days for the folds.
+        """
+        if self.n_folds is None:
+            raise ValueError("Expected 'n_folds' to be set for rolling-origin folds.")
+
+        if "folds" not in self.splits:
+            days = _to_days(self.splits["train"][DATE_COLUMN])
+            last_day = days.max()
+            first_cutoff = last_day + 1 - self.n_folds * self.horizon_days
+            if first_cutoff <= days.min():
+                raise ValueError(
+                    f"Expected more than {self.n_folds * self.horizon_days} days of training data "
+                    f"for {self.n_folds} folds of {self.horizon_days} days, but found "
+                    f"{last_day - days.min() + 1}."
+                )
+
+            folds = []
+            for k in range(self.n_folds):
+                cutoff = first_cutoff + k * self.horizon_days
+                valid = (days >= cutoff) & (days < cutoff + self.horizon_days)
+                folds.append((np.flatnonzero(days < cutoff), np.flatnonzero(valid)))
+            self.splits["folds"] = folds
+
+        return self.splits["folds"]
+
+
+class ChunkedSalesDataset(ModelDataset):
+    """
+    A sales dataset that is never held in memory as a whole.
+
+    The first time a data file is used, it is streamed in chunks of ``chunk_rows`` rows. The date
+    features of each chunk are computed, each row is assigned to the training or test split, and
+    the features are appended to one raw binary file per split and column in ``cache_dir``. The
+    splits are then served as memory-mapped NumPy arrays, so training memory is bounded by the
+    pages in use rather than by the size of the data. Later runs on the same data (same path, size
+    and modification time) and split parameters reuse the cache and skip parsing entirely.
+
+    Unlike ``SalesDataset``, rows are assigned to the training split independently, each with
+    probability ``train_pct``, so the size of the split is ``train_pct`` of the rows on average.
+
+    Attributes
+    ----------
+    preprocessor : DateFeatureExtractor
+        The date feature extractor, fitted on the input columns of the data.
+    metadata : Dict[str, Any]
+        The metadata of the cache: its source, split parameters, columns and rows per split.
+    """
+
+    def __init__(
+        self,
+        data_loc: str | Path,
+        cache_dir: str | Path,
+        train_pct: float = 0.8,
+        random_seed: int = 42,
+        chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    ):
+        self.data_loc = Path(data_loc)
+        self.cache_dir = Path(cache_dir)
+        self.train_pct = train_pct
+        self.random_seed = random_seed
+        self.chunk_rows = chunk_rows
+
+        key = self._cache_key()
+        self.metadata = self._read_metadata()
+        if self.metadata is None or self.metadata["key"] != key:
+            LOG.info("Building the feature cache of %s in %s", self.data_loc, self.cache_dir)
+            self.metadata = self._build_cache(key)
+        else:
+            LOG.info("Using the feature cache of %s in %s", self.data_loc, self.cache_dir)
+
+        self.preprocessor = DateFeatureExtractor().fit(
+            pd.DataFrame(columns=self.metadata["input_columns"])
+        )
+
+    def _cache_key(self) -> Dict[str, Any]:
+        stat = self.data_loc.stat()
+        return {
+            "format_version": FEATURE_CACHE_VERSION,
+            "source": str(self.data_loc.resolve()),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "train_pct": self.train_pct,
+            "random_seed": self.random_seed,
+        }
+
+    def _read_metadata(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.cache_dir / FEATURE_CACHE_METADATA_FILE, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _build_cache(self, key: Dict[str, Any]) -> Dict[str, Any]:
+        tmp_dir = self.cache_dir.with_name(f".{self.cache_dir.name}.tmp-{os.getpid()}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        for split in ("train", "test"):
+            (tmp_dir / split).mkdir(parents=True)
+
+        rng = np.random.default_rng(self.random_seed)
+        rows = {"train": 0, "test": 0}
+        input_columns, dtypes, files = None, None, {}
+        try:
+            for chunk in read_sales_chunks(self.data_loc, self.chunk_rows):
+                if input_columns is None:
+                    input_columns = [c for c in chunk.columns if c != TARGET]
+                    preprocessor = DateFeatureExtractor().fit(chunk[input_columns])
+
+                features = preprocessor.transform(chunk[input_columns])
+                features[TARGET] = chunk[TARGET]
+                if dtypes is None:
+                    dtypes = {c: str(t) for c, t in features.dtypes.items()}
+                    for split in rows:
+                        for c in dtypes:
+                            files[split, c] = open(tmp_dir / split / f"{c}.bin", "wb")
+
+                in_train = rng.random(len(chunk)) < self.train_pct
+                for split, mask in (("train", in_train), ("test", ~in_train)):
+                    for c, dtype in dtypes.items():
+                        features[c].to_numpy(dtype=dtype)[mask].tofile(files[split, c])
+                    rows[split] += int(mask.sum())
+        finally:
+            for f in files.values():
+                f.close()
+
+        if dtypes is None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise ValueError(f"Expected '{self.data_loc}' to have at least one row.")
+
+        metadata = {"key": key, "input_columns": input_columns, "dtypes": dtypes, "rows": rows}
+        # The metadata file is written last; its presence marks the cache as complete
+        with open(tmp_dir / FEATURE_CACHE_METADATA_FILE, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, indent=2)
+
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.replace(tmp_dir, self.cache_dir)
+
+        return metadata
+
+    def _columns(self, split: str) -> Dict[str, np.ndarray]:
+        n_rows = self.metadata["rows"][split]
+        return {
+            c: (
+                np.memmap(self.cache_dir / split / f"{c}.bin", dtype=dtype, mode="r", shape=n_rows)
+                if n_rows
+                else np.empty(0, dtype=dtype)
+            )
+            for c, dtype in self.metadata["dtypes"].items()
+        }
+
+    def get_features(self, split: str) -> Tuple[pd.DataFrame, np.ndarray]:
+        """
+        Returns the features and target of a split, backed by the memory-mapped cache files
+        rather than copies of them.
+
+        Parameters
+        ----------
+        split : str
+            The split, ``train`` or ``test``.
+
+        Returns
+        -------
+        Tuple[pd.DataFrame, np.ndarray]
+            The features, in the order produced by the preprocessor, and the target.
+        """
+        columns = self._columns(split)
+        y = columns.pop(TARGET)
+        return pd.DataFrame(columns, copy=False), y
+
+    def get_training_split(self) -> pd.DataFrame:
+        return pd.DataFrame(self._columns("train"), copy=False)
+
+    def get_validation_split(self) -> pd.DataFrame:
+        """
+        Not supported: the validation split of ``SalesDataset`` holds the most recent days of its
+        training split, but the cache splits rows at random and only keeps their date features, so
+        no such window can be selected from it.
+
+        Raises
+        ------
+        NotImplementedError
+            Always.
+        """
+        raise NotImplementedError(
+            "ChunkedSalesDataset has no validation split: its rows are split at random, and the "
+            "cache does not keep their dates to hold out the most recent days. Use SalesDataset "
+            "with 'n_folds' for time-based validation."
+        )
+
+    def get_test_split(self) -> pd.DataFrame:
+        return pd.DataFrame(self._columns("test"), copy=False)
+
 
 class SalesForecastingModel(PredictionModel):
     def __init__(self, model_id: str, preprocessor: Any, predictor: CatBoostRegressor):
@@ -113,7 +522,7 @@ def parse_args() -> argparse.Namespace:
         "--data-loc",
         type=str,
         default=DEFAULT_TRAIN_DATA_LOC,
-        help="Location of the training data CSV file.",
+        help="Location of the training data, as a CSV or Parquet file.",
     )
     parser.add_argument(
         "--save-loc",
@@ -133,46 +542,258 @@ def parse_args() -> argparse.Namespace:
         default=DEFAULT_RANDOM_SEED,
         help="Random seed for reproducibility.",
     )
+    parser.add_argument(
+        "--artifact-format",
+        type=str,
+        choices=sorted(VALID_ARTIFACT_FORMATS),
+        default=DEFAULT_ARTIFACT_FORMAT,
+        help="Format to save the trained model in: a cloudpickle file ('pickle'), or an artifact "
+        "directory with the predictor in its library's native format ('native').",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Directory of the feature cache. If set, the training data is streamed in chunks into "
+        "memory-mapped feature files on the first run, and later runs reuse them.",
+    )
+    parser.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=DEFAULT_CHUNK_ROWS,
+        help="Number of rows read at a time when building the feature cache.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of models trained concurrently, each in its own process (default is one "
+        "process per model, up to the number of CPUs). With 1, the models are trained in the main "
+        "process.",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="Number of threads each model is trained with (default is the number of CPUs divided "
+        "by --jobs).",
+    )
 
     return parser.parse_args()
 
 
-def train_models(args: argparse.Namespace):
-    # If an unspecified model name is provided, raise an error
-    if set(args.model_name) - VALID_MODEL_TYPES:
-        raise ValueError(
-            f"Expected elements of 'model_name' to be one of {VALID_MODEL_TYPES}, but found '{args.model_name}'."
-        )
+def _cast_sales_data(data: pd.DataFrame) -> pd.DataFrame:
+    # Returns a cast copy; the given frame is left untouched
+    data = data.assign(**{DATE_COLUMN: pd.to_datetime(data[DATE_COLUMN], format=DATE_FORMAT)})
+    return data.astype({c: t for c, t in DATA_DTYPES.items() if c in data.columns})
+
+
+def load_sales_data(path: str | Path) -> pd.DataFrame:
+    """
+    Loads the sales data from a CSV or Parquet file, with compact dtypes: ``int16`` store and item
+    IDs, ``int32`` sales, and parsed (``datetime64``) dates.
+
+    Parameters
+    ----------
+    path : str | Path
+        The data file. Files with a ``.parquet`` suffix are read as Parquet, others as CSV.
+
+    Returns
+    -------
+    pd.DataFrame
+        The sales data.
+    """
+    if Path(path).suffix == ".parquet":
+        return _cast_sales_data(pd.read_parquet(path))
+
+    return pd.read_csv(path, dtype=DATA_DTYPES, parse_dates=[DATE_COLUMN], date_format=DATE_FORMAT)
+
+
+def read_sales_chunks(path: str | Path, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """
+    Reads the sales data from a CSV or Parquet file in chunks, with the dtypes of
+    ``load_sales_data()``.
+
+    Parameters
+    ----------
+    path : str | Path
+        The data file. Files with a ``.parquet`` suffix are read as Parquet, others as CSV.
+    chunk_rows : int
+        The maximum number of rows of a chunk.
+
+    Yields
+    ------
+    pd.DataFrame
+        The chunks, in the order of the file.
+    """
+    if Path(path).suffix == ".parquet":
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield _cast_sales_data(batch.to_pandas())
+        return
+
+    yield from pd.read_csv(
+        path,
+        dtype=DATA_DTYPES,
+        parse_dates=[DATE_COLUMN],
+        date_format=DATE_FORMAT,
+        chunksize=chunk_rows,
+    )
+
+
+# The prepared training data, inherited by (or given to) each training process
+_SHARED_DATA: Dict[str, Any] = {}
+
+
+def _init_training_worker(shared_data: Dict[str, Any]):
+    _SHARED_DATA.update(shared_data)
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
 
+def _train_model(name: str, threads: int, save_loc: str | Path, artifact_format: str) -> dict:
+    """
+    Trains, evaluates and saves one model on the prepared training data, and returns its score,
+    wall time and the peak memory of the process.
+    """
+    start = time.perf_counter()
+    params = {**MODEL_PARAMS[name], THREAD_PARAMS[name]: threads}
+    predictor = MODEL_CLASSES[name](**params)
+    predictor.fit(_SHARED_DATA["X_train"], _SHARED_DATA["y_train"])
+
+    # The preprocessor was fitted once, and the predictor on its output
+    model = SalesForecastingModel(
+        model_id=name, preprocessor=_SHARED_DATA["preprocessor"], predictor=predictor
+    )
+    model.is_fitted_ = True
+
+    score = mean_absolute_percentage_error(
+        _SHARED_DATA["y_test"], predictor.predict(_SHARED_DATA["X_test"])
+    )
+
+    if artifact_format == "native":
+        save_path = Path(save_loc).joinpath(f"{model.model_id}{ARTIFACT_SUFFIX}")
+        save_artifact(model, save_path)
+    else:
+        save_path = Path(save_loc).joinpath(f"{model.model_id}.pkl")
+        model.serialize(save_path)
+
+    return {
+        "model_id": name,
+        "score": score,
+        "save_path": str(save_path),
+        "wall_time_s": time.perf_counter() - start,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _log_result(result: dict):
+    LOG.info(
+        "Trained %s model in %.1f s (peak RSS %.0f MB); evaluation score: %s; saved to '%s'",
+        result["model_id"],
+        result["wall_time_s"],
+        result["peak_rss_mb"],
+        result["score"],
+        result["save_path"],
+    )
+
+
+def _prepared_features(args: argparse.Namespace) -> Dict[str, Any]:
     LOG.info("Loading training data from %s", args.data_loc)
-    data = pd.read_csv(args.data_loc)
+    data = load_sales_data(args.data_loc)
 
     LOG.info("Creating training and test splits")
     model_dataset = SalesDataset(data, train_pct=args.train_pct, random_seed=args.seed)
     train_df = model_dataset.get_training_split()
-    X_train = train_df.drop(columns=[TARGET])
-    y_train = train_df[TARGET].to_numpy()
-
-    for name in args.model_name:
-        LOG.info("Training %s model ...", name)
-        params = MODEL_PARAMS[name]
-        model = SalesForecastingModel(
-            model_id=name,
-            preprocessor=DateFeatureExtractor(),
-            predictor=(CatBoostRegressor if name == "catboost" else LGBMRegressor)(**params),
+    test_df = model_dataset.get_test_split()
+
+    # The features are the same for every model, so they are computed once
+    LOG.info("Preparing features")
+    preprocessor = DateFeatureExtractor().fit(train_df.drop(columns=[TARGET]))
+    return {
+        "preprocessor": preprocessor,
+        "X_train": preprocessor.transform(train_df.drop(columns=[TARGET])),
+        "y_train": train_df[TARGET].to_numpy(),
+        "X_test": preprocessor.transform(test_df.drop(columns=[TARGET])),
+        "y_test": test_df[TARGET].to_numpy(),
+    }
+
+
+def _cached_features(args: argparse.Namespace) -> Dict[str, Any]:
+    # The features are memory-mapped from the cache, which is built on the first run
+    model_dataset = ChunkedSalesDataset(
+        args.data_loc,
+        args.cache_dir,
+        train_pct=args.train_pct,
+        random_seed=args.seed,
+        chunk_rows=args.chunk_rows,
+    )
+    X_train, y_train = model_dataset.get_features("train")
+    X_test, y_test = model_dataset.get_features("test")
+    return {
+        "preprocessor": model_dataset.preprocessor,
+        "X_train": X_train,
+        "y_train": y_train,
+        "X_test": X_test,
+        "y_test": y_test,
+    }
+
+
+def train_models(args: argparse.Namespace) -> List[dict]:
+    # If an unspecified model name is provided, raise an error
+    if set(args.model_name) - VALID_MODEL_TYPES:
+        raise ValueError(
+            f"Expected elements of 'model_name' to be one of {VALID_MODEL_TYPES}, but found '{args.model_name}'."
         )
-        model.fit(X_train, y_train)
 
-        LOG.info("Evaluating model ...")
-        test_df = model_dataset.get_test_split()
-        X_test = test_df.drop(columns=[TARGET])
-        y_test = test_df[TARGET].to_numpy()
-        score = model.evaluate(X_test, y_test)
-        LOG.info("Model evaluation score: %s", score)
+    start = time.perf_counter()
+    if args.cache_dir:
+        shared_data = _cached_features(args)
+    else:
+        shared_data = _prepared_features(args)
+
+    jobs = args.jobs or min(len(args.model_name), os.cpu_count() or 1) or 1
+    threads = args.threads or max(1, (os.cpu_count() or 1) // jobs)
+    LOG.info(
+        "Training %d models in %d processes, with %d threads each",
+        len(args.model_name),
+        jobs,
+        threads,
+    )
 
-        save_path = Path(args.save_loc).joinpath(f"{model.model_id}.pkl")
-        LOG.info("Saving model to '%s'", save_path)
-        model.serialize(save_path)
+    results = []
+    if jobs == 1:
+        # With a single job, the models are trained one after the other in this process
+        _init_training_worker(shared_data)
+        try:
+            for name in args.model_name:
+                result = _train_model(name, threads, args.save_loc, args.artifact_format)
+                _log_result(result)
+                results.append(result)
+        finally:
+            _SHARED_DATA.clear()
+    else:
+        # Forked workers inherit the prepared data (copy-on-write) rather than receiving a copy
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_training_worker,
+            initargs=(shared_data,),
+        ) as pool:
+            futures = [
+                pool.submit(_train_model, name, threads, args.save_loc, args.artifact_format)
+                for name in args.model_name
+            ]
+            for future in futures:
+                result = future.result()
+                _log_result(result)
+                results.append(result)
+
+    LOG.info("Trained %d models in %.1f s", len(results), time.perf_counter() - start)
+
+    return results
 
 
 if __name__ == "__main__":
@@ -0,0 +1,411 @@
+import argparse
+import math
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import lightgbm as lgb
+import numpy as np
+import yaml
+from catboost import CatBoostRegressor, Pool
+from sklearn.metrics import mean_absolute_percentage_error
+
+from usf_model_api.utils import get_logger
+
+# Ugly hack, but it works for now
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+from models.sales_forecasting.train import (  # noqa: E402
+    DEFAULT_HORIZON_DAYS,
+    DEFAULT_N_FOLDS,
+    DEFAULT_RANDOM_SEED,
+    DEFAULT_SCRIPT_PATH,
+    DEFAULT_TRAIN_DATA_LOC,
+    DEFAULT_TRAIN_PCT,
+    MODEL_PARAMS,
+    TARGET,
+    THREAD_PARAMS,
+    VALID_MODEL_TYPES,
+    DateFeatureExtractor,
+    SalesDataset,
+    load_sales_data,
+)
+
+
+LOG = get_logger(__name__)
+
+
+# Defaults (can be overridden by command line args)
+DEFAULT_TUNED_PARAMS_LOC = DEFAULT_SCRIPT_PATH.joinpath("tuned_params.yaml")
+DEFAULT_N_TRIALS = 27
+DEFAULT_ETA = 3
+DEFAULT_MIN_ESTIMATORS = 50
+DEFAULT_MAX_ESTIMATORS = 500
+DEFAULT_EARLY_STOPPING_ROUNDS = 20
+
+# The values tried for each hyperparameter. Parameters that change how LightGBM bins the features
+# (e.g. max_bin) are left out, so that the datasets can be reused across trials.
+SEARCH_SPACE = {
+    "catboost": {
+        "learning_rate": [0.05, 0.1, 0.2, 0.4],
+        "depth": [4, 5, 6, 8],
+        "l2_leaf_reg": [1.0, 3.0, 10.0],
+        "subsample": [0.6, 0.8, 1.0],
+    },
+    "lgbm": {
+        "learning_rate": [0.05, 0.1, 0.2],
+        "num_leaves": [16, 32, 64, 128],
+        "min_child_weight": [1.0, 7.0, 20.0],
+        "lambda_l1": [0.0, 1.0, 3.0],
+        "lambda_l2": [0.0, 1.0, 3.0],
+    },
+}
+
+
+def sample_configs(model_name: str, n_trials: int, seed: int) -> List[Dict[str, Any]]:
+    """
+    Samples distinct hyperparameter configurations from the search space of a model type.
+
+    Parameters
+    ----------
+    model_name : str
+        The model type, one of ``SEARCH_SPACE``.
+    n_trials : int
+        The number of configurations, capped at the size of the search space.
+    seed : int
+        The random seed.
+
+    Returns
+    -------
+    List[Dict[str, Any]]
+        The configurations.
+    """
+    space = SEARCH_SPACE[model_name]
+    n_trials = min(n_trials, math.prod(len(values) for values in space.values()))
+    rng = np.random.default_rng(seed)
+
+    configs, seen = [], set()
+    while len(configs) < n_trials:
+        config = {k: values[rng.integers(len(values))] for k, values in space.items()}
+        key = tuple(config.values())
+        if key not in seen:
+            seen.add(key)
+            configs.append(config)
+
+    return configs
+
+
+def halving_budgets(min_estimators: int, max_estimators: int, eta: int) -> List[int]:
+    """
+    Returns the number of trees trained in each round of successive halving: ``min_estimators``,
+    multiplied by ``eta`` every round, up to ``max_estimators``.
+    """
+    budgets = [min_estimators]
+    while budgets[-1] < max_estimators:
+        budgets.append(min(budgets[-1] * eta, max_estimators))
+
+    return budgets
+
+
+# The prepared training data, inherited by each tuning process
+_SHARED_DATA: Dict[str, Any] = {}
+
+# The native datasets of each (model type, fold), built once per process and reused by every
+# trial it runs
+_DATASETS: Dict[Tuple[str, int], Tuple[Any, Any]] = {}
+
+
+def _init_tuning_worker(shared_data: Dict[str, Any]):
+    _SHARED_DATA.update(shared_data)
+    _DATASETS.clear()
+
+
+def _fold_datasets(model_name: str, fold: int) -> Tuple[Any, Any]:
+    # Built in the worker rather than the parent, since the libraries' thread pools (started by
+    # building a dataset) do not survive a fork
+    key = (model_name, fold)
+    if key not in _DATASETS:
+        train_idx, valid_idx = _SHARED_DATA["folds"][fold]
+        X, y = _SHARED_DATA["X"], _SHARED_DATA["y"]
+        X_train, y_train = X.iloc[train_idx], y[train_idx]
+        X_valid, y_valid = X.iloc[valid_idx], y[valid_idx]
+        if model_name == "catboost":
+            _DATASETS[key] = (Pool(X_train, y_train), Pool(X_valid, y_valid))
+        else:
+            train_set = lgb.Dataset(
+                X_train, y_train, params={"verbose": -1}, free_raw_data=False
+            ).construct()
+            valid_set = lgb.Dataset(
+                X_valid, y_valid, reference=train_set, free_raw_data=False
+            ).construct()
+            _DATASETS[key] = (train_set, valid_set)
+
+    return _DATASETS[key]
+
+
+def _fit_fold(
+    model_name: str, params: Dict[str, Any], n_estimators: int, fold: int, early_stopping: int
+) -> Tuple[float, int]:
+    train_set, valid_set = _fold_datasets(model_name, fold)
+    y_valid = _SHARED_DATA["y"][_SHARED_DATA["folds"][fold][1]]
+    if model_name == "catboost":
+        model = CatBoostRegressor(**params, n_estimators=n_estimators)
+        model.fit(
+            train_set,
+            eval_set=valid_set,
+            early_stopping_rounds=early_stopping,
+            use_best_model=True,
+        )
+        return (
+            mean_absolute_percentage_error(y_valid, model.predict(valid_set)),
+            model.get_best_iteration() + 1,
+        )
+
+    booster = lgb.train(
+        params,
+        train_set,
+        num_boost_round=n_estimators,
+        valid_sets=[valid_set],
+        callbacks=[lgb.early_stopping(early_stopping, verbose=False)],
+    )
+    X_valid = _SHARED_DATA["X"].iloc[_SHARED_DATA["folds"][fold][1]]
+    best_iteration = booster.best_iteration or booster.current_iteration()
+    return (
+        mean_absolute_percentage_error(
+            y_valid, booster.predict(X_valid, num_iteration=best_iteration)
+        ),
+        best_iteration,
+    )
+
+
+def _run_trial(
+    model_name: str, params: Dict[str, Any], n_estimators: int, early_stopping: int
+) -> Dict[str, Any]:
+    """
+    Trains one configuration on every fold, with early stopping on the validation window, and
+    returns its mean validation MAPE and the mean number of trees it kept.
+    """
+    start = time.perf_counter()
+    scores, iterations = zip(
+        *(
+            _fit_fold(model_name, params, n_estimators, fold, early_stopping)
+            for fold in range(len(_SHARED_DATA["folds"]))
+        )
+    )
+    return {
+        "score": float(np.mean(scores)),
+        "best_iterations": int(round(np.mean(iterations))),
+        "wall_time_s": time.perf_counter() - start,
+    }
+
+
+def _trial_params(model_name: str, config: Dict[str, Any], threads: int) -> Dict[str, Any]:
+    params = {k: v for k, v in MODEL_PARAMS[model_name].items() if k != "n_estimators"}
+    params.update(config)
+    params[THREAD_PARAMS[model_name]] = threads
+    if model_name == "catboost":
+        params.update(verbose=0, allow_writing_files=False)
+    else:
+        params.update(verbose=-1)
+
+    return params
+
+
+def tune_model(
+    pool: ProcessPoolExecutor, model_name: str, args: argparse.Namespace, threads: int
+) -> Dict[str, Any]:
+    """
+    Searches the hyperparameters of one model type with successive halving. Every configuration is
+    trained with the smallest budget of trees, then the best ``1 / eta`` of them with ``eta``
+    times more trees, and so on, until the remaining configurations are trained with the full
+    budget. Early stopping on each validation window ends unpromising trials sooner still.
+
+    Parameters
+    ----------
+    pool : ProcessPoolExecutor
+        The processes the trials are run in.
+    model_name : str
+        The model type.
+    args : argparse.Namespace
+        The command line arguments.
+    threads : int
+        The number of threads each trial is trained with.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The model parameters with the best configuration, and ``n_estimators`` set to the number of
+        trees it kept before early stopping.
+    """
+    configs = sample_configs(model_name, args.n_trials, args.seed)
+    budgets = halving_budgets(args.min_estimators, args.max_estimators, args.eta)
+    for i, n_estimators in enumerate(budgets):
+        futures = [
+            pool.submit(
+                _run_trial,
+                model_name,
+                _trial_params(model_name, config, threads),
+                n_estimators,
+                args.early_stopping_rounds,
+            )
+            for config in configs
+        ]
+        results = sorted(
+            zip((f.result() for f in futures), range(len(configs))),
+            key=lambda r: (r[0]["score"], r[1]),
+        )
+        LOG.info(
+            "%s round %d: %d configurations with up to %d trees; best MAPE %.4f",
+            model_name,
+            i + 1,
+            len(configs),
+            n_estimators,
+            results[0][0]["score"],
+        )
+        if i < len(budgets) - 1:
+            keep = max(1, math.ceil(len(configs) / args.eta))
+            configs = [configs[j] for _, j in results[:keep]]
+
+    best, j = results[0]
+    LOG.info(
+        "Best %s configuration: %s (%d trees)", model_name, configs[j], best["best_iterations"]
+    )
+
+    return {**MODEL_PARAMS[model_name], **configs[j], "n_estimators": best["best_iterations"]}
+
+
+def tune_models(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    # If an unspecified model name is provided, raise an error
+    if set(args.model_name) - VALID_MODEL_TYPES:
+        raise ValueError(
+            f"Expected elements of 'model_name' to be one of {VALID_MODEL_TYPES}, but found '{args.model_name}'."
+        )
+
+    LOG.info("Loading training data from %s", args.data_loc)
+    model_dataset = SalesDataset(
+        load_sales_data(args.data_loc),
+        train_pct=args.train_pct,
+        random_seed=args.seed,
+        n_folds=args.n_folds,
+        horizon_days=args.horizon_days,
+    )
+    train_df = model_dataset.get_training_split()
+    X_train = train_df.drop(columns=[TARGET])
+    shared_data = {
+        "X": DateFeatureExtractor().fit(X_train).transform(X_train),
+        "y": train_df[TARGET].to_numpy(),
+        "folds": model_dataset.get_rolling_origin_folds(),
+    }
+
+    jobs = args.jobs or os.cpu_count() or 1
+    threads = args.threads or max(1, (os.cpu_count() or 1) // jobs)
+    LOG.info("Running trials in %d processes, with %d threads each", jobs, threads)
+
+    # Forked workers inherit the prepared data (copy-on-write) rather than receiving a copy of it
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=_init_tuning_worker,
+        initargs=(shared_data,),
+    ) as pool:
+        tuned_params = {name: tune_model(pool, name, args, threads) for name in args.model_name}
+
+    if args.save_loc:
+        LOG.info("Saving tuned parameters to '%s'", args.save_loc)
+        with open(args.save_loc, "w", encoding="utf-8") as f:
+            yaml.safe_dump({**MODEL_PARAMS, **tuned_params}, f, sort_keys=False)
+
+    return tuned_params
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Search the hyperparameters of sales forecasting models with successive "
+        "halving on rolling-origin validation folds."
+    )
+    parser.add_argument(
+        "--model-name",
+        action="append",
+        help=f"Models to tune. One of {VALID_MODEL_TYPES}.",
+        type=str,
+        default=[],
+    )
+    parser.add_argument(
+        "--data-loc",
+        type=str,
+        default=DEFAULT_TRAIN_DATA_LOC,
+        help="Location of the training data, as a CSV or Parquet file.",
+    )
+    parser.add_argument(
+        "--save-loc",
+        type=str,
+        default=DEFAULT_TUNED_PARAMS_LOC,
+        help="Location to save the tuned parameters, in the format of params.yaml.",
+    )
+    parser.add_argument(
+        "--train-pct", type=float, default=DEFAULT_TRAIN_PCT, help="Training data percentage."
+    )
+    parser.add_argument("--seed", type=int, default=DEFAULT_RANDOM_SEED, help="Random seed.")
+    parser.add_argument(
+        "--n-folds", type=int, default=DEFAULT_N_FOLDS, help="Number of validation folds."
+    )
+    parser.add_argument(
+        "--horizon-days",
+        type=int,
+        default=DEFAULT_HORIZON_DAYS,
+        help="Number of days of each validation window.",
+    )
+    parser.add_argument(
+        "--n-trials",
+        type=int,
+        default=DEFAULT_N_TRIALS,
+        help="Number of configurations sampled per model.",
+    )
+    parser.add_argument(
+        "--eta",
+        type=int,
+        default=DEFAULT_ETA,
+        help="Factor by which the configurations are reduced (and the trees increased) each round.",
+    )
+    parser.add_argument(
+        "--min-estimators",
+        type=int,
+        default=DEFAULT_MIN_ESTIMATORS,
+        help="Number of trees trained in the first round.",
+    )
+    parser.add_argument(
+        "--max-estimators",
+        type=int,
+        default=DEFAULT_MAX_ESTIMATORS,
+        help="Number of trees trained in the last round.",
+    )
+    parser.add_argument(
+        "--early-stopping-rounds",
+        type=int,
+        default=DEFAULT_EARLY_STOPPING_ROUNDS,
+        help="Number of trees without improvement of the validation score after which a trial "
+        "stops.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of trials run concurrently (default is the number of CPUs).",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="Number of threads each trial is trained with (default is the number of CPUs "
+        "divided by --jobs).",
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    tune_models(parse_args())
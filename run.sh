@@ -11,11 +11,11 @@ run_train() {
 }
 
 run_serve() {
-  docker run -v usf-model-api-root:/package -p 80:80 usf-model-api:latest pipenv run fastapi run ./service/api.py --port 80
+  docker run -v usf-model-api-root:/package -p 80:80 usf-model-api:latest pipenv run python ./service/serve.py --port 80
 }
 
 run_pytest() {
-  docker run -v usf-model-api-root:/package usf-model-api:latest pipenv run pytest ./tests ./service/routers/sales_forecasting/test_router.py
+  docker run -v usf-model-api-root:/package usf-model-api:latest pipenv run pytest ./tests ./service/routers/sales_forecasting/test_router.py ./models/sales_forecasting/test_train.py
 }
 
 if [[ train == $COMMAND ]]; then
@@ -25,7 +25,7 @@ elif [[ serve == $COMMAND ]]; then
 elif [[ launch == $COMMAND ]]; then
     run_train && wait && run_serve
 elif [[ pytest == $COMMAND ]]; then
-    docker run -v usf-model-api-root:/package usf-model-api:latest pipenv run pytest ./tests ./service/routers/sales_forecasting/test_router.py
+    docker run -v usf-model-api-root:/package usf-model-api:latest pipenv run pytest ./tests ./service/routers/sales_forecasting/test_router.py ./models/sales_forecasting/test_train.py
 else
     echo "No command provided. Available commands: train, serve, launch, and pytest"
 fi
@@ -1,10 +1,68 @@
+from contextlib import asynccontextmanager
+import asyncio
+
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from usf_model_api import metrics
+from usf_model_api.serving.database import SQLDatabase
+from usf_model_api.serving.middleware import ServerTimingMiddleware
+from service.routers.sales_forecasting import config
+from service.routers.sales_forecasting.router import (
+    router,
+    start_writer,
+    stop_writer,
+    warm_up,
+    EXECUTOR,
+    SCORER,
+    SIMPLE_DB,
+    SINK,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):  # pylint: disable=redefined-outer-name, unused-argument
+    """
+    Application lifespan: everything before the ``yield`` runs at startup, and everything after it
+    runs at shutdown.
+    """
+    if config.MODEL_WATCH_INTERVAL:
+        SIMPLE_DB.start_watcher(interval=config.MODEL_WATCH_INTERVAL)
+
+    # Started here rather than at import, so that each worker process has its own writer thread
+    writer = start_writer()
+    if writer is not None:
+        metrics.REGISTRY.register_gauges(
+            "usf_persistence", "Background prediction writer state.", writer.metrics
+        )
+
+    # Warm-up runs in the background, so that /status can report the app as not ready meanwhile
+    warmup = None
+    if config.WARMUP_BATCH_SIZES:
+        warmup = asyncio.create_task(warm_up(config.WARMUP_BATCH_SIZES))
 
-from service.routers.sales_forecasting.router import router
+    yield
 
+    if warmup is not None:
+        warmup.cancel()
+    EXECUTOR.shutdown()
+    # Queued predictions are written before the sink and the database are closed
+    stop_writer()
+    SINK.close()
+    SIMPLE_DB.close()
 
-app = FastAPI()
+
+metrics.REGISTRY.enabled = config.METRICS_ENABLED
+metrics.REGISTRY.register_gauges("usf_executor", "Inference executor state.", EXECUTOR.metrics)
+if SCORER.cache is not None:
+    metrics.REGISTRY.register_gauges("usf_cache", "Prediction cache state.", SCORER.cache.metrics)
+if isinstance(SIMPLE_DB, SQLDatabase):
+    metrics.REGISTRY.register_gauges(
+        "usf_database", "Database connection pool state.", SIMPLE_DB.pool.metrics
+    )
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(ServerTimingMiddleware)
 app.include_router(router)
 # In the future, we can add more routers like this:
 # app.include_router(
@@ -40,3 +98,12 @@ def read_root() -> JSONResponse:
     return JSONResponse(
         status_code=200, content={"message": "Welcome to my Model Prediction Service!"}
     )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics() -> PlainTextResponse:
+    """
+    Returns the stage and request latency histograms, and the executor and cache gauges, in the
+    Prometheus text format. Latencies are only recorded while ``USF_METRICS_ENABLED`` is set.
+    """
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,100 @@
+"""
+Runtime configuration for the Sales Forecasting service. Every setting can be overridden with the
+environment variable of the same name, prefixed with ``USF_`` (e.g. ``USF_MODEL_DIR``).
+"""
+import os
+from pathlib import Path
+from typing import Optional, Tuple
+
+
+def _get_str(name: str, default: Optional[str]) -> Optional[str]:
+    value = os.environ.get(f"USF_{name}")
+    return default if value in (None, "") else value
+
+
+def _get_int(name: str, default: Optional[int]) -> Optional[int]:
+    value = _get_str(name, None)
+    return default if value is None else int(value)
+
+
+def _get_float(name: str, default: Optional[float]) -> Optional[float]:
+    value = _get_str(name, None)
+    return default if value is None else float(value)
+
+
+def _get_bool(name: str, default: bool) -> bool:
+    value = _get_str(name, None)
+    return default if value is None else value.lower() in ("1", "true", "yes", "on")
+
+
+def _get_sizes(name: str, default: Tuple[int, ...]) -> Tuple[int, ...]:
+    # A comma-separated list of positive integers; "0" for none
+    value = _get_str(name, None)
+    if value is None:
+        return default
+
+    sizes = (int(v) for v in value.split(",") if v.strip())
+    return tuple(size for size in sizes if size > 0)
+
+
+def _get_path(name: str, default: Optional[Path]) -> Optional[Path]:
+    value = _get_str(name, None)
+    return default if value is None else Path(value)
+
+
+# Model registry
+MODEL_DIR = _get_path("MODEL_DIR", Path(__file__).parent / "assets")
+MODEL_LAZY_LOADING = _get_bool("MODEL_LAZY_LOADING", False)
+MODEL_MAX_RESIDENT = _get_int("MODEL_MAX_RESIDENT", None)
+MODEL_LOAD_WORKERS = _get_int("MODEL_LOAD_WORKERS", None)
+MODEL_WATCH_INTERVAL = _get_float("MODEL_WATCH_INTERVAL", None)
+
+# Database backend of the model registry and predictions store: "memory" (per process) or "sqlite"
+DATABASE_BACKEND = _get_str("DATABASE_BACKEND", "memory")
+DATABASE_PATH = _get_path("DATABASE_PATH", None)
+DATABASE_POOL_SIZE = _get_int("DATABASE_POOL_SIZE", 4)
+DATABASE_POOL_TIMEOUT = _get_float("DATABASE_POOL_TIMEOUT", 5.0)
+
+# Predictions store
+PREDICTIONS_MAX_ROWS = _get_int("PREDICTIONS_MAX_ROWS", None)
+PREDICTIONS_SPILL_DIR = _get_path("PREDICTIONS_SPILL_DIR", None)
+
+# Persistence of predictions: where they are written, and whether requests wait for the write
+PREDICTIONS_SINK = _get_str("PREDICTIONS_SINK", "memory")
+PREDICTIONS_SINK_PATH = _get_path("PREDICTIONS_SINK_PATH", None)
+PREDICTIONS_WRITE_MODE = _get_str("PREDICTIONS_WRITE_MODE", "sync")
+PREDICTIONS_QUEUE_MAX_ROWS = _get_int("PREDICTIONS_QUEUE_MAX_ROWS", 1_000_000)
+PREDICTIONS_WRITE_BATCH_ROWS = _get_int("PREDICTIONS_WRITE_BATCH_ROWS", 10_000)
+PREDICTIONS_FLUSH_INTERVAL_MS = _get_float("PREDICTIONS_FLUSH_INTERVAL_MS", 100.0)
+
+# Streaming predictions
+STREAM_CHUNK_SIZE = _get_int("STREAM_CHUNK_SIZE", 10_000)
+
+# Inference executor
+EXECUTOR_BACKEND = _get_str("EXECUTOR_BACKEND", "thread")
+EXECUTOR_WORKERS = _get_int("EXECUTOR_WORKERS", None)
+EXECUTOR_MAX_PENDING = _get_int("EXECUTOR_MAX_PENDING", None)
+PREDICT_THREADS = _get_int("PREDICT_THREADS", None)
+
+# Micro-batching of /predict requests
+BATCHING_ENABLED = _get_bool("BATCHING_ENABLED", False)
+BATCH_MAX_SIZE = _get_int("BATCH_MAX_SIZE", 256)
+BATCH_MAX_WAIT_MS = _get_float("BATCH_MAX_WAIT_MS", 2.0)
+
+# Prediction cache (disabled unless a size is set)
+PREDICTION_CACHE_SIZE = _get_int("PREDICTION_CACHE_SIZE", 0)
+PREDICTION_CACHE_TTL = _get_float("PREDICTION_CACHE_TTL", None)
+
+# Materialized forecast tables (disabled unless a directory is set)
+FORECAST_TABLE_DIR = _get_path("FORECAST_TABLE_DIR", None)
+
+# Model warm-up at startup (disabled if set to 0)
+WARMUP_BATCH_SIZES = _get_sizes("WARMUP_BATCH_SIZES", (1, 100))
+
+# Per-stage latency metrics, at /metrics and in Server-Timing headers
+METRICS_ENABLED = _get_bool("METRICS_ENABLED", False)
+
+# Multi-worker serving (service/serve.py)
+WORKERS = _get_int("WORKERS", None)
+WORKER_MAX_REQUESTS = _get_int("WORKER_MAX_REQUESTS", None)
+WORKER_MAX_REQUESTS_JITTER = _get_int("WORKER_MAX_REQUESTS_JITTER", 0)
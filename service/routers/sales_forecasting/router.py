@@ -1,24 +1,74 @@
-from typing import List, Dict, Any
-from uuid import uuid4
-from datetime import datetime
-from pathlib import Path
+from typing import List, Dict, Any, AsyncIterator, Literal, Optional, Sequence
+from datetime import date, datetime
 from http import HTTPStatus
-from dateutil.parser import parse
-
-from pydantic import field_validator
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
-
+import asyncio
+import json
+import threading
+
+from pydantic import ValidationError, field_validator
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+import numpy as np
 import pandas as pd
-
-from usf_model_api.serving.base import PredictionRequest
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from usf_model_api import metrics
+from usf_model_api.models.base import PredictionModel
+from usf_model_api.serving.base import (
+    ARROW_FILE_CONTENT_TYPE,
+    ARROW_STREAM_CONTENT_TYPE,
+    NDJSON_CONTENT_TYPE,
+    PARQUET_CONTENT_TYPE,
+    BulkPredictionRequest,
+    FrameValidationError,
+    PredictionRequest,
+    UnsupportedContentTypeError,
+    iter_line_chunks,
+    read_bulk_frame,
+    read_ndjson_frame,
+    validate_frame,
+)
+from usf_model_api.serving.batching import MicroBatcher, ModelNotFoundError, Scorer, model_features
+from usf_model_api.serving.cache import PredictionCache
+from usf_model_api.serving.database import PoolTimeoutError, make_database
+from usf_model_api.serving.executors import (
+    ExecutorSaturatedError,
+    InferenceExecutor,
+    warm_up_models,
+)
+from usf_model_api.serving.materialized import load_forecast_tables
+from usf_model_api.serving.persistence import (
+    PersistenceSaturatedError,
+    WriteBehindWriter,
+    make_sink,
+)
+from usf_model_api.serving.responses import encode_predictions
+from usf_model_api.serving.storage import prediction_filters
 from usf_model_api.utils import get_logger
-from usf_model_api.serving.utils import MockDatabase
+from usf_model_api.serving.utils import to_iso_date
+
+from service.routers.sales_forecasting import config
 
 
 LOG = get_logger(__name__)
-SAVED_MODEL_LOC = Path(__file__).parent / "assets"
-SIMPLE_DB = MockDatabase(model_dir=SAVED_MODEL_LOC)
+SAVED_MODEL_LOC = config.MODEL_DIR
+SIMPLE_DB = make_database(
+    config.DATABASE_BACKEND,
+    path=config.DATABASE_PATH,
+    pool_size=config.DATABASE_POOL_SIZE,
+    pool_timeout=config.DATABASE_POOL_TIMEOUT,
+    model_dir=SAVED_MODEL_LOC,
+    max_prediction_rows=config.PREDICTIONS_MAX_ROWS,
+    spill_dir=config.PREDICTIONS_SPILL_DIR,
+    lazy=config.MODEL_LAZY_LOADING,
+    max_models=config.MODEL_MAX_RESIDENT,
+    load_workers=config.MODEL_LOAD_WORKERS,
+)
 
 
 router = APIRouter(
@@ -59,23 +109,50 @@ class SalesForecastRequest(PredictionRequest):
         Returns
         -------
         str
-            The validated date string.
+            The validated date, as ``yyyy-MM-dd``.
 
         Raises
         ------
         ValueError
             If the date string is not in a valid format.
         """
-        try:
-            parse(date)
-        except ValueError:
-            LOG.exception("Invalid date value '%s'.", date)
-            raise
-
-        if len(date) != 10:
+        iso_date = to_iso_date(date)
+        if iso_date is None:
+            LOG.warning("Invalid date value '%s'.", date)
             raise ValueError("Invalid date format '%s'. Expected format 'yyyy-MM-dd'." % date)
 
-        return date
+        return iso_date
+
+
+class SalesForecastBulkRequest(BulkPredictionRequest):
+    """
+    A subclass of ``BulkPredictionRequest`` used to represent many sales forecast requests in
+    columnar form. Dates are validated for the whole batch at once when the request is scored.
+
+    Attributes
+    ----------
+    date : List[str]
+        The dates for which the forecasts are requested.
+    store : List[int]
+        The store identifiers.
+    item : List[int]
+        The item identifiers.
+    """
+
+    date: List[str]
+    store: List[int]
+    item: List[int]
+
+
+# The columns of bulk requests, with the rules of SalesForecastRequest (see validate_frame())
+BULK_FIELDS = {"model_id": "string", "date": "date", "store": "integer", "item": "integer"}
+BULK_SCHEMA = pa.schema(
+    [("model_id", pa.string()), ("date", pa.string()), ("store", pa.int64()), ("item", pa.int64())]
+)
+# Page sizes of the stored predictions query and export endpoints
+DEFAULT_QUERY_LIMIT = 100
+MAX_QUERY_LIMIT = 10_000
+EXPORT_PAGE_ROWS = 10_000
 
 
 @router.get("/")
@@ -98,22 +175,329 @@ def read_root():
 def get_app_status() -> JSONResponse:
     """
     This endpoint returns the status of the application.
-    It can be used to check if the application is up and running.
+    It can be used to check if the application is up and running. Until the models are warmed up
+    (see ``warm_up()``), it responds with a 503 status, so that it can be used as a readiness probe.
 
     Returns
     -------
     JSONResponse
         A JSON response with the application status.
     """
+    if WARMUP["state"] not in WARMUP_READY_STATES:
+        return JSONResponse(
+            status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+            content={
+                "message": f"Status Code {HTTPStatus.SERVICE_UNAVAILABLE}: The app is warming up.",
+                "warmup": WARMUP,
+            },
+        )
+
     return JSONResponse(
         status_code=HTTPStatus.OK,
         content={"message": f"Status Code {HTTPStatus.OK}: The app is up and running."},
     )
 
 
-def _predict(
+def _overloaded(error: Exception) -> HTTPException:
+    # A request rejected because a bounded resource is saturated may be retried
+    LOG.warning("Rejecting prediction request: %s", error)
+    return HTTPException(
+        status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+        detail="The service is overloaded. Please retry later.",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def _score(scoring_df: pd.DataFrame, batched: bool = False) -> pd.DataFrame:
+    """
+    Scores a batch of sales forecast requests with ``SCORER`` (see ``Scorer.score()``).
+
+    Raises
+    ------
+    HTTPException
+        If any of the requested models does not exist (404), or the executor is saturated or no
+        database connection is free in time (503). In either case, nothing is stored.
+    """
+    try:
+        return await SCORER.score(scoring_df, batched=batched)
+    except ModelNotFoundError as e:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=str(e)) from e
+    except (ExecutorSaturatedError, PoolTimeoutError) as e:
+        raise _overloaded(e) from e
+
+
+async def _predict_batch(_model_id: str, X: pd.DataFrame, model: PredictionModel) -> np.ndarray:
+    """
+    Scores one micro-batch in the ``EXECUTOR`` worker pool, with the model its requests were
+    resolved to (which may since have been swapped or evicted from ``SIMPLE_DB``).
+    """
+    return await EXECUTOR.predict(model, X)
+
+
+EXECUTOR = InferenceExecutor(
+    backend=config.EXECUTOR_BACKEND,
+    max_workers=config.EXECUTOR_WORKERS,
+    max_pending=config.EXECUTOR_MAX_PENDING,
+    model_dir=SAVED_MODEL_LOC,
+    predict_threads=config.PREDICT_THREADS,
+)
+EXECUTOR.preload(SIMPLE_DB.model_db)
+SIMPLE_DB.add_listener(lambda model_id: EXECUTOR.preload(SIMPLE_DB.model_db))
+BATCHER = MicroBatcher(
+    _predict_batch,
+    max_batch_size=config.BATCH_MAX_SIZE,
+    max_wait_ms=config.BATCH_MAX_WAIT_MS,
+)
+# Tables computed by another version of a model than the one being served are skipped
+FORECAST_TABLES = load_forecast_tables(
+    config.FORECAST_TABLE_DIR, model_version=SIMPLE_DB.model_version
+)
+SCORER = Scorer(
+    SIMPLE_DB,
+    EXECUTOR,
+    batcher=BATCHER,
+    cache=(
+        PredictionCache(max_entries=config.PREDICTION_CACHE_SIZE, ttl=config.PREDICTION_CACHE_TTL)
+        if config.PREDICTION_CACHE_SIZE
+        else None
+    ),
+    tables=FORECAST_TABLES,
+)
+if SCORER.cache is not None:
+    SIMPLE_DB.add_listener(SCORER.cache.invalidate)
+# The in-memory sink writes to the predictions store of SIMPLE_DB
+SINK = make_sink(
+    config.PREDICTIONS_SINK, config.PREDICTIONS_SINK_PATH, store=SIMPLE_DB.predictions_store
+)
+# Sinks are written to by one thread at a time, and synchronous writes run in the threadpool
+SYNC_WRITE_LOCK = threading.Lock()
+# The background writer is started by the app lifespan (see start_writer()), in each worker
+# process, since its thread would not survive the fork of the workers by service/serve.py
+WRITER: Optional[WriteBehindWriter] = None
+
+
+def start_writer() -> Optional[WriteBehindWriter]:
+    """
+    Starts the background writer of the predictions in this process, unless predictions are written
+    synchronously (``USF_PREDICTIONS_WRITE_MODE=sync``) or the writer is already started. Until it
+    is started, predictions are written synchronously.
+
+    Returns
+    -------
+    Optional[WriteBehindWriter]
+        The writer, or None in the ``sync`` write mode.
+    """
+    global WRITER  # pylint: disable=global-statement
+    if WRITER is None and config.PREDICTIONS_WRITE_MODE != "sync":
+        WRITER = WriteBehindWriter(
+            SINK,
+            durability=config.PREDICTIONS_WRITE_MODE,
+            max_queue_rows=config.PREDICTIONS_QUEUE_MAX_ROWS,
+            max_batch_rows=config.PREDICTIONS_WRITE_BATCH_ROWS,
+            flush_interval_ms=config.PREDICTIONS_FLUSH_INTERVAL_MS,
+        )
+
+    return WRITER
+
+
+def stop_writer():
+    """
+    Writes the queued predictions, and stops the background writer of this process, if started.
+    """
+    global WRITER  # pylint: disable=global-statement
+    writer, WRITER = WRITER, None
+    if writer is not None:
+        writer.close()
+
+
+# Synthetic warm-up requests cover the stores and items of the sales data, and the next 90 days
+WARMUP_STORES = 10
+WARMUP_ITEMS = 50
+WARMUP_HORIZON = 90
+WARMUP_READY_STATES = ("ready", "disabled")
+# The app is not ready until the warm-up task started by the app lifespan has completed
+WARMUP: Dict[str, Any] = {
+    "state": "pending" if config.WARMUP_BATCH_SIZES else "disabled",
+    "batch_sizes": [],
+    "models": {},
+    "duration_ms": None,
+}
+
+
+def _drop_forecast_table(model_id: str):
+    # A table computed by a previous version of the model must not be served
+    if FORECAST_TABLES.pop(model_id, None) is not None:
+        LOG.warning("Dropped the stale forecast table of model '%s'", model_id)
+
+
+SIMPLE_DB.add_listener(_drop_forecast_table)
+
+
+def _validate_bulk_frame(scoring_df: pd.DataFrame, row_offset: int = 0) -> pd.DataFrame:
+    """
+    Validates a columnar batch of sales forecast requests with the rules of
+    ``SalesForecastRequest`` (see ``validate_frame()``), and converts its dates to ``yyyy-MM-dd``.
+
+    Raises
+    ------
+    RequestValidationError
+        If any column is missing or has invalid values.
+    """
+    try:
+        return validate_frame(scoring_df, BULK_FIELDS, row_offset=row_offset)
+    except FrameValidationError as e:
+        raise RequestValidationError(e.errors) from e
+
+
+def _decode_bulk_frame(content_type: str, body: bytes) -> pd.DataFrame:
+    # Decodes and validates the body of a bulk prediction request
+    return _validate_bulk_frame(_read_bulk_frame(content_type, body))
+
+
+def _read_bulk_frame(content_type: str, body: bytes) -> pd.DataFrame:
+    """
+    Decodes the body of a bulk prediction request (see ``read_bulk_frame()``).
+
+    Raises
+    ------
+    HTTPException
+        If the content type is not supported.
+    RequestValidationError
+        If a JSON body does not match ``SalesForecastBulkRequest``.
+    """
+    try:
+        return read_bulk_frame(content_type, body, SalesForecastBulkRequest)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False)) from e
+    except UnsupportedContentTypeError as e:
+        raise HTTPException(status_code=HTTPStatus.UNSUPPORTED_MEDIA_TYPE, detail=str(e)) from e
+
+
+async def _predict_frame(scoring_df: pd.DataFrame, batched: bool = False) -> pd.DataFrame:
+    """
+    Scores and stores (atomically; either all are successful or nothing is written) a batch of
+    validated sales forecast requests.
+
+    Parameters
+    ----------
+    scoring_df : pd.DataFrame
+        The requests to score, with a ``model_id`` column and one column per model feature.
+    batched : bool, optional
+        Whether to score through the micro-batching scheduler (default is False).
+
+    Returns
+    -------
+    pd.DataFrame
+        The scored requests.
+    """
+    with metrics.timed("score", rows=len(scoring_df)):
+        scored_df = await _score(scoring_df, batched=batched)
+
+    # Save predictions to database
+    with metrics.timed("save", rows=len(scored_df)):
+        await _save_predictions(scored_df)
+
+    return scored_df
+
+
+def _write_predictions(scored_df: pd.DataFrame):
+    with SYNC_WRITE_LOCK:
+        SINK.write(scored_df)
+
+
+async def _save_predictions(scored_df: pd.DataFrame):
+    """
+    Writes scored requests to the predictions sink: before returning in the ``sync`` write mode (or
+    until the background writer is started), and in the background otherwise (waiting for the write
+    in the ``ack`` mode).
+
+    Parameters
+    ----------
+    scored_df : pd.DataFrame
+        The scored requests.
+
+    Raises
+    ------
+    HTTPException
+        With status 503, if the queue of the background writer is full, or no database connection
+        is free in time.
+    """
+    try:
+        if WRITER is None:
+            # Off the event loop, since a database write may wait for a connection or a lock
+            await run_in_threadpool(_write_predictions, scored_df)
+            return
+
+        future = WRITER.submit(scored_df)
+    except (PersistenceSaturatedError, PoolTimeoutError) as e:
+        raise _overloaded(e) from e
+
+    if WRITER.durability == "ack":
+        await asyncio.wrap_future(future)
+
+
+def _read_ndjson_frame(lines: List[bytes]) -> pd.DataFrame:
+    # Decodes a chunk of NDJSON-encoded sales forecast requests
+    try:
+        return read_ndjson_frame(lines, BULK_SCHEMA)
+    except pa.ArrowInvalid as e:
+        raise RequestValidationError(
+            [{"type": "json_invalid", "loc": ["body"], "msg": f"Invalid NDJSON: {e}"}]
+        ) from e
+
+
+async def _iter_ndjson_chunks(request: Request, chunk_size: int) -> AsyncIterator[pd.DataFrame]:
+    """
+    Reads an NDJSON request body as it arrives, and yields the validated requests in chunks of at
+    most ``chunk_size`` requests, decoded off the event loop.
+    """
+    row_offset = 0
+    async for lines in iter_line_chunks(request.stream(), chunk_size):
+        yield await run_in_threadpool(_decode_ndjson_chunk, lines, row_offset)
+        row_offset += len(lines)
+
+
+def _decode_ndjson_chunk(lines: List[bytes], row_offset: int) -> pd.DataFrame:
+    # Decodes and validates a chunk of streamed requests (off the event loop)
+    return _validate_bulk_frame(_read_ndjson_frame(lines), row_offset=row_offset)
+
+
+async def _predict_ndjson_chunk(scoring_df: Optional[pd.DataFrame]) -> bytes:
+    """
+    Scores and stores one chunk of streamed requests, and encodes the results as NDJSON.
+
+    Parameters
+    ----------
+    scoring_df : Optional[pd.DataFrame]
+        The validated requests of the chunk, or None if there are none.
+
+    Returns
+    -------
+    bytes
+        The scored requests, one JSON object per line.
+    """
+    if scoring_df is None or scoring_df.empty:
+        return b""
+
+    scored_df = await _predict_frame(scoring_df)
+
+    return scored_df.to_json(orient="records", lines=True).encode()
+
+
+def _to_scoring_frame(
     prediction_request: SalesForecastRequest | List[SalesForecastRequest],
-) -> List[Dict[str, Any]]:
+) -> pd.DataFrame:
+    """
+    Creates and prepares the dataframe for scoring, with one row per sales forecast request.
+    """
+    to_score = prediction_request if isinstance(prediction_request, list) else [prediction_request]
+
+    return pd.DataFrame.from_records(map(lambda x: x.model_dump(), to_score))
+
+
+async def _predict(
+    prediction_request: SalesForecastRequest | List[SalesForecastRequest],
+) -> pd.DataFrame:
     """
     Generates and stores (atomically; either all are successful or nothing is written) predictions
     for one or more sales forecast requests. Each request is allowed to request a specific model deployment
@@ -126,69 +510,463 @@ def _predict(
 
     Returns
     -------
-    List[Dict[str, Any]]
-        A list of dictionaries containing the predictions.
+    pd.DataFrame
+        The scored requests.
     """
-    # Create and prepare dataframe for scoring
-    to_score = prediction_request if isinstance(prediction_request, list) else [prediction_request]
-    scoring_df = pd.DataFrame.from_records(map(lambda x: x.model_dump(), to_score))
-    scoring_df.insert(0, column="prediction_id", value=None)
-    scoring_df["prediction"] = None
-    scoring_df["created_at"] = None
-    features = sorted(
-        set(scoring_df.columns) - {"model_id", "prediction_id", "prediction", "created_at"}
+    with metrics.timed("frame"):
+        scoring_df = _to_scoring_frame(prediction_request)
+
+    return await _predict_frame(scoring_df, batched=config.BATCHING_ENABLED)
+
+
+def _warmup_frame(batch_size: int) -> pd.DataFrame:
+    """
+    Creates the features of a batch of synthetic sales forecast requests, spread over the stores and
+    items of the sales data and the days following today.
+    """
+    rng = np.random.default_rng(batch_size)
+    days = pd.Timestamp.today().normalize() + pd.to_timedelta(
+        rng.integers(0, WARMUP_HORIZON, batch_size), unit="D"
     )
-    LOG.info("Identified model features: %s", features)
-
-    # Score by model requested for each batch (also generalizes to one model)
-    requested_models = scoring_df["model_id"].unique()
-    LOG.info("Requested models: %s", requested_models.tolist())
-    for m in requested_models:
-        LOG.info("Running scoring with model '%s' ...", m)
-        model = SIMPLE_DB.get_model(m)
-        if not model:
-            raise HTTPException(
-                status_code=HTTPStatus.NOT_FOUND, detail=f"Model with ID '{m}' not found."
-            )
-
-        predictions = model.predict(X=scoring_df.loc[scoring_df["model_id"] == m, features])
-        scoring_df.loc[scoring_df["model_id"] == m, "prediction"] = predictions
-        scoring_df.loc[scoring_df["model_id"] == m, "prediction_id"] = [
-            str(uuid4()) for _ in range(len(predictions))
-        ]
-        scoring_df.loc[scoring_df["model_id"] == m, "created_at"] = pd.to_datetime(
-            datetime.utcnow()
-        ).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-
-    assert not scoring_df.isnull().values.any(), "Prediction dataframe contains NaN values."
-    # Save predictions to database
-    SIMPLE_DB.save_predictions(scoring_df)
+    warmup_df = pd.DataFrame(
+        {
+            "date": days.strftime("%Y-%m-%d"),
+            "store": rng.integers(1, WARMUP_STORES + 1, batch_size),
+            "item": rng.integers(1, WARMUP_ITEMS + 1, batch_size),
+        }
+    )
+    # The same columns, in the same order, as the features of real requests
+    return warmup_df[model_features(warmup_df)]
+
+
+async def warm_up(batch_sizes: Sequence[int]) -> Dict[str, Any]:
+    """
+    Warms up every model of ``SIMPLE_DB`` in the ``EXECUTOR`` worker pool (see ``warm_up_models()``). The
+    batches bypass the forecast tables and the prediction cache, and their predictions are not
+    stored. Until this completes, ``/status`` reports the app as not ready.
+
+    Parameters
+    ----------
+    batch_sizes : Sequence[int]
+        The number of requests of each synthetic batch, scored in this order.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The warm-up state (also available as ``WARMUP``), with the time taken by each batch of
+        each model, in milliseconds.
+    """
+    return await warm_up_models(SIMPLE_DB, EXECUTOR, batch_sizes, _warmup_frame, WARMUP)
 
-    return scoring_df.to_dict(orient="records")
+
+def _prediction_response(scored_df: pd.DataFrame, orient: str) -> Response:
+    """
+    Encodes scored requests as a successful prediction response.
+    """
+    with metrics.timed("serialize", rows=len(scored_df)):
+        content = encode_predictions(
+            scored_df, orient=orient, message="Prediction request successful."
+        )
+
+    return Response(content=content, status_code=HTTPStatus.OK, media_type="application/json")
 
 
 @router.post("/predict")
-def predict(prediction_request: SalesForecastRequest | List[SalesForecastRequest]) -> JSONResponse:
+async def predict(
+    prediction_request: SalesForecastRequest | List[SalesForecastRequest],
+    orient: Literal["records", "columns"] = "records",
+) -> Response:
     """
     This endpoint is used to get model predictions. The model(s) used to generate predictions
     is determined by the ``model_id`` field value in each ``SalesForecastRequest`` object.
 
+    Inference runs in a bounded worker pool (see ``USF_EXECUTOR_BACKEND``). If the pool is
+    saturated, the request is rejected with a 503 status. If micro-batching is enabled
+    (``USF_BATCHING_ENABLED``), concurrent requests for the same model are scored together in one
+    vectorized call. If the prediction cache is enabled (``USF_PREDICTION_CACHE_SIZE``), only the
+    requests missing from the cache are scored. Requests inside the grid of a materialized forecast
+    table (``USF_FORECAST_TABLE_DIR``) are looked up in the table instead of being scored.
+
     Parameters
     ----------
     prediction_request : SalesForecastRequest | List[SalesForecastRequest]
         A single sales forecast request or a list of sales forecast requests.
+    orient : Literal["records", "columns"]
+        The shape of the predictions: ``records`` (default) for a list of one object per
+        prediction, or ``columns`` for one list per field, e.g.
+        ``{"prediction_id": [...], "prediction": [...], ...}``, which is more compact.
 
     Returns
     -------
-    JSONResponse
+    Response
         A JSON response containing the predictions.
     """
-    predictions = _predict(prediction_request)
+    metrics.record_since_request_start("validate")
+    scored_df = await _predict(prediction_request)
+
+    return _prediction_response(scored_df, orient)
+
+
+@router.get("/admin/models")
+def list_models() -> JSONResponse:
+    """
+    This endpoint lists the models known to the model registry, and whether each is currently
+    resident in memory.
+
+    Returns
+    -------
+    JSONResponse
+        A JSON response mapping each model ID to its file path and residency.
+    """
+    return JSONResponse(status_code=HTTPStatus.OK, content=SIMPLE_DB.list_models())
+
+
+@router.post("/admin/reload")
+async def reload_models() -> JSONResponse:
+    """
+    This endpoint rescans the model directory, and hot-swaps new, updated and removed models.
+    Requests already being scored keep using the model version they started with.
+
+    Returns
+    -------
+    JSONResponse
+        A JSON response with the IDs of the added, reloaded and removed models.
+    """
+    changes = await run_in_threadpool(SIMPLE_DB.refresh)
+
+    return JSONResponse(status_code=HTTPStatus.OK, content=changes)
+
+
+@router.get("/executor")
+def get_executor_metrics() -> JSONResponse:
+    """
+    This endpoint returns the settings and counters of the inference executor, including the
+    number of pending calls and the number of calls rejected because the executor was saturated.
+
+    Returns
+    -------
+    JSONResponse
+        A JSON response with the executor metrics.
+    """
+    return JSONResponse(status_code=HTTPStatus.OK, content=EXECUTOR.metrics())
+
+
+@router.get("/batching")
+def get_batching_metrics() -> JSONResponse:
+    """
+    This endpoint returns the queue depth and batch size statistics of the micro-batching scheduler,
+    per model.
 
+    Returns
+    -------
+    JSONResponse
+        A JSON response with the scheduler settings and per-model statistics.
+    """
     return JSONResponse(
         status_code=HTTPStatus.OK,
         content={
-            "message": "Prediction request successful.",
-            "predictions": predictions,
+            "enabled": config.BATCHING_ENABLED,
+            "max_batch_size": BATCHER.max_batch_size,
+            "max_wait_ms": BATCHER.max_wait_ms,
+            "models": BATCHER.metrics(),
         },
     )
+
+
+@router.get("/warmup")
+def get_warmup_status() -> JSONResponse:
+    """
+    This endpoint returns the state of the startup warm-up (``pending``, ``warming``, ``ready`` or
+    ``disabled``), and the time taken by each synthetic batch of each model.
+
+    Returns
+    -------
+    JSONResponse
+        A JSON response with the warm-up state and timings.
+    """
+    return JSONResponse(status_code=HTTPStatus.OK, content=WARMUP)
+
+
+@router.get("/admin/forecast-tables")
+def list_forecast_tables() -> JSONResponse:
+    """
+    This endpoint lists the materialized forecast tables being served, and the grid each covers.
+
+    Returns
+    -------
+    JSONResponse
+        A JSON response mapping each model ID to the description of its table.
+    """
+    return JSONResponse(
+        status_code=HTTPStatus.OK,
+        content={m: table.metadata() for m, table in FORECAST_TABLES.items()},
+    )
+
+
+@router.get("/persistence")
+def get_persistence_metrics() -> JSONResponse:
+    """
+    This endpoint returns the write mode and sink of the predictions, and the queue state (queued
+    rows, and the age of the oldest queued rows) and counters of the background writer, if any.
+
+    Returns
+    -------
+    JSONResponse
+        A JSON response with the persistence metrics.
+    """
+    content = {"write_mode": config.PREDICTIONS_WRITE_MODE, "sink": config.PREDICTIONS_SINK}
+    if WRITER is not None:
+        content.update(WRITER.metrics())
+
+    return JSONResponse(status_code=HTTPStatus.OK, content=content)
+
+
+@router.get("/predictions/export")
+async def export_predictions(
+    export_format: Literal["parquet", "ndjson"] = Query(default="ndjson", alias="format"),
+    model_id: Optional[str] = None,
+    store: Optional[int] = None,
+    item: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+) -> Response:
+    """
+    This endpoint exports the stored predictions matching the filters (as for
+    ``/predictions``), oldest first, either as a Parquet file or as an NDJSON stream. The NDJSON
+    stream is queried and encoded a page at a time.
+
+    Parameters
+    ----------
+    export_format : Literal["parquet", "ndjson"]
+        The export format (the ``format`` query parameter), ``ndjson`` by default.
+    model_id, store, item, date_from, date_to, created_from, created_to : Optional
+        The filters, as for ``/predictions``.
+
+    Returns
+    -------
+    Response
+        The Parquet file, or a streaming NDJSON response with one prediction per line.
+    """
+    filters = prediction_filters(
+        model_id, store, item, date_from, date_to, created_from, created_to
+    )
+    if export_format == "parquet":
+
+        def encode() -> bytes:
+            found, _ = SINK.query(filters)
+            sink = pa.BufferOutputStream()
+            pq.write_table(pa.Table.from_pandas(found, preserve_index=False), sink)
+            return sink.getvalue().to_pybytes()
+
+        return Response(content=await run_in_threadpool(encode), media_type=PARQUET_CONTENT_TYPE)
+
+    async def stream() -> AsyncIterator[bytes]:
+        cursor = None
+        while True:
+            found, cursor = await run_in_threadpool(SINK.query, filters, EXPORT_PAGE_ROWS, cursor)
+            if not found.empty:
+                yield found.to_json(orient="records", lines=True).encode()
+            if cursor is None:
+                break
+
+    return StreamingResponse(stream(), media_type=NDJSON_CONTENT_TYPE)
+
+
+@router.get("/predictions/{prediction_id}")
+def get_prediction(prediction_id: str) -> Response:
+    """
+    This endpoint looks up a stored prediction by ID, in the predictions sink. With the ``memory``
+    sink, only the predictions held in memory (not evicted ones) can be looked up.
+
+    Parameters
+    ----------
+    prediction_id : str
+        The prediction ID.
+
+    Returns
+    -------
+    Response
+        A JSON response containing the prediction.
+
+    Raises
+    ------
+    HTTPException
+        If no stored prediction has this ID.
+    """
+    found = SINK.lookup([prediction_id])
+    if found.empty:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail=f"Prediction '{prediction_id}' not found.",
+        )
+
+    return Response(
+        content=encode_predictions(found), status_code=HTTPStatus.OK, media_type="application/json"
+    )
+
+
+@router.get("/predictions")
+def query_predictions(
+    model_id: Optional[str] = None,
+    store: Optional[int] = None,
+    item: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    limit: int = Query(default=DEFAULT_QUERY_LIMIT, gt=0, le=MAX_QUERY_LIMIT),
+    cursor: Optional[int] = Query(default=None, ge=0),
+    orient: Literal["records", "columns"] = "records",
+) -> Response:
+    """
+    This endpoint queries the stored predictions, in the predictions sink. Filters are combined,
+    and the ranges are inclusive. The matching predictions are returned oldest first, a page of at
+    most ``limit`` at a time. With the ``memory`` sink, only the predictions held in memory (not
+    evicted ones) are queried.
+
+    Parameters
+    ----------
+    model_id, store, item : Optional
+        Exact values to match.
+    date_from, date_to : Optional[date]
+        The range of the requested ``date``.
+    created_from, created_to : Optional[datetime]
+        The range of ``created_at`` (UTC).
+    limit : int
+        The maximum number of predictions returned.
+    cursor : Optional[int]
+        The ``next_cursor`` of the previous page, to get the next page.
+    orient : Literal["records", "columns"]
+        The shape of the predictions, as for ``/predict``.
+
+    Returns
+    -------
+    Response
+        A JSON response containing the page of predictions, and the ``next_cursor`` of the next
+        page (null on the last page).
+    """
+    filters = prediction_filters(
+        model_id, store, item, date_from, date_to, created_from, created_to
+    )
+    found, next_cursor = SINK.query(filters, limit=limit, cursor=cursor)
+    content = encode_predictions(found, orient=orient, next_cursor=next_cursor)
+
+    return Response(content=content, status_code=HTTPStatus.OK, media_type="application/json")
+
+
+@router.get("/cache")
+def get_cache_metrics() -> JSONResponse:
+    """
+    This endpoint returns the settings and hit/miss counters of the prediction cache.
+
+    Returns
+    -------
+    JSONResponse
+        A JSON response with the cache metrics.
+    """
+    content = {"enabled": SCORER.cache is not None}
+    if SCORER.cache is not None:
+        content.update(SCORER.cache.metrics())
+
+    return JSONResponse(status_code=HTTPStatus.OK, content=content)
+
+
+@router.post(
+    "/predict/bulk",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": SalesForecastBulkRequest.model_json_schema()},
+                ARROW_STREAM_CONTENT_TYPE: {"schema": {"type": "string", "format": "binary"}},
+                ARROW_FILE_CONTENT_TYPE: {"schema": {"type": "string", "format": "binary"}},
+                PARQUET_CONTENT_TYPE: {"schema": {"type": "string", "format": "binary"}},
+            },
+        }
+    },
+)
+async def predict_bulk(
+    request: Request, orient: Literal["records", "columns"] = "records"
+) -> Response:
+    """
+    This endpoint is used to get model predictions for large batches. Instead of one object per
+    prediction, the request body holds one array per column (``model_id``, ``date``, ``store`` and
+    ``item``), either as a JSON ``SalesForecastBulkRequest`` or as an Arrow IPC / Parquet table.
+    The whole batch is validated column-wise and scored without building per-row objects.
+
+    Parameters
+    ----------
+    request : Request
+        The incoming request. Its ``Content-Type`` header selects how the body is decoded.
+    orient : Literal["records", "columns"]
+        The shape of the predictions, as for ``/predict``.
+
+    Returns
+    -------
+    Response
+        A JSON response containing the predictions.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    body = await request.body()
+
+    # Decoding and validating large bodies would block the event loop
+    scoring_df = await run_in_threadpool(_decode_bulk_frame, content_type, body)
+    scored_df = await _predict_frame(scoring_df)
+
+    return await run_in_threadpool(_prediction_response, scored_df, orient)
+
+
+@router.post(
+    "/predict/stream",
+    response_class=StreamingResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {NDJSON_CONTENT_TYPE: {"schema": {"type": "string", "format": "binary"}}},
+        }
+    },
+)
+async def predict_stream(
+    request: Request,
+    chunk_size: int = Query(default=config.STREAM_CHUNK_SIZE, gt=0),
+) -> StreamingResponse:
+    """
+    This endpoint is used to get model predictions for very large batches, with bounded memory. The
+    request body is NDJSON (one ``SalesForecastRequest`` object per line), and is read, validated,
+    scored and stored in chunks of ``chunk_size`` requests. The predictions are streamed back as
+    NDJSON as soon as each chunk is scored.
+
+    Unlike ``/predict``, predictions are stored chunk by chunk. If a later chunk is invalid, the
+    predictions of the earlier chunks have already been returned and stored, and the stream ends
+    with a single ``{"error": ...}`` line describing the problem.
+
+    Parameters
+    ----------
+    request : Request
+        The incoming request.
+    chunk_size : int
+        The maximum number of requests scored at once.
+
+    Returns
+    -------
+    StreamingResponse
+        An NDJSON stream of predictions, one object per line.
+    """
+    chunks = _iter_ndjson_chunks(request, chunk_size)
+
+    # The first chunk is scored before responding, so that invalid requests get an error status
+    first = await _predict_ndjson_chunk(await anext(chunks, None))
+
+    async def stream() -> AsyncIterator[bytes]:
+        yield first
+        try:
+            async for chunk in chunks:
+                yield await _predict_ndjson_chunk(chunk)
+        except RequestValidationError as e:
+            yield json.dumps({"error": jsonable_encoder(e.errors())}).encode() + b"\n"
+        except HTTPException as e:
+            yield json.dumps({"error": e.detail}).encode() + b"\n"
+
+    return StreamingResponse(stream(), media_type=NDJSON_CONTENT_TYPE)
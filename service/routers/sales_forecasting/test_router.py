@@ -4,12 +4,38 @@ from pathlib import Path
 # Ugly hack, but it works for now
 sys.path.append(str(Path(__file__).resolve().parent.parent.parent.parent))
 
+from datetime import date
+import asyncio
+import io
+import json
+import os
+import signal
+
 import pytest
+import pandas as pd
+import pyarrow as pa
+from fastapi import HTTPException
+from fastapi.exceptions import RequestValidationError
 from fastapi.testclient import TestClient
 from http import HTTPStatus
 from unittest.mock import patch, MagicMock
 
-from service.routers.sales_forecasting.router import router, SalesForecastRequest, SIMPLE_DB
+from usf_model_api import metrics
+from usf_model_api.serving.cache import PredictionCache
+from usf_model_api.serving.materialized import write_forecast_table
+from usf_model_api.serving.persistence import ParquetSink, WriteBehindWriter
+from service.api import app
+from service.routers.sales_forecasting import config
+from service.routers.sales_forecasting import router as router_module
+from service.routers.sales_forecasting.router import (
+    router,
+    SalesForecastRequest,
+    SIMPLE_DB,
+    EXECUTOR,
+    WARMUP,
+    ARROW_STREAM_CONTENT_TYPE,
+    NDJSON_CONTENT_TYPE,
+)
 
 client = TestClient(router)
 
@@ -21,12 +47,59 @@ def test_read_root():
 
 
 def test_get_app_status():
-    response = client.get("/sales-forecasting/status")
+    with patch.dict(WARMUP, state="ready"):
+        response = client.get("/sales-forecasting/status")
     assert response.status_code == HTTPStatus.OK
     assert response.json() == {
         "message": f"Status Code {HTTPStatus.OK}: The app is up and running."
     }
 
+    # Not ready until the warm-up task has run
+    with patch.dict(WARMUP, state="pending"):
+        response = client.get("/sales-forecasting/status")
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+
+
+def test_warm_up():
+    calls = []
+
+    def predict(X):
+        calls.append(len(X))
+        assert list(X.columns) == ["date", "item", "store"]
+        metrics.record("inference", 0.1, model_id="a", rows=len(X))
+        if WARMUP["state"] == "warming":
+            assert (
+                client.get("/sales-forecasting/status").status_code
+                == HTTPStatus.SERVICE_UNAVAILABLE
+            )
+        return [0.5] * len(X)
+
+    num_saved = len(SIMPLE_DB.predictions_db)
+    metrics.STAGE_SECONDS.clear()
+    cache = PredictionCache(max_entries=100)
+    with patch.dict(WARMUP), patch.object(
+        SIMPLE_DB, "list_models", return_value={"a": {}, "b": {}}
+    ), patch.object(SIMPLE_DB, "get_model", return_value=MagicMock(predict=predict)), patch.dict(
+        router_module.FORECAST_TABLES, {"a": MagicMock()}
+    ), patch.object(
+        router_module.SCORER, "cache", cache
+    ), patch.object(
+        metrics.REGISTRY, "enabled", True
+    ):
+        state = asyncio.run(router_module.warm_up([1, 5]))
+
+        # Every model is scored, bypassing its forecast table and the cache
+        assert calls == [1, 5, 1, 5]
+        assert state["state"] == "ready"
+        assert set(state["models"]["a"]["batch_ms"]) == {"1", "5"}
+        assert client.get("/sales-forecasting/status").status_code == HTTPStatus.OK
+        assert client.get("/sales-forecasting/warmup").json()["models"].keys() == {"a", "b"}
+
+    # Warm-up predictions are neither stored, cached nor recorded in the metrics
+    assert len(SIMPLE_DB.predictions_db) == num_saved
+    assert cache.metrics()["entries"] == 0
+    assert not metrics.STAGE_SECONDS.samples()
+
 
 @patch.object(SIMPLE_DB, "get_model", return_value=MagicMock(predict=lambda X: [0.5] * len(X)))
 def test_predict_single_request(mock_get_model):
@@ -49,6 +122,487 @@ def test_predict_multiple_requests(mock_get_model):
     assert len(response.json()["predictions"]) == 2
 
 
+def test_predict_multiple_models():
+    models = {
+        "model_a": MagicMock(predict=lambda X: [1.0] * len(X)),
+        "model_b": MagicMock(predict=lambda X: [2.0] * len(X)),
+    }
+    request_data = [
+        {"date": "2023-01-01", "store": 1, "item": 1, "model_id": "model_a"},
+        {"date": "2023-01-02", "store": 2, "item": 2, "model_id": "model_b"},
+        {"date": "2023-01-03", "store": 3, "item": 3, "model_id": "model_a"},
+    ]
+    with patch.object(SIMPLE_DB, "get_model", side_effect=models.get):
+        response = client.post("/sales-forecasting/predict", json=request_data)
+
+    assert response.status_code == HTTPStatus.OK
+    predictions = response.json()["predictions"]
+    assert [p["store"] for p in predictions] == [1, 2, 3]
+    assert [p["prediction"] for p in predictions] == [1.0, 2.0, 1.0]
+    assert len({p["prediction_id"] for p in predictions}) == 3
+
+
+@patch.object(SIMPLE_DB, "get_model", return_value=None)
+def test_predict_unknown_model(mock_get_model):
+    request_data = {"date": "2023-01-01", "store": 1, "item": 1, "model_id": "missing"}
+    with pytest.raises(HTTPException) as exc_info:
+        client.post("/sales-forecasting/predict", json=request_data)
+
+    assert exc_info.value.status_code == HTTPStatus.NOT_FOUND
+
+
 def test_sales_forecast_request_date_validation():
     with pytest.raises(ValueError):
         SalesForecastRequest(date="invalid-date", store=1, item=1, model_id="test_model")
+
+
+def test_bulk_date_validation_matches_single_requests():
+    dates = ["2023-01-01", "2023/01/02", "01/03/2023", "2023-02-30", "2023-1-02", "invalid-da"]
+    valid = []
+    for value in dates:
+        try:
+            SalesForecastRequest(date=value, store=1, item=1, model_id="test_model")
+            valid.append(True)
+        except ValueError:
+            valid.append(False)
+
+    bulk_df = pd.DataFrame({"model_id": "test_model", "date": dates, "store": 1, "item": 1})
+    with pytest.raises(RequestValidationError) as exc_info:
+        router_module._validate_bulk_frame(bulk_df)
+
+    invalid_rows = [e["loc"][2] for e in exc_info.value.errors()]
+    assert invalid_rows == [i for i, v in enumerate(valid) if not v]
+    assert valid[:3] == [True, True, True]
+
+    # Valid dates in other formats are converted to yyyy-MM-dd, the format the models parse
+    expected = ["2023-01-01", "2023-01-02", "2023-01-03"]
+    assert [
+        SalesForecastRequest(date=d, store=1, item=1, model_id="test_model").date for d in dates[:3]
+    ] == expected
+    validated = router_module._validate_bulk_frame(bulk_df.iloc[:3])
+    assert validated["date"].tolist() == expected
+    assert bulk_df["date"].tolist() == dates
+
+
+def test_predict_non_iso_dates():
+    def predict(X):
+        # The models parse yyyy-MM-dd dates only
+        return pd.to_datetime(X["date"], format="%Y-%m-%d").dt.day.to_numpy().astype(float)
+
+    request_data = [
+        {"date": "2023/01/02", "store": 1, "item": 1, "model_id": "test_model"},
+        {"date": "01/03/2023", "store": 1, "item": 1, "model_id": "test_model"},
+    ]
+    with patch.object(SIMPLE_DB, "get_model", return_value=MagicMock(predict=predict)):
+        response = client.post("/sales-forecasting/predict", json=request_data)
+        bulk_response = client.post(
+            "/sales-forecasting/predict/bulk",
+            json={"model_id": "test_model", "date": ["2023/01/02"], "store": [1], "item": [1]},
+        )
+
+    assert response.status_code == HTTPStatus.OK
+    assert [p["prediction"] for p in response.json()["predictions"]] == [2.0, 3.0]
+    assert [p["date"] for p in response.json()["predictions"]] == ["2023-01-02", "2023-01-03"]
+    assert bulk_response.status_code == HTTPStatus.OK
+    assert bulk_response.json()["predictions"][0]["prediction"] == 2.0
+
+
+@patch.object(SIMPLE_DB, "get_model", return_value=MagicMock(predict=lambda X: [0.5] * len(X)))
+def test_predict_bulk_json(mock_get_model):
+    request_data = {
+        "model_id": "test_model",
+        "date": ["2023-01-01", "2023-01-02", "2023-01-03"],
+        "store": [1, 2, 3],
+        "item": [4, 5, 6],
+    }
+    response = client.post("/sales-forecasting/predict/bulk", json=request_data)
+    assert response.status_code == HTTPStatus.OK
+    predictions = response.json()["predictions"]
+    assert [p["item"] for p in predictions] == [4, 5, 6]
+    assert all(p["model_id"] == "test_model" for p in predictions)
+
+
+@patch.object(SIMPLE_DB, "get_model", return_value=MagicMock(predict=lambda X: [0.5] * len(X)))
+def test_predict_bulk_arrow(mock_get_model):
+    table = pa.table(
+        {
+            "model_id": ["test_model", "test_model"],
+            "date": pa.array([date(2023, 1, 1), date(2023, 1, 2)], type=pa.date32()),
+            "store": [1, 2],
+            "item": [3, 4],
+        }
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    response = client.post(
+        "/sales-forecasting/predict/bulk",
+        content=sink.getvalue().to_pybytes(),
+        headers={"Content-Type": ARROW_STREAM_CONTENT_TYPE},
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert [p["date"] for p in response.json()["predictions"]] == ["2023-01-01", "2023-01-02"]
+
+
+def test_predict_bulk_validation():
+    request_data = {
+        "model_id": ["test_model", "test_model"],
+        "date": ["2023-01-01", "2023-1-02"],
+        "store": [1, 2],
+        "item": [3, 4],
+    }
+    with pytest.raises(RequestValidationError) as exc_info:
+        client.post("/sales-forecasting/predict/bulk", json=request_data)
+
+    assert [e["loc"] for e in exc_info.value.errors()] == [["body", "date", 1]]
+
+
+def test_predict_bulk_mismatched_lengths():
+    request_data = {"model_id": "test_model", "date": ["2023-01-01"], "store": [1, 2], "item": [3]}
+    with pytest.raises(RequestValidationError):
+        client.post("/sales-forecasting/predict/bulk", json=request_data)
+
+
+def test_predict_stream():
+    lines = [
+        json.dumps({"date": f"2023-01-0{i}", "store": i, "item": i, "model_id": "test_model"})
+        for i in range(1, 6)
+    ]
+    model = MagicMock()
+    model.predict.side_effect = lambda X: [0.5] * len(X)
+    with patch.object(SIMPLE_DB, "get_model", return_value=model):
+        response = client.post(
+            "/sales-forecasting/predict/stream?chunk_size=2",
+            content="\n".join(lines).encode(),
+            headers={"Content-Type": NDJSON_CONTENT_TYPE},
+        )
+
+    assert response.status_code == HTTPStatus.OK
+    predictions = [json.loads(line) for line in response.text.splitlines()]
+    assert [p["store"] for p in predictions] == [1, 2, 3, 4, 5]
+    assert all(p["prediction"] == 0.5 for p in predictions)
+    assert [len(c.kwargs["X"]) for c in model.predict.call_args_list] == [2, 2, 1]
+
+
+@patch.object(SIMPLE_DB, "get_model", return_value=MagicMock(predict=lambda X: [0.5] * len(X)))
+def test_predict_stream_invalid_chunk(mock_get_model):
+    lines = [
+        json.dumps({"date": "2023-01-01", "store": 1, "item": 1, "model_id": "test_model"}),
+        json.dumps({"date": "2023-1-02", "store": 2, "item": 2, "model_id": "test_model"}),
+    ]
+    response = client.post(
+        "/sales-forecasting/predict/stream?chunk_size=1", content="\n".join(lines).encode()
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    first, last = [json.loads(line) for line in response.text.splitlines()]
+    assert first["store"] == 1
+    assert last["error"][0]["loc"] == ["body", "date", 1]
+
+
+@patch.object(config, "BATCHING_ENABLED", True)
+@patch.object(SIMPLE_DB, "get_model", return_value=MagicMock(predict=lambda X: [0.5] * len(X)))
+def test_predict_batched(mock_get_model):
+    request_data = [
+        {"date": "2023-01-01", "store": 1, "item": 1, "model_id": "test_model"},
+        {"date": "2023-01-02", "store": 2, "item": 2, "model_id": "test_model"},
+    ]
+    response = client.post("/sales-forecasting/predict", json=request_data)
+    assert response.status_code == HTTPStatus.OK
+    assert [p["store"] for p in response.json()["predictions"]] == [1, 2]
+
+    response = client.get("/sales-forecasting/batching")
+    assert response.json()["models"]["test_model"]["batched_rows"] >= 2
+
+
+@patch.object(config, "BATCHING_ENABLED", True)
+def test_predict_batched_model_evicted():
+    model = MagicMock(predict=lambda X: [0.5] * len(X))
+    get_model = MagicMock(side_effect=lambda model_id: model if get_model.call_count == 1 else None)
+    # The model is evicted after it is resolved, before its batch is flushed
+    with patch.object(SIMPLE_DB, "get_model", get_model):
+        request_data = {"date": "2023-01-01", "store": 1, "item": 1, "model_id": "test_model"}
+        response = client.post("/sales-forecasting/predict", json=request_data)
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()["predictions"][0]["prediction"] == 0.5
+
+
+@patch.object(EXECUTOR, "max_pending", 0)
+@patch.object(SIMPLE_DB, "get_model", return_value=MagicMock(predict=lambda X: [0.5] * len(X)))
+def test_predict_saturated(mock_get_model):
+    request_data = {"date": "2023-01-01", "store": 1, "item": 1, "model_id": "test_model"}
+    num_saved = len(SIMPLE_DB.predictions_db)
+    with pytest.raises(HTTPException) as exc_info:
+        client.post("/sales-forecasting/predict", json=request_data)
+
+    assert exc_info.value.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert len(SIMPLE_DB.predictions_db) == num_saved
+
+
+@pytest.mark.parametrize("durability", ["fire_and_forget", "ack"])
+@patch.object(SIMPLE_DB, "get_model", return_value=MagicMock(predict=lambda X: [0.5] * len(X)))
+def test_predict_write_behind(mock_get_model, durability):
+    request_data = {"date": "2023-01-01", "store": 1, "item": 1, "model_id": "test_model"}
+    num_saved = len(SIMPLE_DB.predictions_db)
+    writer = WriteBehindWriter(router_module.SINK, durability=durability, flush_interval_ms=1)
+    with patch.object(router_module, "WRITER", writer):
+        response = client.post("/sales-forecasting/predict", json=[request_data] * 3)
+        assert response.status_code == HTTPStatus.OK
+        if durability == "ack":
+            assert len(SIMPLE_DB.predictions_db) == num_saved + 3
+
+        writer.close()
+        assert len(SIMPLE_DB.predictions_db) == num_saved + 3
+        metrics = client.get("/sales-forecasting/persistence").json()
+        assert metrics["durability"] == durability and metrics["written_rows"] == 3
+
+
+@patch.object(SIMPLE_DB, "get_model", return_value=MagicMock(predict=lambda X: [0.5] * len(X)))
+def test_predict_sync_write_off_event_loop(mock_get_model):
+    on_event_loop = []
+
+    def write(predictions_df):
+        try:
+            asyncio.get_running_loop()
+            on_event_loop.append(True)
+        except RuntimeError:
+            on_event_loop.append(False)
+
+    request_data = {"date": "2023-01-01", "store": 1, "item": 1, "model_id": "test_model"}
+    with patch.object(router_module, "WRITER", None), patch.object(
+        router_module.SINK, "write", side_effect=write
+    ):
+        response = client.post("/sales-forecasting/predict", json=request_data)
+
+    assert response.status_code == HTTPStatus.OK
+    assert on_event_loop == [False]
+
+
+def test_writer_started_in_forked_worker():
+    # Like service/serve.py, the app is imported in the parent and served by a forked worker, whose
+    # lifespan starts its own writer thread
+    request_data = {"date": "2023-01-01", "store": 1, "item": 1, "model_id": "test_model"}
+    with patch.object(config, "PREDICTIONS_WRITE_MODE", "ack"), patch.object(
+        config, "WARMUP_BATCH_SIZES", ()
+    ), patch.object(
+        SIMPLE_DB, "get_model", return_value=MagicMock(predict=lambda X: [0.5] * len(X))
+    ):
+        assert router_module.WRITER is None
+        # As in service/serve.py, no inference thread is running in the parent when it forks
+        EXECUTOR.shutdown()
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 1
+            try:
+                # An ack that never comes fails the worker rather than hanging the test
+                signal.alarm(10)
+                with TestClient(app) as worker_client:
+                    response = worker_client.post("/sales-forecasting/predict", json=request_data)
+                    if (
+                        response.status_code == HTTPStatus.OK
+                        and router_module.WRITER.metrics()["written_rows"] == 1
+                    ):
+                        exit_code = 0
+            finally:
+                os._exit(exit_code)  # pylint: disable=protected-access
+
+        _, status = os.waitpid(pid, 0)
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert router_module.WRITER is None
+
+
+def test_admin_reload():
+    with patch.object(
+        SIMPLE_DB, "refresh", return_value={"added": ["m"], "reloaded": [], "removed": []}
+    ):
+        response = client.post("/sales-forecasting/admin/reload")
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()["added"] == ["m"]
+    assert client.get("/sales-forecasting/admin/models").status_code == HTTPStatus.OK
+
+
+@patch.object(SIMPLE_DB, "get_model", return_value=MagicMock(predict=lambda X: [0.5] * len(X)))
+def test_predict_columns_orient(mock_get_model):
+    request_data = [
+        {"date": "2023-01-01", "store": 1, "item": 1, "model_id": "test_model"},
+        {"date": "2023-01-02", "store": 2, "item": 3, "model_id": "test_model"},
+    ]
+    response = client.post("/sales-forecasting/predict?orient=columns", json=request_data)
+    assert response.status_code == HTTPStatus.OK
+
+    predictions = response.json()["predictions"]
+    assert set(predictions) == {
+        "prediction_id",
+        "model_id",
+        "date",
+        "item",
+        "store",
+        "prediction",
+        "created_at",
+    }
+    assert predictions["date"] == ["2023-01-01", "2023-01-02"]
+    assert predictions["item"] == [1, 3]
+    assert predictions["prediction"] == [0.5, 0.5]
+
+    with pytest.raises(RequestValidationError):
+        client.post("/sales-forecasting/predict?orient=index", json=request_data)
+
+
+def test_predict_stage_metrics():
+    request_data = [
+        {"date": "2023-01-01", "store": 1, "item": 1, "model_id": "test_model"},
+        {"date": "2023-01-02", "store": 2, "item": 2, "model_id": "test_model"},
+    ]
+    metrics.STAGE_SECONDS.clear()
+    with patch.object(metrics.REGISTRY, "enabled", True), patch.object(
+        SIMPLE_DB, "get_model", return_value=MagicMock(predict=lambda X: [0.5] * len(X))
+    ):
+        response = client.post("/sales-forecasting/predict", json=request_data)
+        assert response.status_code == HTTPStatus.OK
+
+    stages = {labels[0]: labels[2] for labels in metrics.STAGE_SECONDS.samples()}
+    assert stages == {
+        "frame": "",
+        "score": "2-10",
+        "save": "2-10",
+        "serialize": "2-10",
+    }
+    metrics.STAGE_SECONDS.clear()
+
+
+def test_predict_cached():
+    calls = []
+
+    def predict(X):
+        calls.append(len(X))
+        return X["store"].to_numpy() * 0.5
+
+    cache = PredictionCache(max_entries=100)
+    request_data = [
+        {"date": "2023-01-01", "store": 1, "item": 1, "model_id": "test_model"},
+        {"date": "2023-01-02", "store": 2, "item": 2, "model_id": "test_model"},
+    ]
+    with patch.object(router_module.SCORER, "cache", cache), patch.object(
+        SIMPLE_DB, "get_model", return_value=MagicMock(predict=predict)
+    ):
+        client.post("/sales-forecasting/predict", json=request_data[0])
+        response = client.post("/sales-forecasting/predict", json=request_data)
+
+        # Only the uncached request is scored
+        assert calls == [1, 1]
+        assert [p["prediction"] for p in response.json()["predictions"]] == [0.5, 1.0]
+
+        metrics = client.get("/sales-forecasting/cache").json()
+        assert metrics["enabled"]
+        assert (metrics["hits"], metrics["misses"]) == (1, 2)
+
+        # A new model version invalidates the cached predictions
+        cache.invalidate("test_model")
+        client.post("/sales-forecasting/predict", json=request_data)
+        assert calls == [1, 1, 2]
+
+
+def test_predict_cached_model_replaced_while_resolving():
+    cache = PredictionCache(max_entries=100)
+    old_model = MagicMock(predict=lambda X: [0.5] * len(X))
+
+    def get_model(model_id):
+        # The model is replaced (and its predictions invalidated) once it was resolved
+        cache.invalidate(model_id)
+        return old_model
+
+    request_data = {"date": "2023-01-01", "store": 1, "item": 1, "model_id": "test_model"}
+    with patch.object(router_module.SCORER, "cache", cache), patch.object(
+        SIMPLE_DB, "get_model", side_effect=get_model
+    ):
+        response = client.post("/sales-forecasting/predict", json=request_data)
+
+    assert response.status_code == HTTPStatus.OK
+    # The predictions of the replaced model are not cached under the new generation
+    assert cache.metrics()["entries"] == 0
+
+
+def test_predict_materialized(tmp_path):
+    class Model:
+        model_id = "test_model"
+        calls = []
+
+        def predict(self, X):
+            self.calls.append(len(X))
+            return X["store"].to_numpy() * 0.5
+
+    model = Model()
+    table = write_forecast_table(
+        model, tmp_path / "t.forecasts", start_date="2023-01-01", horizon=2, stores=[1], items=[1]
+    )
+    model.calls.clear()
+    request_data = [
+        {"date": "2023-01-02", "store": 1, "item": 1, "model_id": "test_model"},
+        {"date": "2023-01-03", "store": 2, "item": 1, "model_id": "test_model"},
+    ]
+    with patch.dict(router_module.FORECAST_TABLES, {"test_model": table}), patch.object(
+        SIMPLE_DB, "get_model", return_value=model
+    ):
+        response = client.post("/sales-forecasting/predict", json=request_data)
+        assert "test_model" in client.get("/sales-forecasting/admin/forecast-tables").json()
+
+    # Only the request outside of the grid is scored live
+    assert model.calls == [1]
+    assert [p["prediction"] for p in response.json()["predictions"]] == [0.5, 1.0]
+
+
+@patch.object(SIMPLE_DB, "get_model", return_value=MagicMock(predict=lambda X: [0.5] * len(X)))
+def test_query_predictions(mock_get_model):
+    request_data = [
+        {"date": f"2031-02-0{i}", "store": 7, "item": i, "model_id": "query_model"}
+        for i in range(1, 6)
+    ]
+    predictions = client.post("/sales-forecasting/predict", json=request_data).json()["predictions"]
+
+    prediction_id = predictions[2]["prediction_id"]
+    response = client.get(f"/sales-forecasting/predictions/{prediction_id}")
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()["predictions"] == [predictions[2]]
+    with pytest.raises(HTTPException) as exc_info:
+        client.get("/sales-forecasting/predictions/unknown")
+    assert exc_info.value.status_code == HTTPStatus.NOT_FOUND
+
+    params = {"model_id": "query_model", "date_from": "2031-02-02", "limit": 3}
+    response = client.get("/sales-forecasting/predictions", params=params).json()
+    assert response["predictions"] == predictions[1:4]
+    params["cursor"] = response["next_cursor"]
+    response = client.get("/sales-forecasting/predictions", params=params).json()
+    assert response["predictions"] == predictions[4:]
+    assert response["next_cursor"] is None
+
+    params = {"model_id": "query_model", "item": 1}
+    response = client.get("/sales-forecasting/predictions/export", params=params)
+    assert response.headers["content-type"] == NDJSON_CONTENT_TYPE
+    assert [json.loads(line) for line in response.text.splitlines()] == predictions[:1]
+    params["format"] = "parquet"
+    response = client.get("/sales-forecasting/predictions/export", params=params)
+    exported = pd.read_parquet(io.BytesIO(response.content))
+    assert exported["prediction_id"].tolist() == [predictions[0]["prediction_id"]]
+
+
+@patch.object(SIMPLE_DB, "get_model", return_value=MagicMock(predict=lambda X: [0.5] * len(X)))
+def test_query_predictions_of_parquet_sink(mock_get_model, tmp_path):
+    request_data = [
+        {"date": "2031-03-01", "store": 8, "item": i, "model_id": "parquet_model"} for i in range(3)
+    ]
+    with patch.object(router_module, "SINK", ParquetSink(tmp_path)):
+        predictions = client.post("/sales-forecasting/predict", json=request_data).json()
+        predictions = predictions["predictions"]
+        # The predictions are queried in the configured sink, not in the predictions store
+        assert SIMPLE_DB.predictions_store.lookup([predictions[0]["prediction_id"]]).empty
+
+        prediction_id = predictions[1]["prediction_id"]
+        response = client.get(f"/sales-forecasting/predictions/{prediction_id}")
+        assert response.json()["predictions"] == [predictions[1]]
+        params = {"model_id": "parquet_model", "limit": 2}
+        response = client.get("/sales-forecasting/predictions", params=params).json()
+        assert response["predictions"] == predictions[:2]
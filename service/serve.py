@@ -0,0 +1,264 @@
+"""
+Multi-worker serving entrypoint for the model prediction service.
+
+The parent process loads every model once, binds the listening socket, and then forks the
+``uvicorn`` worker processes, which inherit the models (and their boosters) copy-on-write instead of
+loading their own copies. The socket is only bound once the models are loaded, so no request is
+accepted before the service is ready.
+
+Each worker's CatBoost/LightGBM (and OpenMP/BLAS) threads are capped at ``--threads`` (by default,
+the number of CPUs divided by the number of workers), so that the workers do not oversubscribe the
+CPUs. Models are warmed up (``USF_WARMUP_BATCH_SIZES``) in each worker rather than in the parent,
+since the OpenMP and CatBoost thread pools started by inference do not survive a fork. Workers that
+exit (e.g. after serving ``--max-requests`` requests) are replaced. Send ``SIGHUP`` to the parent to
+gracefully recycle every worker, and ``SIGTERM`` or ``SIGINT`` to shut down.
+
+Usage:
+    python ./service/serve.py --workers 4 --port 80
+"""
+from typing import Dict, Optional
+import argparse
+import gc
+import os
+import random
+import signal
+import socket
+import sys
+import time
+from pathlib import Path
+
+# Ugly hack, but it works for now
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from service.routers.sales_forecasting import config  # noqa: E402
+from usf_model_api.utils import get_logger  # noqa: E402
+
+
+LOG = get_logger(__name__)
+
+# Environment variables read by native thread pools when their libraries are first loaded
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+# A worker that exits with an error sooner than this after starting is restarted after a delay,
+# rather than immediately
+MIN_WORKER_UPTIME = 1.0
+
+
+def worker_threads(workers: int, cpus: Optional[int] = None) -> int:
+    """
+    Returns the default number of threads per worker: an even share of the CPUs.
+
+    Parameters
+    ----------
+    workers : int
+        The number of workers.
+    cpus : Optional[int]
+        The number of CPUs (default is ``os.cpu_count()``).
+
+    Returns
+    -------
+    int
+        The number of threads per worker, at least 1.
+    """
+    return max(1, (cpus or os.cpu_count() or 1) // workers)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Serve the model prediction service with multiple worker processes."
+    )
+    parser.add_argument("--host", type=str, default="0.0.0.0", help="Address to bind to.")
+    parser.add_argument("--port", type=int, default=80, help="Port to bind to.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=config.WORKERS or os.cpu_count() or 1,
+        help="Number of worker processes (default is USF_WORKERS, or the number of CPUs).",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=config.PREDICT_THREADS,
+        help="Maximum number of model threads per worker (default is USF_PREDICT_THREADS, or the "
+        "number of CPUs divided by the number of workers).",
+    )
+    parser.add_argument(
+        "--max-requests",
+        type=int,
+        default=config.WORKER_MAX_REQUESTS,
+        help="Number of requests after which a worker is replaced (default is "
+        "USF_WORKER_MAX_REQUESTS, or never).",
+    )
+    parser.add_argument(
+        "--max-requests-jitter",
+        type=int,
+        default=config.WORKER_MAX_REQUESTS_JITTER,
+        help="Random number of requests (up to this) added to --max-requests for each worker, so "
+        "that workers are not all replaced at once.",
+    )
+    parser.add_argument(
+        "--timeout-graceful-shutdown",
+        type=float,
+        default=30.0,
+        help="Seconds a stopping worker waits for in-flight requests to complete.",
+    )
+
+    return parser.parse_args()
+
+
+class Supervisor:
+    """
+    Forks the worker processes, and replaces them as they exit, until it is stopped.
+
+    Attributes
+    ----------
+    workers : int
+        The number of worker processes.
+    """
+
+    def __init__(self, app, sock: socket.socket, args: argparse.Namespace, threads: int):
+        """
+        Initializes the Supervisor.
+
+        Parameters
+        ----------
+        app : FastAPI
+            The application the workers serve.
+        sock : socket.socket
+            The bound listening socket, shared by the workers.
+        args : argparse.Namespace
+            The command line arguments.
+        threads : int
+            The maximum number of model threads per worker.
+        """
+        self.app = app
+        self.sock = sock
+        self.args = args
+        self.threads = threads
+        self.workers = args.workers
+        self._pids: Dict[int, float] = {}
+        self._stopping = False
+
+    def run(self):
+        """
+        Starts the workers, and supervises them until ``SIGTERM`` or ``SIGINT`` is received.
+        """
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGHUP, self._recycle)
+
+        for _ in range(self.workers):
+            self._spawn()
+
+        while self._pids:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+
+            started = self._pids.pop(pid, None)
+            if started is None:
+                continue
+
+            exit_code = os.waitstatus_to_exitcode(status)
+            LOG.info("Worker %d exited with code %d", pid, exit_code)
+            if not self._stopping:
+                if exit_code != 0 and time.monotonic() - started < MIN_WORKER_UPTIME:
+                    time.sleep(MIN_WORKER_UPTIME)
+                self._spawn()
+
+        LOG.info("All workers exited")
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 1
+            try:
+                self._run_worker()
+                exit_code = 0
+            except BaseException:  # pylint: disable=broad-except
+                LOG.exception("Worker %d failed", os.getpid())
+            finally:
+                os._exit(exit_code)  # pylint: disable=protected-access
+
+        self._pids[pid] = time.monotonic()
+        LOG.info("Started worker %d", pid)
+
+    def _run_worker(self):
+        # pylint: disable=import-outside-toplevel
+        import uvicorn
+        from threadpoolctl import threadpool_limits
+
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(signum, signal.SIG_DFL)
+
+        # Caps OpenMP (LightGBM) and BLAS pools that were initialized before the fork
+        threadpool_limits(limits=self.threads)
+
+        max_requests = self.args.max_requests
+        if max_requests and self.args.max_requests_jitter:
+            max_requests += random.randint(0, self.args.max_requests_jitter)
+
+        server = uvicorn.Server(
+            uvicorn.Config(
+                self.app,
+                limit_max_requests=max_requests,
+                timeout_graceful_shutdown=self.args.timeout_graceful_shutdown,
+            )
+        )
+        server.run(sockets=[self.sock])
+
+    def _signal_workers(self, signum: int):
+        for pid in list(self._pids):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def _stop(self, signum, frame):  # pylint: disable=unused-argument
+        LOG.info("Stopping %d workers", len(self._pids))
+        self._stopping = True
+        self._signal_workers(signal.SIGTERM)
+
+    def _recycle(self, signum, frame):  # pylint: disable=unused-argument
+        LOG.info("Recycling %d workers", len(self._pids))
+        self._signal_workers(signal.SIGTERM)
+
+
+def main(args: argparse.Namespace):
+    threads = args.threads or worker_threads(args.workers)
+
+    # Before the model libraries are imported, so their thread pools start at the right size
+    for name in THREAD_ENV_VARS:
+        os.environ.setdefault(name, str(threads))
+    config.PREDICT_THREADS = threads
+
+    # pylint: disable=import-outside-toplevel
+    import uvicorn
+    from service.api import app
+    from service.routers.sales_forecasting.router import SIMPLE_DB
+
+    # Lazily loaded models are loaded now as well, so that the workers share them
+    for model_id in SIMPLE_DB.list_models():
+        SIMPLE_DB.get_model(model_id)
+    LOG.info(
+        "Loaded %d models; starting %d workers with %d threads each",
+        len(SIMPLE_DB.model_db),
+        args.workers,
+        threads,
+    )
+
+    # Moves the loaded objects out of the garbage collector's reach, so collections in the workers
+    # do not write to (and copy) the pages they share with the parent
+    gc.collect()
+    gc.freeze()
+
+    sock = uvicorn.Config(app, host=args.host, port=args.port).bind_socket()
+    try:
+        Supervisor(app, sock, args, threads).run()
+    finally:
+        sock.close()
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,399 @@
+"""
+A lightweight timing layer, exported in the Prometheus text format.
+
+Code wraps each stage of a request in ``timed(stage, model_id=..., rows=...)``. When metrics are
+enabled, each stage duration is observed in the ``usf_stage_duration_seconds`` histogram, labeled
+by stage, model ID and batch size bucket, and appended to the timings of the current request (if
+any), which the serving middleware reports in a ``Server-Timing`` header. When metrics are
+disabled, ``timed()`` returns a shared no-op context manager, so the cost of an instrumented stage
+is one function call. Stages run inside ``suppressed()`` (e.g. the synthetic batches of model
+warm-up) are not recorded.
+"""
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+import threading
+import time
+
+# Histogram buckets, in seconds
+DEFAULT_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# Upper bounds of the batch size buckets used as labels
+BATCH_SIZE_BUCKETS = (1, 10, 100, 1_000, 10_000)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_NOOP = nullcontext()
+
+
+def batch_size_bucket(rows: Optional[int]) -> str:
+    """
+    Returns the label of the batch size bucket ``rows`` falls in, e.g. ``11-100``.
+
+    Parameters
+    ----------
+    rows : Optional[int]
+        The number of rows of a batch, or None if not applicable.
+
+    Returns
+    -------
+    str
+        The bucket label, or an empty string if ``rows`` is None.
+    """
+    if rows is None:
+        return ""
+
+    i = bisect_left(BATCH_SIZE_BUCKETS, rows)
+    if i == len(BATCH_SIZE_BUCKETS):
+        return f"{BATCH_SIZE_BUCKETS[-1] + 1}+"
+
+    low = BATCH_SIZE_BUCKETS[i - 1] + 1 if i > 0 else 1
+    high = BATCH_SIZE_BUCKETS[i]
+    return str(high) if low == high else f"{low}-{high}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    labels = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class Histogram:
+    """
+    A Prometheus histogram, with one series per combination of label values.
+
+    Attributes
+    ----------
+    name : str
+        The metric name.
+    help : str
+        The metric description.
+    label_names : Tuple[str, ...]
+        The names of the labels.
+    buckets : Tuple[float, ...]
+        The upper bounds of the buckets.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [bucket counts (not cumulative), sum, count]
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        """
+        Observes a value.
+
+        Parameters
+        ----------
+        value : float
+            The observed value.
+        *label_values : str
+            The label values, in the order of ``label_names``.
+        """
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self) -> Dict[Tuple[str, ...], Tuple[List[int], float, int]]:
+        """
+        Returns a snapshot of each series, as cumulative bucket counts, sum and count.
+        """
+        with self._lock:
+            snapshot = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+
+        samples = {}
+        for label_values, (counts, total, count) in snapshot.items():
+            cumulative, running = [], 0
+            for c in counts:
+                running += c
+                cumulative.append(running)
+            samples[label_values] = (cumulative, total, count)
+
+        return samples
+
+    def render(self) -> List[str]:
+        """
+        Returns the histogram in the Prometheus text format, one line per element.
+        """
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, (cumulative, total, count) in sorted(self.samples().items()):
+            for bound, c in zip((*self.buckets, "+Inf"), cumulative):
+                le = f'le="{bound}"'
+                labels = _format_labels(self.label_names, label_values, le)
+                lines.append(f"{self.name}_bucket{labels} {c}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+
+        return lines
+
+    def clear(self):
+        """
+        Drops every series.
+        """
+        with self._lock:
+            self._series.clear()
+
+
+class MetricsRegistry:
+    """
+    The metrics of the process: histograms, and gauges read from callbacks when rendered.
+
+    Attributes
+    ----------
+    enabled : bool
+        Whether timings are recorded.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._histograms: Dict[str, Histogram] = {}
+        self._gauges: Dict[str, Tuple[str, Callable[[], Dict[str, Any]]]] = {}
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """
+        Returns the histogram with the given name, creating it if needed.
+        """
+        if name not in self._histograms:
+            self._histograms[name] = Histogram(name, help_text, label_names, buckets)
+        return self._histograms[name]
+
+    def register_gauges(self, prefix: str, help_text: str, callback: Callable[[], Dict[str, Any]]):
+        """
+        Registers a callback whose numeric values are rendered as gauges named
+        ``<prefix>_<key>``. Other values are skipped.
+
+        Parameters
+        ----------
+        prefix : str
+            The prefix of the gauge names.
+        help_text : str
+            The description of the gauges.
+        callback : Callable[[], Dict[str, Any]]
+            Returns the current values, keyed by gauge name suffix.
+        """
+        self._gauges[prefix] = (help_text, callback)
+
+    def render(self) -> str:
+        """
+        Returns every metric in the Prometheus text format.
+        """
+        lines = []
+        for histogram in self._histograms.values():
+            lines.extend(histogram.render())
+
+        for prefix, (help_text, callback) in self._gauges.items():
+            for key, value in callback().items():
+                if isinstance(value, (int, float)):
+                    name = f"{prefix}_{key}"
+                    lines.extend(
+                        [
+                            f"# HELP {name} {help_text}",
+                            f"# TYPE {name} gauge",
+                            f"{name} {float(value)}",
+                        ]
+                    )
+
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+STAGE_SECONDS = REGISTRY.histogram(
+    "usf_stage_duration_seconds",
+    "Duration of each stage of a prediction request.",
+    ("stage", "model_id", "batch_size"),
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "usf_request_duration_seconds",
+    "Duration of HTTP requests, from receipt to the start of the response.",
+    ("method", "path", "status"),
+)
+
+
+@dataclass
+class RequestTimings:
+    """
+    The stage timings of one request, reported in its ``Server-Timing`` header.
+
+    Attributes
+    ----------
+    start : float
+        When the request was received (``time.perf_counter()``).
+    stages : Dict[str, float]
+        The total duration of each stage so far, in seconds.
+    """
+
+    start: float = field(default_factory=time.perf_counter)
+    stages: Dict[str, float] = field(default_factory=dict)
+
+    def server_timing(self) -> str:
+        """
+        Returns the value of the ``Server-Timing`` header, with durations in milliseconds.
+        """
+        entries = [f"{stage};dur={seconds * 1e3:.3f}" for stage, seconds in self.stages.items()]
+        entries.append(f"total;dur={(time.perf_counter() - self.start) * 1e3:.3f}")
+        return ", ".join(entries)
+
+
+_REQUEST_TIMINGS: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+_SUPPRESSED: ContextVar[bool] = ContextVar("metrics_suppressed", default=False)
+
+
+def start_request() -> Tuple[RequestTimings, Any]:
+    """
+    Starts collecting the stage timings of the current request.
+
+    Returns
+    -------
+    Tuple[RequestTimings, Any]
+        The timings, and a token to pass to ``end_request()``.
+    """
+    timings = RequestTimings()
+    return timings, _REQUEST_TIMINGS.set(timings)
+
+
+def end_request(token: Any):
+    """
+    Stops collecting the stage timings of the current request.
+    """
+    _REQUEST_TIMINGS.reset(token)
+
+
+@contextmanager
+def suppressed() -> Iterator[None]:
+    """
+    Returns a context manager within which no stage duration is recorded, including in the worker
+    threads the current context is copied to.
+    """
+    token = _SUPPRESSED.set(True)
+    try:
+        yield
+    finally:
+        _SUPPRESSED.reset(token)
+
+
+def record(stage: str, seconds: float, model_id: str = "", rows: Optional[int] = None):
+    """
+    Records the duration of a stage, if metrics are enabled.
+
+    Parameters
+    ----------
+    stage : str
+        The stage name.
+    seconds : float
+        The duration of the stage.
+    model_id : str, optional
+        The ID of the model the stage ran for, if any.
+    rows : Optional[int]
+        The number of rows processed by the stage, if applicable.
+    """
+    if not REGISTRY.enabled or _SUPPRESSED.get():
+        return
+
+    STAGE_SECONDS.observe(seconds, stage, model_id, batch_size_bucket(rows))
+    timings = _REQUEST_TIMINGS.get()
+    if timings is not None:
+        timings.stages[stage] = timings.stages.get(stage, 0.0) + seconds
+
+
+def record_since_request_start(stage: str, rows: Optional[int] = None):
+    """
+    Records the time elapsed since the current request was received as the duration of a stage,
+    e.g. to time request parsing and validation, which happen before the endpoint is called.
+
+    Parameters
+    ----------
+    stage : str
+        The stage name.
+    rows : Optional[int]
+        The number of rows processed by the stage, if applicable.
+    """
+    timings = _REQUEST_TIMINGS.get()
+    if REGISTRY.enabled and timings is not None:
+        record(stage, time.perf_counter() - timings.start, rows=rows)
+
+
+class _Timer:
+    __slots__ = ("stage", "model_id", "rows", "start")
+
+    def __init__(self, stage: str, model_id: str, rows: Optional[int]):
+        self.stage = stage
+        self.model_id = model_id
+        self.rows = rows
+        self.start = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.stage, time.perf_counter() - self.start, self.model_id, self.rows)
+
+
+def timed(stage: str, model_id: str = "", rows: Optional[int] = None):
+    """
+    Returns a context manager that records the duration of its block as a stage.
+
+    Parameters
+    ----------
+    stage : str
+        The stage name.
+    model_id : str, optional
+        The ID of the model the stage runs for, if any.
+    rows : Optional[int]
+        The number of rows processed by the stage, if applicable.
+
+    Returns
+    -------
+    ContextManager
+        The timer, or a no-op context manager if metrics are disabled.
+    """
+    if not REGISTRY.enabled:
+        return _NOOP
+
+    return _Timer(stage, model_id, rows)
@@ -1,17 +1,112 @@
-from typing import Any, Optional
+from typing import Any, Dict, Mapping, Optional
 from pathlib import Path
+import os
 
 import cloudpickle
 import pandas as pd
 import numpy as np
+import pyarrow as pa
 from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.utils.validation import check_is_fitted
 from sklearn.pipeline import Pipeline
 
+from usf_model_api import metrics
 from usf_model_api.utils import get_logger
 
 LOG = get_logger(__name__)
 
+# Model inputs: a frame, an Arrow table or record batch, a NumPy structured array, or a mapping of
+# column names to arrays
+ModelInput = pd.DataFrame | pa.Table | pa.RecordBatch | np.ndarray | Mapping[str, Any]
+
+
+def _arrow_to_numpy(column: pa.Array | pa.ChunkedArray) -> np.ndarray:
+    if isinstance(column, pa.ChunkedArray) and column.num_chunks == 1:
+        column = column.chunk(0)
+    # Zero-copy for numeric columns without nulls; strings and nullable columns are converted
+    return column.to_numpy(zero_copy_only=False)
+
+
+def as_columns(X: ModelInput) -> pd.DataFrame | Dict[str, np.ndarray]:
+    """
+    Returns the columns of a model input as NumPy arrays, sharing the memory of the input where
+    possible. Frames are returned as is.
+
+    Parameters
+    ----------
+    X : ModelInput
+        The input: a frame, an Arrow table or record batch, a NumPy structured array, or a mapping
+        of column names to arrays.
+
+    Returns
+    -------
+    pd.DataFrame | Dict[str, np.ndarray]
+        The frame, or the arrays by column name.
+
+    Raises
+    ------
+    TypeError
+        If the input is of another type.
+    """
+    if isinstance(X, pd.DataFrame):
+        return X
+    if isinstance(X, (pa.Table, pa.RecordBatch)):
+        return {name: _arrow_to_numpy(column) for name, column in zip(X.column_names, X.columns)}
+    if isinstance(X, np.ndarray) and X.dtype.names is not None:
+        return {name: X[name] for name in X.dtype.names}
+    if isinstance(X, Mapping):
+        return {name: np.asarray(values) for name, values in X.items()}
+
+    raise TypeError(
+        "Expected a DataFrame, Arrow table or record batch, NumPy structured array or mapping of "
+        f"columns, but found {type(X).__name__}."
+    )
+
+
+def feature_matrix(columns: Mapping[str, np.ndarray], dtype: Any = np.float32) -> np.ndarray:
+    """
+    Stacks feature columns into one C-contiguous matrix, with one allocation.
+
+    Parameters
+    ----------
+    columns : Mapping[str, np.ndarray]
+        The feature columns, in the order of the matrix.
+    dtype : Any, optional
+        The dtype of the matrix (default is ``float32``, which the boosters evaluate natively).
+
+    Returns
+    -------
+    np.ndarray
+        The ``(rows, features)`` matrix.
+    """
+    values = list(columns.values())
+    matrix = np.empty((len(values[0]) if values else 0, len(values)), dtype=dtype)
+    for i, column in enumerate(values):
+        matrix[:, i] = column
+
+    return matrix
+
+
+def _predicts_matrix(predictor: Any) -> bool:
+    # CatBoost and LightGBM match features by position, and take float32 matrices as they are
+    if hasattr(predictor, "booster_"):
+        return True
+
+    try:
+        from catboost import CatBoost  # pylint: disable=import-outside-toplevel
+
+        return isinstance(predictor, CatBoost)
+    except ImportError:
+        return False
+
+
+def _predict_matrix(predictor: Any, X: np.ndarray, **predict_params) -> np.ndarray:
+    if hasattr(predictor, "booster_"):
+        # The booster itself skips the feature name checks of LightGBM's scikit-learn wrapper
+        return predictor.booster_.predict(X, **predict_params)
+
+    return predictor.predict(X, **predict_params)
+
 
 class ModelDataset:
     """
@@ -174,14 +269,20 @@ class PredictionModel(TransformerMixin, BaseEstimator):
 
         return self
 
-    def predict(self, X: pd.DataFrame, **predict_params) -> np.ndarray:
+    def predict(self, X: ModelInput, **predict_params) -> np.ndarray:
         """
         Makes predictions using the fitted model.
 
+        When the preprocessor can return its features as arrays (``transform_columns()``) and the
+        predictor is a CatBoost or LightGBM model, the features are passed to the predictor as one
+        ``float32`` matrix, without building intermediate frames. Otherwise, inputs other than
+        frames are converted to a frame first.
+
         Parameters
         ----------
-        X : pd.DataFrame
-            The input data.
+        X : ModelInput
+            The input data: a frame, an Arrow table or record batch, a NumPy structured array, or a
+            mapping of column names to arrays.
         **predict_params : dict
             Additional parameters to pass to the predict method.
 
@@ -192,12 +293,39 @@ class PredictionModel(TransformerMixin, BaseEstimator):
         """
         try:
             check_is_fitted(self.model)
+            X = as_columns(X)
+            if not isinstance(self.model, Pipeline):
+                return self.model.predict(X, **predict_params)
+            if hasattr(self.preprocessor, "transform_columns") and _predicts_matrix(self.predictor):
+                return self._predict_columns(X, **predict_params)
+            if not isinstance(X, pd.DataFrame):
+                X = pd.DataFrame(X, copy=False)
+            if metrics.REGISTRY.enabled:
+                return self._timed_predict(X, **predict_params)
             return self.model.predict(X, **predict_params)
         except AttributeError as e:
             raise NotImplementedError(
                 f"Method predict(..) is not implemented by {type(self.model)}."
             ) from e
 
+    def _timed_predict(self, X: pd.DataFrame, **predict_params) -> np.ndarray:
+        # Pipeline.predict(), with the preprocessing and inference stages timed separately
+        rows = len(X)
+        with metrics.timed("preprocess", model_id=self.model_id, rows=rows):
+            for _, _, transformer in self.model._iter(with_final=False):  # pylint: disable=W0212
+                X = transformer.transform(X)
+        with metrics.timed("inference", model_id=self.model_id, rows=rows):
+            return self.model.steps[-1][1].predict(X, **predict_params)
+
+    def _predict_columns(
+        self, X: pd.DataFrame | Dict[str, np.ndarray], **predict_params
+    ) -> np.ndarray:
+        rows = len(X) if isinstance(X, pd.DataFrame) else len(next(iter(X.values()), ()))
+        with metrics.timed("preprocess", model_id=self.model_id, rows=rows):
+            features = feature_matrix(self.preprocessor.transform_columns(X))
+        with metrics.timed("inference", model_id=self.model_id, rows=rows):
+            return _predict_matrix(self.predictor, features, **predict_params)
+
     def evaluate(self, X: pd.DataFrame, y: np.ndarray) -> float:
         """
         Evaluates the model on the given data.
@@ -223,7 +351,8 @@ class PredictionModel(TransformerMixin, BaseEstimator):
 
     def serialize(self, file_path: str | Path):
         """
-        Serializes the model using pickle.
+        Serializes the model using pickle. When ``file_path`` is a path, the file is replaced
+        atomically.
 
         Parameters
         ----------
@@ -239,8 +368,11 @@ class PredictionModel(TransformerMixin, BaseEstimator):
         try:
             cloudpickle.dump(self, file_path)
         except TypeError:
-            with open(file_path, "wb") as f:
+            # Write to a temporary file first, so readers never see a partially written model
+            tmp_path = Path(f"{file_path}.tmp")
+            with open(tmp_path, "wb") as f:
                 cloudpickle.dump(self, f)
+            os.replace(tmp_path, file_path)
 
     @classmethod
     def deserialize(cls, file_path: str | Path) -> "PredictionModel":
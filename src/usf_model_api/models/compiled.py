@@ -0,0 +1,639 @@
+"""
+Compiled tree ensembles.
+
+A fitted CatBoost or LightGBM regressor is converted ("compiled") into flat NumPy arrays, which are
+evaluated for a whole batch at once with vectorized array indexing. This skips the per-call work of
+the libraries' Python wrappers (building a ``Pool`` or validating a ``DataFrame``, and dispatching
+to native code), which dominates the latency of small batches.
+
+ * CatBoost trees are oblivious: every node at a given depth tests the same feature against the
+   same border, so the leaf a row lands in is the binary number formed by its test results. An
+   ensemble of ``T`` trees of depth ``D`` is stored as ``(T, D)`` arrays of split features and
+   borders, and a ``(T, 2 ** D)`` array of leaf values.
+ * LightGBM trees are stored as flat node arrays (feature, threshold, children, value). Every
+   tree is traversed one level at a time for all rows at once, with leaves pointing to themselves,
+   so the traversal runs a fixed number of steps (the depth of the deepest tree).
+
+``compile_model()`` compiles the predictor of a ``PredictionModel`` and checks that the compiled
+model makes the same predictions as the original. The compiled model evaluates its preprocessor
+and ensemble directly (``CompiledPipeline``), rather than through a scikit-learn ``Pipeline``, and
+preprocessors with a ``transform_columns()`` method (returning the feature columns as arrays) skip
+building a ``DataFrame`` of the features as well.
+
+Compiled ensembles are evaluated on the calling thread, and are faster than the native libraries
+for small batches only; see ``benchmarks/bench_compiled.py``.
+"""
+from typing import Any, Dict, List, Mapping, Optional
+from pathlib import Path
+import copy
+import json
+import tempfile
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, RegressorMixin
+
+from usf_model_api import metrics
+from usf_model_api.models.base import PredictionModel
+from usf_model_api.utils import get_logger
+
+LOG = get_logger(__name__)
+
+# Rows evaluated at a time, bounding the size of the (rows, trees, ...) intermediate arrays
+DEFAULT_BLOCK_ROWS = 4096
+
+# Objectives whose prediction is the raw sum of the trees
+CATBOOST_IDENTITY_LOSSES = {"RMSE", "MAE", "Quantile", "MAPE", "Huber", "Expectile", "Lq"}
+LIGHTGBM_IDENTITY_OBJECTIVES = {
+    "regression",
+    "regression_l1",
+    "huber",
+    "fair",
+    "quantile",
+    "mape",
+}
+
+# LightGBM missing value types, as stored in the node arrays
+_MISSING_NONE, _MISSING_ZERO, _MISSING_NAN = 0, 1, 2
+_LIGHTGBM_MISSING_TYPES = {"None": _MISSING_NONE, "Zero": _MISSING_ZERO, "NaN": _MISSING_NAN}
+# Values LightGBM treats as zero (kZeroThreshold)
+_LIGHTGBM_ZERO_THRESHOLD = 1e-35
+
+
+class CompilationError(ValueError):
+    """
+    Raised when a predictor cannot be compiled, or its compiled form does not make the same
+    predictions.
+    """
+
+
+class CompiledTreeEnsemble(RegressorMixin, BaseEstimator):
+    """
+    Base class of compiled tree ensembles: a scikit-learn style regressor evaluating flat arrays.
+
+    Attributes
+    ----------
+    feature_names_ : List[str]
+        The names of the features, in the order the arrays index them.
+    arrays_ : Dict[str, np.ndarray]
+        The arrays of the ensemble.
+    params_ : Dict[str, Any]
+        The scalar parameters of the ensemble.
+    """
+
+    kind = ""
+
+    def __init__(
+        self,
+        feature_names: Optional[List[str]] = None,
+        arrays: Optional[Dict[str, np.ndarray]] = None,
+        params: Optional[Dict[str, Any]] = None,
+    ):
+        self.feature_names = feature_names
+        self.arrays = arrays
+        self.params = params
+
+    @property
+    def feature_names_(self) -> List[str]:
+        return self.feature_names
+
+    @property
+    def arrays_(self) -> Dict[str, np.ndarray]:
+        return self.arrays
+
+    @property
+    def params_(self) -> Dict[str, Any]:
+        return self.params
+
+    @property
+    def n_trees_(self) -> int:
+        """
+        Returns the number of trees of the ensemble.
+        """
+        raise NotImplementedError("Subclasses must implement this property.")
+
+    def __sklearn_is_fitted__(self) -> bool:
+        return self.arrays is not None
+
+    def fit(self, X: pd.DataFrame, y: np.ndarray) -> "CompiledTreeEnsemble":
+        """
+        Not supported; ensembles are compiled from fitted predictors.
+
+        Raises
+        ------
+        NotImplementedError
+            Always.
+        """
+        raise NotImplementedError(f"{type(self).__name__} only serves compiled predictors.")
+
+    def predict(
+        self, X: pd.DataFrame | Mapping[str, np.ndarray] | np.ndarray, **predict_params
+    ) -> np.ndarray:
+        """
+        Makes predictions with the compiled ensemble.
+
+        Parameters
+        ----------
+        X : pd.DataFrame | Mapping[str, np.ndarray] | np.ndarray
+            The input data. The columns of a frame (or mapping of column arrays) are selected by
+            name; the columns of an array must be in the order of ``feature_names_``.
+        **predict_params : dict
+            Ignored; accepted for compatibility with the parameters of the original predictors
+            (e.g. ``thread_count``). The ensemble is evaluated on the calling thread.
+
+        Returns
+        -------
+        np.ndarray
+            The predicted values.
+        """
+        if isinstance(X, np.ndarray):
+            X = np.asarray(X, dtype=np.float64)
+        else:
+            # Faster than X[self.feature_names].to_numpy() for small frames
+            X = np.column_stack(
+                [np.asarray(X[name], dtype=np.float64) for name in self.feature_names]
+            )
+
+        block_rows = self.params.get("block_rows", DEFAULT_BLOCK_ROWS)
+        if len(X) <= block_rows:
+            return self._predict_block(X)
+
+        return np.concatenate(
+            [self._predict_block(X[i : i + block_rows]) for i in range(0, len(X), block_rows)]
+        )
+
+    def _predict_block(self, X: np.ndarray) -> np.ndarray:
+        raise NotImplementedError("Subclasses must implement this method.")
+
+
+class ObliviousTreeEnsemble(CompiledTreeEnsemble):
+    """
+    A compiled ensemble of oblivious (symmetric) trees, e.g. a CatBoost model.
+
+    Its arrays are ``split_features`` and ``split_borders`` (one row per tree, one column per
+    depth), ``leaf_values`` (flattened, ``2 ** depth`` per tree) with the ``leaf_offsets`` of the
+    trees, and ``nan_values`` (the value the missing values of each feature are replaced with). A
+    row goes right at a split when its feature is greater than the border, and the result of the
+    split at depth ``d`` is bit ``d`` of the leaf index.
+    """
+
+    kind = "oblivious"
+
+    @property
+    def n_trees_(self) -> int:
+        return len(self.arrays["split_features"])
+
+    def _predict_block(self, X: np.ndarray) -> np.ndarray:
+        arrays = self.arrays
+        # CatBoost compares features as float32
+        X = X.astype(np.float32)
+        nan = np.isnan(X)
+        if nan.any():
+            X = np.where(nan, arrays["nan_values"], X)
+
+        split_features, split_borders = arrays["split_features"], arrays["split_borders"]
+        leaves = np.broadcast_to(arrays["leaf_offsets"], (len(X), self.n_trees_)).copy()
+        for d in range(split_features.shape[1]):
+            leaves |= (X[:, split_features[:, d]] > split_borders[:, d]).astype(np.int64) << d
+        sums = arrays["leaf_values"][leaves].sum(axis=1)
+
+        return self.params["scale"] * sums + self.params["bias"]
+
+
+class BinaryTreeEnsemble(CompiledTreeEnsemble):
+    """
+    A compiled ensemble of binary trees, e.g. a LightGBM model.
+
+    Its arrays hold the nodes of every tree: ``feature``, ``threshold``, ``children`` (the indices
+    of the left and right child of each node, interleaved), ``value``, ``default_left`` and
+    ``missing_type``, and the ``roots`` of the trees. A row goes left at a node when its feature is
+    at most the threshold. Leaves are their own children, and hold the tree's output in ``value``.
+    """
+
+    kind = "binary"
+
+    @property
+    def n_trees_(self) -> int:
+        return len(self.arrays["roots"])
+
+    def _predict_block(self, X: np.ndarray) -> np.ndarray:
+        arrays = self.arrays
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(arrays["roots"], (len(X), self.n_trees_))
+        has_nan = np.isnan(X).any()
+        children = arrays["children"]
+        for _ in range(self.params["max_depth"]):
+            x = X[rows, arrays["feature"][nodes]]
+            go_left = x <= arrays["threshold"][nodes]
+            if self.params["has_missing"] or has_nan:
+                go_left = self._missing_go_left(x, nodes, go_left)
+            # The left child of node i is children[2 * i], and its right child children[2 * i + 1]
+            nodes = children[2 * nodes + ~go_left]
+
+        return arrays["value"][nodes].sum(axis=1)
+
+    def _missing_go_left(self, x: np.ndarray, nodes: np.ndarray, go_left: np.ndarray) -> np.ndarray:
+        # LightGBM's missing value handling: NaN is zero unless the node treats NaN as missing,
+        # and missing values go to the node's default child
+        arrays = self.arrays
+        missing_type = arrays["missing_type"][nodes]
+        nan = np.isnan(x)
+        x = np.where(nan & (missing_type != _MISSING_NAN), 0.0, x)
+        go_left = np.where(nan, x <= arrays["threshold"][nodes], go_left)
+        missing = ((missing_type == _MISSING_ZERO) & (np.abs(x) <= _LIGHTGBM_ZERO_THRESHOLD)) | (
+            (missing_type == _MISSING_NAN) & nan
+        )
+        return np.where(missing, arrays["default_left"][nodes], go_left)
+
+
+ENSEMBLE_CLASSES = {cls.kind: cls for cls in (ObliviousTreeEnsemble, BinaryTreeEnsemble)}
+
+
+def save_ensemble(ensemble: CompiledTreeEnsemble, path: str | Path):
+    """
+    Saves a compiled ensemble as a NumPy ``.npz`` file: its arrays, and its kind, feature names and
+    parameters as JSON.
+
+    Parameters
+    ----------
+    ensemble : CompiledTreeEnsemble
+        The ensemble.
+    path : str | Path
+        The file to save to.
+    """
+    header = {
+        "kind": ensemble.kind,
+        "feature_names": ensemble.feature_names,
+        "params": ensemble.params,
+    }
+    with open(path, "wb") as f:
+        np.savez(f, __header__=np.array(json.dumps(header)), **ensemble.arrays)
+
+
+def load_ensemble(path: str | Path) -> CompiledTreeEnsemble:
+    """
+    Loads a compiled ensemble saved by ``save_ensemble()``.
+
+    Parameters
+    ----------
+    path : str | Path
+        The ``.npz`` file.
+
+    Returns
+    -------
+    CompiledTreeEnsemble
+        The ensemble.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        header = json.loads(str(data["__header__"]))
+        arrays = {name: data[name] for name in data.files if name != "__header__"}
+
+    return ENSEMBLE_CLASSES[header["kind"]](
+        feature_names=header["feature_names"], arrays=arrays, params=header["params"]
+    )
+
+
+class CompiledPipeline(BaseEstimator):
+    """
+    The pipeline of a compiled model: its preprocessor followed by its compiled ensemble, evaluated
+    directly rather than through a scikit-learn ``Pipeline``.
+
+    Attributes
+    ----------
+    preprocessor : Any
+        The fitted preprocessor, or None.
+    ensemble : CompiledTreeEnsemble
+        The compiled ensemble.
+    model_id : str
+        The ID of the model, which labels the timings of its stages.
+    """
+
+    def __init__(
+        self,
+        preprocessor: Any = None,
+        ensemble: Optional[CompiledTreeEnsemble] = None,
+        model_id: str = "",
+    ):
+        self.preprocessor = preprocessor
+        self.ensemble = ensemble
+        self.model_id = model_id
+
+    @property
+    def feature_names_in_(self) -> Optional[np.ndarray]:
+        return getattr(self.preprocessor, "feature_names_in_", None)
+
+    def __sklearn_is_fitted__(self) -> bool:
+        return self.ensemble is not None
+
+    def fit(self, X: pd.DataFrame, y: np.ndarray) -> "CompiledPipeline":
+        """
+        Not supported; compiled models are compiled from fitted models.
+
+        Raises
+        ------
+        NotImplementedError
+            Always.
+        """
+        raise NotImplementedError("CompiledPipeline only serves compiled models.")
+
+    def _transform(self, X: pd.DataFrame | Dict[str, np.ndarray]) -> Any:
+        if self.preprocessor is None:
+            return X
+        transform = getattr(self.preprocessor, "transform_columns", None)
+        if transform is not None:
+            return transform(X)
+        if not isinstance(X, pd.DataFrame):
+            X = pd.DataFrame(X, copy=False)
+        return self.preprocessor.transform(X)
+
+    def predict(self, X: pd.DataFrame | Dict[str, np.ndarray], **predict_params) -> np.ndarray:
+        """
+        Makes predictions with the preprocessor and the compiled ensemble.
+
+        Parameters
+        ----------
+        X : pd.DataFrame | Dict[str, np.ndarray]
+            The input data, as a frame or arrays by column name (see ``as_columns()``).
+        **predict_params : dict
+            Passed to ``CompiledTreeEnsemble.predict()``.
+
+        Returns
+        -------
+        np.ndarray
+            The predicted values.
+        """
+        if not metrics.REGISTRY.enabled:
+            return self.ensemble.predict(self._transform(X), **predict_params)
+
+        rows = len(X)
+        with metrics.timed("preprocess", model_id=self.model_id, rows=rows):
+            X = self._transform(X)
+        with metrics.timed("inference", model_id=self.model_id, rows=rows):
+            return self.ensemble.predict(X, **predict_params)
+
+
+def with_ensemble(model: PredictionModel, ensemble: CompiledTreeEnsemble) -> PredictionModel:
+    """
+    Sets the predictor of a model to a compiled ensemble, evaluated by a ``CompiledPipeline``.
+
+    Parameters
+    ----------
+    model : PredictionModel
+        The model, which is modified in place.
+    ensemble : CompiledTreeEnsemble
+        The compiled ensemble.
+
+    Returns
+    -------
+    PredictionModel
+        The model.
+    """
+    # pylint: disable=protected-access
+    model._predictor = ensemble
+    model._model = CompiledPipeline(model.preprocessor, ensemble, model.model_id)
+    return model
+
+
+def compile_catboost(predictor: Any) -> ObliviousTreeEnsemble:
+    """
+    Compiles a fitted CatBoost regressor.
+
+    Parameters
+    ----------
+    predictor : catboost.CatBoost
+        The fitted regressor, with numerical features only.
+
+    Returns
+    -------
+    ObliviousTreeEnsemble
+        The compiled ensemble.
+
+    Raises
+    ------
+    CompilationError
+        If the model has categorical or text features, non-symmetric trees, or a loss whose
+        predictions are not the raw sum of the trees.
+    """
+    loss = str(predictor.get_all_params().get("loss_function", "RMSE")).split(":")[0]
+    if loss not in CATBOOST_IDENTITY_LOSSES:
+        raise CompilationError(f"CatBoost models with the '{loss}' loss are not supported.")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / "model.json"
+        predictor.save_model(str(path), format="json")
+        with open(path, encoding="utf-8") as f:
+            dump = json.load(f)
+
+    features_info = dump["features_info"]
+    if set(features_info) - {"float_features"} or "oblivious_trees" not in dump:
+        raise CompilationError(
+            "Only CatBoost models with numerical features and symmetric trees are supported."
+        )
+
+    float_features = features_info["float_features"]
+    flat_index = [f["flat_feature_index"] for f in float_features]
+    feature_names = [str(name) for name in predictor.feature_names_]
+    nan_values = np.full(len(feature_names), np.nan, dtype=np.float32)
+    for f in float_features:
+        treatment = f.get("nan_value_treatment", "AsIs")
+        if treatment in ("AsFalse", "Min"):
+            nan_values[f["flat_feature_index"]] = -np.inf
+        elif treatment in ("AsTrue", "Max"):
+            nan_values[f["flat_feature_index"]] = np.inf
+
+    trees = dump["oblivious_trees"]
+    depth = max(len(tree["splits"]) for tree in trees)
+    # Shallower trees are padded with splits that always go left (bit 0), which leaves their leaf
+    # indices unchanged
+    split_features = np.zeros((len(trees), depth), dtype=np.int64)
+    split_borders = np.full((len(trees), depth), np.inf, dtype=np.float32)
+    leaf_values = np.zeros((len(trees), 2**depth), dtype=np.float64)
+    for t, tree in enumerate(trees):
+        for d, split in enumerate(tree["splits"]):
+            if split.get("split_type", "FloatFeature") != "FloatFeature":
+                raise CompilationError(
+                    f"CatBoost '{split['split_type']}' splits are not supported."
+                )
+            split_features[t, d] = flat_index[split["float_feature_index"]]
+            split_borders[t, d] = split["border"]
+        values = tree["leaf_values"]
+        leaf_values[t, : len(values)] = values
+
+    scale, biases = dump.get("scale_and_bias", [1.0, [0.0]])
+    return ObliviousTreeEnsemble(
+        feature_names=feature_names,
+        arrays={
+            "split_features": split_features,
+            "split_borders": split_borders,
+            "leaf_values": leaf_values.ravel(),
+            "leaf_offsets": np.arange(len(trees), dtype=np.int64) << depth,
+            "nan_values": nan_values,
+        },
+        params={"scale": float(scale), "bias": float(np.sum(biases))},
+    )
+
+
+def compile_lightgbm(predictor: Any) -> BinaryTreeEnsemble:
+    """
+    Compiles a fitted LightGBM regressor.
+
+    Parameters
+    ----------
+    predictor : lightgbm.LGBMModel | LightGBMBoosterRegressor
+        The fitted regressor, with numerical features only.
+
+    Returns
+    -------
+    BinaryTreeEnsemble
+        The compiled ensemble.
+
+    Raises
+    ------
+    CompilationError
+        If the model has categorical splits, is a random forest, or has an objective whose
+        predictions are not the raw sum of the trees.
+    """
+    dump = predictor.booster_.dump_model()
+    objective = str(dump.get("objective", "regression")).split()[0]
+    if objective not in LIGHTGBM_IDENTITY_OBJECTIVES:
+        raise CompilationError(
+            f"LightGBM models with the '{objective}' objective are not supported."
+        )
+    if dump.get("average_output") or dump.get("num_tree_per_iteration", 1) != 1:
+        raise CompilationError("LightGBM random forests and multi-output models are not supported.")
+
+    feature, threshold, left, right, value, default_left, missing_type, roots = (
+        [] for _ in range(8)
+    )
+    max_depth = 0
+
+    def _add(node: Dict[str, Any], depth: int) -> int:
+        nonlocal max_depth
+        index = len(feature)
+        for column in (feature, threshold, left, right, value, default_left, missing_type):
+            column.append(0)
+
+        if "leaf_value" in node:
+            max_depth = max(max_depth, depth)
+            left[index] = right[index] = index
+            value[index] = node["leaf_value"]
+            return index
+
+        if node["decision_type"] != "<=":
+            raise CompilationError("LightGBM categorical splits are not supported.")
+        feature[index] = node["split_feature"]
+        threshold[index] = node["threshold"]
+        default_left[index] = node["default_left"]
+        missing_type[index] = _LIGHTGBM_MISSING_TYPES[node["missing_type"]]
+        left[index] = _add(node["left_child"], depth + 1)
+        right[index] = _add(node["right_child"], depth + 1)
+        return index
+
+    for tree in dump["tree_info"]:
+        roots.append(_add(tree["tree_structure"], 0))
+
+    missing_type = np.asarray(missing_type, dtype=np.int8)
+    is_leaf = np.asarray(left) == np.arange(len(left))
+    return BinaryTreeEnsemble(
+        feature_names=[str(name) for name in dump["feature_names"]],
+        arrays={
+            "feature": np.asarray(feature, dtype=np.int64),
+            "threshold": np.asarray(threshold, dtype=np.float64),
+            "children": np.column_stack([left, right]).astype(np.int64).ravel(),
+            "value": np.asarray(value, dtype=np.float64),
+            "default_left": np.asarray(default_left, dtype=bool),
+            "missing_type": missing_type,
+            "roots": np.asarray(roots, dtype=np.int64),
+        },
+        params={
+            "max_depth": max_depth,
+            "has_missing": bool((missing_type[~is_leaf] == _MISSING_ZERO).any()),
+        },
+    )
+
+
+def compile_predictor(predictor: Any) -> CompiledTreeEnsemble:
+    """
+    Compiles a fitted CatBoost or LightGBM regressor.
+
+    Parameters
+    ----------
+    predictor : Any
+        The fitted regressor.
+
+    Returns
+    -------
+    CompiledTreeEnsemble
+        The compiled ensemble.
+
+    Raises
+    ------
+    CompilationError
+        If the predictor is of another type, or uses features the compiled ensembles do not support.
+    """
+    # LightGBM's scikit-learn models and LightGBMBoosterRegressor both expose their booster
+    if hasattr(predictor, "booster_"):
+        return compile_lightgbm(predictor)
+
+    try:
+        from catboost import CatBoost  # pylint: disable=import-outside-toplevel
+
+        if isinstance(predictor, CatBoost):
+            return compile_catboost(predictor)
+    except ImportError:
+        pass
+
+    raise CompilationError(f"Predictors of type {type(predictor).__name__} cannot be compiled.")
+
+
+def compile_model(
+    model: PredictionModel,
+    X_check: pd.DataFrame,
+    rtol: float = 1e-6,
+    atol: float = 1e-6,
+) -> PredictionModel:
+    """
+    Returns a copy of a model whose predictor is compiled, after checking that it makes the same
+    predictions as the original model.
+
+    Parameters
+    ----------
+    model : PredictionModel
+        The fitted model.
+    X_check : pd.DataFrame
+        The inputs (as passed to ``model.predict()``) the predictions are compared on.
+    rtol : float, optional
+        The relative tolerance of the comparison (default is 1e-6).
+    atol : float, optional
+        The absolute tolerance of the comparison (default is 1e-6).
+
+    Returns
+    -------
+    PredictionModel
+        The compiled model, of the same class as ``model``.
+
+    Raises
+    ------
+    CompilationError
+        If the predictor cannot be compiled, or the compiled model's predictions differ from the
+        original's.
+    """
+    compiled = with_ensemble(copy.copy(model), compile_predictor(model.predictor))
+
+    expected = np.asarray(model.predict(X_check), dtype=np.float64)
+    actual = compiled.predict(X_check)
+    if not np.allclose(actual, expected, rtol=rtol, atol=atol):
+        max_error = float(np.max(np.abs(actual - expected)))
+        raise CompilationError(
+            f"Expected the compiled model '{model.model_id}' to make the same predictions as the "
+            f"original, but found differences of up to {max_error:g}."
+        )
+
+    LOG.info(
+        "Compiled model '%s' (%d trees), checked on %d rows",
+        model.model_id,
+        compiled.predictor.n_trees_,
+        len(X_check),
+    )
+
+    return compiled
@@ -1,4 +1,24 @@
-from pydantic import BaseModel
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional, Type
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.json as pa_json
+import pyarrow.parquet as pq
+from pydantic import BaseModel, model_validator
+
+from usf_model_api.serving.utils import to_iso_date
+
+
+# Request body content types accepted by the bulk prediction endpoints
+ARROW_STREAM_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+ARROW_FILE_CONTENT_TYPE = "application/vnd.apache.arrow.file"
+PARQUET_CONTENT_TYPE = "application/vnd.apache.parquet"
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+# Field types checked by validate_frame()
+VALID_FIELD_TYPES = {"string", "integer", "date"}
+MAX_REPORTED_ERRORS = 100
 
 
 class PredictionRequest(BaseModel):
@@ -15,3 +35,291 @@ class PredictionRequest(BaseModel):
     """
 
     model_id: str
+
+
+class BulkPredictionRequest(BaseModel):
+    """
+    Columnar counterpart of ``PredictionRequest``, used to send many prediction requests at once
+    without building one object per request. Subclasses declare one list-valued field per feature,
+    and all lists must have the same length.
+
+    Attributes
+    ----------
+    model_id : str | List[str]
+        The unique identifier for the model, either shared by all rows or given per row.
+    """
+
+    model_id: str | List[str]
+
+    @model_validator(mode="after")
+    def check_lengths(self) -> "BulkPredictionRequest":
+        """
+        Checks that all list-valued fields have the same length.
+
+        Returns
+        -------
+        BulkPredictionRequest
+            The validated request.
+
+        Raises
+        ------
+        ValueError
+            If the list-valued fields have different lengths.
+        """
+        lengths = {k: len(v) for k, v in self if isinstance(v, list)}
+        if len(set(lengths.values())) > 1:
+            raise ValueError(f"Expected all columns to have the same length, but found {lengths}.")
+
+        return self
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Converts the request to a DataFrame with one row per prediction request.
+
+        Returns
+        -------
+        pd.DataFrame
+            The request columns, with a scalar ``model_id`` broadcast to every row.
+        """
+        columns = dict(self)
+        n_rows = max((len(v) for v in columns.values() if isinstance(v, list)), default=0)
+        if isinstance(self.model_id, str):
+            columns["model_id"] = [self.model_id] * n_rows
+
+        return pd.DataFrame(columns)
+
+
+class UnsupportedContentTypeError(ValueError):
+    """
+    Raised when a bulk request body has a content type that cannot be decoded.
+    """
+
+
+class FrameValidationError(ValueError):
+    """
+    Raised when a frame of requests is not valid.
+
+    Attributes
+    ----------
+    errors : List[Dict[str, Any]]
+        The errors, in the format of the errors of pydantic.
+    """
+
+    def __init__(self, errors: List[Dict[str, Any]]):
+        super().__init__(f"{len(errors)} validation error(s)")
+        self.errors = errors
+
+
+def read_bulk_frame(
+    content_type: str, body: bytes, request_type: Type[BulkPredictionRequest]
+) -> pd.DataFrame:
+    """
+    Decodes the body of a bulk prediction request into a DataFrame of requests.
+
+    Parameters
+    ----------
+    content_type : str
+        The media type of the request body. One of ``application/json``, Arrow IPC (stream or file
+        format) or Parquet.
+    body : bytes
+        The raw request body.
+    request_type : Type[BulkPredictionRequest]
+        The request model a JSON body is validated with.
+
+    Returns
+    -------
+    pd.DataFrame
+        The (not yet validated) requests, one row per prediction.
+
+    Raises
+    ------
+    UnsupportedContentTypeError
+        If the content type is not supported.
+    pydantic.ValidationError
+        If a JSON body does not match ``request_type``.
+    """
+    if content_type in ("", "application/json"):
+        return request_type.model_validate_json(body).to_frame()
+
+    if content_type == ARROW_STREAM_CONTENT_TYPE:
+        table = pa.ipc.open_stream(body).read_all()
+    elif content_type == ARROW_FILE_CONTENT_TYPE:
+        table = pa.ipc.open_file(body).read_all()
+    elif content_type == PARQUET_CONTENT_TYPE:
+        table = pq.read_table(pa.BufferReader(body))
+    else:
+        raise UnsupportedContentTypeError(f"Unsupported content type '{content_type}'.")
+
+    # Date-typed columns are formatted in bulk, so they match the JSON representation
+    if "date" in table.column_names and pa.types.is_temporal(table.schema.field("date").type):
+        index = table.column_names.index("date")
+        table = table.set_column(index, "date", pc.strftime(table.column("date"), "%Y-%m-%d"))
+
+    return table.to_pandas()
+
+
+def read_ndjson_frame(lines: List[bytes], schema: pa.Schema) -> pd.DataFrame:
+    """
+    Decodes a chunk of NDJSON-encoded requests (one JSON object per line) into a DataFrame of
+    requests, without building one Python object per line.
+
+    Parameters
+    ----------
+    lines : List[bytes]
+        The encoded requests, one per element.
+    schema : pa.Schema
+        The fields of the requests. Other fields are ignored.
+
+    Returns
+    -------
+    pd.DataFrame
+        The (not yet validated) requests, one row per line. Missing fields are null.
+
+    Raises
+    ------
+    pa.ArrowInvalid
+        If the chunk is not valid NDJSON.
+    """
+    table = pa_json.read_json(
+        pa.BufferReader(b"\n".join(lines)),
+        parse_options=pa_json.ParseOptions(
+            explicit_schema=schema, unexpected_field_behavior="ignore"
+        ),
+    )
+
+    return table.to_pandas()
+
+
+async def iter_line_chunks(
+    stream: AsyncIterator[bytes], chunk_size: int
+) -> AsyncIterator[List[bytes]]:
+    """
+    Splits a byte stream into its non-blank lines, as the data arrives, and yields them in chunks of
+    at most ``chunk_size`` lines. Only the current chunk (plus one partial line) is held in memory.
+
+    Parameters
+    ----------
+    stream : AsyncIterator[bytes]
+        The byte stream, e.g. the body of a request.
+    chunk_size : int
+        The maximum number of lines per chunk.
+
+    Yields
+    ------
+    List[bytes]
+        The lines of each chunk.
+    """
+    partial, lines = b"", []
+    async for data in stream:
+        *complete, partial = (partial + data).split(b"\n")
+        lines.extend(line for line in complete if line.strip())
+        while len(lines) >= chunk_size:
+            chunk, lines = lines[:chunk_size], lines[chunk_size:]
+            yield chunk
+
+    if partial.strip():
+        lines.append(partial)
+
+    if lines:
+        yield lines
+
+
+def validate_frame(
+    frame: pd.DataFrame,
+    fields: Mapping[str, str],
+    row_offset: int = 0,
+    max_errors: Optional[int] = MAX_REPORTED_ERRORS,
+) -> pd.DataFrame:
+    """
+    Validates a columnar batch of requests, one column at a time, without building one object per
+    row. ``yyyy-MM-dd`` dates are checked in bulk, and only the other dates are checked (and
+    converted to ``yyyy-MM-dd``) one by one with ``to_iso_date()``.
+
+    Parameters
+    ----------
+    frame : pd.DataFrame
+        The requests to validate.
+    fields : Mapping[str, str]
+        The type of each expected column: ``string`` (no nulls), ``integer`` or ``date``.
+    row_offset : int, optional
+        The position of the first row within the whole request, used in error locations when the
+        request is validated in chunks (default is 0).
+    max_errors : Optional[int]
+        The maximum number of invalid dates reported (default is ``MAX_REPORTED_ERRORS``), to keep
+        error responses small. If None, every invalid date is reported.
+
+    Returns
+    -------
+    pd.DataFrame
+        The validated requests, restricted to the expected columns, with ``yyyy-MM-dd`` dates.
+
+    Raises
+    ------
+    FrameValidationError
+        If any column is missing or has invalid values. Errors are reported per offending row, in
+        the same format as the errors of pydantic.
+    ValueError
+        If a field type is not valid.
+    """
+    unknown = set(fields.values()) - VALID_FIELD_TYPES
+    if unknown:
+        raise ValueError(
+            f"Expected field types in {VALID_FIELD_TYPES}, but found {sorted(unknown)}."
+        )
+
+    missing = [c for c in fields if c not in frame.columns]
+    if missing:
+        raise FrameValidationError(
+            [{"type": "missing", "loc": ["body", c], "msg": "Field required"} for c in missing]
+        )
+
+    frame = frame[list(fields)]
+    errors, converted = [], {}
+    for column, field_type in fields.items():
+        if field_type == "integer" and not pd.api.types.is_integer_dtype(frame[column]):
+            errors.append(
+                {
+                    "type": "int_type",
+                    "loc": ["body", column],
+                    "msg": "Input should be a list of valid integers",
+                }
+            )
+        elif field_type == "string" and frame[column].isna().any():
+            errors.append(
+                {
+                    "type": "string_type",
+                    "loc": ["body", column],
+                    "msg": "Input should be a valid string",
+                }
+            )
+        elif field_type == "date":
+            dates = frame[column].astype(str)
+            parsed = pd.to_datetime(dates, format="%Y-%m-%d", errors="coerce")
+            invalid = parsed.isna().to_numpy() | (dates.str.len() != 10).to_numpy()
+            # Dates in other formats may still be valid, and are converted to yyyy-MM-dd
+            candidates = np.flatnonzero(invalid)
+            iso_dates = [to_iso_date(d) for d in dates.iloc[candidates]]
+            invalid[candidates] = [d is None for d in iso_dates]
+            converted[column] = [(row, d) for row, d in zip(candidates, iso_dates) if d is not None]
+            for row in np.flatnonzero(invalid)[:max_errors]:
+                errors.append(
+                    {
+                        "type": "value_error",
+                        "loc": ["body", column, row_offset + int(row)],
+                        "msg": "Value error, Invalid date format '%s'. Expected format "
+                        "'yyyy-MM-dd'." % dates.iat[row],
+                        "input": dates.iat[row],
+                    }
+                )
+
+    if errors:
+        raise FrameValidationError(errors)
+
+    converted = {c: rows for c, rows in converted.items() if rows}
+    if converted:
+        frame = frame.copy()
+        for column, rows in converted.items():
+            positions, iso_dates = zip(*rows)
+            frame.iloc[list(positions), frame.columns.get_loc(column)] = iso_dates
+
+    return frame
@@ -0,0 +1,379 @@
+"""
+Offline batch scoring of request files.
+
+The input (CSV, Parquet, or newline-delimited JSON, with one request per row) is read in chunks of
+``chunk_rows`` rows. Each chunk is scored in a pool of worker processes: its rows are routed to the
+model named in their ``model_id`` column, and the scored rows are written to a Parquet part file,
+``part-<chunk>.parquet``, with the ``prediction_id``, ``prediction`` and ``created_at`` columns of
+the ``/predict`` route. The completed chunks are recorded in a manifest in the output directory, so
+a run that is interrupted (or fails on a chunk) resumes where it left off when run again.
+
+Usage:
+    usf-batch-score requests.parquet --model-dir ./assets --output-dir ./scores --jobs 4
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from usf_model_api.models.artifacts import find_model, load_model, predict_thread_params
+from usf_model_api.models.base import PredictionModel
+from usf_model_api.serving.utils import get_created_at, scored_frame
+from usf_model_api.utils import get_logger
+
+
+LOG = get_logger(__name__)
+
+MANIFEST_FORMAT_VERSION = 1
+MANIFEST_FILE = "_manifest.json"
+PART_FILE = "part-{:05d}.parquet"
+DEFAULT_CHUNK_ROWS = 100_000
+NDJSON_SUFFIXES = (".ndjson", ".jsonl")
+
+
+def read_request_chunks(path: str | Path, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """
+    Reads a request file in chunks.
+
+    Parameters
+    ----------
+    path : str | Path
+        The request file: Parquet (``.parquet``), newline-delimited JSON (``.ndjson`` or
+        ``.jsonl``), or CSV (any other suffix).
+    chunk_rows : int
+        The maximum number of rows of a chunk.
+
+    Yields
+    ------
+    pd.DataFrame
+        The chunks, in the order of the file.
+    """
+    suffix = Path(path).suffix
+    if suffix == ".parquet":
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    elif suffix in NDJSON_SUFFIXES:
+        # Dates are kept as strings, as in a request body
+        with pd.read_json(
+            path, lines=True, chunksize=chunk_rows, dtype={"date": str}, convert_dates=False
+        ) as reader:
+            yield from reader
+    else:
+        with pd.read_csv(
+            path, chunksize=chunk_rows, dtype={"date": str, "model_id": str}
+        ) as reader:
+            yield from reader
+
+
+def _input_key(path: Path, chunk_rows: int) -> Dict[str, Any]:
+    stat = path.stat()
+    return {
+        "format_version": MANIFEST_FORMAT_VERSION,
+        "input": str(path.resolve()),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "chunk_rows": chunk_rows,
+    }
+
+
+def _write_json(data: Dict[str, Any], path: Path):
+    tmp_path = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class Manifest:
+    """
+    The progress of a batch scoring run: the input it scores, and the rows of each completed chunk.
+
+    Attributes
+    ----------
+    path : Path
+        The manifest file.
+    key : Dict[str, Any]
+        The input file (path, size and modification time) and chunk size of the run.
+    completed : Dict[int, int]
+        The number of rows of each completed chunk, by chunk index.
+    """
+
+    def __init__(self, path: Path, key: Dict[str, Any], completed: Optional[Dict[int, int]] = None):
+        self.path = path
+        self.key = key
+        self.completed = completed or {}
+
+    @classmethod
+    def open(cls, output_dir: Path, key: Dict[str, Any], restart: bool = False) -> "Manifest":
+        """
+        Opens the manifest of a run, or starts a new one.
+
+        Parameters
+        ----------
+        output_dir : Path
+            The output directory of the run.
+        key : Dict[str, Any]
+            The input file and chunk size of the run.
+        restart : bool, optional
+            Whether to discard the progress of a previous run on a different input (default is
+            False).
+
+        Returns
+        -------
+        Manifest
+            The manifest, with the chunks completed by a previous run on the same input.
+
+        Raises
+        ------
+        ValueError
+            If the output directory holds the progress of a run on a different input (or with a
+            different chunk size), and ``restart`` is False.
+        """
+        path = output_dir / MANIFEST_FILE
+        if path.exists():
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data["key"] == key:
+                completed = {int(k): v for k, v in data["completed"].items()}
+                return cls(path, key, completed)
+            if not restart:
+                raise ValueError(
+                    f"Expected '{output_dir}' to hold the output of the same input and chunk size, "
+                    "but found a different run. Use a new output directory, or restart."
+                )
+            for part in output_dir.glob(PART_FILE.replace("{:05d}", "*")):
+                part.unlink()
+
+        manifest = cls(path, key)
+        manifest.save()
+        return manifest
+
+    def save(self):
+        """
+        Writes the manifest, atomically.
+        """
+        _write_json({"key": self.key, "completed": self.completed}, self.path)
+
+
+# The models of a worker process, loaded on first use
+_MODELS: Dict[str, PredictionModel] = {}
+_WORKER_SETTINGS: Dict[str, Any] = {}
+
+
+def _init_worker(model_dir: str, threads: Optional[int]):
+    _MODELS.clear()
+    _WORKER_SETTINGS.update(model_dir=model_dir, threads=threads)
+
+
+def _get_model(model_id: str) -> PredictionModel:
+    if model_id not in _MODELS:
+        path = find_model(_WORKER_SETTINGS["model_dir"], model_id)
+        if not path.exists():
+            raise ValueError(f"Model with ID '{model_id}' not found.")
+        _MODELS[model_id] = load_model(path)
+
+    return _MODELS[model_id]
+
+
+def score_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    """
+    Scores a chunk of requests, each with the model named in its ``model_id`` column, and every
+    other column as a feature.
+
+    Parameters
+    ----------
+    chunk : pd.DataFrame
+        The requests, with a ``model_id`` column.
+
+    Returns
+    -------
+    pd.DataFrame
+        The scored requests, with the columns of the ``/predict`` route.
+
+    Raises
+    ------
+    ValueError
+        If a request has no model ID, or a requested model does not exist.
+    """
+    if chunk["model_id"].isna().any():
+        raise ValueError("Expected every request to have a 'model_id'.")
+
+    features = sorted(set(chunk.columns) - {"model_id"})
+    predictions = np.empty(len(chunk), dtype=np.float64)
+    created_at = np.empty(len(chunk), dtype=object)
+    for model_id, rows in chunk.groupby("model_id", sort=False).indices.items():
+        model = _get_model(model_id)
+        predictions[rows] = model.predict(
+            chunk[features].take(rows),
+            **predict_thread_params(model, _WORKER_SETTINGS.get("threads")),
+        )
+        created_at[rows] = get_created_at()
+
+    return scored_frame(chunk.reset_index(drop=True), predictions, created_at)
+
+
+def _score_chunk_to_file(index: int, chunk: pd.DataFrame, output_dir: str) -> Tuple[int, int]:
+    part_path = Path(output_dir) / PART_FILE.format(index)
+    tmp_path = part_path.with_name(f".{part_path.name}.tmp-{os.getpid()}")
+    score_chunk(chunk).to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, part_path)
+
+    return index, len(chunk)
+
+
+def score_file(
+    input_path: str | Path,
+    model_dir: str | Path,
+    output_dir: str | Path,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    jobs: Optional[int] = None,
+    threads: Optional[int] = None,
+    restart: bool = False,
+) -> Dict[str, Any]:
+    """
+    Scores a request file, chunk by chunk, in a pool of worker processes, and writes the scored
+    chunks to Parquet part files. Chunks completed by a previous run on the same input are skipped.
+
+    Parameters
+    ----------
+    input_path : str | Path
+        The request file (see ``read_request_chunks()``).
+    model_dir : str | Path
+        The directory of the models (pickle files or artifacts).
+    output_dir : str | Path
+        The directory of the part files and the manifest.
+    chunk_rows : int, optional
+        The number of rows scored at a time (default is ``DEFAULT_CHUNK_ROWS``).
+    jobs : Optional[int]
+        The number of worker processes (default is the number of CPUs).
+    threads : Optional[int]
+        The number of threads each worker scores with (default is the number of CPUs divided by
+        ``jobs``).
+    restart : bool, optional
+        Whether to discard the output of a previous run on a different input (default is False).
+
+    Returns
+    -------
+    Dict[str, Any]
+        The number of chunks and rows scored by this run, of chunks skipped, and the wall time.
+    """
+    input_path, output_dir = Path(input_path), Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest.open(output_dir, _input_key(input_path, chunk_rows), restart=restart)
+
+    jobs = jobs or os.cpu_count() or 1
+    threads = threads or max(1, (os.cpu_count() or 1) // jobs)
+    LOG.info(
+        "Scoring '%s' in %d processes with %d threads each (%d chunks already done)",
+        input_path,
+        jobs,
+        threads,
+        len(manifest.completed),
+    )
+
+    start = time.perf_counter()
+    summary = {"chunks": 0, "rows": 0, "skipped_chunks": 0}
+
+    def _record(futures: List[Future]):
+        # Chunks completed alongside a failed one are recorded before the error is raised
+        errors = []
+        for future in futures:
+            try:
+                index, rows = future.result()
+            except Exception as e:  # pylint: disable=broad-except
+                errors.append(e)
+                continue
+            manifest.completed[index] = rows
+            summary["chunks"] += 1
+            summary["rows"] += rows
+        manifest.save()
+        if errors:
+            raise errors[0]
+
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_worker, initargs=(str(model_dir), threads)
+    ) as pool:
+        pending = set()
+        for index, chunk in enumerate(read_request_chunks(input_path, chunk_rows)):
+            if index in manifest.completed:
+                summary["skipped_chunks"] += 1
+                continue
+
+            # At most two chunks per worker are held in memory at once
+            if len(pending) >= 2 * jobs:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                _record(done)
+            pending.add(pool.submit(_score_chunk_to_file, index, chunk, str(output_dir)))
+
+        _record(wait(pending).done)
+
+    summary["wall_time_s"] = time.perf_counter() - start
+    LOG.info(
+        "Scored %d rows in %d chunks (%d skipped) in %.1f s",
+        summary["rows"],
+        summary["chunks"],
+        summary["skipped_chunks"],
+        summary["wall_time_s"],
+    )
+
+    return summary
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Score a file of sales forecast requests.")
+    parser.add_argument(
+        "input", type=str, help="Request file: CSV, Parquet (.parquet) or NDJSON (.ndjson/.jsonl)."
+    )
+    parser.add_argument("--model-dir", type=str, required=True, help="Location of the models.")
+    parser.add_argument(
+        "--output-dir", type=str, required=True, help="Location to write the scored part files."
+    )
+    parser.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=DEFAULT_CHUNK_ROWS,
+        help="Number of rows scored at a time.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of worker processes (default is the number of CPUs).",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="Number of threads each worker scores with (default is the number of CPUs divided "
+        "by --jobs).",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Discard the output of a previous run on a different input in --output-dir.",
+    )
+
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    score_file(
+        args.input,
+        args.model_dir,
+        args.output_dir,
+        chunk_rows=args.chunk_rows,
+        jobs=args.jobs,
+        threads=args.threads,
+        restart=args.restart,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+from collections import deque
+from dataclasses import dataclass, field
+import asyncio
+
+import numpy as np
+import pandas as pd
+
+from usf_model_api.models.base import PredictionModel
+from usf_model_api.serving.cache import PredictionCache
+from usf_model_api.serving.executors import ExecutorSaturatedError, InferenceExecutor
+from usf_model_api.serving.materialized import ForecastTable
+from usf_model_api.serving.utils import Database, get_created_at, partition_by_model, scored_frame
+from usf_model_api.utils import get_logger
+
+
+LOG = get_logger(__name__)
+
+
+@dataclass
+class BatchStats:
+    """
+    Running statistics of the batches formed for one model.
+
+    Attributes
+    ----------
+    queue_depth : int
+        The number of requests currently waiting to be batched.
+    queued_rows : int
+        The number of rows currently waiting to be batched.
+    batches : int
+        The number of batches run so far.
+    batched_requests : int
+        The number of requests scored in those batches.
+    batched_rows : int
+        The number of rows scored in those batches.
+    max_batch_rows : int
+        The number of rows in the largest batch run so far.
+    """
+
+    queue_depth: int = 0
+    queued_rows: int = 0
+    batches: int = 0
+    batched_requests: int = 0
+    batched_rows: int = 0
+    max_batch_rows: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Returns the statistics as a dictionary, including the mean batch size.
+        """
+        return {
+            "queue_depth": self.queue_depth,
+            "queued_rows": self.queued_rows,
+            "batches": self.batches,
+            "batched_requests": self.batched_requests,
+            "batched_rows": self.batched_rows,
+            "max_batch_rows": self.max_batch_rows,
+            "mean_batch_rows": self.batched_rows / self.batches if self.batches else 0.0,
+            "mean_batch_requests": self.batched_requests / self.batches if self.batches else 0.0,
+        }
+
+
+@dataclass
+class _ModelQueue:
+    pending: Deque[Tuple[pd.DataFrame, asyncio.Future, Any]] = field(default_factory=deque)
+    timer: Optional[asyncio.TimerHandle] = None
+    stats: BatchStats = field(default_factory=BatchStats)
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent prediction requests for the same model into a single vectorized call.
+
+    Requests are queued per model ID. A queue is flushed as soon as it holds ``max_batch_size`` rows,
+    or ``max_wait_ms`` milliseconds after its oldest request arrived, whichever happens first. The
+    queued frames are then concatenated, scored with one call to ``predict_fn``, and the predictions
+    are split back and returned to each caller. A request larger than ``max_batch_size`` is scored
+    on its own. Each request can carry the model object it was resolved to; a batch only holds
+    requests with the same model object, so a model swapped or evicted while requests are queued
+    does not affect them.
+
+    Attributes
+    ----------
+    max_batch_size : int
+        The maximum number of rows per batch.
+    max_wait_ms : float
+        The maximum time (in milliseconds) a request waits for other requests to join its batch.
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[str, pd.DataFrame, Any], Awaitable[np.ndarray]],
+        max_batch_size: int = 256,
+        max_wait_ms: float = 2.0,
+    ):
+        """
+        Initializes the MicroBatcher.
+
+        Parameters
+        ----------
+        predict_fn : Callable[[str, pd.DataFrame, Any], Awaitable[np.ndarray]]
+            The coroutine function used to score a batch, given a model ID, the batch features and
+            the model object of the batch requests.
+        max_batch_size : int, optional
+            The maximum number of rows per batch (default is 256).
+        max_wait_ms : float, optional
+            The maximum time (in milliseconds) a request waits for other requests to join its batch
+            (default is 2.0).
+        """
+        if max_batch_size < 1:
+            raise ValueError(
+                f"Expected 'max_batch_size' to be positive, but found {max_batch_size}."
+            )
+
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._predict_fn = predict_fn
+        self._queues: Dict[str, _ModelQueue] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns the queue depth and batch size statistics of each model.
+
+        Returns
+        -------
+        Dict[str, Dict[str, Any]]
+            A mapping from model ID to its ``BatchStats``, as a dictionary.
+        """
+        return {model_id: q.stats.to_dict() for model_id, q in self._queues.items()}
+
+    async def submit(self, model_id: str, X: pd.DataFrame, model: Any = None) -> np.ndarray:
+        """
+        Queues a prediction request, and waits for its predictions.
+
+        Parameters
+        ----------
+        model_id : str
+            The ID of the model used to score the request.
+        X : pd.DataFrame
+            The features of the request.
+        model : Any, optional
+            The model object used to score the request, passed on to ``predict_fn`` (default is
+            None).
+
+        Returns
+        -------
+        np.ndarray
+            The predictions for the rows of ``X``, in order.
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Queues and timers are bound to the event loop they were created in
+            self._loop = loop
+            self._queues = {}
+            self._tasks = set()
+
+        queue = self._queues.setdefault(model_id, _ModelQueue())
+        future = loop.create_future()
+        queue.pending.append((X, future, model))
+        queue.stats.queue_depth += 1
+        queue.stats.queued_rows += len(X)
+
+        if queue.stats.queued_rows >= self.max_batch_size:
+            self._flush(model_id)
+        elif queue.timer is None:
+            queue.timer = loop.call_later(self.max_wait_ms / 1e3, self._flush, model_id)
+
+        return await future
+
+    def _flush(self, model_id: str):
+        queue = self._queues[model_id]
+        if queue.timer is not None:
+            queue.timer.cancel()
+            queue.timer = None
+
+        while queue.pending:
+            batch, rows = [], 0
+            while queue.pending and (
+                not batch
+                or (
+                    rows + len(queue.pending[0][0]) <= self.max_batch_size
+                    and queue.pending[0][2] is batch[0][2]
+                )
+            ):
+                X, future, model = queue.pending.popleft()
+                batch.append((X, future, model))
+                rows += len(X)
+
+            queue.stats.queue_depth -= len(batch)
+            queue.stats.queued_rows -= rows
+            queue.stats.batches += 1
+            queue.stats.batched_requests += len(batch)
+            queue.stats.batched_rows += rows
+            queue.stats.max_batch_rows = max(queue.stats.max_batch_rows, rows)
+            task = self._loop.create_task(self._run_batch(model_id, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(
+        self, model_id: str, batch: List[Tuple[pd.DataFrame, asyncio.Future, Any]]
+    ):
+        try:
+            X = (
+                batch[0][0]
+                if len(batch) == 1
+                else pd.concat([x for x, _, _ in batch], ignore_index=True)
+            )
+            predictions = np.asarray(await self._predict_fn(model_id, X, batch[0][2]))
+        except Exception as e:  # pylint: disable=broad-except
+            if isinstance(e, ExecutorSaturatedError):
+                # Expected under load, and reported to the callers
+                LOG.warning(
+                    "Batch of %d requests for model '%s' rejected: %s", len(batch), model_id, e
+                )
+            else:
+                LOG.exception("Batch of %d requests for model '%s' failed.", len(batch), model_id)
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        offsets = np.cumsum([0] + [len(x) for x, _, _ in batch])
+        for (_, future, _), start, end in zip(batch, offsets[:-1], offsets[1:]):
+            if not future.done():
+                future.set_result(predictions[start:end])
+
+
+class ModelNotFoundError(LookupError):
+    """
+    Raised when a requested model is not in the model registry.
+    """
+
+
+def model_features(scoring_df: pd.DataFrame) -> List[str]:
+    """
+    Returns the model features of a scoring batch, i.e. every column except ``model_id``.
+    """
+    features = sorted(set(scoring_df.columns) - {"model_id"})
+    LOG.info("Identified model features: %s", features)
+
+    return features
+
+
+class Scorer:
+    """
+    Scores batches of requests. Each row is scored by the model named in its ``model_id`` column,
+    and every other column is passed to the model as a feature. For each model, the rows inside the
+    grid of its materialized forecast table (if any) are looked up in the table, then the rows in
+    the prediction cache (if any) are looked up in the cache, and only the other rows are scored by
+    the model, in the worker pool of an ``InferenceExecutor`` (or through a ``MicroBatcher``), so
+    the event loop is not blocked.
+
+    Attributes
+    ----------
+    database : Database
+        The database the models are resolved in.
+    executor : InferenceExecutor
+        The executor the models are run in.
+    batcher : Optional[MicroBatcher]
+        The micro-batching scheduler of batched requests.
+    cache : Optional[PredictionCache]
+        The prediction cache, or None if predictions are not cached.
+    tables : Dict[str, ForecastTable]
+        The materialized forecast tables, by model ID.
+    """
+
+    def __init__(
+        self,
+        database: Database,
+        executor: InferenceExecutor,
+        batcher: Optional[MicroBatcher] = None,
+        cache: Optional[PredictionCache] = None,
+        tables: Optional[Dict[str, ForecastTable]] = None,
+    ):
+        self.database = database
+        self.executor = executor
+        self.batcher = batcher
+        self.cache = cache
+        self.tables = tables if tables is not None else {}
+
+    async def score(self, scoring_df: pd.DataFrame, batched: bool = False) -> pd.DataFrame:
+        """
+        Scores a batch of requests.
+
+        Parameters
+        ----------
+        scoring_df : pd.DataFrame
+            The requests to score, with a ``model_id`` column and one column per model feature.
+        batched : bool, optional
+            Whether to queue each model's rows in the micro-batching scheduler, so that they are
+            scored together with the rows of concurrent requests for the same model (default is
+            False).
+
+        Returns
+        -------
+        pd.DataFrame
+            The scored requests, with ``prediction_id``, ``prediction`` and ``created_at`` columns
+            added.
+
+        Raises
+        ------
+        ModelNotFoundError
+            If any of the requested models does not exist. Nothing is scored.
+        ExecutorSaturatedError
+            If the executor is saturated.
+        """
+        features = model_features(scoring_df)
+        partitions = partition_by_model(scoring_df["model_id"])
+        LOG.info("Requested models: %s", list(partitions))
+        # The cache generations are read before the models are resolved, so that the predictions
+        # of a model replaced in between are not cached under the generation of its successor
+        generations = (
+            {m: self.cache.generation(m) for m in partitions} if self.cache is not None else {}
+        )
+        models = await self.resolve_models(list(partitions))
+
+        # Score by model requested for each batch (also generalizes to one model)
+        feature_df = scoring_df[features]
+        if batched:
+            results = await asyncio.gather(
+                *(
+                    self.score_model(
+                        m,
+                        models[m],
+                        feature_df.take(rows),
+                        batched=True,
+                        generation=generations.get(m),
+                    )
+                    for m, rows in partitions.items()
+                )
+            )
+        else:
+            # Models are scored one after the other, so a request holds at most one executor slot
+            results = []
+            for m, rows in partitions.items():
+                LOG.info("Running scoring with model '%s' ...", m)
+                results.append(
+                    await self.score_model(
+                        m, models[m], feature_df.take(rows), generation=generations.get(m)
+                    )
+                )
+
+        predictions = np.empty(len(scoring_df), dtype=np.float64)
+        created_at = np.empty(len(scoring_df), dtype=object)
+        for rows, result in zip(partitions.values(), results):
+            predictions[rows] = result
+            created_at[rows] = get_created_at()
+
+        return scored_frame(scoring_df, predictions, created_at)
+
+    async def resolve_models(self, model_ids: List[str]) -> Dict[str, PredictionModel]:
+        """
+        Looks up every requested model, so that nothing is scored if any of them is missing.
+        Unless every model is resident, the models are looked up in a thread, as non-resident
+        models are loaded from disk (and, with the ``sqlite`` backend, looked up in the database).
+
+        Parameters
+        ----------
+        model_ids : List[str]
+            The requested model IDs.
+
+        Returns
+        -------
+        Dict[str, PredictionModel]
+            A mapping from each requested model ID to its model.
+
+        Raises
+        ------
+        ModelNotFoundError
+            If any of the requested models does not exist.
+        """
+        if all(m in self.database.model_db for m in model_ids):
+            models = {m: self.database.get_model(m) for m in model_ids}
+        else:
+            models = await asyncio.to_thread(
+                lambda: {m: self.database.get_model(m) for m in model_ids}
+            )
+
+        for m, model in models.items():
+            if not model:
+                raise ModelNotFoundError(f"Model with ID '{m}' not found.")
+
+        return models
+
+    async def score_model(
+        self,
+        model_id: str,
+        model: PredictionModel,
+        X: pd.DataFrame,
+        batched: bool = False,
+        generation: Optional[int] = None,
+    ) -> np.ndarray:
+        """
+        Scores the rows of one model, through its forecast table and the prediction cache.
+
+        Parameters
+        ----------
+        model_id : str
+            The ID of the model.
+        model : PredictionModel
+            The model.
+        X : pd.DataFrame
+            The features of the rows.
+        batched : bool, optional
+            Whether to score through the micro-batching scheduler (default is False).
+        generation : Optional[int]
+            The cache generation of the model, read before the model was resolved. If the model
+            was invalidated since, its predictions are not cached. If None, the current generation
+            is used.
+
+        Returns
+        -------
+        np.ndarray
+            The predictions, in the order of ``X``.
+        """
+
+        async def run(X_live: pd.DataFrame) -> np.ndarray:
+            if batched and self.batcher is not None:
+                return await self.batcher.submit(model_id, X_live, model=model)
+            return await self.executor.predict(model, X_live)
+
+        async def score_live(X_live: pd.DataFrame) -> np.ndarray:
+            if self.cache is None:
+                return await run(X_live)
+            return await self.cache.predict(model_id, X_live, run, generation=generation)
+
+        table = self.tables.get(model_id)
+        if table is None:
+            return await score_live(X)
+
+        return await table.predict(X, score_live)
@@ -0,0 +1,264 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+from collections import OrderedDict
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from usf_model_api import metrics
+from usf_model_api.utils import get_logger
+
+
+LOG = get_logger(__name__)
+
+
+class PredictionCache:
+    """
+    A bounded, in-process cache of predictions, keyed by model ID and feature values.
+
+    Entries are evicted in least recently used order once the cache holds ``max_entries``
+    predictions, and expire ``ttl`` seconds after they were stored. Each model has a generation
+    counter, which ``invalidate()`` increments when the model is replaced or removed; entries
+    stored under a previous generation are never returned.
+
+    Attributes
+    ----------
+    max_entries : int
+        The maximum number of cached predictions.
+    ttl : Optional[float]
+        The number of seconds a prediction stays cached, or None if it only leaves by eviction.
+    """
+
+    def __init__(self, max_entries: int = 100_000, ttl: Optional[float] = None):
+        """
+        Initializes the PredictionCache.
+
+        Parameters
+        ----------
+        max_entries : int, optional
+            The maximum number of cached predictions (default is 100,000).
+        ttl : Optional[float]
+            The number of seconds a prediction stays cached. If None (the default), predictions
+            only leave the cache when evicted or invalidated.
+        """
+        if max_entries < 1:
+            raise ValueError(f"Expected 'max_entries' to be positive, but found {max_entries}.")
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # (model_id, key) -> (prediction, generation, expires_at)
+        self._entries: OrderedDict[Tuple[str, Hashable], Tuple[float, int, float]] = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def make_keys(X: pd.DataFrame) -> List[Tuple[Any, ...]]:
+        """
+        Returns the cache key of each row of a feature frame, i.e. the tuple of its feature values.
+
+        Parameters
+        ----------
+        X : pd.DataFrame
+            The features, one column per feature, in a fixed order.
+
+        Returns
+        -------
+        List[Tuple[Any, ...]]
+            The key of each row.
+        """
+        return list(zip(*(X[column].tolist() for column in X.columns)))
+
+    def generation(self, model_id: str) -> int:
+        """
+        Returns the current generation of a model. Pass it to ``put_many()`` to discard predictions
+        made by a model version that was replaced while they were being computed.
+
+        Parameters
+        ----------
+        model_id : str
+            The model ID.
+
+        Returns
+        -------
+        int
+            The number of times the model was invalidated.
+        """
+        return self._generations.get(model_id, 0)
+
+    def get_many(self, model_id: str, keys: Sequence[Hashable]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Looks up the cached predictions of a model.
+
+        Parameters
+        ----------
+        model_id : str
+            The model ID.
+        keys : Sequence[Hashable]
+            The keys to look up (see ``make_keys()``).
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray]
+            The cached predictions (NaN where missing), and a boolean mask of the keys found.
+        """
+        predictions = np.full(len(keys), np.nan)
+        found = np.zeros(len(keys), dtype=bool)
+        now = time.monotonic()
+
+        with self._lock:
+            generation = self._generations.get(model_id, 0)
+            for i, key in enumerate(keys):
+                entry = self._entries.get((model_id, key))
+                if entry is None:
+                    continue
+
+                prediction, entry_generation, expires_at = entry
+                if entry_generation != generation or expires_at <= now:
+                    del self._entries[(model_id, key)]
+                    self._expirations += entry_generation == generation
+                    continue
+
+                self._entries.move_to_end((model_id, key))
+                predictions[i] = prediction
+                found[i] = True
+
+            hits = int(found.sum())
+            self._hits += hits
+            self._misses += len(keys) - hits
+
+        return predictions, found
+
+    def put_many(
+        self,
+        model_id: str,
+        keys: Sequence[Hashable],
+        predictions: Sequence[float],
+        generation: Optional[int] = None,
+    ):
+        """
+        Caches predictions of a model.
+
+        Parameters
+        ----------
+        model_id : str
+            The model ID.
+        keys : Sequence[Hashable]
+            The keys of the predictions (see ``make_keys()``).
+        predictions : Sequence[float]
+            The predictions.
+        generation : Optional[int]
+            The generation of the model when the predictions were requested. If the model was
+            invalidated since, the predictions are not cached. If None (the default), the
+            predictions are cached under the current generation.
+        """
+        expires_at = np.inf if self.ttl is None else time.monotonic() + self.ttl
+
+        with self._lock:
+            current = self._generations.get(model_id, 0)
+            if generation is not None and generation != current:
+                return
+
+            for key, prediction in zip(keys, predictions):
+                self._entries[(model_id, key)] = (float(prediction), current, expires_at)
+                self._entries.move_to_end((model_id, key))
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    async def predict(
+        self,
+        model_id: str,
+        X: pd.DataFrame,
+        score: Callable[[pd.DataFrame], Awaitable[np.ndarray]],
+        generation: Optional[int] = None,
+    ) -> np.ndarray:
+        """
+        Returns the predictions of a model, scoring (and then caching) only the rows that are not
+        cached.
+
+        Parameters
+        ----------
+        model_id : str
+            The model ID.
+        X : pd.DataFrame
+            The features of the rows.
+        score : Callable[[pd.DataFrame], Awaitable[np.ndarray]]
+            Scores the features of the rows missing from the cache.
+        generation : Optional[int]
+            The generation of the model when it was resolved, as for ``put_many()`` (default is the
+            current generation).
+
+        Returns
+        -------
+        np.ndarray
+            The predictions, in the order of ``X``.
+        """
+        with metrics.timed("cache_lookup", model_id=model_id, rows=len(X)):
+            keys = self.make_keys(X)
+            if generation is None:
+                generation = self.generation(model_id)
+            predictions, found = self.get_many(model_id, keys)
+        if not found.all():
+            missed = np.flatnonzero(~found)
+            predictions[missed] = await score(X.take(missed))
+            self.put_many(
+                model_id, [keys[i] for i in missed], predictions[missed], generation=generation
+            )
+
+        return predictions
+
+    def invalidate(self, model_id: str):
+        """
+        Invalidates every cached prediction of a model, e.g. when a new version of the model is
+        loaded. Invalidated entries are dropped lazily, when looked up or evicted.
+
+        Parameters
+        ----------
+        model_id : str
+            The model ID.
+        """
+        with self._lock:
+            self._generations[model_id] = self._generations.get(model_id, 0) + 1
+            self._invalidations += 1
+
+        LOG.info("Invalidated cached predictions of model '%s'", model_id)
+
+    def clear(self):
+        """
+        Drops every cached prediction.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Returns the cache settings and counters.
+
+        Returns
+        -------
+        Dict[str, Any]
+            The size and limits of the cache, and the number of hits, misses, evictions,
+            expirations and invalidations so far.
+        """
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+            "evictions": self._evictions,
+            "expirations": self._expirations,
+            "invalidations": self._invalidations,
+        }
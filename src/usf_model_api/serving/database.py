@@ -0,0 +1,644 @@
+"""
+Database backends of the model registry and the predictions store.
+
+``MockDatabase`` (``memory``) keeps everything in process memory, so each worker process of the
+service has its own predictions and its own view of the model registry. ``SQLDatabase``
+(``sqlite``) keeps them in a SQL database shared by every worker instead:
+ * Predictions are appended to a ``predictions`` table with one bulk ``executemany()`` insert per
+   batch, and looked up and queried through indexes of the table (see ``SQLPredictionStore``).
+ * The model files known to any worker are recorded in a shared ``models`` table, so every worker
+   lists the same models, and can load a model registered by another worker.
+
+Connections are borrowed from a ``ConnectionPool``, which bounds the number of open connections, and
+fails with ``PoolTimeoutError`` if none is free in time. A pool (or a database) may be created before
+the worker processes are forked: each process opens its own connections, since SQLite connections
+must not be used across a ``fork()``.
+"""
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+import os
+import queue
+import sqlite3
+import threading
+import weakref
+
+import pandas as pd
+
+from usf_model_api.models.artifacts import load_model
+from usf_model_api.models.base import PredictionModel
+from usf_model_api.serving.storage import ID_COLUMN, INDEXED_COLUMNS
+from usf_model_api.serving.utils import Database, MockDatabase, ModelFile, check_model_id
+from usf_model_api.utils import get_logger
+
+
+LOG = get_logger(__name__)
+
+VALID_BACKENDS = {"memory", "sqlite"}
+DEFAULT_POOL_SIZE = 4
+DEFAULT_POOL_TIMEOUT = 5.0
+PREDICTIONS_TABLE = "predictions"
+MODELS_TABLE = "models"
+# SQLite limits the number of parameters of a statement
+MAX_LOOKUP_IDS = 500
+
+
+class PoolTimeoutError(RuntimeError):
+    """
+    Raised when no database connection is free before the timeout of the pool.
+    """
+
+
+class ConnectionPool:
+    """
+    A bounded pool of SQLite connections, shared by threads. Connections are opened on demand, up to
+    ``size``, in WAL mode, so readers do not block the writer. Borrowing a connection when all of
+    them are in use waits up to ``timeout`` seconds, then fails with ``PoolTimeoutError``.
+
+    In a process forked from the one that created the pool, the pool starts over with no connection:
+    the connections inherited from the parent are never used or closed by the child.
+
+    Attributes
+    ----------
+    path : Path
+        The database file.
+    size : int
+        The maximum number of open connections.
+    timeout : float
+        The maximum wait for a free connection, in seconds.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        size: int = DEFAULT_POOL_SIZE,
+        timeout: float = DEFAULT_POOL_TIMEOUT,
+    ):
+        if size < 1:
+            raise ValueError(f"Expected 'size' to be at least 1, but found {size}.")
+
+        self.path = Path(path)
+        self.size = size
+        self.timeout = timeout
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Most recently returned first, so idle connections stay warm
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._inherited: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._num_open = 0
+        self._num_in_use = 0
+        self._num_timeouts = 0
+        self._closed = False
+
+        # The pool is not kept alive by the hook
+        pool_ref = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: _reset_after_fork(pool_ref))
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Returns the settings and state of the pool.
+        """
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self._num_open,
+                "in_use": self._num_in_use,
+                "timeouts": self._num_timeouts,
+            }
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Borrows a connection for the duration of a ``with`` block. The block runs in a transaction,
+        committed when it exits, and rolled back if it raises.
+
+        Yields
+        ------
+        sqlite3.Connection
+            The connection.
+
+        Raises
+        ------
+        PoolTimeoutError
+            If no connection is free within ``timeout`` seconds.
+        """
+        conn = self._acquire()
+        try:
+            with conn:
+                yield conn
+        finally:
+            with self._lock:
+                self._num_in_use -= 1
+                closed = self._closed
+            if closed:
+                conn.close()
+            else:
+                self._idle.put(conn)
+
+    def close(self):
+        """
+        Closes the idle connections. Connections in use are closed when they are returned.
+        """
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+
+    def _after_fork(self):
+        # Runs in the child, before any other thread is started. The locks of the parent may have
+        # been held by its other threads, so they are replaced rather than acquired. Closing an
+        # inherited connection could checkpoint or delete the WAL of the parent, so the connections
+        # are only kept alive.
+        self._inherited.extend(self._idle.queue)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._num_open = 0
+        self._num_in_use = 0
+
+    def _acquire(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"The connection pool of '{self.path}' is closed.")
+            self._num_in_use += 1
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            if self._num_open < self.size:
+                self._num_open += 1
+                opened = True
+            else:
+                opened = False
+
+        try:
+            if opened:
+                return self._connect()
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self._lock:
+                self._num_in_use -= 1
+                self._num_timeouts += 1
+            raise PoolTimeoutError(
+                f"No connection to '{self.path}' was free within {self.timeout} seconds."
+            ) from None
+        except BaseException:
+            with self._lock:
+                self._num_in_use -= 1
+                self._num_open -= int(opened)
+            raise
+
+    def _connect(self) -> sqlite3.Connection:
+        # A connection is used by one thread at a time, but not always the same one
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+
+def _reset_after_fork(pool_ref: "weakref.ref[ConnectionPool]"):
+    pool = pool_ref()
+    if pool is not None:
+        pool._after_fork()  # pylint: disable=protected-access
+
+
+def _sql_type(column: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(column) or pd.api.types.is_integer_dtype(column):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(column):
+        return "REAL"
+    return "TEXT"
+
+
+class SQLPredictionStore:
+    """
+    A predictions store backed by a table of a SQL database, with the same interface as
+    ``PredictionStore``. Each appended frame is inserted with a single ``executemany()`` call. The
+    table is created on first append, with the columns of the first frame, and an index on
+    ``prediction_id`` and on each of the ``INDEXED_COLUMNS``. Query cursors are table row IDs.
+
+    Attributes
+    ----------
+    pool : ConnectionPool
+        The pool of connections to the database.
+    table : str
+        The table.
+    """
+
+    def __init__(self, pool: ConnectionPool, table: str = PREDICTIONS_TABLE):
+        self.pool = pool
+        self.table = table
+        self._columns: Optional[List[str]] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        if not self._exists():
+            return 0
+        with self.pool.connection() as conn:
+            return conn.execute(f'SELECT COUNT(*) FROM "{self.table}"').fetchone()[0]
+
+    @property
+    def num_evicted(self) -> int:
+        """
+        Returns the number of rows evicted from the store, which is always 0, as the table is not
+        bounded.
+        """
+        return 0
+
+    @property
+    def segments(self) -> List[Path]:
+        """
+        Returns the spilled segment files, of which there are none.
+        """
+        return []
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """
+        Returns all stored rows as a single DataFrame, oldest first.
+        """
+        return self._select("", [])
+
+    def append(self, predictions_df: pd.DataFrame):
+        """
+        Inserts a frame of predictions into the table, in one transaction.
+
+        Parameters
+        ----------
+        predictions_df : pd.DataFrame
+            The predictions.
+        """
+        if predictions_df.empty:
+            return
+
+        columns = [str(c) for c in predictions_df.columns]
+        self._ensure_table(predictions_df)
+        # Native Python values, column by column, which is much faster than iterating over rows
+        values = [predictions_df[c].tolist() for c in predictions_df.columns]
+        names = ", ".join(f'"{c}"' for c in columns)
+        placeholders = ", ".join("?" for _ in columns)
+        with self.pool.connection() as conn:
+            conn.executemany(
+                f'INSERT INTO "{self.table}" ({names}) VALUES ({placeholders})', zip(*values)
+            )
+
+    def lookup(self, prediction_ids: Iterable[str]) -> pd.DataFrame:
+        """
+        Looks up predictions by ID, as ``PredictionStore.lookup()``.
+
+        Parameters
+        ----------
+        prediction_ids : Iterable[str]
+            The prediction IDs.
+
+        Returns
+        -------
+        pd.DataFrame
+            The predictions found, in the order of ``prediction_ids``.
+        """
+        prediction_ids = list(prediction_ids)
+        if not prediction_ids:
+            return pd.DataFrame()
+
+        found = []
+        for start in range(0, len(prediction_ids), MAX_LOOKUP_IDS):
+            ids = prediction_ids[start : start + MAX_LOOKUP_IDS]
+            placeholders = ", ".join("?" for _ in ids)
+            found.append(self._select(f'WHERE "{ID_COLUMN}" IN ({placeholders})', ids))
+
+        found = pd.concat(found, axis=0, ignore_index=True)
+        if found.empty:
+            return found
+
+        found = found.drop_duplicates(ID_COLUMN).set_index(ID_COLUMN, drop=False)
+        ids = [i for i in prediction_ids if i in found.index]
+        return found.loc[ids].reset_index(drop=True)
+
+    def query(
+        self,
+        filters: Optional[Dict[str, Tuple[Any, Any]]] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[int] = None,
+    ) -> Tuple[pd.DataFrame, Optional[int]]:
+        """
+        Queries the stored predictions by ranges of the indexed columns, as
+        ``PredictionStore.query()``.
+
+        Parameters
+        ----------
+        filters : Optional[Dict[str, Tuple[Any, Any]]]
+            The inclusive ``(low, high)`` bounds of each filtered column.
+        limit : Optional[int]
+            The maximum number of rows returned (default is no limit).
+        cursor : Optional[int]
+            The cursor of the page to return (default is the first page).
+
+        Returns
+        -------
+        Tuple[pd.DataFrame, Optional[int]]
+            The matching rows of the page, oldest first, and the cursor of the next page, or None
+            if this is the last page.
+
+        Raises
+        ------
+        ValueError
+            If a filtered column is not indexed.
+        """
+        filters = filters or {}
+        unknown = set(filters) - set(INDEXED_COLUMNS)
+        if unknown:
+            raise ValueError(
+                f"Expected filters on {INDEXED_COLUMNS}, but found filters on {sorted(unknown)}."
+            )
+
+        conditions, params = ["rowid >= ?"], [cursor or 0]
+        for column, (low, high) in filters.items():
+            if low is not None:
+                conditions.append(f'"{column}" >= ?')
+                params.append(low)
+            if high is not None:
+                conditions.append(f'"{column}" <= ?')
+                params.append(high)
+
+        clause = f"WHERE {' AND '.join(conditions)} ORDER BY rowid"
+        if limit is not None:
+            # One more row than the page, to know whether there is a next page
+            clause += " LIMIT ?"
+            params.append(limit + 1)
+
+        found = self._select(clause, params, with_rowid=True)
+        next_cursor = None
+        if limit is not None and len(found) > limit:
+            next_cursor = int(found["rowid"].iloc[limit])
+            found = found.iloc[:limit]
+
+        return found.drop(columns="rowid", errors="ignore").reset_index(drop=True), next_cursor
+
+    def _exists(self) -> bool:
+        if self._columns is not None:
+            return True
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(f'PRAGMA table_info("{self.table}")').fetchall()
+        if rows:
+            self._columns = [r[1] for r in rows]
+
+        return bool(rows)
+
+    def _ensure_table(self, predictions_df: pd.DataFrame):
+        with self._lock:
+            if not self._exists():
+                columns = ", ".join(
+                    f'"{c}" {_sql_type(predictions_df[c])}' for c in predictions_df.columns
+                )
+                indexed = [c for c in (ID_COLUMN, *INDEXED_COLUMNS) if c in predictions_df]
+                with self.pool.connection() as conn:
+                    # Another worker may have created the table meanwhile
+                    conn.execute(f'CREATE TABLE IF NOT EXISTS "{self.table}" ({columns})')
+                    for column in indexed:
+                        conn.execute(
+                            f'CREATE INDEX IF NOT EXISTS "{self.table}_{column}" '
+                            f'ON "{self.table}" ("{column}")'
+                        )
+                self._columns = None
+                self._exists()
+
+            missing = [c for c in predictions_df.columns if c not in self._columns]
+            if missing:
+                with self.pool.connection() as conn:
+                    for column in missing:
+                        conn.execute(
+                            f'ALTER TABLE "{self.table}" ADD COLUMN "{column}" '
+                            f"{_sql_type(predictions_df[column])}"
+                        )
+                self._columns.extend(missing)
+
+    def _select(self, clause: str, params: List[Any], with_rowid: bool = False) -> pd.DataFrame:
+        if not self._exists():
+            return pd.DataFrame()
+
+        columns = "rowid, *" if with_rowid else "*"
+        if "ORDER BY" not in clause:
+            clause += " ORDER BY rowid"
+        with self.pool.connection() as conn:
+            result = conn.execute(f'SELECT {columns} FROM "{self.table}" {clause}', params)
+            names = [d[0] for d in result.description]
+            rows = result.fetchall()
+
+        return pd.DataFrame.from_records(rows, columns=names)
+
+
+class SQLDatabase(Database):
+    """
+    A model registry and predictions store backed by a SQLite database, which every worker process
+    of the service can share. Models are still deserialized and kept resident in each process, by a
+    ``MockDatabase``, but the model files known to each process are recorded in a shared ``models``
+    table:
+     * ``list_models()`` lists the models registered by any process.
+     * ``get_model()`` loads a model registered by another process, from its recorded path.
+    Predictions are stored in a ``SQLPredictionStore``.
+
+    Attributes
+    ----------
+    pool : ConnectionPool
+        The pool of connections to the database.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        model_dir: Optional[Path] = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        pool_timeout: float = DEFAULT_POOL_TIMEOUT,
+        **kwargs: Any,
+    ):
+        """
+        Initializes the database, creating the database file and the ``models`` table if needed.
+
+        Parameters
+        ----------
+        path : str | Path
+            The database file.
+        model_dir : Optional[Path]
+            The directory containing model files, as for ``MockDatabase``.
+        pool_size : int, optional
+            The maximum number of open connections (default is 4).
+        pool_timeout : float, optional
+            The maximum wait for a free connection, in seconds (default is 5.0).
+        **kwargs : Any
+            Other arguments of ``MockDatabase`` (``lazy``, ``max_models`` and ``load_workers``).
+        """
+        super().__init__()
+        self.pool = ConnectionPool(path, size=pool_size, timeout=pool_timeout)
+        with self.pool.connection() as conn:
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS "{MODELS_TABLE}" '
+                "(model_id TEXT PRIMARY KEY, path TEXT, mtime_ns INTEGER, updated_at TEXT)"
+            )
+
+        self._local = MockDatabase(predictions_store=SQLPredictionStore(self.pool), **kwargs)
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        if model_dir is not None:
+            self.load_models(model_dir)
+
+    @property
+    def model_db(self) -> Dict[str, PredictionModel]:
+        return self._local.model_db
+
+    @property
+    def predictions_store(self) -> SQLPredictionStore:
+        return self._local.predictions_store
+
+    def list_models(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Lists the models known to the registry, including those only registered by other processes.
+
+        Returns
+        -------
+        Dict[str, Dict[str, Any]]
+            A mapping from model ID to its file path and whether it is currently resident in the
+            memory of this process.
+        """
+        models = self._local.list_models()
+        for model_id, model_file in self._registered().items():
+            models.setdefault(model_id, {"path": str(model_file.path), "resident": False})
+
+        return models
+
+    def add_listener(self, callback: Callable[[str], None]):
+        self._local.add_listener(callback)
+
+    def load_models(self, dir_path: Path, overwrite: bool = True):
+        self._local.load_models(dir_path, overwrite=overwrite)
+        self._register()
+
+    def get_model(self, model_id: str) -> Optional[PredictionModel]:
+        model = self._local.get_model(model_id)
+        if model is not None:
+            return model
+
+        # Registered by another process. It is not added to the model files of this process, which
+        # only tracks its own model directory.
+        model_file = self._registered().get(model_id)
+        if model_file is None or not model_file.path.exists():
+            return None
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(model_id, threading.Lock())
+
+        # Only one thread loads a given model, and others wait for it
+        with load_lock:
+            model = self._local.model_db.get(model_id)
+            if model is None:
+                LOG.info("Loading model file '%s', registered by another process", model_file.path)
+                model = load_model(model_file.path)
+                check_model_id(model_id, model)
+                self._local.add_model(model_id, model)
+
+        return model
+
+    def model_version(self, model_id: str) -> Optional[int]:
+        version = self._local.model_version(model_id)
+        if version is not None:
+            return version
+
+        model_file = self._registered().get(model_id)
+        return model_file.mtime_ns if model_file is not None else None
+
+    def refresh(self) -> Dict[str, List[str]]:
+        changes = self._local.refresh()
+        if changes["removed"]:
+            with self.pool.connection() as conn:
+                conn.executemany(
+                    f'DELETE FROM "{MODELS_TABLE}" WHERE model_id = ?',
+                    [(m,) for m in changes["removed"]],
+                )
+        if changes["added"] or changes["reloaded"]:
+            self._register()
+
+        return changes
+
+    def close(self):
+        super().close()
+        self._local.close()
+        self.pool.close()
+
+    def _register(self):
+        # Upserts the model files known to this process
+        updated_at = datetime.now(timezone.utc).isoformat()
+        rows = [
+            (model_id, model["path"], self._local.model_version(model_id), updated_at)
+            for model_id, model in self._local.list_models().items()
+            if model["path"] is not None
+        ]
+        if not rows:
+            return
+
+        with self.pool.connection() as conn:
+            conn.executemany(
+                f'INSERT INTO "{MODELS_TABLE}" (model_id, path, mtime_ns, updated_at) '
+                "VALUES (?, ?, ?, ?) ON CONFLICT (model_id) DO UPDATE SET "
+                "path = excluded.path, mtime_ns = excluded.mtime_ns, "
+                "updated_at = excluded.updated_at",
+                rows,
+            )
+
+    def _registered(self) -> Dict[str, ModelFile]:
+        with self.pool.connection() as conn:
+            rows = conn.execute(f'SELECT model_id, path, mtime_ns FROM "{MODELS_TABLE}"').fetchall()
+
+        return {model_id: ModelFile(Path(path), mtime_ns) for model_id, path, mtime_ns in rows}
+
+
+def make_database(
+    backend: str,
+    path: Optional[str | Path] = None,
+    pool_size: int = DEFAULT_POOL_SIZE,
+    pool_timeout: float = DEFAULT_POOL_TIMEOUT,
+    **kwargs: Any,
+) -> Database:
+    """
+    Returns a model registry and predictions store of the given backend.
+
+    Parameters
+    ----------
+    backend : str
+        The backend, one of ``memory`` (``MockDatabase``) or ``sqlite`` (``SQLDatabase``).
+    path : Optional[str | Path]
+        The database file of the ``sqlite`` backend.
+    pool_size : int, optional
+        The maximum number of open connections of the ``sqlite`` backend (default is 4).
+    pool_timeout : float, optional
+        The maximum wait for a free connection of the ``sqlite`` backend, in seconds (default is
+        5.0).
+    **kwargs : Any
+        Other arguments of ``MockDatabase``. ``max_prediction_rows`` and ``spill_dir`` only apply
+        to the ``memory`` backend.
+
+    Returns
+    -------
+    Database
+        The database.
+
+    Raises
+    ------
+    ValueError
+        If the backend is not valid, or the ``sqlite`` backend has no path.
+    """
+    if backend not in VALID_BACKENDS:
+        raise ValueError(
+            f"Expected 'backend' to be one of {VALID_BACKENDS}, but found '{backend}'."
+        )
+    if backend == "memory":
+        return MockDatabase(**kwargs)
+    if path is None:
+        raise ValueError(f"Expected a path for the '{backend}' database backend.")
+
+    kwargs.pop("max_prediction_rows", None)
+    kwargs.pop("spill_dir", None)
+    return SQLDatabase(path, pool_size=pool_size, pool_timeout=pool_timeout, **kwargs)
@@ -0,0 +1,331 @@
+from typing import Any, Callable, Dict, Optional, Sequence
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+import asyncio
+import contextvars
+import multiprocessing
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from usf_model_api import metrics
+from usf_model_api.utils import get_logger
+from usf_model_api.models.base import PredictionModel
+from usf_model_api.models.artifacts import find_model, load_model, predict_thread_params
+from usf_model_api.serving.utils import Database
+
+
+LOG = get_logger(__name__)
+
+# Inference backends
+VALID_BACKENDS = {"thread", "process"}
+
+# Models available to the current process pool worker, keyed by model ID. With the ``fork`` start
+# method, this is populated by the parent before the workers are started, so every worker shares the
+# parent's model memory (copy-on-write) instead of loading its own copy.
+_WORKER_MODELS: Dict[str, PredictionModel] = {}
+_WORKER_MODEL_DIR: Optional[Path] = None
+
+
+class ExecutorSaturatedError(RuntimeError):
+    """
+    Raised when an ``InferenceExecutor`` already has ``max_pending`` calls queued or running.
+    """
+
+
+def _init_worker(model_dir: Optional[Path]):
+    global _WORKER_MODEL_DIR  # pylint: disable=global-statement
+    _WORKER_MODEL_DIR = model_dir
+
+
+def _predict_in_worker(model_id: str, X: pd.DataFrame, n_threads: Optional[int]) -> np.ndarray:
+    model = _WORKER_MODELS.get(model_id)
+    if model is None:
+        if _WORKER_MODEL_DIR is None:
+            raise LookupError(f"Model with ID '{model_id}' is not loaded in worker {os.getpid()}.")
+
+        model = load_model(find_model(_WORKER_MODEL_DIR, model_id))
+        _WORKER_MODELS[model_id] = model
+
+    return model.predict(X, **predict_thread_params(model, n_threads))
+
+
+class InferenceExecutor:
+    """
+    Runs model inference off the event loop, in a bounded pool of workers.
+
+    Two backends are supported:
+     * ``thread``: a ``ThreadPoolExecutor`` with ``max_workers`` threads. Models are shared with the
+       calling process, and inference runs in parallel to the extent the model libraries release the
+       GIL (CatBoost and LightGBM do).
+     * ``process``: a ``ProcessPoolExecutor`` with ``max_workers`` processes, started with ``fork``
+       by default. Models passed to ``preload()`` are inherited by the workers (copy-on-write), and
+       any other model is loaded by each worker from ``model_dir`` on first use.
+
+    To apply backpressure, at most ``max_pending`` calls may be queued or running at once. Further
+    calls fail immediately with ``ExecutorSaturatedError`` instead of queueing indefinitely. The
+    number of threads each CatBoost or LightGBM call scores with can be capped with
+    ``predict_threads``, so that concurrent calls (or serving processes) do not oversubscribe the
+    CPUs.
+
+    Attributes
+    ----------
+    backend : str
+        The inference backend, one of ``thread`` or ``process``.
+    max_workers : int
+        The number of worker threads or processes.
+    max_pending : int
+        The maximum number of calls queued or running at once.
+    predict_threads : Optional[int]
+        The maximum number of threads of each model call, or None for the library default.
+    """
+
+    def __init__(
+        self,
+        backend: str = "thread",
+        max_workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        model_dir: Optional[Path] = None,
+        start_method: str = "fork",
+        predict_threads: Optional[int] = None,
+    ):
+        """
+        Initializes the InferenceExecutor. The worker pool is created on first use.
+
+        Parameters
+        ----------
+        backend : str, optional
+            The inference backend, one of ``thread`` or ``process`` (default is ``thread``).
+        max_workers : Optional[int]
+            The number of worker threads or processes (default is the number of CPUs).
+        max_pending : Optional[int]
+            The maximum number of calls queued or running at once (default is 4 per worker).
+        model_dir : Optional[Path]
+            The directory ``process`` workers load models from (as ``<model_id>.model`` artifacts
+            or ``<model_id>.pkl`` files) when they were not preloaded.
+        start_method : str, optional
+            The ``multiprocessing`` start method of ``process`` workers (default is ``fork``).
+        predict_threads : Optional[int]
+            The maximum number of threads of each model call (default is the library default,
+            which is every core for CatBoost).
+        """
+        if backend not in VALID_BACKENDS:
+            raise ValueError(
+                f"Expected 'backend' to be one of {VALID_BACKENDS}, but found '{backend}'."
+            )
+
+        self.backend = backend
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 4 * self.max_workers
+        self.model_dir = model_dir
+        self.start_method = start_method
+        self.predict_threads = predict_threads
+        self._pool: Optional[Executor] = None
+        # Guards the pool, which the model watcher thread can replace (see preload()) while the
+        # event loop submits calls to it
+        self._pool_lock = threading.Lock()
+        self._pending = 0
+        self._rejected = 0
+        self._completed = 0
+        self._failed = 0
+
+    @property
+    def pending(self) -> int:
+        """
+        Returns the number of calls currently queued or running.
+        """
+        return self._pending
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Returns the executor settings and counters.
+
+        Returns
+        -------
+        Dict[str, Any]
+            The backend, pool size, backpressure limit, and the number of pending, completed,
+            failed (raised an error) and rejected calls.
+        """
+        return {
+            "backend": self.backend,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "predict_threads": self.predict_threads,
+            "pending": self._pending,
+            "completed": self._completed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+        }
+
+    def preload(self, models: Dict[str, PredictionModel]):
+        """
+        Makes models available to ``process`` workers without loading them in each worker. The
+        current pool (if any) is shut down once its pending calls complete, and new workers are
+        started on next use, so this can also be used to publish updated models. Has no effect on
+        the ``thread`` backend, which always uses the models it is given.
+
+        Parameters
+        ----------
+        models : Dict[str, PredictionModel]
+            The models to share with the workers, keyed by model ID.
+        """
+        if self.backend != "process":
+            return
+
+        with self._pool_lock:
+            _WORKER_MODELS.clear()
+            _WORKER_MODELS.update(models)
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    async def predict(self, model: PredictionModel, X: pd.DataFrame) -> np.ndarray:
+        """
+        Scores a batch with the given model in the worker pool.
+
+        Parameters
+        ----------
+        model : PredictionModel
+            The model to score with. The ``process`` backend only uses its ``model_id``, and scores
+            with the worker's copy of the model.
+        X : pd.DataFrame
+            The batch features.
+
+        Returns
+        -------
+        np.ndarray
+            The predictions.
+
+        Raises
+        ------
+        ExecutorSaturatedError
+            If ``max_pending`` calls are already queued or running.
+        """
+        if self._pending >= self.max_pending:
+            self._rejected += 1
+            raise ExecutorSaturatedError(
+                f"Inference executor is saturated ({self._pending} pending calls)."
+            )
+
+        loop = asyncio.get_running_loop()
+        if self.backend == "thread":
+            # Copy the context, so context variables set by the caller are visible to the model
+            params = predict_thread_params(model, self.predict_threads)
+            call = partial(contextvars.copy_context().run, partial(model.predict, X=X, **params))
+        else:
+            call = partial(_predict_in_worker, model.model_id, X, self.predict_threads)
+
+        self._pending += 1
+        try:
+            with self._pool_lock:
+                future = self._get_pool().submit(call)
+            predictions = await asyncio.wrap_future(future, loop=loop)
+        except BaseException:
+            self._failed += 1
+            raise
+        finally:
+            self._pending -= 1
+
+        self._completed += 1
+        return predictions
+
+    def shutdown(self, wait: bool = True):
+        """
+        Shuts down the worker pool. A new pool is created on next use.
+
+        Parameters
+        ----------
+        wait : bool, optional
+            Whether to wait for pending calls to complete (default is True).
+        """
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            LOG.info("Starting %s inference pool with %d workers", self.backend, self.max_workers)
+            if self.backend == "thread":
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="inference"
+                )
+            else:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_init_worker,
+                    initargs=(self.model_dir,),
+                )
+
+        return self._pool
+
+
+async def warm_up_models(
+    database: Database,
+    executor: InferenceExecutor,
+    batch_sizes: Sequence[int],
+    make_batch: Callable[[int], pd.DataFrame],
+    state: Dict[str, Any],
+) -> Dict[str, Any]:
+    """
+    Warms up every model of a database by scoring synthetic batches of each size with the model
+    in an executor, so that the first real requests do not pay for the lazy allocations and
+    first-call overheads of the model libraries. The stage durations of the batches are not
+    recorded in the metrics. A model that fails to warm up is logged and skipped.
+
+    Parameters
+    ----------
+    database : Database
+        The database of the models.
+    executor : InferenceExecutor
+        The executor the batches are scored in.
+    batch_sizes : Sequence[int]
+        The number of requests of each synthetic batch, scored in this order.
+    make_batch : Callable[[int], pd.DataFrame]
+        Returns the features of a synthetic batch of the given size.
+    state : Dict[str, Any]
+        The warm-up state, updated in place as the models are warmed up: ``state`` (``warming``,
+        then ``ready``), ``batch_sizes``, the timings or error of each model (``models``), and the
+        total duration (``duration_ms``).
+
+    Returns
+    -------
+    Dict[str, Any]
+        The warm-up state, with the time taken by each batch of each model, in milliseconds.
+    """
+    state.update(state="warming", batch_sizes=list(batch_sizes), models={}, duration_ms=None)
+    start = time.perf_counter()
+    with metrics.suppressed():
+        for model_id in database.list_models():
+            timings = {}
+            try:
+                # Lazily loaded models are loaded here, off the event loop
+                model = await asyncio.to_thread(database.get_model, model_id)
+                if model is None:
+                    raise LookupError(f"Model with ID '{model_id}' not found.")
+                for batch_size in batch_sizes:
+                    X = make_batch(batch_size)
+                    batch_start = time.perf_counter()
+                    await executor.predict(model, X)
+                    timings[str(batch_size)] = (time.perf_counter() - batch_start) * 1e3
+            except Exception as e:  # pylint: disable=broad-except
+                LOG.exception("Failed to warm up model '%s'", model_id)
+                state["models"][model_id] = {"error": str(e)}
+                continue
+
+            state["models"][model_id] = {"batch_ms": timings}
+            LOG.info(
+                "Warmed up model '%s' in %s",
+                model_id,
+                ", ".join(f"{ms:.1f} ms ({size} rows)" for size, ms in timings.items()),
+            )
+
+    state.update(state="ready", duration_ms=(time.perf_counter() - start) * 1e3)
+    LOG.info("Warm-up completed in %.1f ms", state["duration_ms"])
+
+    return state
@@ -0,0 +1,395 @@
+"""
+Precomputed ("materialized") sales forecasts.
+
+A forecast table holds the predictions of one model for every (store, item, day) of a grid of
+stores, items and consecutive days, in a ``(n_stores, n_items, horizon)`` NumPy array. Tables are
+saved as a ``<model_id>.forecasts`` directory holding the array (``forecasts.npy``) and its
+``metadata.json``, and are memory-mapped when opened, so a lookup only reads the pages it needs and
+all the processes serving a table share one copy of it. The metadata records the version of the
+model the table was computed with, so a table is not served once its model has been saved again.
+"""
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Tuple
+from datetime import datetime, timezone
+from pathlib import Path
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from usf_model_api import metrics
+from usf_model_api.utils import get_logger
+
+
+LOG = get_logger(__name__)
+
+TABLE_FORMAT_VERSION = 1
+TABLE_SUFFIX = ".forecasts"
+FORECASTS_FILE = "forecasts.npy"
+METADATA_FILE = "metadata.json"
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+
+def _dense_index(ids: np.ndarray) -> np.ndarray:
+    # Maps each ID to its position along an axis of the table (-1 if absent)
+    index = np.full(int(ids.max()) + 1, -1, dtype=np.int64)
+    index[ids] = np.arange(len(ids))
+    return index
+
+
+def _positions(index: np.ndarray, values: np.ndarray) -> np.ndarray:
+    values = np.asarray(values, dtype=np.int64)
+    positions = np.full(len(values), -1, dtype=np.int64)
+    valid = (values >= 0) & (values < len(index))
+    positions[valid] = index[values[valid]]
+    return positions
+
+
+class ForecastTable:
+    """
+    The precomputed predictions of one model over a grid of stores, items and days.
+
+    Attributes
+    ----------
+    model_id : str
+        The ID of the model that computed the predictions.
+    model_version : Optional[int]
+        The version of the model that computed the predictions (see
+        ``usf_model_api.models.artifacts.model_version()``), if known.
+    start_date : str
+        The first day of the grid, as ``YYYY-MM-DD``.
+    stores : np.ndarray
+        The store IDs of the grid.
+    items : np.ndarray
+        The item IDs of the grid.
+    forecasts : np.ndarray
+        The predictions, indexed by (store position, item position, day offset).
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        forecasts: np.ndarray,
+        start_date: str,
+        stores: Sequence[int],
+        items: Sequence[int],
+        model_version: Optional[int] = None,
+    ):
+        """
+        Initializes the ForecastTable.
+
+        Parameters
+        ----------
+        model_id : str
+            The ID of the model that computed the predictions.
+        forecasts : np.ndarray
+            The predictions, of shape ``(len(stores), len(items), horizon)``.
+        start_date : str
+            The first day of the grid, as ``YYYY-MM-DD``.
+        stores : Sequence[int]
+            The (non-negative) store IDs of the grid.
+        items : Sequence[int]
+            The (non-negative) item IDs of the grid.
+        model_version : Optional[int]
+            The version of the model that computed the predictions, if known.
+        """
+        self.model_id = model_id
+        self.model_version = model_version
+        self.forecasts = forecasts
+        self.start_date = start_date
+        self.stores = np.asarray(stores, dtype=np.int64)
+        self.items = np.asarray(items, dtype=np.int64)
+        if forecasts.shape[:2] != (len(self.stores), len(self.items)):
+            raise ValueError(
+                f"Expected forecasts of shape ({len(self.stores)}, {len(self.items)}, horizon), "
+                f"but found {forecasts.shape}."
+            )
+
+        self._start_day = np.datetime64(start_date, "D").astype(np.int64)
+        self._store_index = _dense_index(self.stores)
+        self._item_index = _dense_index(self.items)
+
+    @property
+    def horizon(self) -> int:
+        """
+        Returns the number of days of the grid.
+        """
+        return self.forecasts.shape[2]
+
+    def __len__(self) -> int:
+        return self.forecasts.size
+
+    @classmethod
+    def open(cls, dir_path: str | Path) -> "ForecastTable":
+        """
+        Opens a saved forecast table, memory-mapped read-only.
+
+        Parameters
+        ----------
+        dir_path : str | Path
+            The table directory.
+
+        Returns
+        -------
+        ForecastTable
+            The table.
+        """
+        dir_path = Path(dir_path)
+        with open(dir_path / METADATA_FILE, encoding="utf-8") as f:
+            metadata = json.load(f)
+
+        version = metadata.get("format_version")
+        if version != TABLE_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported forecast table format version {version} in '{dir_path}' "
+                f"(expected {TABLE_FORMAT_VERSION})."
+            )
+
+        return cls(
+            model_id=metadata["model_id"],
+            forecasts=np.load(dir_path / FORECASTS_FILE, mmap_mode="r"),
+            start_date=metadata["start_date"],
+            stores=metadata["stores"],
+            items=metadata["items"],
+            model_version=metadata.get("model_version"),
+        )
+
+    def lookup(
+        self, dates: Sequence[str], stores: Sequence[int], items: Sequence[int]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Looks up the predictions of a batch of (date, store, item) keys. Keys with a date that is
+        not ``YYYY-MM-DD`` are treated as missing.
+
+        Parameters
+        ----------
+        dates : Sequence[str]
+            The dates, as ``YYYY-MM-DD`` strings (or ``datetime64`` values).
+        stores : Sequence[int]
+            The store IDs.
+        items : Sequence[int]
+            The item IDs.
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray]
+            The predictions (NaN where missing), and a boolean mask of the keys inside the grid.
+        """
+        parsed = pd.to_datetime(np.asarray(dates), format="%Y-%m-%d", errors="coerce")
+        offsets = parsed.to_numpy(dtype="datetime64[D]").view(np.int64) - self._start_day
+        store_positions = _positions(self._store_index, stores)
+        item_positions = _positions(self._item_index, items)
+        found = (
+            ~parsed.isna()
+            & (offsets >= 0)
+            & (offsets < self.horizon)
+            & (store_positions >= 0)
+            & (item_positions >= 0)
+        )
+
+        predictions = np.full(len(found), np.nan)
+        predictions[found] = self.forecasts[
+            store_positions[found], item_positions[found], offsets[found]
+        ]
+        return predictions, found
+
+    async def predict(
+        self, X: pd.DataFrame, score: Callable[[pd.DataFrame], Awaitable[np.ndarray]]
+    ) -> np.ndarray:
+        """
+        Returns the predictions of a batch of requests: those inside the grid are looked up in the
+        table, and only the others are scored.
+
+        Parameters
+        ----------
+        X : pd.DataFrame
+            The features of the requests, with ``date``, ``store`` and ``item`` columns.
+        score : Callable[[pd.DataFrame], Awaitable[np.ndarray]]
+            Scores the features of the requests outside of the grid.
+
+        Returns
+        -------
+        np.ndarray
+            The predictions, in the order of ``X``.
+        """
+        with metrics.timed("table_lookup", model_id=self.model_id, rows=len(X)):
+            predictions, found = self.lookup(
+                X["date"].to_numpy(), X["store"].to_numpy(), X["item"].to_numpy()
+            )
+        if not found.all():
+            missed = np.flatnonzero(~found)
+            predictions[missed] = await score(X.take(missed))
+
+        return predictions
+
+    def metadata(self) -> Dict[str, Any]:
+        """
+        Returns a description of the table.
+
+        Returns
+        -------
+        Dict[str, Any]
+            The model ID and version, grid bounds and size of the table.
+        """
+        return {
+            "model_id": self.model_id,
+            "model_version": self.model_version,
+            "start_date": self.start_date,
+            "horizon": self.horizon,
+            "stores": len(self.stores),
+            "items": len(self.items),
+            "entries": len(self),
+        }
+
+
+def write_forecast_table(
+    model: Any,
+    dir_path: str | Path,
+    start_date: str,
+    horizon: int,
+    stores: Sequence[int],
+    items: Sequence[int],
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    model_version: Optional[int] = None,
+    model_id: Optional[str] = None,
+) -> ForecastTable:
+    """
+    Scores every (store, item, day) of a grid with a model, and saves the predictions as a forecast
+    table. The grid is scored in chunks of whole days of about ``chunk_rows`` rows, and written
+    straight to a memory-mapped file, so memory use is bounded by the chunk size. The table is
+    written next to ``dir_path`` first, and then moved into place.
+
+    Parameters
+    ----------
+    model : PredictionModel
+        The model, which is given ``date``, ``item`` and ``store`` columns to predict from.
+    dir_path : str | Path
+        The table directory, conventionally ``<model_id>.forecasts``. An existing table is
+        replaced.
+    start_date : str
+        The first day of the grid, as ``YYYY-MM-DD``.
+    horizon : int
+        The number of days of the grid.
+    stores : Sequence[int]
+        The store IDs of the grid.
+    items : Sequence[int]
+        The item IDs of the grid.
+    chunk_rows : int, optional
+        The approximate number of rows scored at once (default is 1,000,000).
+    model_version : Optional[int]
+        The version of the saved model (see ``usf_model_api.models.artifacts.model_version()``),
+        recorded so that the table is not served by a later version of the model.
+    model_id : Optional[str]
+        The ID the model is served under, i.e. the name of its file in the model registry (default
+        is the ``model_id`` of the model).
+
+    Returns
+    -------
+    ForecastTable
+        The saved table, memory-mapped.
+    """
+    dir_path = Path(dir_path)
+    model_id = model_id or model.model_id
+    stores = np.asarray(stores, dtype=np.int64)
+    items = np.asarray(items, dtype=np.int64)
+    dates = pd.date_range(start_date, periods=horizon, freq="D").strftime("%Y-%m-%d").to_numpy()
+
+    tmp_path = dir_path.with_name(f".{dir_path.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+
+    forecasts = np.lib.format.open_memmap(
+        tmp_path / FORECASTS_FILE,
+        mode="w+",
+        dtype=np.float64,
+        shape=(len(stores), len(items), horizon),
+    )
+    days_per_chunk = max(1, chunk_rows // (len(stores) * len(items)))
+    for start in range(0, horizon, days_per_chunk):
+        end = min(start + days_per_chunk, horizon)
+        grid_stores, grid_items, grid_dates = np.meshgrid(
+            stores, items, dates[start:end], indexing="ij"
+        )
+        X = pd.DataFrame(
+            {"date": grid_dates.ravel(), "item": grid_items.ravel(), "store": grid_stores.ravel()}
+        )
+        predictions = np.asarray(model.predict(X), dtype=np.float64)
+        forecasts[:, :, start:end] = predictions.reshape(len(stores), len(items), end - start)
+        LOG.info("Scored days %d-%d of %d for model '%s'", start, end - 1, horizon, model_id)
+
+    forecasts.flush()
+    del forecasts
+
+    metadata = {
+        "format_version": TABLE_FORMAT_VERSION,
+        "model_id": model_id,
+        "model_version": model_version,
+        "start_date": str(np.datetime64(start_date, "D")),
+        "horizon": horizon,
+        "stores": stores.tolist(),
+        "items": items.tolist(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    with open(tmp_path / METADATA_FILE, "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+
+    old_path = dir_path.with_name(f".{dir_path.name}.old-{os.getpid()}")
+    if dir_path.exists():
+        os.replace(dir_path, old_path)
+    os.replace(tmp_path, dir_path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+    return ForecastTable.open(dir_path)
+
+
+def load_forecast_tables(
+    dir_path: Optional[str | Path],
+    model_version: Optional[Callable[[str], Optional[int]]] = None,
+) -> Dict[str, ForecastTable]:
+    """
+    Opens every forecast table of a directory.
+
+    Parameters
+    ----------
+    dir_path : Optional[str | Path]
+        The directory holding the ``<model_id>.forecasts`` tables. If None, no table is opened.
+    model_version : Optional[Callable[[str], Optional[int]]]
+        Returns the version of the model currently served under a model ID. If given, a table
+        computed with another version of its model (or with an unrecorded version) is skipped.
+
+    Returns
+    -------
+    Dict[str, ForecastTable]
+        The tables, keyed by model ID: the name of the table directory, which is also the name of
+        the model file in the model registry.
+    """
+    tables = {}
+    if dir_path is None:
+        return tables
+
+    for table_path in sorted(Path(dir_path).glob(f"*{TABLE_SUFFIX}")):
+        try:
+            table = ForecastTable.open(table_path)
+        except (OSError, ValueError, KeyError):
+            LOG.exception("Failed to open forecast table '%s'", table_path)
+            continue
+
+        model_id = table_path.name[: -len(TABLE_SUFFIX)]
+        if model_version is not None:
+            expected = model_version(model_id)
+            if expected is None or table.model_version != expected:
+                LOG.warning(
+                    "Skipped forecast table '%s': it was computed with version %s of model '%s', "
+                    "but version %s is served",
+                    table_path,
+                    table.model_version,
+                    model_id,
+                    expected,
+                )
+                continue
+
+        LOG.info("Opened forecast table '%s': %s", table_path, table.metadata())
+        tables[model_id] = table
+
+    return tables
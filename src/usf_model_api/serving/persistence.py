@@ -0,0 +1,589 @@
+"""
+Write-behind persistence of scored predictions.
+
+Predictions are written to a sink: the in-memory ``PredictionStore`` (``memory``), the predictions
+table of a SQLite database (``sqlite``), or numbered Parquet segment files in a directory
+(``parquet``).
+
+By default, the service writes each scored batch to its sink before responding. With a
+``WriteBehindWriter``, a request only enqueues its scored rows. A background thread drains the
+queue in batches of up to ``max_batch_rows`` rows, at least every ``flush_interval_ms``
+milliseconds. The cost of storage is then off the critical path of requests, and spread over many
+of them.
+Two durability modes are supported:
+ * ``fire_and_forget``: the request responds as soon as its rows are queued. Queued rows are lost if
+   the process dies before they are written.
+ * ``ack``: the request responds once the batch holding its rows has been written.
+
+The queue holds at most ``max_queue_rows`` rows; to apply backpressure, further writes fail with
+``PersistenceSaturatedError`` until it drains. ``close()`` writes the queued rows before stopping.
+
+Written predictions can be looked up and queried through the sink, as through a ``PredictionStore``:
+through the indexes of the store (``memory``) or table (``sqlite``), or by scanning the segments
+(``parquet``).
+"""
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from usf_model_api.serving.database import ConnectionPool, SQLPredictionStore
+from usf_model_api.serving.storage import ID_COLUMN, PredictionStore
+from usf_model_api.utils import get_logger
+
+
+LOG = get_logger(__name__)
+
+# Sink types, and write modes (``sync`` writes before responding, without a WriteBehindWriter)
+VALID_SINKS = {"memory", "sqlite", "parquet"}
+VALID_WRITE_MODES = {"sync", "fire_and_forget", "ack"}
+DURABILITY_MODES = {"fire_and_forget", "ack"}
+
+DEFAULT_MAX_QUEUE_ROWS = 1_000_000
+DEFAULT_MAX_BATCH_ROWS = 10_000
+DEFAULT_FLUSH_INTERVAL_MS = 100.0
+SEGMENT_FILE = "predictions-{:06d}.parquet"
+
+
+class PersistenceSaturatedError(RuntimeError):
+    """
+    Raised when a ``WriteBehindWriter`` already has ``max_queue_rows`` rows queued.
+    """
+
+
+class PredictionSink:
+    """
+    Base class of the destinations predictions are written to. Sinks are written to by one thread
+    at a time.
+    """
+
+    def write(self, predictions_df: pd.DataFrame):
+        """
+        Writes a frame of predictions.
+
+        Parameters
+        ----------
+        predictions_df : pd.DataFrame
+            The predictions. It must not be mutated afterwards.
+
+        Raises
+        ------
+        NotImplementedError
+            If the method is not implemented by a subclass.
+        """
+        raise NotImplementedError("write() is not implemented.")
+
+    def read(self) -> pd.DataFrame:
+        """
+        Reads back every prediction written so far.
+
+        Raises
+        ------
+        NotImplementedError
+            If the method is not implemented by a subclass.
+        """
+        raise NotImplementedError("read() is not implemented.")
+
+    def lookup(self, prediction_ids: Iterable[str]) -> pd.DataFrame:
+        """
+        Looks up written predictions by ID, as ``PredictionStore.lookup()``.
+
+        Parameters
+        ----------
+        prediction_ids : Iterable[str]
+            The prediction IDs.
+
+        Raises
+        ------
+        NotImplementedError
+            If the method is not implemented by a subclass.
+        """
+        raise NotImplementedError("lookup() is not implemented.")
+
+    def query(
+        self,
+        filters: Optional[Dict[str, Tuple[Any, Any]]] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[int] = None,
+    ) -> Tuple[pd.DataFrame, Optional[int]]:
+        """
+        Queries the written predictions by ranges of the indexed columns, as
+        ``PredictionStore.query()``.
+
+        Parameters
+        ----------
+        filters : Optional[Dict[str, Tuple[Any, Any]]]
+            The inclusive ``(low, high)`` bounds of each filtered column.
+        limit : Optional[int]
+            The maximum number of rows returned (default is no limit).
+        cursor : Optional[int]
+            The cursor of the page to return (default is the first page).
+
+        Raises
+        ------
+        NotImplementedError
+            If the method is not implemented by a subclass.
+        """
+        raise NotImplementedError("query() is not implemented.")
+
+    def close(self):
+        """
+        Releases the resources of the sink.
+        """
+
+
+class MemorySink(PredictionSink):
+    """
+    Writes predictions to a ``PredictionStore``.
+
+    Attributes
+    ----------
+    store : PredictionStore
+        The store.
+    """
+
+    def __init__(self, store: PredictionStore):
+        self.store = store
+
+    def write(self, predictions_df: pd.DataFrame):
+        self.store.append(predictions_df)
+
+    def read(self) -> pd.DataFrame:
+        return self.store.frame
+
+    def lookup(self, prediction_ids: Iterable[str]) -> pd.DataFrame:
+        return self.store.lookup(prediction_ids)
+
+    def query(
+        self,
+        filters: Optional[Dict[str, Tuple[Any, Any]]] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[int] = None,
+    ) -> Tuple[pd.DataFrame, Optional[int]]:
+        return self.store.query(filters, limit=limit, cursor=cursor)
+
+
+class SQLiteSink(MemorySink):
+    """
+    Appends predictions to the ``predictions`` table of a SQLite database, through a
+    ``SQLPredictionStore``: the table has the same schema and indexes as with the ``sqlite`` database
+    backend, which may share the database file. Connections are opened on demand by each process, so
+    the sink can be created before the worker processes are forked.
+
+    Attributes
+    ----------
+    path : Path
+        The database file.
+    pool : ConnectionPool
+        The pool of connections to the database.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.pool = ConnectionPool(self.path)
+        super().__init__(SQLPredictionStore(self.pool))
+
+    def close(self):
+        self.pool.close()
+
+
+class ParquetSink(PredictionSink):
+    """
+    Writes each frame of predictions to a new Parquet segment file, ``predictions-<n>.parquet``, in
+    a directory. Numbering continues after the segments already in the directory. Several processes
+    (e.g. the workers of the service) can write to the same directory: a segment number is claimed
+    by atomically linking the written file to its name, which fails if another process claimed it.
+
+    Attributes
+    ----------
+    dir_path : Path
+        The directory of the segments.
+    """
+
+    def __init__(self, dir_path: str | Path):
+        self.dir_path = Path(dir_path)
+        self.dir_path.mkdir(parents=True, exist_ok=True)
+        self._next_segment = len(self.segments)
+
+    @property
+    def segments(self) -> List[Path]:
+        """
+        Returns the paths of the segment files, oldest first.
+        """
+        return sorted(self.dir_path.glob(SEGMENT_FILE.replace("{:06d}", "*")))
+
+    def write(self, predictions_df: pd.DataFrame):
+        # Written next to the segments first, so readers never see a partially written segment
+        tmp_path = self.dir_path / f".predictions.tmp-{os.getpid()}-{threading.get_ident()}"
+        predictions_df.to_parquet(tmp_path, index=False)
+        try:
+            while True:
+                segment = self.dir_path / SEGMENT_FILE.format(self._next_segment)
+                try:
+                    os.link(tmp_path, segment)
+                    break
+                except FileExistsError:
+                    # Claimed by another writer; skip past the segments written since
+                    self._next_segment = max(self._next_segment + 1, len(self.segments))
+        finally:
+            tmp_path.unlink()
+
+        self._next_segment += 1
+
+    def read(self) -> pd.DataFrame:
+        segments = self.segments
+        if not segments:
+            return pd.DataFrame()
+
+        return pd.concat([pd.read_parquet(s) for s in segments], axis=0, ignore_index=True)
+
+    def lookup(self, prediction_ids: Iterable[str]) -> pd.DataFrame:
+        """
+        Looks up predictions by ID, as ``PredictionStore.lookup()``, by scanning every segment.
+        """
+        prediction_ids = list(prediction_ids)
+        if not prediction_ids:
+            return pd.DataFrame()
+
+        filters = [(ID_COLUMN, "in", prediction_ids)]
+        found = [pd.read_parquet(s, filters=filters) for s in self.segments]
+        found = pd.concat(found, axis=0, ignore_index=True) if found else pd.DataFrame()
+        if found.empty:
+            return found
+
+        found = found.drop_duplicates(ID_COLUMN).set_index(ID_COLUMN, drop=False)
+        ids = [i for i in prediction_ids if i in found.index]
+        return found.loc[ids].reset_index(drop=True)
+
+    def query(
+        self,
+        filters: Optional[Dict[str, Tuple[Any, Any]]] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[int] = None,
+    ) -> Tuple[pd.DataFrame, Optional[int]]:
+        """
+        Queries the predictions, as ``PredictionStore.query()``, by scanning the segments in order,
+        from the one holding the cursor until the page is full. Cursors count the rows of every
+        segment.
+        """
+        cursor = cursor or 0
+        pages, num_found, start = [], 0, 0
+        for segment in self.segments:
+            end = start + pq.ParquetFile(segment).metadata.num_rows
+            if end > cursor:
+                store = PredictionStore()
+                store.append(pd.read_parquet(segment))
+                remaining = None if limit is None else limit - num_found
+                found, next_cursor = store.query(
+                    filters, limit=remaining, cursor=max(cursor - start, 0)
+                )
+                pages.append(found)
+                num_found += len(found)
+                if next_cursor is not None:
+                    return pd.concat(pages, axis=0, ignore_index=True), start + next_cursor
+            start = end
+
+        if not pages:
+            return pd.DataFrame(), None
+
+        return pd.concat(pages, axis=0, ignore_index=True), None
+
+
+def make_sink(
+    kind: str, path: Optional[str | Path] = None, store: Optional[PredictionStore] = None
+) -> PredictionSink:
+    """
+    Returns a prediction sink of the given type.
+
+    Parameters
+    ----------
+    kind : str
+        The sink type, one of ``memory``, ``sqlite`` or ``parquet``.
+    path : Optional[str | Path]
+        The database file (``sqlite``) or segment directory (``parquet``).
+    store : Optional[PredictionStore]
+        The store of a ``memory`` sink (default is a new, unbounded store).
+
+    Returns
+    -------
+    PredictionSink
+        The sink.
+
+    Raises
+    ------
+    ValueError
+        If the sink type is not valid, or a file-based sink has no path.
+    """
+    if kind not in VALID_SINKS:
+        raise ValueError(f"Expected 'kind' to be one of {VALID_SINKS}, but found '{kind}'.")
+    if kind == "memory":
+        return MemorySink(store if store is not None else PredictionStore())
+    if path is None:
+        raise ValueError(f"Expected a path for the '{kind}' prediction sink.")
+
+    return SQLiteSink(path) if kind == "sqlite" else ParquetSink(path)
+
+
+class WriteBehindWriter:
+    """
+    Writes predictions to a sink in the background, in batches.
+
+    Frames are queued by ``submit()``, which returns a future completed (with the number of rows of
+    the frame) once the frame is written. A background thread writes the queued frames as soon as
+    they add up to ``max_batch_rows`` rows, or ``flush_interval_ms`` milliseconds after the oldest
+    of them was queued, whichever happens first.
+
+    Attributes
+    ----------
+    sink : PredictionSink
+        The sink written to.
+    durability : str
+        ``fire_and_forget`` or ``ack``; whether callers should wait for their future. The writer
+        itself behaves the same in both modes.
+    max_queue_rows : int
+        The maximum number of rows queued at once.
+    max_batch_rows : int
+        The number of rows that triggers a write.
+    flush_interval_ms : float
+        The maximum time (in milliseconds) a frame is queued before a write is started.
+    """
+
+    def __init__(
+        self,
+        sink: PredictionSink,
+        durability: str = "fire_and_forget",
+        max_queue_rows: int = DEFAULT_MAX_QUEUE_ROWS,
+        max_batch_rows: int = DEFAULT_MAX_BATCH_ROWS,
+        flush_interval_ms: float = DEFAULT_FLUSH_INTERVAL_MS,
+    ):
+        """
+        Initializes the WriteBehindWriter, and starts its background thread.
+
+        Parameters
+        ----------
+        sink : PredictionSink
+            The sink to write to.
+        durability : str, optional
+            ``fire_and_forget`` (the default) or ``ack``.
+        max_queue_rows : int, optional
+            The maximum number of rows queued at once (default is ``DEFAULT_MAX_QUEUE_ROWS``). A
+            single larger frame is accepted when the queue is empty.
+        max_batch_rows : int, optional
+            The number of rows that triggers a write (default is ``DEFAULT_MAX_BATCH_ROWS``).
+        flush_interval_ms : float, optional
+            The maximum time (in milliseconds) a frame is queued before a write is started (default
+            is ``DEFAULT_FLUSH_INTERVAL_MS``).
+        """
+        if durability not in DURABILITY_MODES:
+            raise ValueError(
+                f"Expected 'durability' to be one of {DURABILITY_MODES}, but found '{durability}'."
+            )
+        if max_queue_rows < 1 or max_batch_rows < 1:
+            raise ValueError(
+                "Expected 'max_queue_rows' and 'max_batch_rows' to be positive, but found "
+                f"{max_queue_rows} and {max_batch_rows}."
+            )
+
+        self.sink = sink
+        self.durability = durability
+        self.max_queue_rows = max_queue_rows
+        self.max_batch_rows = max_batch_rows
+        self.flush_interval_ms = flush_interval_ms
+        self._queue: Deque[Tuple[pd.DataFrame, Future, float]] = deque()
+        self._queued_rows = 0
+        self._writing_rows = 0
+        self._flush_waiters = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._counters = {
+            "written_rows": 0,
+            "writes": 0,
+            "failed_writes": 0,
+            "failed_rows": 0,
+            "rejected_rows": 0,
+            "last_write_ms": 0.0,
+            "last_write_lag_s": 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, name="prediction-writer", daemon=True)
+        self._thread.start()
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Returns the writer settings, queue state and counters.
+
+        Returns
+        -------
+        Dict[str, Any]
+            The durability mode and limits; the number of queued frames and rows, and the age of
+            the oldest queued frame (``lag_s``); the number of rows and writes completed, failed
+            and rejected; and the duration and lag (age of its oldest frame) of the last write.
+        """
+        with self._cond:
+            lag = time.monotonic() - self._queue[0][2] if self._queue else 0.0
+            return {
+                "durability": self.durability,
+                "max_queue_rows": self.max_queue_rows,
+                "max_batch_rows": self.max_batch_rows,
+                "flush_interval_ms": self.flush_interval_ms,
+                "queued_frames": len(self._queue),
+                "queued_rows": self._queued_rows,
+                "lag_s": lag,
+                **self._counters,
+            }
+
+    def submit(self, predictions_df: pd.DataFrame) -> Future:
+        """
+        Queues a frame of predictions to be written.
+
+        Parameters
+        ----------
+        predictions_df : pd.DataFrame
+            The predictions. It must not be mutated afterwards.
+
+        Returns
+        -------
+        Future
+            Completed with the number of rows of the frame once it is written, or with the error of
+            the failed write.
+
+        Raises
+        ------
+        PersistenceSaturatedError
+            If the queue is full.
+        RuntimeError
+            If the writer is closed.
+        """
+        future: Future = Future()
+        rows = len(predictions_df)
+        if rows == 0:
+            future.set_result(0)
+            return future
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("The prediction writer is closed.")
+            if self._queue and self._queued_rows + rows > self.max_queue_rows:
+                self._counters["rejected_rows"] += rows
+                raise PersistenceSaturatedError(
+                    f"Expected at most {self.max_queue_rows} queued prediction rows, but "
+                    f"{self._queued_rows} are queued already."
+                )
+
+            self._queue.append((predictions_df, future, time.monotonic()))
+            self._queued_rows += rows
+            self._cond.notify_all()
+
+        return future
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Writes the queued frames now, and waits until they are written.
+
+        Parameters
+        ----------
+        timeout : Optional[float]
+            The maximum time to wait, in seconds (default is no limit).
+
+        Returns
+        -------
+        bool
+            Whether the queue was drained before the timeout.
+        """
+        with self._cond:
+            self._flush_waiters += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(
+                    lambda: not self._queue and not self._writing_rows, timeout=timeout
+                )
+            finally:
+                self._flush_waiters -= 1
+
+    def close(self, timeout: Optional[float] = None):
+        """
+        Writes the queued frames, and stops the background thread. The sink is left open.
+
+        Parameters
+        ----------
+        timeout : Optional[float]
+            The maximum time to wait for the queued frames to be written, in seconds (default is no
+            limit).
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            LOG.warning("Closed the prediction writer with %d rows still queued", self._queued_rows)
+
+    def _next_batch(self) -> List[Tuple[pd.DataFrame, Future, float]]:
+        # Waits for a full batch, the flush interval of the oldest frame, a flush or close
+        with self._cond:
+            while not self._queue:
+                if self._closed:
+                    return []
+                self._cond.wait()
+
+            deadline = self._queue[0][2] + self.flush_interval_ms / 1e3
+            while (
+                self._queued_rows < self.max_batch_rows
+                and not self._closed
+                and not self._flush_waiters
+            ):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            # At least one frame, however large
+            batch = [self._queue.popleft()]
+            rows = len(batch[0][0])
+            while self._queue and rows + len(self._queue[0][0]) <= self.max_batch_rows:
+                batch.append(self._queue.popleft())
+                rows += len(batch[-1][0])
+            self._queued_rows -= rows
+            self._writing_rows = rows
+
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+
+            self._write(batch)
+            with self._cond:
+                self._writing_rows = 0
+                self._cond.notify_all()
+
+    def _write(self, batch: List[Tuple[pd.DataFrame, Future, float]]):
+        frames = [frame for frame, _, _ in batch]
+        rows = sum(len(frame) for frame in frames)
+        start = time.perf_counter()
+        try:
+            self.sink.write(
+                frames[0] if len(frames) == 1 else pd.concat(frames, axis=0, ignore_index=True)
+            )
+        except Exception as e:  # pylint: disable=broad-except
+            LOG.exception("Failed to write %d predictions", rows)
+            with self._cond:
+                self._counters["failed_writes"] += 1
+                self._counters["failed_rows"] += rows
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        with self._cond:
+            self._counters["written_rows"] += rows
+            self._counters["writes"] += 1
+            self._counters["last_write_ms"] = (time.perf_counter() - start) * 1e3
+            self._counters["last_write_lag_s"] = time.monotonic() - batch[0][2]
+        for frame, future, _ in batch:
+            future.set_result(len(frame))
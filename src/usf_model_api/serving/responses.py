@@ -0,0 +1,76 @@
+from typing import Any, List
+from datetime import date, datetime
+
+import numpy as np
+import orjson
+import pandas as pd
+
+
+PREDICTION_ORIENTS = ("records", "columns")
+
+# The NumPy dtypes orjson serializes natively (OPT_SERIALIZE_NUMPY)
+_NUMPY_DTYPES = frozenset(
+    np.dtype(t)
+    for t in ("float64", "float32", "int64", "int32", "int8", "uint64", "uint32", "uint8", "bool")
+)
+
+
+def _default(value: Any) -> Any:
+    # Called by orjson for values it does not serialize natively
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def _column_values(column: pd.Series) -> np.ndarray | List[Any]:
+    values = column.to_numpy()
+    if values.dtype in _NUMPY_DTYPES:
+        return np.ascontiguousarray(values)
+    return values.tolist()
+
+
+def encode_predictions(scored_df: pd.DataFrame, orient: str = "records", **fields: Any) -> bytes:
+    """
+    Encodes scored requests as a JSON object, straight from the columns of the frame. This is
+    equivalent to ``json.dumps({**fields, "predictions": scored_df.to_dict(orient=...)})``, but
+    several times faster for large batches: with the ``records`` orient, the rows are built from
+    native Python column values (rather than through ``DataFrame.to_dict()``), and with the
+    ``columns`` orient, numeric columns are encoded directly from their NumPy buffers. Floats are
+    encoded in their shortest round-trip representation, as by ``json.dumps()``.
+
+    Parameters
+    ----------
+    scored_df : pd.DataFrame
+        The scored requests.
+    orient : str, optional
+        The shape of the predictions: ``records`` (default) for one object per prediction, or
+        ``columns`` for one array per column, e.g. ``{"prediction_id": [...], "prediction": [...]}``.
+    **fields : Any
+        Other members of the encoded object, placed before ``predictions``.
+
+    Returns
+    -------
+    bytes
+        The UTF-8 encoded JSON object.
+
+    Raises
+    ------
+    ValueError
+        If ``orient`` is not one of ``PREDICTION_ORIENTS``.
+    """
+    if orient == "records":
+        columns = [str(c) for c in scored_df.columns]
+        values = [scored_df[c].tolist() for c in scored_df.columns]
+        predictions = [dict(zip(columns, row)) for row in zip(*values)]
+    elif orient == "columns":
+        predictions = {str(c): _column_values(scored_df[c]) for c in scored_df.columns}
+    else:
+        raise ValueError(
+            f"Expected 'orient' to be one of {PREDICTION_ORIENTS}, but found '{orient}'."
+        )
+
+    return orjson.dumps(
+        {**fields, "predictions": predictions}, default=_default, option=orjson.OPT_SERIALIZE_NUMPY
+    )
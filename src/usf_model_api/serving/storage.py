@@ -0,0 +1,369 @@
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+from datetime import date, datetime
+from pathlib import Path
+import threading
+
+import numpy as np
+import pandas as pd
+
+from usf_model_api.utils import get_logger
+
+
+LOG = get_logger(__name__)
+
+# The column of the hash index, and the columns of the sorted indexes
+ID_COLUMN = "prediction_id"
+INDEXED_COLUMNS = ("model_id", "store", "item", "date", "created_at")
+
+
+def prediction_filters(
+    model_id: Optional[str] = None,
+    store: Optional[int] = None,
+    item: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+) -> Dict[str, Tuple[Any, Any]]:
+    """
+    Converts the filters of a stored predictions query into the inclusive bounds of
+    ``PredictionStore.query()``, formatted as the stored values. Unset filters are left out.
+
+    Parameters
+    ----------
+    model_id, store, item : Optional
+        Exact values to match.
+    date_from, date_to : Optional[date]
+        The range of the requested ``date``.
+    created_from, created_to : Optional[datetime]
+        The range of ``created_at`` (UTC).
+
+    Returns
+    -------
+    Dict[str, Tuple[Any, Any]]
+        The ``(low, high)`` bounds of each filtered column.
+    """
+
+    def created_at(value: Optional[datetime]) -> Optional[str]:
+        return None if value is None else value.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+    bounds = {
+        "model_id": (model_id, model_id),
+        "store": (store, store),
+        "item": (item, item),
+        "date": tuple(None if d is None else d.isoformat() for d in (date_from, date_to)),
+        "created_at": (created_at(created_from), created_at(created_to)),
+    }
+
+    return {c: b for c, b in bounds.items() if b != (None, None)}
+
+
+class PredictionStore:
+    """
+    An append-optimized, in-memory store for prediction records.
+
+    Appended frames are buffered as-is in a queue of chunks, so the cost of an append does not depend
+    on the amount of history already stored. The chunks are only consolidated into a single DataFrame
+    when the store is read (see ``frame``), so many appends followed by one read costs a single
+    concatenation instead of one per append.
+
+    Optionally, the store keeps a bounded window of the most recent ``max_rows`` rows. Rows that fall
+    out of the window are either dropped or, if ``spill_dir`` is given, written to numbered Parquet
+    segment files in that directory.
+
+    The rows held in memory can be looked up by ``prediction_id`` (``lookup()``), through a hash
+    index updated on append, and queried by ranges of ``INDEXED_COLUMNS`` (``query()``), through
+    sorted indexes. Each chunk has its own sorted indexes, built on the first query that needs them.
+    Before a query, runs of small chunks are merged, so each chunk is at least twice as large as the
+    next, and a query searches O(log n) chunks.
+
+    Attributes
+    ----------
+    max_rows : Optional[int]
+        The maximum number of rows kept in memory, or None for an unbounded store.
+    spill_dir : Optional[Path]
+        The directory that evicted rows are spilled to, or None if evicted rows are dropped.
+    """
+
+    def __init__(self, max_rows: Optional[int] = None, spill_dir: Optional[Path] = None):
+        """
+        Initializes an empty PredictionStore.
+
+        Parameters
+        ----------
+        max_rows : Optional[int]
+            The maximum number of rows kept in memory. If None (the default), the store is unbounded.
+        spill_dir : Optional[Path]
+            The directory that rows evicted from the in-memory window are written to, as Parquet
+            segment files. If None (the default), evicted rows are dropped.
+        """
+        if max_rows is not None and max_rows < 0:
+            raise ValueError(f"Expected 'max_rows' to be non-negative, but found {max_rows}.")
+
+        self.max_rows = max_rows
+        self.spill_dir = Path(spill_dir) if spill_dir is not None else None
+        self._chunks: Deque[pd.DataFrame] = deque()
+        # The sorted indexes of each chunk: (order, sorted values) by column
+        self._indexes: Deque[Dict[str, Tuple[np.ndarray, np.ndarray]]] = deque()
+        # The position of each prediction ID, counting every row ever appended
+        self._id_index: Dict[str, int] = {}
+        self._num_rows = 0
+        self._num_evicted = 0
+        self._segments: List[Path] = []
+        self._lock = threading.Lock()
+
+        if self.spill_dir is not None:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+
+    def __len__(self) -> int:
+        """
+        Returns the number of rows currently held in memory.
+        """
+        return self._num_rows
+
+    @property
+    def num_evicted(self) -> int:
+        """
+        Returns the total number of rows that have been evicted from the in-memory window.
+        """
+        return self._num_evicted
+
+    @property
+    def segments(self) -> List[Path]:
+        """
+        Returns the paths of the Parquet segment files written so far, oldest first.
+        """
+        return list(self._segments)
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """
+        Returns the rows held in memory as a single DataFrame, consolidating any buffered chunks.
+
+        Returns
+        -------
+        pd.DataFrame
+            The rows currently held in memory, oldest first, with a fresh ``RangeIndex``.
+        """
+        with self._lock:
+            return self._consolidate()
+
+    def append(self, predictions_df: pd.DataFrame):
+        """
+        Appends a frame of predictions to the store. The frame is buffered without copying, so callers
+        must not mutate it after it has been appended.
+
+        Parameters
+        ----------
+        predictions_df : pd.DataFrame
+            The DataFrame containing predictions to be stored.
+        """
+        if predictions_df.empty:
+            return
+
+        with self._lock:
+            if ID_COLUMN in predictions_df.columns:
+                start = self._num_evicted + self._num_rows
+                ids = predictions_df[ID_COLUMN].tolist()
+                self._id_index.update(zip(ids, range(start, start + len(ids))))
+
+            self._chunks.append(predictions_df)
+            self._indexes.append({})
+            self._num_rows += len(predictions_df)
+
+            if self.max_rows is not None and self._num_rows > self.max_rows:
+                self._evict(self._num_rows - self.max_rows)
+
+    def lookup(self, prediction_ids: Iterable[str]) -> pd.DataFrame:
+        """
+        Looks up predictions held in memory by ID.
+
+        Parameters
+        ----------
+        prediction_ids : Iterable[str]
+            The prediction IDs.
+
+        Returns
+        -------
+        pd.DataFrame
+            The predictions found, in the order of ``prediction_ids``. IDs that are unknown (or
+            evicted) are skipped.
+        """
+        with self._lock:
+            positions = [self._id_index.get(i) for i in prediction_ids]
+            positions = [p - self._num_evicted for p in positions if p is not None]
+            if not positions:
+                return pd.DataFrame()
+
+            self._compact()
+            starts = np.cumsum([0] + [len(c) for c in self._chunks])
+            chunk_ids = np.searchsorted(starts, positions, side="right") - 1
+            rows = [self._chunks[c].iloc[[p - starts[c]]] for c, p in zip(chunk_ids, positions)]
+
+        return pd.concat(rows, axis=0, ignore_index=True)
+
+    def query(
+        self,
+        filters: Optional[Dict[str, Tuple[Any, Any]]] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[int] = None,
+    ) -> Tuple[pd.DataFrame, Optional[int]]:
+        """
+        Queries the predictions held in memory by ranges of the indexed columns.
+
+        Parameters
+        ----------
+        filters : Optional[Dict[str, Tuple[Any, Any]]]
+            The inclusive ``(low, high)`` bounds of each filtered column, one of
+            ``INDEXED_COLUMNS``; either bound may be None. Use ``(value, value)`` for equality.
+        limit : Optional[int]
+            The maximum number of rows returned (default is no limit).
+        cursor : Optional[int]
+            The cursor of the page to return, as returned with the previous page (default is the
+            first page).
+
+        Returns
+        -------
+        Tuple[pd.DataFrame, Optional[int]]
+            The matching rows of the page, oldest first, and the cursor of the next page, or None
+            if this is the last page.
+
+        Raises
+        ------
+        ValueError
+            If a filtered column is not indexed.
+        """
+        filters = filters or {}
+        unknown = set(filters) - set(INDEXED_COLUMNS)
+        if unknown:
+            raise ValueError(
+                f"Expected filters on {INDEXED_COLUMNS}, but found filters on {sorted(unknown)}."
+            )
+
+        with self._lock:
+            self._compact()
+            pages, num_found, next_cursor = [], 0, None
+            # Cursors count every row ever appended, so they stay valid across appends and evictions
+            start = self._num_evicted
+            cursor = max(cursor or 0, start)
+            for i, chunk in enumerate(self._chunks):
+                end = start + len(chunk)
+                if end > cursor:
+                    rows = self._match(i, filters)
+                    rows = rows[rows >= cursor - start]
+                    if limit is not None and num_found + len(rows) >= limit:
+                        rows = rows[: limit - num_found]
+                        next_cursor = start + int(rows[-1]) + 1 if len(rows) else cursor
+                    pages.append(chunk.take(rows))
+                    num_found += len(rows)
+                    if next_cursor is not None:
+                        break
+                start = end
+
+        if not pages:
+            return pd.DataFrame(), None
+
+        return pd.concat(pages, axis=0, ignore_index=True), next_cursor
+
+    def read_segments(self) -> pd.DataFrame:
+        """
+        Reads all spilled Parquet segments back into a single DataFrame.
+
+        Returns
+        -------
+        pd.DataFrame
+            The spilled rows, oldest first. Empty if nothing has been spilled.
+        """
+        segments = self.segments
+        if not segments:
+            return pd.DataFrame()
+
+        return pd.concat([pd.read_parquet(s) for s in segments], axis=0, ignore_index=True)
+
+    def _consolidate(self) -> pd.DataFrame:
+        if not self._chunks:
+            return pd.DataFrame()
+
+        if len(self._chunks) > 1 or not isinstance(self._chunks[0].index, pd.RangeIndex):
+            consolidated = pd.concat(list(self._chunks), axis=0, ignore_index=True)
+            self._chunks = deque([consolidated])
+            self._indexes = deque([{}])
+
+        return self._chunks[0]
+
+    def _compact(self):
+        # Merges the newest chunks while a chunk is less than twice as large as the next one
+        chunks, indexes = [], []
+        for chunk, index in zip(self._chunks, self._indexes):
+            chunks.append(chunk)
+            indexes.append(index)
+            while len(chunks) > 1 and len(chunks[-2]) < 2 * len(chunks[-1]):
+                last = chunks.pop()
+                chunks[-1] = pd.concat([chunks[-1], last], axis=0, ignore_index=True)
+                indexes.pop()
+                indexes[-1] = {}
+
+        if len(chunks) < len(self._chunks):
+            self._chunks, self._indexes = deque(chunks), deque(indexes)
+
+    def _sorted_index(self, i: int, column: str) -> Tuple[np.ndarray, np.ndarray]:
+        index = self._indexes[i]
+        if column not in index:
+            values = self._chunks[i][column].to_numpy()
+            order = np.argsort(values, kind="stable")
+            index[column] = (order, values[order])
+
+        return index[column]
+
+    def _match(self, i: int, filters: Dict[str, Tuple[Any, Any]]) -> np.ndarray:
+        # The positions of the rows of chunk i within the bounds of every filter, in order
+        chunk = self._chunks[i]
+        if not filters:
+            return np.arange(len(chunk))
+        if set(filters) - set(chunk.columns):
+            return np.empty(0, dtype=np.int64)
+
+        matched = np.ones(len(chunk), dtype=bool)
+        for column, (low, high) in filters.items():
+            order, values = self._sorted_index(i, column)
+            lo = 0 if low is None else np.searchsorted(values, low, side="left")
+            hi = len(values) if high is None else np.searchsorted(values, high, side="right")
+            in_range = np.zeros(len(chunk), dtype=bool)
+            in_range[order[lo:hi]] = True
+            matched &= in_range
+
+        return np.flatnonzero(matched)
+
+    def _evict(self, num_rows: int):
+        evicted = []
+        while num_rows > 0:
+            head = self._chunks[0]
+            if len(head) <= num_rows:
+                evicted.append(self._chunks.popleft())
+                self._indexes.popleft()
+                num_rows -= len(head)
+                continue
+
+            evicted.append(head.iloc[:num_rows])
+            self._chunks[0] = head.iloc[num_rows:]
+            self._indexes[0] = {}
+            num_rows = 0
+
+        for frame in evicted:
+            if ID_COLUMN in frame.columns:
+                for prediction_id in frame[ID_COLUMN].tolist():
+                    self._id_index.pop(prediction_id, None)
+
+        num_evicted = sum(len(e) for e in evicted)
+        self._num_rows -= num_evicted
+        self._num_evicted += num_evicted
+
+        if self.spill_dir is not None:
+            self._spill(evicted)
+
+    def _spill(self, frames: List[pd.DataFrame]):
+        segment = self.spill_dir / f"predictions-{len(self._segments):06d}.parquet"
+        LOG.info("Spilling %d evicted predictions to '%s'", sum(len(f) for f in frames), segment)
+        pd.concat(frames, axis=0, ignore_index=True).to_parquet(segment, index=False)
+        self._segments.append(segment)
@@ -1,28 +1,407 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, List, NamedTuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
+import os
+import threading
+
+from dateutil.parser import parse
+import numpy as np
 import pandas as pd
 
 from usf_model_api.utils import get_logger
 from usf_model_api.models.base import PredictionModel
+from usf_model_api.models.artifacts import ARTIFACT_SUFFIX, is_artifact, load_model, model_version
+from usf_model_api.serving.storage import PredictionStore
 
 
 LOG = get_logger(__name__)
 
+_HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+_UUID_HEX_POSITIONS = np.array([i for i in range(36) if i not in (8, 13, 18, 23)])
+
+
+def generate_prediction_ids(n: int) -> np.ndarray:
+    """
+    Generates ``n`` random (version 4) UUID strings in bulk. This is equivalent to calling
+    ``str(uuid.uuid4())`` ``n`` times, but draws all random bytes at once and formats them with NumPy.
+
+    Parameters
+    ----------
+    n : int
+        The number of IDs to generate.
+
+    Returns
+    -------
+    np.ndarray
+        An array of ``n`` UUID strings of the form ``xxxxxxxx-xxxx-4xxx-yxxx-xxxxxxxxxxxx``.
+    """
+    raw = np.frombuffer(os.urandom(16 * n), dtype=np.uint8).reshape(n, 16).copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40  # version 4
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80  # RFC 4122 variant
+
+    nibbles = np.empty((n, 32), dtype=np.uint8)
+    nibbles[:, 0::2] = raw >> 4
+    nibbles[:, 1::2] = raw & 0x0F
+
+    chars = np.full((n, 36), ord("-"), dtype=np.uint8)
+    chars[:, _UUID_HEX_POSITIONS] = _HEX_DIGITS[nibbles]
+
+    return chars.view("S36").ravel().astype(str)
+
+
+def get_created_at() -> str:
+    """
+    Returns the current UTC time formatted as a ``created_at`` value (``yyyy-MM-dd HH:mm:ss.SSS``).
+
+    Returns
+    -------
+    str
+        The formatted timestamp.
+    """
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+def scored_frame(
+    scoring_df: pd.DataFrame, predictions: np.ndarray, created_at: np.ndarray
+) -> pd.DataFrame:
+    """
+    Assembles scored requests, with ``prediction_id``, ``prediction`` and ``created_at`` columns
+    added around the request columns.
+
+    Parameters
+    ----------
+    scoring_df : pd.DataFrame
+        The scored requests.
+    predictions : np.ndarray
+        The prediction of each request.
+    created_at : np.ndarray
+        The ``created_at`` value of each request.
+
+    Returns
+    -------
+    pd.DataFrame
+        The ``prediction_id``, request, ``prediction`` and ``created_at`` columns.
+    """
+    assert not np.isnan(predictions).any(), "Prediction dataframe contains NaN values."
+
+    scored_df = pd.DataFrame({"prediction_id": generate_prediction_ids(len(scoring_df))})
+    for column in scoring_df.columns:
+        scored_df[column] = scoring_df[column].to_numpy()
+    scored_df["prediction"] = predictions
+    scored_df["created_at"] = created_at
+
+    return scored_df
+
+
+def to_iso_date(value: str) -> Optional[str]:
+    """
+    Validates a ``date`` request value, and returns it as ``yyyy-MM-dd``. A valid date is a
+    parseable date of 10 characters, such as ``yyyy-MM-dd``, ``yyyy/MM/dd`` or ``MM/dd/yyyy``. This
+    is the rule of both single and bulk requests, and the models are only given ``yyyy-MM-dd``
+    dates.
+
+    Parameters
+    ----------
+    value : str
+        The date string to validate.
+
+    Returns
+    -------
+    Optional[str]
+        The date as ``yyyy-MM-dd``, or None if it is not valid.
+    """
+    if len(value) != 10:
+        return None
+
+    try:
+        return parse(value).strftime("%Y-%m-%d")
+    except (ValueError, OverflowError):
+        return None
+
+
+def partition_by_model(model_ids: pd.Series) -> Dict[str, np.ndarray]:
+    """
+    Partitions the rows of a scoring batch by requested model, in a single pass.
+
+    Parameters
+    ----------
+    model_ids : pd.Series
+        The ``model_id`` column of the scoring batch.
+
+    Returns
+    -------
+    Dict[str, np.ndarray]
+        A mapping from each requested model ID (in order of first appearance) to the positional
+        indices of its rows, in their original order.
+    """
+    codes, uniques = pd.factorize(model_ids, sort=False)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+
+    return {m: order[bounds[i] : bounds[i + 1]] for i, m in enumerate(uniques)}
+
+
+def check_model_id(model_id: str, model: PredictionModel):
+    """
+    Warns if a model was saved with another ID than the one it is served under (its file name).
+
+    Parameters
+    ----------
+    model_id : str
+        The ID the model is served under.
+    model : PredictionModel
+        The model.
+    """
+    if model.model_id != model_id:
+        LOG.warning(
+            "Model '%s' was saved with the ID '%s'; it is served under its file name",
+            model_id,
+            model.model_id,
+        )
+
+
+class ModelFile(NamedTuple):
+    """
+    A model file of a model registry, and its version (see
+    ``usf_model_api.models.artifacts.model_version()``).
+    """
+
+    path: Path
+    mtime_ns: int
+
+
+class Database:
+    """
+    Base class of the database backends, which hold a model registry and a predictions store. The
+    registry serves the models of a directory under their file names, and keeps them resident in
+    ``model_db``. ``refresh()`` picks up changes to the model files; ``start_watcher()`` calls it
+    periodically from a background thread.
+    """
+
+    def __init__(self):
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_watcher = threading.Event()
+
+    @property
+    def model_db(self) -> Dict[str, PredictionModel]:
+        """
+        Returns the resident models, by model ID.
+
+        Raises
+        ------
+        NotImplementedError
+            If the property is not implemented by a subclass.
+        """
+        raise NotImplementedError("model_db is not implemented.")
+
+    @property
+    def predictions_store(self) -> PredictionStore:
+        """
+        Returns the store of the predictions: a ``PredictionStore``, or a store with the same
+        interface.
+
+        Raises
+        ------
+        NotImplementedError
+            If the property is not implemented by a subclass.
+        """
+        raise NotImplementedError("predictions_store is not implemented.")
+
+    @property
+    def predictions_db(self) -> pd.DataFrame:
+        """
+        Returns the stored predictions as a single DataFrame.
+        """
+        return self.predictions_store.frame
+
+    def list_models(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Lists the models known to the registry, whether resident or not.
+
+        Returns
+        -------
+        Dict[str, Dict[str, Any]]
+            A mapping from model ID to its file path (if loaded from a file) and whether it is
+            currently resident in memory.
+
+        Raises
+        ------
+        NotImplementedError
+            If the method is not implemented by a subclass.
+        """
+        raise NotImplementedError("list_models() is not implemented.")
+
+    def add_listener(self, callback: Callable[[str], None]):
+        """
+        Registers a callback that is called with a model ID whenever that model is replaced by a
+        new version or removed.
+
+        Parameters
+        ----------
+        callback : Callable[[str], None]
+            The callback.
+
+        Raises
+        ------
+        NotImplementedError
+            If the method is not implemented by a subclass.
+        """
+        raise NotImplementedError("add_listener() is not implemented.")
+
+    def load_models(self, dir_path: Path, overwrite: bool = True):
+        """
+        Loads the models of a directory.
+
+        Parameters
+        ----------
+        dir_path : Path
+            The directory path to load models from.
+        overwrite : bool, optional
+            Whether to overwrite the existing models in the database (default is True).
+
+        Raises
+        ------
+        NotImplementedError
+            If the method is not implemented by a subclass.
+        """
+        raise NotImplementedError("load_models() is not implemented.")
+
+    def get_model(self, model_id: str) -> Optional[PredictionModel]:
+        """
+        Retrieves a model by its ID. Returns None if the model is not found.
+
+        Parameters
+        ----------
+        model_id : str
+            The unique identifier of the model.
+
+        Raises
+        ------
+        NotImplementedError
+            If the method is not implemented by a subclass.
+        """
+        raise NotImplementedError("get_model() is not implemented.")
+
+    def model_version(self, model_id: str) -> Optional[int]:
+        """
+        Returns the version of a model, or None if it is not loaded from a model file.
+
+        Parameters
+        ----------
+        model_id : str
+            The unique identifier of the model.
+
+        Raises
+        ------
+        NotImplementedError
+            If the method is not implemented by a subclass.
+        """
+        raise NotImplementedError("model_version() is not implemented.")
+
+    def refresh(self) -> Dict[str, List[str]]:
+        """
+        Picks up new, updated and removed model files.
+
+        Returns
+        -------
+        Dict[str, List[str]]
+            The IDs of the ``added``, ``reloaded`` and ``removed`` models.
+
+        Raises
+        ------
+        NotImplementedError
+            If the method is not implemented by a subclass.
+        """
+        raise NotImplementedError("refresh() is not implemented.")
+
+    def save_predictions(self, predictions_df: pd.DataFrame):
+        """
+        Saves predictions to the predictions store.
+
+        Parameters
+        ----------
+        predictions_df : pd.DataFrame
+            The DataFrame containing predictions to be saved. It must not be mutated afterwards.
+        """
+        self.predictions_store.append(predictions_df)
 
-class MockDatabase:
+    def start_watcher(self, interval: float = 5.0):
+        """
+        Starts a background thread that calls ``refresh()`` every ``interval`` seconds.
+
+        Parameters
+        ----------
+        interval : float, optional
+            The polling interval, in seconds (default is 5.0).
+        """
+        if self._watcher is not None:
+            return
+
+        def watch():
+            while not self._stop_watcher.wait(interval):
+                try:
+                    self.refresh()
+                except Exception:  # pylint: disable=broad-except
+                    LOG.exception("Failed to refresh models")
+
+        self._stop_watcher.clear()
+        self._watcher = threading.Thread(target=watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        """
+        Stops the background thread started by ``start_watcher()``, if any.
+        """
+        if self._watcher is None:
+            return
+
+        self._stop_watcher.set()
+        self._watcher.join()
+        self._watcher = None
+
+    def close(self):
+        """
+        Stops the background watcher, if any, and releases the resources of the database.
+        """
+        self.stop_watcher()
+
+
+class MockDatabase(Database):
     """
     A mock database class for managing in-memory model objects and predictions. The ``model_db``
     is meant to simulate a very simple in-memory model 'registry'.
 
+    The registry indexes the model files of a directory, and keeps the deserialized models resident
+    in ``model_db``. Models can be loaded eagerly (in parallel) when the directory is loaded, or
+    lazily on first use. If ``max_models`` is set, the least recently used models are evicted from
+    memory (and reloaded from disk when used again). Calling ``refresh()`` (or running the background
+    watcher started by ``start_watcher()``) picks up new, updated and removed model files. Updated
+    models are deserialized before being swapped in, so requests already holding the previous model
+    are not affected. Models are either ``<model_id>.pkl`` pickle files or ``<model_id>.model``
+    artifact directories (see ``usf_model_api.models.artifacts``); when both exist, the artifact is
+    used. Whether loaded eagerly or lazily, a model is identified by its file name.
+
     Attributes
     ----------
     model_db : dict
-        A dictionary to store models with their model IDs as keys.
+        A dictionary to store the resident models with their model IDs as keys, in least to most
+        recently used order.
     predictions_db : pd.DataFrame
-        A DataFrame to store predictions.
+        A DataFrame of the stored predictions, backed by an append-optimized ``PredictionStore``.
     """
 
-    def __init__(self, model_dir: Optional[Path] = None):
+    def __init__(
+        self,
+        model_dir: Optional[Path] = None,
+        max_prediction_rows: Optional[int] = None,
+        spill_dir: Optional[Path] = None,
+        lazy: bool = False,
+        max_models: Optional[int] = None,
+        load_workers: Optional[int] = None,
+        predictions_store: Optional[PredictionStore] = None,
+    ):
         """
         Initializes the MockDatabase with a directory containing model files.
 
@@ -32,9 +411,37 @@ class MockDatabase:
             The directory containing model files. If specified, models will be loaded from this
             directory. Otherwise, an empty database will be created, which can be populated at any
             time by calling ``load_models()``.
+        max_prediction_rows : Optional[int]
+            The maximum number of predictions kept in memory. If None (the default), all predictions
+            are kept.
+        spill_dir : Optional[Path]
+            The directory that predictions evicted from memory are written to, as Parquet segment
+            files. If None (the default), evicted predictions are dropped.
+        lazy : bool, optional
+            Whether to defer deserializing each model until it is first requested (default is
+            False).
+        max_models : Optional[int]
+            The maximum number of resident models. If None (the default), all models stay resident.
+        load_workers : Optional[int]
+            The number of threads used to deserialize models in parallel when loading a directory
+            eagerly (default is one per model file, up to 8).
+        predictions_store : Optional[PredictionStore]
+            The store of the predictions (default is a new in-memory ``PredictionStore``, bounded by
+            ``max_prediction_rows`` and spilling to ``spill_dir``).
         """
-        self._model_db = {}
-        self._predictions_db = pd.DataFrame()
+        super().__init__()
+        self._model_db: OrderedDict[str, PredictionModel] = OrderedDict()
+        self._model_files: Dict[str, ModelFile] = {}
+        self._model_dir: Optional[Path] = None
+        self._lazy = lazy
+        self._max_models = max_models
+        self._load_workers = load_workers
+        self._lock = threading.RLock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._listeners: List[Callable[[str], None]] = []
+        if predictions_store is None:
+            predictions_store = PredictionStore(max_rows=max_prediction_rows, spill_dir=spill_dir)
+        self._predictions_store = predictions_store
 
         if model_dir is not None:
             self.load_models(model_dir)
@@ -47,15 +454,50 @@ class MockDatabase:
         return self._model_db
 
     @property
-    def predictions_db(self) -> pd.DataFrame:
+    def predictions_store(self) -> PredictionStore:
         """
-        Returns the predictions database, which is a pandas DataFrame.
+        Returns the ``PredictionStore`` backing the predictions database.
         """
-        return self._predictions_db
+        return self._predictions_store
+
+    def list_models(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Lists the models known to the registry, whether resident or not.
+
+        Returns
+        -------
+        Dict[str, Dict[str, Any]]
+            A mapping from model ID to its file path (if loaded from a file) and whether it is
+            currently resident in memory.
+        """
+        with self._lock:
+            model_ids = list(self._model_files) + [
+                m for m in self._model_db if m not in self._model_files
+            ]
+            return {
+                m: {
+                    "path": str(self._model_files[m].path) if m in self._model_files else None,
+                    "resident": m in self._model_db,
+                }
+                for m in model_ids
+            }
+
+    def add_listener(self, callback: Callable[[str], None]):
+        """
+        Registers a callback that is called with a model ID whenever that model is replaced by a
+        new version or removed by ``refresh()``.
+
+        Parameters
+        ----------
+        callback : Callable[[str], None]
+            The callback.
+        """
+        self._listeners.append(callback)
 
     def load_models(self, dir_path: Path, overwrite: bool = True):
         """
-        Loads models from the specified directory.
+        Loads models from the specified directory. Unless the database is lazy, the models are
+        deserialized in parallel. Listeners are notified of the models replaced or removed.
 
         Parameters
         ----------
@@ -64,24 +506,34 @@ class MockDatabase:
         overwrite : bool, optional
             Whether to overwrite the existing models in the database (default is True).
         """
+        files = self._scan(dir_path)
+        if len(files) == 0:
+            LOG.warning("No models found in '%s'. You need to train at least one first.", dir_path)
+
         db = {}
-        for file in dir_path.glob("*.pkl"):
-            LOG.info("Loading saved model file '%s'", file)
-            model = PredictionModel.deserialize(file)
-            db[model.model_id] = model
+        if not self._lazy:
+            models = self._deserialize_all([f.path for f in files.values()])
+            db = dict(zip(files, models))
+            for model_id, model in db.items():
+                check_model_id(model_id, model)
 
-        if len(db) == 0:
-            LOG.warning("No models found in '%s'. You need to train at least one first.", dir_path)
+        with self._lock:
+            previous = set(self._model_files) | set(self._model_db)
+            self._model_dir = dir_path
+            if overwrite:
+                self._model_db = OrderedDict()
+                self._model_files = {}
 
-        if overwrite:
-            self._model_db = db
-            return
+            self._model_files.update(files)
+            for model_id, model in db.items():
+                self._insert(model_id, model)
 
-        self.model_db.update(db)
+        self._notify(sorted(previous if overwrite else previous & set(files)))
 
     def get_model(self, model_id: str) -> Optional[PredictionModel]:
         """
-        Retrieves a model by its ID. Returns None if the model is not found.
+        Retrieves a model by its ID, loading it from disk if it is not resident. Returns None if
+        the model is not found.
 
         Parameters
         ----------
@@ -93,17 +545,177 @@ class MockDatabase:
         Optional[PredictionModel]
             The model corresponding to the given ID, or None if not found.
         """
-        return self.model_db.get(model_id)
+        with self._lock:
+            model = self._model_db.get(model_id)
+            if model is not None:
+                self._model_db.move_to_end(model_id)
+                return model
 
-    def save_predictions(self, predictions_df: pd.DataFrame):
+            model_file = self._model_files.get(model_id)
+            if model_file is None:
+                return None
+
+            load_lock = self._load_locks.setdefault(model_id, threading.Lock())
+
+        # Only one thread deserializes a given model, and others wait for it
+        with load_lock:
+            with self._lock:
+                model = self._model_db.get(model_id)
+            if model is None:
+                LOG.info("Loading saved model file '%s'", model_file.path)
+                model = load_model(model_file.path)
+                check_model_id(model_id, model)
+                with self._lock:
+                    # Not cached if refresh() updated or removed the file meanwhile
+                    if self._model_files.get(model_id) == model_file:
+                        self._insert(model_id, model)
+
+        return model
+
+    def add_model(self, model_id: str, model: PredictionModel):
         """
-        Saves predictions to the predictions database.
+        Makes a model resident under an ID, without a model file. Beyond ``max_models`` resident
+        models, the least recently used ones are evicted.
 
         Parameters
         ----------
-        predictions_df : pd.DataFrame
-            The DataFrame containing predictions to be saved.
+        model_id : str
+            The unique identifier of the model.
+        model : PredictionModel
+            The model.
         """
-        self._predictions_db = pd.concat(
-            [self.predictions_db, predictions_df], axis=0, ignore_index=True
-        )
+        with self._lock:
+            self._insert(model_id, model)
+
+    def model_version(self, model_id: str) -> Optional[int]:
+        """
+        Returns the version of a model: the modification time of its file, as recorded when the file
+        was last (re)loaded (see ``usf_model_api.models.artifacts.model_version()``).
+
+        Parameters
+        ----------
+        model_id : str
+            The unique identifier of the model.
+
+        Returns
+        -------
+        Optional[int]
+            The version of the model, or None if it is not loaded from a model file.
+        """
+        with self._lock:
+            model_file = self._model_files.get(model_id)
+
+        return model_file.mtime_ns if model_file is not None else None
+
+    def refresh(self) -> Dict[str, List[str]]:
+        """
+        Rescans the model directory, and picks up new, updated and removed model files. Updated
+        resident models are deserialized before being swapped in, so the swap is atomic, and a model
+        whose new version fails to load keeps serving its previous version.
+
+        Returns
+        -------
+        Dict[str, List[str]]
+            The IDs of the ``added``, ``reloaded`` and ``removed`` models.
+        """
+        changes = {"added": [], "reloaded": [], "removed": []}
+        if self._model_dir is None:
+            return changes
+
+        files = {f.path: f for f in self._scan(self._model_dir).values()}
+        with self._lock:
+            known = {f.path: (model_id, f) for model_id, f in self._model_files.items()}
+
+        for path, (model_id, model_file) in known.items():
+            if path not in files:
+                with self._lock:
+                    self._model_files.pop(model_id, None)
+                    self._model_db.pop(model_id, None)
+                changes["removed"].append(model_id)
+            elif files[path].mtime_ns != model_file.mtime_ns:
+                if self._reload(model_id, files[path]):
+                    changes["reloaded"].append(model_id)
+
+        for path, model_file in files.items():
+            if path in known:
+                continue
+
+            model_id = path.stem
+            if not self._lazy:
+                try:
+                    model = load_model(path)
+                except Exception:  # pylint: disable=broad-except
+                    LOG.exception("Failed to load new model file '%s'", path)
+                    continue
+
+                check_model_id(model_id, model)
+                with self._lock:
+                    self._insert(model_id, model)
+
+            with self._lock:
+                self._model_files[model_id] = model_file
+            changes["added"].append(model_id)
+
+        if any(changes.values()):
+            LOG.info("Refreshed models from '%s': %s", self._model_dir, changes)
+
+        self._notify(changes["reloaded"] + changes["removed"])
+
+        return changes
+
+    def _notify(self, model_ids: List[str]):
+        for model_id in model_ids:
+            for callback in self._listeners:
+                callback(model_id)
+
+    def _scan(self, dir_path: Path) -> Dict[str, ModelFile]:
+        files = {
+            file.stem: ModelFile(path=file, mtime_ns=model_version(file))
+            for file in sorted(dir_path.glob("*.pkl"))
+        }
+        # An artifact is complete once its metadata file is written, which also marks its version
+        for artifact in sorted(dir_path.glob(f"*{ARTIFACT_SUFFIX}")):
+            if is_artifact(artifact):
+                files[artifact.stem] = ModelFile(path=artifact, mtime_ns=model_version(artifact))
+
+        return files
+
+    def _deserialize_all(self, paths: List[Path]) -> List[PredictionModel]:
+        def load(path: Path) -> PredictionModel:
+            LOG.info("Loading saved model file '%s'", path)
+            return load_model(path)
+
+        if len(paths) <= 1:
+            models = [load(p) for p in paths]
+        else:
+            workers = self._load_workers or min(8, len(paths))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="model-loader") as pool:
+                models = list(pool.map(load, paths))
+
+        return models
+
+    def _reload(self, model_id: str, model_file: ModelFile) -> bool:
+        with self._lock:
+            resident = model_id in self._model_db
+
+        if resident:
+            try:
+                LOG.info("Reloading updated model file '%s'", model_file.path)
+                model = load_model(model_file.path)
+            except Exception:  # pylint: disable=broad-except
+                LOG.exception("Failed to reload model file '%s'", model_file.path)
+                return False
+
+        with self._lock:
+            self._model_files[model_id] = model_file
+            if resident and model_id in self._model_db:
+                self._model_db[model_id] = model
+
+        return True
+
+    def _insert(self, model_id: str, model: PredictionModel):
+        self._model_db[model_id] = model
+        self._model_db.move_to_end(model_id)
+        while self._max_models is not None and len(self._model_db) > self._max_models:
+            evicted, _ = self._model_db.popitem(last=False)
+            LOG.info("Evicted least recently used model '%s'", evicted)
@@ -0,0 +1,119 @@
+# pylint: disable=redefined-outer-name, protected-access
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from catboost import CatBoostRegressor
+from lightgbm import LGBMRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import StandardScaler
+
+from usf_model_api.models.artifacts import (
+    ARTIFACT_FORMAT_VERSION,
+    METADATA_FILE,
+    ArtifactFormatError,
+    LightGBMBoosterRegressor,
+    find_model,
+    load_artifact,
+    load_model,
+    model_version,
+    predict_thread_params,
+    save_artifact,
+)
+from usf_model_api.models.base import PredictionModel
+from usf_model_api.serving.utils import MockDatabase
+
+
+@pytest.fixture
+def training_data():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame({"store": rng.integers(1, 11, 200), "item": rng.integers(1, 51, 200)})
+    y = 2.0 * X["store"].to_numpy() + 0.5 * X["item"].to_numpy() + rng.normal(size=200)
+    return X, y
+
+
+@pytest.mark.parametrize(
+    "predictor, predictor_type",
+    [
+        (CatBoostRegressor(iterations=20, verbose=0, allow_writing_files=False), "catboost"),
+        (LGBMRegressor(n_estimators=20, verbose=-1), "lightgbm"),
+        (LinearRegression(), "pickle"),
+    ],
+)
+def test_artifact_round_trip(tmp_path, training_data, predictor, predictor_type):
+    X, y = training_data
+    model = PredictionModel(model_id="m", preprocessor=StandardScaler(), predictor=predictor)
+    model.fit(X, y)
+
+    path = save_artifact(model, tmp_path / "m.model")
+    metadata = json.loads((path / METADATA_FILE).read_text())
+    assert metadata["format_version"] == ARTIFACT_FORMAT_VERSION
+    assert metadata["model_id"] == "m"
+    assert metadata["predictor"]["type"] == predictor_type
+    assert metadata["features"] == ["store", "item"]
+    assert metadata["libraries"]["catboost"] is not None
+
+    loaded = load_artifact(path)
+    assert type(loaded) is PredictionModel
+    assert loaded.model_id == "m"
+    np.testing.assert_allclose(loaded.predict(X), model.predict(X))
+    if predictor_type == "lightgbm":
+        assert isinstance(loaded.predictor, LightGBMBoosterRegressor)
+
+    # The thread cap of each predictor type is accepted by its predict()
+    thread_params = predict_thread_params(loaded, 1)
+    assert len(thread_params) == (predictor_type != "pickle")
+    np.testing.assert_allclose(loaded.predict(X, **thread_params), model.predict(X))
+
+    # A re-saved artifact replaces the previous one
+    save_artifact(loaded, path)
+    np.testing.assert_allclose(load_model(path).predict(X), model.predict(X))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["m.model"]
+
+
+def test_unsupported_format_version(tmp_path, training_data):
+    X, y = training_data
+    model = PredictionModel(model_id="m", preprocessor=None, predictor=LinearRegression())
+    path = save_artifact(model.fit(X, y), tmp_path / "m.model")
+    metadata = json.loads((path / METADATA_FILE).read_text())
+    metadata["format_version"] = ARTIFACT_FORMAT_VERSION + 1
+    (path / METADATA_FILE).write_text(json.dumps(metadata))
+
+    with pytest.raises(ArtifactFormatError):
+        load_artifact(path)
+
+    with pytest.raises(ArtifactFormatError):
+        load_artifact(tmp_path)
+
+
+def test_mock_database_loads_artifacts(tmp_path, training_data):
+    X, y = training_data
+    model = PredictionModel(
+        model_id="catboost",
+        preprocessor=None,
+        predictor=CatBoostRegressor(iterations=5, verbose=0, allow_writing_files=False),
+    )
+    model.fit(X, y)
+    save_artifact(model, tmp_path / "catboost.model")
+    PredictionModel(model_id="linear", preprocessor=None, predictor=LinearRegression()).fit(
+        X, y
+    ).serialize(tmp_path / "linear.pkl")
+    assert find_model(tmp_path, "catboost") == tmp_path / "catboost.model"
+    assert find_model(tmp_path, "linear") == tmp_path / "linear.pkl"
+
+    db = MockDatabase(model_dir=tmp_path)
+    assert set(db.model_db) == {"catboost", "linear"}
+    np.testing.assert_allclose(db.get_model("catboost").predict(X), model.predict(X))
+    assert db.model_version("linear") == model_version(tmp_path / "linear.pkl")
+    assert db.model_version("unknown") is None
+    version = db.model_version("catboost")
+
+    # Re-saving the artifact is picked up as an update
+    save_artifact(model, tmp_path / "catboost.model")
+    metadata_path = tmp_path / "catboost.model" / METADATA_FILE
+    stat = metadata_path.stat()
+    os.utime(metadata_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert db.refresh() == {"added": [], "reloaded": ["catboost"], "removed": []}
+    assert db.model_version("catboost") == model_version(tmp_path / "catboost.model") != version
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+from sklearn.linear_model import LinearRegression
+
+from usf_model_api.models.base import PredictionModel, as_columns, feature_matrix
+
+
+def _frame() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "date": ["2023-01-01", "2023-01-02", "2023-01-03"],
+            "store": np.array([1, 2, 3], dtype=np.int64),
+            "item": np.array([10.0, 20.0, 30.0]),
+        }
+    )
+
+
+def test_as_columns():
+    X = _frame()
+    assert as_columns(X) is X
+
+    table = pa.Table.from_pandas(X, preserve_index=False)
+    structured = X.to_records(index=False)
+    for columns in (
+        as_columns(table),
+        as_columns(table.to_batches()[0]),
+        as_columns(structured),
+        as_columns({name: X[name].tolist() for name in X.columns}),
+    ):
+        assert list(columns) == ["date", "store", "item"]
+        for name, values in columns.items():
+            np.testing.assert_array_equal(values, X[name].to_numpy())
+
+    # Numeric Arrow columns without nulls are not copied
+    item = table.column("item").chunk(0)
+    assert np.shares_memory(as_columns(table)["item"], item.to_numpy())
+
+    with pytest.raises(TypeError, match="found list"):
+        as_columns([[1, 2, 3]])
+
+
+def test_feature_matrix():
+    matrix = feature_matrix({"a": np.arange(3), "b": np.array([0.5, 1.5, 2.5])})
+    assert matrix.dtype == np.float32 and matrix.flags["C_CONTIGUOUS"]
+    np.testing.assert_array_equal(matrix, [[0, 0.5], [1, 1.5], [2, 2.5]])
+    assert feature_matrix({}).shape == (0, 0)
+
+
+def test_predict_inputs():
+    X = _frame().drop(columns=["date"])
+    model = PredictionModel(model_id="m", preprocessor=None, predictor=LinearRegression())
+    model.fit(X, 2.0 * X["store"] + X["item"])
+
+    expected = model.predict(X)
+    table = pa.Table.from_pandas(X, preserve_index=False)
+    for X_other in (table, table.to_batches()[0], X.to_records(index=False)):
+        np.testing.assert_allclose(model.predict(X_other), expected)
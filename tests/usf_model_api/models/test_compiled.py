@@ -0,0 +1,123 @@
+# pylint: disable=redefined-outer-name
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from catboost import CatBoostRegressor
+from lightgbm import LGBMRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import StandardScaler
+
+from usf_model_api.models.artifacts import (
+    METADATA_FILE,
+    load_artifact,
+    predict_thread_params,
+    save_artifact,
+)
+from usf_model_api.models.base import PredictionModel
+from usf_model_api.models.compiled import (
+    BinaryTreeEnsemble,
+    CompilationError,
+    CompiledPipeline,
+    ObliviousTreeEnsemble,
+    compile_model,
+)
+
+
+@pytest.fixture
+def training_data():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(
+        {
+            "store": rng.integers(1, 11, 500).astype(float),
+            "item": rng.integers(1, 51, 500).astype(float),
+            "day": rng.uniform(0, 365, 500),
+        }
+    )
+    y = 2.0 * X["store"] + 0.5 * X["item"] + np.sin(X["day"] / 58) + rng.normal(size=500)
+    # Missing values in training, so the trees learn where to send them
+    X.loc[rng.random(500) < 0.1, "item"] = np.nan
+    return X, y.to_numpy()
+
+
+def _predictor(name: str):
+    if name == "catboost":
+        return CatBoostRegressor(iterations=30, depth=4, verbose=0, allow_writing_files=False)
+
+    return LGBMRegressor(n_estimators=30, num_leaves=15, verbose=-1)
+
+
+@pytest.mark.parametrize(
+    "name, ensemble_class",
+    [("catboost", ObliviousTreeEnsemble), ("lgbm", BinaryTreeEnsemble)],
+)
+def test_compile_model(training_data, name, ensemble_class):
+    X, y = training_data
+    model = PredictionModel(
+        model_id=name, preprocessor=StandardScaler(), predictor=_predictor(name)
+    )
+    model.fit(X, y)
+
+    compiled = compile_model(model, X)
+    assert isinstance(compiled.predictor, ensemble_class)
+    assert isinstance(compiled.model, CompiledPipeline)
+    assert compiled.predictor.n_trees_ == 30
+    # The original model is left as is
+    assert not isinstance(model.predictor, ensemble_class)
+
+    # Unseen rows, single rows and missing values give the same predictions
+    X_new = X.sample(frac=1, random_state=1).reset_index(drop=True)
+    X_new.loc[::7, "store"] = np.nan
+    np.testing.assert_allclose(compiled.predict(X_new), model.predict(X_new), rtol=1e-6, atol=1e-6)
+    np.testing.assert_allclose(compiled.predict(X_new[:1]), model.predict(X_new[:1]), atol=1e-6)
+
+    # Batches larger than a block are evaluated a block at a time
+    compiled.predictor.params["block_rows"] = 64
+    np.testing.assert_allclose(compiled.predict(X_new), model.predict(X_new), atol=1e-6)
+
+
+@pytest.mark.parametrize("name", ["catboost", "lgbm"])
+def test_compiled_artifact_round_trip(tmp_path, training_data, name):
+    X, y = training_data
+    model = PredictionModel(model_id="m", preprocessor=None, predictor=_predictor(name)).fit(X, y)
+    compiled = compile_model(model, X)
+
+    path = save_artifact(compiled, tmp_path / "m.model")
+    metadata = json.loads((path / METADATA_FILE).read_text())
+    assert metadata["predictor"]["type"] == "compiled"
+    assert metadata["predictor"]["file"] == "predictor.npz"
+    assert metadata["features"] == ["store", "item", "day"]
+
+    loaded = load_artifact(path)
+    assert type(loaded.predictor) is type(compiled.predictor)
+    assert predict_thread_params(loaded, 1) == {}
+    np.testing.assert_allclose(loaded.predict(X), model.predict(X), atol=1e-6)
+
+
+def test_compile_model_unsupported(training_data):
+    X, y = training_data
+    X = X.fillna(0.0)
+    model = PredictionModel(model_id="m", preprocessor=None, predictor=LinearRegression())
+    with pytest.raises(CompilationError, match="LinearRegression cannot be compiled"):
+        compile_model(model.fit(X, y), X)
+
+    predictor = CatBoostRegressor(
+        iterations=5, loss_function="Poisson", verbose=0, allow_writing_files=False
+    )
+    model = PredictionModel(model_id="m", preprocessor=None, predictor=predictor)
+    with pytest.raises(CompilationError, match="'Poisson' loss"):
+        compile_model(model.fit(X, np.abs(y).round()), X)
+
+
+def test_compile_model_mismatch(training_data, monkeypatch):
+    X, y = training_data
+    model = PredictionModel(model_id="m", preprocessor=None, predictor=_predictor("lgbm"))
+    model.fit(X, y)
+
+    # A compiled ensemble that disagrees with the original fails the check
+    monkeypatch.setattr(
+        BinaryTreeEnsemble, "_predict_block", lambda self, X: np.zeros(len(X), dtype=np.float64)
+    )
+    with pytest.raises(CompilationError, match="same predictions"):
+        compile_model(model, X)
@@ -0,0 +1,87 @@
+import asyncio
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from usf_model_api.serving.base import (
+    ARROW_STREAM_CONTENT_TYPE,
+    BulkPredictionRequest,
+    FrameValidationError,
+    UnsupportedContentTypeError,
+    iter_line_chunks,
+    read_bulk_frame,
+    read_ndjson_frame,
+    validate_frame,
+)
+
+
+FIELDS = {"model_id": "string", "date": "date", "store": "integer"}
+
+
+def test_validate_frame_converts_dates():
+    frame = pd.DataFrame(
+        {"model_id": ["a", "a"], "date": ["2023-01-02", "01/03/2023"], "store": [1, 2], "x": 0}
+    )
+
+    validated = validate_frame(frame, FIELDS)
+    assert list(validated.columns) == list(FIELDS)
+    assert validated["date"].tolist() == ["2023-01-02", "2023-01-03"]
+    # The input frame is left untouched
+    assert frame["date"].tolist() == ["2023-01-02", "01/03/2023"]
+
+
+def test_validate_frame_reports_errors_per_row():
+    frame = pd.DataFrame(
+        {"model_id": ["a", None], "date": ["2023-01-02", "bad"], "store": [1.5, 2.0]}
+    )
+
+    with pytest.raises(FrameValidationError) as e:
+        validate_frame(frame, FIELDS, row_offset=10)
+    assert [error["loc"] for error in e.value.errors] == [
+        ["body", "model_id"],
+        ["body", "date", 11],
+        ["body", "store"],
+    ]
+
+
+def test_validate_frame_missing_and_invalid_fields():
+    with pytest.raises(FrameValidationError) as e:
+        validate_frame(pd.DataFrame({"model_id": ["a"]}), FIELDS)
+    assert [error["loc"] for error in e.value.errors] == [["body", "date"], ["body", "store"]]
+
+    with pytest.raises(ValueError, match="Expected field types"):
+        validate_frame(pd.DataFrame({"x": [1]}), {"x": "float"})
+
+
+def test_read_bulk_frame_arrow():
+    table = pa.table({"model_id": ["a"], "date": pa.array([pd.Timestamp("2023-01-02")])})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    frame = read_bulk_frame(ARROW_STREAM_CONTENT_TYPE, sink.getvalue().to_pybytes(), None)
+    assert frame.to_dict("records") == [{"model_id": "a", "date": "2023-01-02"}]
+
+    with pytest.raises(UnsupportedContentTypeError):
+        read_bulk_frame("text/csv", b"", BulkPredictionRequest)
+
+
+def test_read_ndjson_frame():
+    schema = pa.schema([("model_id", pa.string()), ("store", pa.int64())])
+
+    frame = read_ndjson_frame([b'{"model_id": "a", "store": 1, "x": 0}', b'{"store": 2}'], schema)
+    assert list(frame.columns) == ["model_id", "store"]
+    assert frame["model_id"].tolist() == ["a", None]
+    assert frame["store"].tolist() == [1, 2]
+
+
+def test_iter_line_chunks():
+    async def stream():
+        for data in (b"a\nb", b"\n\n c\nd", b"\ne"):
+            yield data
+
+    async def run():
+        return [chunk async for chunk in iter_line_chunks(stream(), chunk_size=2)]
+
+    assert asyncio.run(run()) == [[b"a", b"b"], [b" c", b"d"], [b"e"]]
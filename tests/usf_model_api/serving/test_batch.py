@@ -0,0 +1,133 @@
+# pylint: disable=redefined-outer-name
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import FunctionTransformer
+
+from usf_model_api.models.base import PredictionModel
+from usf_model_api.serving.batch import MANIFEST_FILE, main, read_request_chunks, score_file
+
+
+def _numeric_features(X: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "day": pd.to_datetime(X["date"]).dt.day.to_numpy(),
+            "store": X["store"].to_numpy(),
+            "item": X["item"].to_numpy(),
+        }
+    )
+
+
+def _requests(n: int, model_ids=("a", "b")) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "date": (np.datetime64("2023-01-01") + rng.integers(0, 60, n)).astype(str),
+            "store": rng.integers(1, 10, n),
+            "item": rng.integers(1, 50, n),
+            "model_id": np.asarray(model_ids)[rng.integers(0, len(model_ids), n)],
+        }
+    )
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    model_dir = tmp_path / "models"
+    model_dir.mkdir()
+    X = _requests(100).drop(columns=["model_id"])
+    for i, model_id in enumerate(["a", "b"]):
+        model = PredictionModel(
+            model_id=model_id,
+            preprocessor=FunctionTransformer(_numeric_features),
+            predictor=LinearRegression(),
+        )
+        model.fit(X, X["store"] * (i + 1) + X["item"])
+        model.serialize(model_dir / f"{model_id}.pkl")
+
+    return model_dir
+
+
+def _expected_predictions(requests: pd.DataFrame, model_dir) -> np.ndarray:
+    predictions = np.empty(len(requests))
+    for model_id in ("a", "b"):
+        rows = (requests["model_id"] == model_id).to_numpy()
+        model = PredictionModel.deserialize(model_dir / f"{model_id}.pkl")
+        predictions[rows] = model.predict(requests[rows].drop(columns=["model_id"]))
+    return predictions
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet", ".ndjson"])
+def test_read_request_chunks(tmp_path, suffix):
+    requests = _requests(25)
+    path = tmp_path / f"requests{suffix}"
+    if suffix == ".csv":
+        requests.to_csv(path, index=False)
+    elif suffix == ".parquet":
+        requests.to_parquet(path, row_group_size=10)
+    else:
+        requests.to_json(path, orient="records", lines=True)
+
+    chunks = list(read_request_chunks(path, chunk_rows=10))
+    assert [len(c) for c in chunks] == [10, 10, 5]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), requests, check_dtype=False)
+
+
+def test_score_file(tmp_path, model_dir):
+    requests = _requests(50)
+    input_path = tmp_path / "requests.parquet"
+    requests.to_parquet(input_path, row_group_size=10)
+    output_dir = tmp_path / "scores"
+
+    summary = score_file(input_path, model_dir, output_dir, chunk_rows=10, jobs=2)
+    assert summary["chunks"] == 5 and summary["rows"] == 50 and summary["skipped_chunks"] == 0
+
+    # The parts hold the columns of the /predict route, in the order of the input
+    scored = pd.read_parquet(output_dir)
+    assert scored.columns.tolist() == [
+        "prediction_id",
+        "date",
+        "store",
+        "item",
+        "model_id",
+        "prediction",
+        "created_at",
+    ]
+    assert scored["prediction_id"].is_unique
+    pd.testing.assert_frame_equal(scored[requests.columns], requests)
+    np.testing.assert_allclose(scored["prediction"], _expected_predictions(requests, model_dir))
+
+    # A second run resumes after the completed chunks
+    (output_dir / "part-00003.parquet").unlink()
+    manifest = json.loads((output_dir / MANIFEST_FILE).read_text())
+    del manifest["completed"]["3"]
+    (output_dir / MANIFEST_FILE).write_text(json.dumps(manifest))
+    summary = score_file(input_path, model_dir, output_dir, chunk_rows=10, jobs=2)
+    assert summary["chunks"] == 1 and summary["rows"] == 10 and summary["skipped_chunks"] == 4
+    assert len(pd.read_parquet(output_dir)) == 50
+
+    # The output of another input is only replaced on request
+    with pytest.raises(ValueError, match="different run"):
+        score_file(input_path, model_dir, output_dir, chunk_rows=20)
+    main(
+        [str(input_path), "--model-dir", str(model_dir), "--output-dir", str(output_dir)]
+        + ["--chunk-rows", "25", "--restart"]
+    )
+    assert len(list(output_dir.glob("part-*.parquet"))) == 2
+    assert len(pd.read_parquet(output_dir)) == 50
+
+
+def test_score_file_unknown_model(tmp_path, model_dir):
+    requests = pd.concat([_requests(20), _requests(5, model_ids=["c"])], ignore_index=True)
+    input_path = tmp_path / "requests.csv"
+    requests.to_csv(input_path, index=False)
+    output_dir = tmp_path / "scores"
+
+    with pytest.raises(ValueError, match="'c' not found"):
+        score_file(input_path, model_dir, output_dir, chunk_rows=10, jobs=1)
+
+    # The chunks scored before the failure are kept
+    manifest = json.loads((output_dir / MANIFEST_FILE).read_text())
+    assert manifest["completed"] == {"0": 10, "1": 10}
@@ -0,0 +1,157 @@
+from unittest.mock import MagicMock
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from usf_model_api.serving.batching import MicroBatcher, ModelNotFoundError, Scorer
+from usf_model_api.serving.cache import PredictionCache
+from usf_model_api.serving.executors import ExecutorSaturatedError, InferenceExecutor
+
+
+def _frame(start: int, n: int) -> pd.DataFrame:
+    return pd.DataFrame({"x": np.arange(start, start + n, dtype=float)})
+
+
+def _make_batcher(calls, **kwargs) -> MicroBatcher:
+    async def predict_fn(model_id, X, model):
+        calls.append((model_id, len(X)))
+        return X["x"].to_numpy() * 2
+
+    return MicroBatcher(predict_fn, **kwargs)
+
+
+def test_concurrent_requests_are_coalesced():
+    calls = []
+    batcher = _make_batcher(calls, max_batch_size=100, max_wait_ms=20)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit("m", _frame(i * 2, 2)) for i in range(5)))
+
+    results = asyncio.run(run())
+    assert calls == [("m", 10)]
+    for i, result in enumerate(results):
+        np.testing.assert_array_equal(result, [i * 4, i * 4 + 2])
+
+    metrics = batcher.metrics()["m"]
+    assert metrics["batches"] == 1
+    assert metrics["batched_requests"] == 5
+    assert metrics["queue_depth"] == 0
+
+
+def test_batches_are_split_by_model_and_size():
+    calls = []
+    batcher = _make_batcher(calls, max_batch_size=4, max_wait_ms=1000)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.submit("a", _frame(0, 2)),
+            batcher.submit("b", _frame(0, 1)),
+            batcher.submit("a", _frame(2, 2)),
+            batcher.submit("b", _frame(1, 3)),
+        )
+
+    results = asyncio.run(run())
+    assert sorted(calls) == [("a", 4), ("b", 4)]
+    np.testing.assert_array_equal(results[2], [4, 6])
+    np.testing.assert_array_equal(results[3], [2, 4, 6])
+
+
+def test_batches_keep_the_model_of_each_request():
+    calls = []
+
+    async def predict_fn(model_id, X, model):
+        calls.append((model, len(X)))
+        return np.full(len(X), model)
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=100, max_wait_ms=20)
+
+    async def run():
+        # The model was swapped between the second and the third request
+        return await asyncio.gather(
+            batcher.submit("m", _frame(0, 1), model="v1"),
+            batcher.submit("m", _frame(1, 2), model="v1"),
+            batcher.submit("m", _frame(3, 1), model="v2"),
+        )
+
+    results = asyncio.run(run())
+    assert calls == [("v1", 3), ("v2", 1)]
+    assert [r.tolist() for r in results] == [["v1"], ["v1", "v1"], ["v2"]]
+
+
+def test_saturated_batch_is_logged_without_traceback(caplog):
+    async def predict_fn(model_id, X, model):
+        raise ExecutorSaturatedError("full")
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=10, max_wait_ms=1)
+    with pytest.raises(ExecutorSaturatedError):
+        asyncio.run(batcher.submit("m", _frame(0, 1)))
+
+    assert [(r.levelname, r.exc_info) for r in caplog.records] == [("WARNING", None)]
+
+
+def test_failed_batch_propagates_to_all_callers():
+    async def predict_fn(model_id, X, model):
+        raise RuntimeError("boom")
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=10, max_wait_ms=1)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.submit("m", _frame(0, 1)),
+            batcher.submit("m", _frame(1, 1)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_invalid_batch_size():
+    with pytest.raises(ValueError):
+        MicroBatcher(lambda model_id, X, model: None, max_batch_size=0)
+
+
+def _make_scorer(models, **kwargs) -> Scorer:
+    database = MagicMock(model_db=models, get_model=models.get)
+    return Scorer(database, InferenceExecutor(backend="thread", max_workers=1), **kwargs)
+
+
+def test_scorer_scores_each_row_with_its_model():
+    scorer = _make_scorer(
+        {
+            "a": MagicMock(predict=lambda X: X["x"].to_numpy() * 2),
+            "b": MagicMock(predict=lambda X: X["x"].to_numpy() * 3),
+        }
+    )
+    scoring_df = pd.DataFrame({"model_id": ["a", "b", "a"], "x": [1.0, 2.0, 3.0]})
+
+    scored_df = asyncio.run(scorer.score(scoring_df))
+    np.testing.assert_allclose(scored_df["prediction"], [2.0, 6.0, 6.0])
+    assert scored_df["created_at"].notna().all()
+    scorer.executor.shutdown()
+
+
+def test_scorer_caches_predictions():
+    calls = []
+    model = MagicMock(predict=lambda X: calls.append(len(X)) or X["x"].to_numpy())
+    scorer = _make_scorer({"a": model}, cache=PredictionCache(max_entries=10))
+    scoring_df = pd.DataFrame({"model_id": ["a", "a"], "x": [1.0, 2.0]})
+
+    for _ in range(2):
+        scored_df = asyncio.run(scorer.score(scoring_df))
+    np.testing.assert_allclose(scored_df["prediction"], [1.0, 2.0])
+    assert calls == [2]
+    scorer.executor.shutdown()
+
+
+def test_scorer_rejects_missing_models():
+    model = MagicMock()
+    scorer = _make_scorer({"a": model})
+    scoring_df = pd.DataFrame({"model_id": ["a", "b"], "x": [1.0, 2.0]})
+
+    with pytest.raises(ModelNotFoundError, match="Model with ID 'b' not found."):
+        asyncio.run(scorer.score(scoring_df))
+    model.predict.assert_not_called()
+    scorer.executor.shutdown()
@@ -0,0 +1,75 @@
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from usf_model_api.serving.cache import PredictionCache
+
+
+def test_make_keys():
+    X = pd.DataFrame({"date": ["2023-01-01", "2023-01-02"], "item": [1, 2], "store": [3, 4]})
+    assert PredictionCache.make_keys(X) == [("2023-01-01", 1, 3), ("2023-01-02", 2, 4)]
+
+
+def test_get_and_put():
+    cache = PredictionCache(max_entries=10)
+    cache.put_many("m", ["a", "b"], [1.0, 2.0])
+
+    predictions, found = cache.get_many("m", ["a", "c", "b"])
+    np.testing.assert_array_equal(found, [True, False, True])
+    np.testing.assert_array_equal(predictions[found], [1.0, 2.0])
+    assert np.isnan(predictions[1])
+
+    # Keys are scoped by model
+    assert not cache.get_many("other", ["a"])[1].any()
+
+    metrics = cache.metrics()
+    assert metrics["hits"] == 2
+    assert metrics["misses"] == 2
+    assert metrics["entries"] == 2
+
+
+def test_lru_eviction():
+    cache = PredictionCache(max_entries=2)
+    cache.put_many("m", ["a", "b"], [1.0, 2.0])
+    cache.get_many("m", ["a"])
+    cache.put_many("m", ["c"], [3.0])
+
+    assert cache.get_many("m", ["a", "b", "c"])[1].tolist() == [True, False, True]
+    assert cache.metrics()["evictions"] == 1
+
+
+def test_ttl_expiration():
+    cache = PredictionCache(ttl=10.0)
+    with patch("usf_model_api.serving.cache.time.monotonic", return_value=100.0):
+        cache.put_many("m", ["a"], [1.0])
+    with patch("usf_model_api.serving.cache.time.monotonic", return_value=105.0):
+        assert cache.get_many("m", ["a"])[1].all()
+    with patch("usf_model_api.serving.cache.time.monotonic", return_value=111.0):
+        assert not cache.get_many("m", ["a"])[1].any()
+
+    assert cache.metrics()["expirations"] == 1
+    assert len(cache) == 0
+
+
+def test_invalidate():
+    cache = PredictionCache()
+    cache.put_many("m", ["a"], [1.0])
+    cache.put_many("other", ["a"], [2.0])
+    generation = cache.generation("m")
+    cache.invalidate("m")
+
+    assert not cache.get_many("m", ["a"])[1].any()
+    assert cache.get_many("other", ["a"])[1].all()
+
+    # Predictions computed by the previous model version are discarded
+    cache.put_many("m", ["a"], [1.0], generation=generation)
+    assert not cache.get_many("m", ["a"])[1].any()
+    cache.put_many("m", ["a"], [3.0], generation=cache.generation("m"))
+    assert cache.get_many("m", ["a"])[0].tolist() == [3.0]
+
+
+def test_invalid_size():
+    with pytest.raises(ValueError):
+        PredictionCache(max_entries=0)
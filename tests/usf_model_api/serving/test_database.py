@@ -0,0 +1,210 @@
+# pylint: disable=redefined-outer-name
+from unittest.mock import patch
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression
+
+from usf_model_api.models.base import PredictionModel
+from usf_model_api.serving.database import (
+    ConnectionPool,
+    PoolTimeoutError,
+    SQLDatabase,
+    SQLPredictionStore,
+    make_database,
+)
+from usf_model_api.serving.utils import Database, MockDatabase
+
+
+def _scored(start: int, n: int) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "prediction_id": [str(i) for i in range(start, start + n)],
+            "model_id": ["a" if i % 2 else "b" for i in range(start, start + n)],
+            "store": [i % 3 for i in range(start, start + n)],
+            "date": [f"2023-01-{i % 28 + 1:02d}" for i in range(start, start + n)],
+            "prediction": [float(i) for i in range(start, start + n)],
+        }
+    )
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    model_dir = tmp_path / "models"
+    model_dir.mkdir()
+    for model_id in ("model_a", "model_b"):
+        model = PredictionModel(model_id=model_id, preprocessor=None, predictor=LinearRegression())
+        model.serialize(model_dir / f"{model_id}.pkl")
+
+    return model_dir
+
+
+def test_connection_pool(tmp_path):
+    pool = ConnectionPool(tmp_path / "db.sqlite", size=1, timeout=0.05)
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        # The only connection is in use
+        with pytest.raises(PoolTimeoutError, match="was free within"):
+            with pool.connection():
+                pass
+
+    with pytest.raises(ZeroDivisionError):
+        with pool.connection() as conn:
+            conn.execute("INSERT INTO t VALUES (1)")
+            raise ZeroDivisionError
+    with pool.connection() as first:
+        # Rolled back, and the connection is reused
+        assert first.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    assert first is conn
+    assert pool.metrics() == {"size": 1, "open": 1, "in_use": 0, "timeouts": 1}
+
+    pool.close()
+    with pytest.raises(RuntimeError, match="closed"):
+        with pool.connection():
+            pass
+
+
+def test_connection_pool_after_fork(tmp_path):
+    pool = ConnectionPool(tmp_path / "db.sqlite", size=1, timeout=0.05)
+    with pool.connection() as parent_conn:
+        parent_conn.execute("CREATE TABLE t (x INTEGER)")
+
+    pid = os.fork()
+    if pid == 0:
+        exit_code = 1
+        try:
+            # The child opens its own connection, rather than reusing the one of its parent
+            with pool.connection() as conn:
+                conn.execute("INSERT INTO t VALUES (1)")
+            if conn is not parent_conn and pool.metrics()["open"] == 1:
+                exit_code = 0
+        finally:
+            os._exit(exit_code)  # pylint: disable=protected-access
+
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    with pool.connection() as conn:
+        assert conn is parent_conn
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+    pool.close()
+
+
+def test_sql_prediction_store(tmp_path):
+    store = SQLPredictionStore(ConnectionPool(tmp_path / "db.sqlite"))
+    assert len(store) == 0
+    assert store.frame.empty
+    assert store.query({"store": (1, 1)})[0].empty
+
+    threads = [threading.Thread(target=store.append, args=(_scored(i * 10, 10),)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(store) == 40
+    frame = store.frame
+    assert sorted(frame["prediction_id"], key=int) == [str(i) for i in range(40)]
+    assert frame["store"].dtype == "int64"
+
+    found = store.lookup(["27", "unknown", "3"])
+    assert found["prediction_id"].tolist() == ["27", "3"]
+    assert found["prediction"].tolist() == [27.0, 3.0]
+
+    expected = frame[(frame["model_id"] == "a") & frame["date"].between("2023-01-05", "2023-01-20")]
+    filters = {"model_id": ("a", "a"), "date": ("2023-01-05", "2023-01-20")}
+    pages, cursor = [], None
+    while True:
+        found, cursor = store.query(filters, limit=3, cursor=cursor)
+        pages.append(found)
+        if cursor is None:
+            break
+    assert pd.concat(pages)["prediction_id"].tolist() == expected["prediction_id"].tolist()
+    assert all(len(page) == 3 for page in pages[:-1])
+
+    with pytest.raises(ValueError, match="filters on"):
+        store.query({"prediction": (0, 1)})
+
+
+def test_sql_database_shares_models_and_predictions(tmp_path, model_dir):
+    path = tmp_path / "db.sqlite"
+    first = SQLDatabase(path, model_dir=model_dir, lazy=True)
+    # Another worker, with no model directory of its own
+    second = SQLDatabase(path)
+
+    assert set(second.list_models()) == {"model_a", "model_b"}
+    assert not second.list_models()["model_a"]["resident"]
+    assert second.get_model("model_b").model_id == "model_b"
+    assert second.get_model("unknown") is None
+    assert second.model_version("model_a") == first.model_version("model_a") is not None
+    assert second.model_version("unknown") is None
+
+    first.save_predictions(_scored(0, 5))
+    second.save_predictions(_scored(5, 5))
+    assert len(first.predictions_db) == len(second.predictions_db) == 10
+
+    (model_dir / "model_a.pkl").unlink()
+    assert first.refresh()["removed"] == ["model_a"]
+    assert set(second.list_models()) == {"model_b"}
+
+    first.close()
+    second.close()
+
+
+def test_sql_database_loads_models_of_other_processes_once(tmp_path, model_dir):
+    path = tmp_path / "db.sqlite"
+    first = SQLDatabase(path, model_dir=model_dir, lazy=True)
+    second = SQLDatabase(path)
+    loaded = []
+
+    def load_model(model_path):
+        loaded.append(model_path)
+        time.sleep(0.05)
+        return PredictionModel.deserialize(model_path)
+
+    models = []
+    with patch("usf_model_api.serving.database.load_model", side_effect=load_model):
+        threads = [
+            threading.Thread(target=lambda: models.append(second.get_model("model_a")))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert loaded == [model_dir / "model_a.pkl"]
+    assert len(models) == 4 and all(m is models[0] for m in models)
+    first.close()
+    second.close()
+
+
+def test_sql_database_watcher_registers_models(tmp_path, model_dir):
+    path = tmp_path / "db.sqlite"
+    first = SQLDatabase(path, model_dir=model_dir, lazy=True)
+    second = SQLDatabase(path)
+    first.start_watcher(interval=0.01)
+
+    (model_dir / "model_c.pkl").write_bytes((model_dir / "model_a.pkl").read_bytes())
+    deadline = time.monotonic() + 5
+    while "model_c" not in second.list_models() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert "model_c" in second.list_models()
+
+    first.close()
+    second.close()
+
+
+def test_make_database(tmp_path):
+    memory = make_database("memory", max_prediction_rows=5)
+    assert isinstance(memory, Database) and isinstance(memory, MockDatabase)
+    db = make_database("sqlite", path=tmp_path / "db.sqlite", max_prediction_rows=5)
+    assert isinstance(db, Database) and isinstance(db, SQLDatabase)
+    assert isinstance(db.predictions_store, SQLPredictionStore)
+
+    with pytest.raises(ValueError, match="Expected 'backend'"):
+        make_database("postgres")
+    with pytest.raises(ValueError, match="Expected a path"):
+        make_database("sqlite")
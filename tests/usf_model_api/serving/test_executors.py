@@ -0,0 +1,102 @@
+# pylint: disable=redefined-outer-name, protected-access
+import asyncio
+import threading
+import time
+from unittest.mock import MagicMock
+
+import numpy as np
+import pandas as pd
+import pytest
+from catboost import CatBoostRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import StandardScaler
+
+from usf_model_api.models.base import PredictionModel
+from usf_model_api.serving.executors import ExecutorSaturatedError, InferenceExecutor
+
+
+@pytest.fixture
+def fitted_model():
+    X = pd.DataFrame({"x": np.arange(10, dtype=float)})
+    model = PredictionModel(
+        model_id="linear", preprocessor=StandardScaler(), predictor=LinearRegression()
+    )
+    return model.fit(X, 2 * X["x"].to_numpy())
+
+
+def test_thread_backend(fitted_model):
+    executor = InferenceExecutor(backend="thread", max_workers=2)
+    X = pd.DataFrame({"x": [1.0, 2.0]})
+    predictions = asyncio.run(executor.predict(fitted_model, X))
+    np.testing.assert_allclose(predictions, [2.0, 4.0])
+    assert executor.metrics()["completed"] == 1
+
+    # Failed calls are not counted as completed
+    with pytest.raises(ValueError):
+        asyncio.run(executor.predict(fitted_model, pd.DataFrame({"y": [1.0]})))
+    assert executor.metrics()["completed"] == 1
+    assert executor.metrics()["failed"] == 1
+    executor.shutdown()
+
+
+def test_predict_threads():
+    X = pd.DataFrame({"x": np.arange(10, dtype=float)})
+    model = PredictionModel(
+        model_id="catboost",
+        preprocessor=None,
+        predictor=CatBoostRegressor(iterations=10, verbose=0, allow_writing_files=False),
+    ).fit(X, 2 * X["x"].to_numpy())
+    model.predictor.predict = MagicMock(wraps=model.predictor.predict)
+
+    executor = InferenceExecutor(backend="thread", max_workers=1, predict_threads=2)
+    asyncio.run(executor.predict(model, X))
+    assert model.predictor.predict.call_args.kwargs == {"thread_count": 2}
+    executor.shutdown()
+
+
+def test_process_backend_uses_preloaded_models(fitted_model):
+    executor = InferenceExecutor(backend="process", max_workers=1)
+    executor.preload({"linear": fitted_model})
+    X = pd.DataFrame({"x": [3.0]})
+    predictions = asyncio.run(executor.predict(fitted_model, X))
+    np.testing.assert_allclose(predictions, [6.0])
+    executor.shutdown()
+
+
+def test_backpressure():
+    executor = InferenceExecutor(backend="thread", max_workers=1, max_pending=1)
+    model = MagicMock(predict=lambda X: time.sleep(0.05) or [0.0])
+
+    async def run():
+        return await asyncio.gather(
+            executor.predict(model, None), executor.predict(model, None), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert results[0] == [0.0]
+    assert isinstance(results[1], ExecutorSaturatedError)
+    assert executor.metrics()["rejected"] == 1
+    executor.shutdown()
+
+
+def test_invalid_backend():
+    with pytest.raises(ValueError):
+        InferenceExecutor(backend="gpu")
+
+
+def test_pool_replaced_concurrently(fitted_model):
+    executor = InferenceExecutor(backend="thread", max_workers=1)
+    get_pool = executor._get_pool
+
+    def get_pool_then_replace():
+        pool = get_pool()
+        # The model watcher thread replaces the pool right after it is looked up
+        replacer = threading.Thread(target=executor.shutdown, kwargs={"wait": False})
+        replacer.start()
+        replacer.join(timeout=0.2)
+        return pool
+
+    executor._get_pool = get_pool_then_replace
+    predictions = asyncio.run(executor.predict(fitted_model, pd.DataFrame({"x": [1.0]})))
+    np.testing.assert_allclose(predictions, [2.0])
+    executor.shutdown()
@@ -0,0 +1,126 @@
+# pylint: disable=redefined-outer-name
+import numpy as np
+import pandas as pd
+import pytest
+
+from usf_model_api.serving.materialized import (
+    ForecastTable,
+    load_forecast_tables,
+    write_forecast_table,
+)
+
+
+class GridModel:
+    model_id = "grid"
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        self.calls.append(len(X))
+        days = pd.to_datetime(X["date"]).dt.day.to_numpy()
+        return X["store"].to_numpy() * 1000.0 + X["item"].to_numpy() * 10.0 + days
+
+
+@pytest.fixture
+def table(tmp_path) -> ForecastTable:
+    return write_forecast_table(
+        GridModel(),
+        tmp_path / "grid.forecasts",
+        start_date="2023-01-30",
+        horizon=5,
+        stores=[1, 2, 5],
+        items=[3, 4],
+        chunk_rows=12,
+    )
+
+
+def test_write_forecast_table(tmp_path):
+    model = GridModel()
+    table = write_forecast_table(
+        model,
+        tmp_path / "grid.forecasts",
+        start_date="2023-01-30",
+        horizon=5,
+        stores=[1, 2, 5],
+        items=[3, 4],
+        chunk_rows=12,
+    )
+
+    # Each chunk holds whole days of the grid
+    assert model.calls == [12, 12, 6]
+    assert isinstance(table.forecasts, np.memmap)
+    assert table.forecasts.shape == (3, 2, 5)
+    assert table.forecasts[2, 1, 3] == 5042.0
+    assert table.metadata()["entries"] == 30
+
+
+def test_lookup(table):
+    predictions, found = table.lookup(
+        dates=["2023-01-30", "2023-02-03", "2023-02-04", "2023-01-29", "2023-02-01", "2023-02-01"],
+        stores=[1, 5, 1, 1, 3, 2],
+        items=[3, 4, 3, 3, 3, 99],
+    )
+    np.testing.assert_array_equal(found, [True, True, False, False, False, False])
+    np.testing.assert_array_equal(predictions[found], [1060.0, 5043.0])
+    assert np.isnan(predictions[~found]).all()
+
+
+def test_lookup_of_malformed_dates(table):
+    # Dates that are not YYYY-MM-DD are missing from the table, so they are scored live
+    predictions, found = table.lookup(
+        dates=["2023-01-30", "01/30/2023", "not a date", "2023-02-30"],
+        stores=[1, 1, 1, 1],
+        items=[3, 3, 3, 3],
+    )
+    np.testing.assert_array_equal(found, [True, False, False, False])
+    assert predictions[0] == 1060.0
+
+
+def test_load_forecast_tables_keys_by_registry_name(tmp_path):
+    # The model was saved as "sales.pkl" in the registry, but its own ID is "grid"
+    write_forecast_table(
+        GridModel(),
+        tmp_path / "sales.forecasts",
+        start_date="2023-01-30",
+        horizon=2,
+        stores=[1],
+        items=[3],
+        model_version=1,
+        model_id="sales",
+    )
+    tables = load_forecast_tables(tmp_path, model_version={"sales": 1}.get)
+    assert list(tables) == ["sales"]
+    assert tables["sales"].model_id == "sales"
+
+
+def test_load_forecast_tables(tmp_path, table):
+    (tmp_path / "broken.forecasts").mkdir()
+    tables = load_forecast_tables(tmp_path)
+    assert list(tables) == ["grid"]
+    assert tables["grid"].horizon == table.horizon
+    assert load_forecast_tables(None) == {}
+
+
+def test_load_forecast_tables_checks_model_version(tmp_path):
+    for version in (1, 2):
+        write_forecast_table(
+            GridModel(),
+            tmp_path / f"v{version}" / "grid.forecasts",
+            start_date="2023-01-30",
+            horizon=2,
+            stores=[1],
+            items=[3],
+            model_version=version,
+        )
+
+    def served_version(model_id):
+        return 2 if model_id == "grid" else None
+
+    # A table computed by another version of the model is not served
+    assert load_forecast_tables(tmp_path / "v1", model_version=served_version) == {}
+    tables = load_forecast_tables(tmp_path / "v2", model_version=served_version)
+    assert tables["grid"].model_version == 2
+    assert tables["grid"].metadata()["model_version"] == 2
+    # Tables of models with no known version are skipped too
+    assert load_forecast_tables(tmp_path / "v2", model_version=lambda model_id: None) == {}
@@ -0,0 +1,38 @@
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from usf_model_api import metrics
+from usf_model_api.serving.middleware import ServerTimingMiddleware, stage_timings
+
+app = FastAPI()
+app.add_middleware(ServerTimingMiddleware)
+
+
+@app.get("/items/{item_id}")
+def get_item(item_id: int):
+    with metrics.timed("lookup"):
+        return {"item_id": item_id}
+
+
+client = TestClient(app)
+
+
+def test_server_timing_disabled():
+    response = client.get("/items/1")
+    assert response.status_code == 200
+    assert "server-timing" not in response.headers
+
+
+def test_server_timing():
+    metrics.REQUEST_SECONDS.clear()
+    with patch.object(metrics.REGISTRY, "enabled", True):
+        response = client.get("/items/1")
+
+    assert response.json() == {"item_id": 1}
+    assert set(stage_timings(response.headers)) == {"lookup", "total"}
+
+    # Requests are labeled by route, not by URL
+    assert metrics.REQUEST_SECONDS.samples()[("GET", "/items/{item_id}", "200")][2] == 1
+    metrics.REQUEST_SECONDS.clear()
@@ -0,0 +1,186 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from usf_model_api.serving.database import make_database
+from usf_model_api.serving.persistence import (
+    MemorySink,
+    ParquetSink,
+    PersistenceSaturatedError,
+    PredictionSink,
+    WriteBehindWriter,
+    make_sink,
+)
+from usf_model_api.serving.storage import PredictionStore
+
+
+def _predictions(n: int, start: int = 0) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "prediction_id": np.arange(start, start + n).astype(str),
+            "store": np.arange(start, start + n),
+            "prediction": np.arange(start, start + n) * 0.5,
+        }
+    )
+
+
+class _RecordingSink(PredictionSink):
+    def __init__(self):
+        self.frames = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def write(self, predictions_df: pd.DataFrame):
+        self.release.wait()
+        self.frames.append(predictions_df)
+
+    def read(self) -> pd.DataFrame:
+        return pd.concat(self.frames, ignore_index=True)
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite", "parquet"])
+def test_sinks(tmp_path, kind):
+    path = tmp_path / ("predictions.db" if kind == "sqlite" else "predictions")
+    sink = make_sink(kind, path)
+    assert sink.read().empty
+
+    sink.write(_predictions(3))
+    sink.write(_predictions(2, start=3))
+    pd.testing.assert_frame_equal(sink.read(), _predictions(5))
+    sink.close()
+
+    # File-based sinks keep their predictions across instances
+    if kind != "memory":
+        sink = make_sink(kind, path)
+        sink.write(_predictions(1, start=5))
+        pd.testing.assert_frame_equal(sink.read(), _predictions(6))
+        sink.close()
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite", "parquet"])
+def test_sinks_lookup_and_query(tmp_path, kind):
+    path = tmp_path / ("predictions.db" if kind == "sqlite" else "predictions")
+    sink = make_sink(kind, path)
+    assert sink.lookup(["1"]).empty
+    assert sink.query()[0].empty
+
+    for start in range(0, 10, 3):
+        sink.write(_predictions(min(3, 10 - start), start=start))
+
+    assert sink.lookup(["7", "unknown", "2"])["prediction_id"].tolist() == ["7", "2"]
+    found, _ = sink.query({"store": (2, 8)})
+    assert found["store"].tolist() == list(range(2, 9))
+
+    # Pages span the frames written, oldest first
+    pages, cursor = [], None
+    while True:
+        found, cursor = sink.query({"store": (1, 8)}, limit=3, cursor=cursor)
+        pages.append(found["store"].tolist())
+        if cursor is None:
+            break
+    assert sum(pages, []) == list(range(1, 9))
+    assert all(len(page) == 3 for page in pages[:2])
+    sink.close()
+
+
+def test_sqlite_sink_shares_database_backend(tmp_path):
+    path = tmp_path / "usf.db"
+    sink = make_sink("sqlite", path)
+    # Connections are only opened on use, so the sink can be created before forking
+    assert sink.pool.metrics()["open"] == 0
+
+    database = make_database("sqlite", path)
+    sink.write(_predictions(3))
+    database.predictions_store.append(_predictions(2, start=3))
+    pd.testing.assert_frame_equal(sink.read(), _predictions(5))
+    found = database.predictions_store.lookup(["4", "1"])
+    assert found["prediction_id"].tolist() == ["4", "1"]
+    database.close()
+    sink.close()
+
+
+def test_parquet_sinks_share_directory(tmp_path):
+    # Like the workers of the service, both sinks are created before either of them writes
+    sinks = [ParquetSink(tmp_path), ParquetSink(tmp_path)]
+    for i in range(4):
+        sinks[i % 2].write(_predictions(2, start=2 * i))
+
+    assert [p.name for p in sinks[0].segments] == [f"predictions-{n:06d}.parquet" for n in range(4)]
+    assert not list(tmp_path.glob(".*"))
+    pd.testing.assert_frame_equal(sinks[1].read(), _predictions(8))
+
+
+def test_make_sink_errors():
+    with pytest.raises(ValueError, match="one of"):
+        make_sink("duckdb")
+    with pytest.raises(ValueError, match="Expected a path"):
+        make_sink("sqlite")
+
+
+def test_write_behind_writer_batches():
+    sink = _RecordingSink()
+    writer = WriteBehindWriter(sink, max_batch_rows=10, flush_interval_ms=60_000)
+    futures = [writer.submit(_predictions(4, start=4 * i)) for i in range(5)]
+    assert writer.submit(_predictions(0)).result() == 0
+
+    # Full batches are written without waiting for the flush interval; the rest on flush()
+    assert [f.result(timeout=5) for f in futures[:4]] == [4] * 4
+    assert writer.flush(timeout=5)
+    assert [f.result() for f in futures] == [4] * 5
+    assert [len(f) for f in sink.frames] == [8, 8, 4]
+    pd.testing.assert_frame_equal(sink.read(), _predictions(20))
+
+    metrics = writer.metrics()
+    assert metrics["written_rows"] == 20 and metrics["writes"] == 3
+    assert metrics["queued_rows"] == 0 and metrics["lag_s"] == 0.0
+    writer.close()
+
+
+def test_write_behind_writer_flush_interval():
+    store = PredictionStore()
+    writer = WriteBehindWriter(MemorySink(store), durability="ack", flush_interval_ms=10)
+    assert writer.submit(_predictions(3)).result(timeout=5) == 3
+    assert len(store) == 3
+    writer.close()
+
+
+def test_write_behind_writer_saturated():
+    sink = _RecordingSink()
+    sink.release.clear()
+    writer = WriteBehindWriter(sink, max_queue_rows=5, max_batch_rows=2, flush_interval_ms=0)
+
+    # The first frame is written (and blocks the writer); the next ones fill the queue
+    first = writer.submit(_predictions(2))
+    while writer.metrics()["queued_rows"]:
+        time.sleep(0.001)
+    queued = writer.submit(_predictions(5, start=2))
+    with pytest.raises(PersistenceSaturatedError):
+        writer.submit(_predictions(1, start=7))
+    metrics = writer.metrics()
+    assert metrics["queued_rows"] == 5 and metrics["rejected_rows"] == 1 and metrics["lag_s"] > 0
+
+    # Closing the writer writes the queued rows
+    sink.release.set()
+    writer.close(timeout=5)
+    assert first.result() == 2 and queued.result() == 5
+    pd.testing.assert_frame_equal(sink.read(), _predictions(7))
+    with pytest.raises(RuntimeError, match="closed"):
+        writer.submit(_predictions(1))
+
+
+def test_write_behind_writer_failed_write():
+    class FailingSink(PredictionSink):
+        def write(self, predictions_df: pd.DataFrame):
+            raise OSError("disk full")
+
+    writer = WriteBehindWriter(FailingSink(), flush_interval_ms=0)
+    future = writer.submit(_predictions(3))
+    with pytest.raises(OSError, match="disk full"):
+        future.result(timeout=5)
+
+    metrics = writer.metrics()
+    assert metrics["failed_writes"] == 1 and metrics["failed_rows"] == 3
+    writer.close()
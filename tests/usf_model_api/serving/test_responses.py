@@ -0,0 +1,51 @@
+import json
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from usf_model_api.serving.responses import encode_predictions
+
+
+@pytest.fixture
+def scored_df():
+    return pd.DataFrame(
+        {
+            "prediction_id": ["a", "b", "c"],
+            "date": ["2023-01-01", "2023-01-02", "2023-01-03"],
+            "store": np.array([1, 2, 3], dtype=np.int64),
+            "item": np.array([4, 5, 6], dtype=np.int16),
+            "prediction": [0.1, 1 / 3, 12345.678901234567],
+        }
+    )
+
+
+def test_records(scored_df):  # pylint: disable=redefined-outer-name
+    content = encode_predictions(scored_df, message="ok")
+
+    # Same content as the stdlib encoder, floats included
+    expected = {"message": "ok", "predictions": scored_df.to_dict(orient="records")}
+    assert json.loads(content) == expected
+    assert content == json.dumps(expected, separators=(",", ":")).encode()
+
+
+def test_columns(scored_df):  # pylint: disable=redefined-outer-name
+    content = json.loads(encode_predictions(scored_df, orient="columns"))
+
+    assert content["predictions"] == scored_df.to_dict(orient="list")
+    assert list(content["predictions"]) == list(scored_df.columns)
+
+
+def test_other_values():
+    scored_df = pd.DataFrame({"date": [date(2023, 1, 1)], "flag": [np.float16(0.5)]}, dtype=object)
+
+    for orient in ("records", "columns"):
+        predictions = json.loads(encode_predictions(scored_df, orient=orient))["predictions"]
+        assert predictions in (
+            [{"date": "2023-01-01", "flag": 0.5}],
+            {"date": ["2023-01-01"], "flag": [0.5]},
+        )
+
+    with pytest.raises(ValueError):
+        encode_predictions(scored_df, orient="index")
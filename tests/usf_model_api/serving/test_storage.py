@@ -0,0 +1,134 @@
+from datetime import date, datetime
+
+import pandas as pd
+import pytest
+
+from usf_model_api.serving.storage import PredictionStore, prediction_filters
+
+
+def _predictions(start: int, n: int) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "prediction_id": [str(i) for i in range(start, start + n)],
+            "prediction": [float(i) for i in range(start, start + n)],
+        }
+    )
+
+
+def test_append_is_lazy_until_read():
+    store = PredictionStore()
+    for i in range(5):
+        store.append(_predictions(i * 2, 2))
+
+    assert len(store._chunks) == 5
+    frame = store.frame
+    assert len(store._chunks) == 1
+    assert len(frame) == 10
+    assert frame.index.equals(pd.RangeIndex(10))
+    assert frame["prediction_id"].tolist() == [str(i) for i in range(10)]
+
+
+def test_empty_store():
+    store = PredictionStore()
+    store.append(pd.DataFrame())
+    assert len(store) == 0
+    assert store.frame.empty
+
+
+def test_bounded_window_drops_oldest_rows():
+    store = PredictionStore(max_rows=5)
+    store.append(_predictions(0, 3))
+    store.append(_predictions(3, 4))
+
+    assert len(store) == 5
+    assert store.num_evicted == 2
+    assert store.frame["prediction_id"].tolist() == ["2", "3", "4", "5", "6"]
+    assert not store.segments
+
+
+def test_bounded_window_spills_to_parquet(tmp_path):
+    store = PredictionStore(max_rows=4, spill_dir=tmp_path / "spill")
+    store.append(_predictions(0, 3))
+    store.append(_predictions(3, 3))
+    store.append(_predictions(6, 3))
+
+    assert len(store.segments) == 2
+    assert all(s.exists() for s in store.segments)
+    spilled = store.read_segments()
+    assert spilled["prediction_id"].tolist() == [str(i) for i in range(5)]
+    assert store.frame["prediction_id"].tolist() == [str(i) for i in range(5, 9)]
+
+
+def _scored(start: int, n: int) -> pd.DataFrame:
+    predictions = _predictions(start, n)
+    predictions["model_id"] = ["a" if i % 2 else "b" for i in range(start, start + n)]
+    predictions["store"] = [i % 3 for i in range(start, start + n)]
+    predictions["date"] = [f"2023-01-{i % 28 + 1:02d}" for i in range(start, start + n)]
+    return predictions
+
+
+def test_lookup():
+    store = PredictionStore(max_rows=20)
+    for i in range(6):
+        store.append(_scored(i * 5, 5))
+
+    found = store.lookup(["27", "12", "unknown", "10"])
+    assert found["prediction_id"].tolist() == ["27", "12", "10"]
+    assert found["prediction"].tolist() == [27.0, 12.0, 10.0]
+    # Evicted rows can no longer be looked up
+    assert store.lookup(["9"]).empty
+    assert store.lookup([]).empty
+
+
+def test_query():
+    store = PredictionStore()
+    for i in range(10):
+        store.append(_scored(i * 7, 7))
+
+    expected = _scored(0, 70)
+    mask = (expected["model_id"] == "a") & (expected["store"] == 1)
+    mask &= expected["date"].between("2023-01-05", "2023-01-20")
+    filters = {"model_id": ("a", "a"), "store": (1, 1), "date": ("2023-01-05", "2023-01-20")}
+    found, cursor = store.query(filters)
+    assert found["prediction_id"].tolist() == expected.loc[mask, "prediction_id"].tolist()
+    assert cursor is None
+    # Chunks are merged so that each is at least twice as large as the next
+    assert len(store._chunks) < 10
+
+    found, _ = store.query({"store": (None, 0)})
+    assert found["prediction_id"].tolist() == [str(i) for i in range(0, 70, 3)]
+    with pytest.raises(ValueError, match="filters on"):
+        store.query({"prediction": (0, 1)})
+
+
+def test_query_pages():
+    store = PredictionStore(max_rows=30)
+    for i in range(4):
+        store.append(_scored(i * 10, 10))
+
+    pages, cursor = [], None
+    while True:
+        found, cursor = store.query({"model_id": ("a", "a")}, limit=4, cursor=cursor)
+        pages.append(found["prediction_id"].tolist())
+        if cursor is None:
+            break
+        # Appends and evictions between pages do not shift the cursor
+        store.append(_scored(100 + len(pages), 1))
+
+    ids = [i for page in pages for i in page]
+    assert all(len(page) <= 4 for page in pages)
+    assert ids[:5] == ["11", "13", "15", "17", "19"]
+    assert len(ids) == len(set(ids))
+    assert store.query({"model_id": ("c", "c")})[0].empty
+
+
+def test_prediction_filters():
+    filters = prediction_filters(
+        store=1, date_from=date(2023, 1, 1), created_to=datetime(2023, 1, 2, 3, 4, 5, 6000)
+    )
+    assert filters == {
+        "store": (1, 1),
+        "date": ("2023-01-01", None),
+        "created_at": (None, "2023-01-02 03:04:05.006"),
+    }
+    assert not prediction_filters()
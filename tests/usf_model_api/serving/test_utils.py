@@ -1,12 +1,21 @@
 # pylint: disable=abstract-method, redefined-outer-name, unused-argument, protected-access
 from unittest.mock import MagicMock, patch
+import os
+from uuid import UUID
 import pytest
 
+import numpy as np
 import pandas as pd
 from sklearn.linear_model import LinearRegression
 from sklearn.impute import SimpleImputer
 
-from usf_model_api.serving.utils import MockDatabase
+from usf_model_api.serving.utils import (
+    MockDatabase,
+    generate_prediction_ids,
+    get_created_at,
+    partition_by_model,
+    to_iso_date,
+)
 from usf_model_api.models.base import PredictionModel
 
 
@@ -73,3 +82,155 @@ def test_save_predictions():
     assert "prediction_id" in db.predictions_db.columns
     assert "prediction" in db.predictions_db.columns
     assert "created_at" in db.predictions_db.columns
+
+
+def test_save_predictions_bounded():
+    db = MockDatabase(max_prediction_rows=3)
+    for i in range(3):
+        db.save_predictions(
+            pd.DataFrame({"prediction_id": [f"{i}a", f"{i}b"], "prediction": [i, i]})
+        )
+
+    assert len(db.predictions_db) == 3
+    assert db.predictions_db["prediction_id"].tolist() == ["1b", "2a", "2b"]
+    assert db.predictions_store.num_evicted == 3
+
+
+def test_generate_prediction_ids():
+    ids = generate_prediction_ids(100)
+    assert len(ids) == 100
+    assert len(set(ids)) == 100
+    for prediction_id in ids:
+        uuid = UUID(prediction_id)
+        assert uuid.version == 4
+        assert str(uuid) == prediction_id
+
+
+def test_get_created_at():
+    created_at = get_created_at()
+    assert len(created_at) == len("2023-01-01 00:00:00.000")
+    assert pd.to_datetime(created_at, format="%Y-%m-%d %H:%M:%S.%f") is not None
+
+
+@pytest.fixture
+def multi_model_dir(tmp_path):
+    model_dir = tmp_path / "multi"
+    model_dir.mkdir()
+    for model_id in ("model_a", "model_b", "model_c"):
+        LinearRegressionModel(model_id=model_id).serialize(model_dir / f"{model_id}.pkl")
+
+    return model_dir
+
+
+def test_parallel_eager_loading(multi_model_dir):
+    db = MockDatabase(model_dir=multi_model_dir, load_workers=3)
+    assert set(db.model_db) == {"model_a", "model_b", "model_c"}
+
+
+def test_lazy_loading(multi_model_dir):
+    db = MockDatabase(model_dir=multi_model_dir, lazy=True)
+    assert len(db.model_db) == 0
+    assert not db.list_models()["model_a"]["resident"]
+
+    model = db.get_model("model_a")
+    assert model.model_id == "model_a"
+    assert list(db.model_db) == ["model_a"]
+    assert db.get_model("model_a") is model
+    assert db.get_model("non_existent_model") is None
+
+
+def test_lru_eviction(multi_model_dir):
+    db = MockDatabase(model_dir=multi_model_dir, lazy=True, max_models=2)
+    db.get_model("model_a")
+    db.get_model("model_b")
+    db.get_model("model_a")
+    db.get_model("model_c")
+    assert list(db.model_db) == ["model_a", "model_c"]
+
+    # Evicted models are reloaded from disk on next use
+    assert db.get_model("model_b").model_id == "model_b"
+    assert "model_b" in db.model_db
+
+
+def test_refresh(multi_model_dir):
+    db = MockDatabase(model_dir=multi_model_dir)
+    changed = []
+    db.add_listener(changed.append)
+    previous = db.get_model("model_a")
+
+    LinearRegressionModel(model_id="model_a").serialize(multi_model_dir / "model_a.pkl")
+    stat = (multi_model_dir / "model_a.pkl").stat()
+    os.utime(multi_model_dir / "model_a.pkl", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    (multi_model_dir / "model_b.pkl").unlink()
+    LinearRegressionModel(model_id="model_d").serialize(multi_model_dir / "model_d.pkl")
+
+    changes = db.refresh()
+    assert changes == {"added": ["model_d"], "reloaded": ["model_a"], "removed": ["model_b"]}
+    assert db.get_model("model_a") is not previous
+    assert db.get_model("model_b") is None
+    assert db.get_model("model_d").model_id == "model_d"
+    assert changed == ["model_a", "model_b"]
+    assert db.refresh() == {"added": [], "reloaded": [], "removed": []}
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_models_are_identified_by_file_name(tmp_path, lazy):
+    model_dir = tmp_path / "renamed"
+    model_dir.mkdir()
+    LinearRegressionModel(model_id="model_a").serialize(model_dir / "renamed.pkl")
+
+    db = MockDatabase(model_dir=model_dir, lazy=lazy)
+    assert list(db.list_models()) == ["renamed"]
+    assert db.get_model("renamed").model_id == "model_a"
+    assert db.get_model("model_a") is None
+
+
+def test_load_models_notifies_listeners(multi_model_dir):
+    db = MockDatabase(model_dir=multi_model_dir)
+    changed = []
+    db.add_listener(changed.append)
+
+    db.load_models(multi_model_dir)
+    assert changed == ["model_a", "model_b", "model_c"]
+
+
+def test_lazy_load_racing_refresh(multi_model_dir):
+    db = MockDatabase(model_dir=multi_model_dir, lazy=True)
+    path = multi_model_dir / "model_a.pkl"
+
+    def load_then_update(model_path):
+        model = LinearRegressionModel(model_id="model_a")
+        # The file is updated and refreshed while the previous version is being loaded
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        db.refresh()
+        return model
+
+    with patch("usf_model_api.serving.utils.load_model", side_effect=load_then_update):
+        stale = db.get_model("model_a")
+
+    # The stale version serves the request that loaded it, but is not kept
+    assert "model_a" not in db.model_db
+    assert db.get_model("model_a") is not stale
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("2023-01-02", "2023-01-02"),
+        ("2023/01/02", "2023-01-02"),
+        ("01/02/2023", "2023-01-02"),
+        ("2023-1-2", None),
+        ("2023-13-45", None),
+    ],
+)
+def test_to_iso_date(value, expected):
+    assert to_iso_date(value) == expected
+
+
+def test_partition_by_model():
+    partitions = partition_by_model(pd.Series(["b", "a", "b", "c", "a"]))
+    assert list(partitions) == ["b", "a", "c"]
+    np.testing.assert_array_equal(partitions["b"], [0, 2])
+    np.testing.assert_array_equal(partitions["a"], [1, 4])
+    np.testing.assert_array_equal(partitions["c"], [3])
@@ -0,0 +1,110 @@
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import StandardScaler
+
+from usf_model_api import metrics
+from usf_model_api.metrics import Histogram, MetricsRegistry
+from usf_model_api.models.base import PredictionModel
+
+
+@pytest.fixture
+def enabled():
+    metrics.STAGE_SECONDS.clear()
+    with patch.object(metrics.REGISTRY, "enabled", True):
+        yield
+    metrics.STAGE_SECONDS.clear()
+
+
+@pytest.mark.parametrize(
+    "rows, bucket",
+    [
+        (None, ""),
+        (0, "1"),
+        (1, "1"),
+        (2, "2-10"),
+        (100, "11-100"),
+        (101, "101-1000"),
+        (10**6, "10001+"),
+    ],
+)
+def test_batch_size_bucket(rows, bucket):
+    assert metrics.batch_size_bucket(rows) == bucket
+
+
+def test_histogram_render():
+    histogram = Histogram("h_seconds", "A histogram.", ("stage",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "a")
+    histogram.observe(0.5, "a")
+    histogram.observe(5.0, "a")
+
+    assert histogram.render() == [
+        "# HELP h_seconds A histogram.",
+        "# TYPE h_seconds histogram",
+        'h_seconds_bucket{stage="a",le="0.1"} 1',
+        'h_seconds_bucket{stage="a",le="1.0"} 2',
+        'h_seconds_bucket{stage="a",le="+Inf"} 3',
+        'h_seconds_sum{stage="a"} 5.55',
+        'h_seconds_count{stage="a"} 3',
+    ]
+
+
+def test_registry_gauges():
+    registry = MetricsRegistry()
+    registry.register_gauges("usf_x", "X state.", lambda: {"pending": 2, "backend": "thread"})
+
+    assert registry.render().splitlines() == [
+        "# HELP usf_x_pending X state.",
+        "# TYPE usf_x_pending gauge",
+        "usf_x_pending 2.0",
+    ]
+
+
+def test_timed_disabled():
+    metrics.STAGE_SECONDS.clear()
+    with metrics.timed("stage"):
+        pass
+
+    assert not metrics.STAGE_SECONDS.samples()
+
+
+def test_timed(enabled):  # pylint: disable=redefined-outer-name, unused-argument
+    timings, token = metrics.start_request()
+    try:
+        with metrics.timed("stage", model_id="m", rows=5):
+            pass
+        with metrics.timed("stage", model_id="m", rows=5):
+            pass
+    finally:
+        metrics.end_request(token)
+
+    assert metrics.STAGE_SECONDS.samples()[("stage", "m", "2-10")][2] == 2
+    assert list(timings.stages) == ["stage"]
+    assert timings.server_timing().startswith("stage;dur=")
+    assert ", total;dur=" in timings.server_timing()
+
+
+def test_suppressed(enabled):  # pylint: disable=redefined-outer-name, unused-argument
+    with metrics.suppressed():
+        with metrics.timed("stage"):
+            pass
+    assert not metrics.STAGE_SECONDS.samples()
+
+    with metrics.timed("stage"):
+        pass
+    assert len(metrics.STAGE_SECONDS.samples()) == 1
+
+
+def test_predict_stages(enabled):  # pylint: disable=redefined-outer-name, unused-argument
+    X = pd.DataFrame({"store": np.arange(20.0), "item": np.arange(20.0) % 3})
+    model = PredictionModel("m", StandardScaler(), LinearRegression()).fit(X, X["store"] * 2)
+    expected = model.model.predict(X)
+
+    np.testing.assert_allclose(model.predict(X), expected)
+
+    samples = metrics.STAGE_SECONDS.samples()
+    assert samples[("preprocess", "m", "11-100")][2] == 1
+    assert samples[("inference", "m", "11-100")][2] == 1